@@ -3,6 +3,15 @@ ASGI config for sistema project.
 
 It exposes the ASGI callable as a module-level variable named ``application``.
 
+Las vistas asíncronas (el autocompletado de la caja y el escaneo de productos) solo liberan al
+servidor mientras esperan a la base de datos si se sirven con esta aplicación, por ejemplo::
+
+    uvicorn sistema.asgi:application --workers 2
+
+Con ASGI cada petición usa su propio hilo para las consultas, por lo que las conexiones
+persistentes no se reutilizan entre peticiones; por eso aquí DB_CONN_MAX_AGE es 0 por defecto
+(ver `sistema/settings.py`). Para compararla con WSGI, ver el comando ``prueba_carga``.
+
 For more information on this file, see
 https://docs.djangoproject.com/en/5.1/howto/deployment/asgi/
 """
@@ -12,5 +21,7 @@ import os
 from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'sistema.settings')
+# Cierra la conexión a la base de datos al terminar cada petición (ver la documentación del módulo).
+os.environ.setdefault('DB_CONN_MAX_AGE', '0')
 
 application = get_asgi_application()
@@ -12,6 +12,7 @@ https://docs.djangoproject.com/en/5.1/ref/settings/
 
 from pathlib import Path
 import os
+import tempfile
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
 
@@ -41,6 +42,8 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    # Mide consultas y tiempos de cada petición; va primero para incluir la sesión y el usuario.
+    'sistemaApp.instrumentacion.InstrumentacionMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -48,6 +51,8 @@ MIDDLEWARE = [
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
+    # Elige la base de datos de lectura de cada petición (ver sistemaApp.replicas).
+    'sistemaApp.replicas.ReplicaMiddleware',
 ]
 
 ROOT_URLCONF = 'sistema.urls'
@@ -63,6 +68,8 @@ TEMPLATES = [
                 'django.template.context_processors.request',
                 'django.contrib.auth.context_processors.auth',
                 'django.contrib.messages.context_processors.messages',
+                # Versiones para las claves de los fragmentos en caché (ver sistemaApp.fragmentos).
+                'sistemaApp.fragmentos.contexto',
             ],
         },
     },
@@ -74,6 +81,16 @@ WSGI_APPLICATION = 'sistema.wsgi.application'
 # Database
 # https://docs.djangoproject.com/en/5.1/ref/settings/#databases
 
+# Conexiones persistentes: cada hilo del servidor conserva su conexión entre peticiones durante
+# DB_CONN_MAX_AGE segundos (0 = una conexión nueva por petición; vacío = sin límite) y, con
+# DB_CONN_HEALTH_CHECKS, comprueba que siga respondiendo antes de reutilizarla. Debe ser menor que
+# `wait_timeout` de MySQL. Cada proceso abre a lo sumo una conexión por hilo, por lo que el tamaño
+# del conjunto de conexiones de cada proceso es su cantidad de hilos (por ejemplo, `gunicorn --threads`).
+# Con ASGI (`sistema/asgi.py`) el valor por defecto es 0.
+DB_CONN_MAX_AGE = os.environ.get('DB_CONN_MAX_AGE', '300')
+DB_CONN_MAX_AGE = int(DB_CONN_MAX_AGE) if DB_CONN_MAX_AGE else None
+DB_CONN_HEALTH_CHECKS = os.environ.get('DB_CONN_HEALTH_CHECKS', '1') == '1'
+
 DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.mysql',
@@ -82,9 +99,42 @@ DATABASES = {
         'PASSWORD': 'password',
         'HOST': 'db-aws-desarollo.c36u4u4mo6pa.us-east-2.rds.amazonaws.com',
         'PORT': '10060',
+        'CONN_MAX_AGE': DB_CONN_MAX_AGE,
+        'CONN_HEALTH_CHECKS': DB_CONN_HEALTH_CHECKS,
+        # Segundos que se espera al servidor antes de dar la base de datos por caída (ver
+        # sistemaApp.conexiones.es_error_conexion): sin ellos, una conexión cortada sin aviso deja
+        # la caja esperando hasta que el sistema operativo la cierra.
+        'OPTIONS': {
+            'connect_timeout': int(os.environ.get('DB_CONNECT_TIMEOUT', '5')),
+            'read_timeout': int(os.environ.get('DB_READ_TIMEOUT', '60')),
+            'write_timeout': int(os.environ.get('DB_WRITE_TIMEOUT', '30')),
+        },
     }
 }
 
+# Réplica de solo lectura (opcional): si se define DB_REPLICA_HOST, las vistas de reportes y
+# listados del back-office leen de ella (ver sistemaApp.replicas). Las lecturas vuelven a la base
+# principal durante REPLICA_ADHERENCIA segundos después de que el usuario escribe, y mientras la
+# réplica tenga más de REPLICA_RETRASO_MAXIMO segundos de retraso (se verifica cada
+# REPLICA_VERIFICACION segundos). REPLICA_ADHERENCIA debe ser mayor que REPLICA_RETRASO_MAXIMO.
+REPLICA_ALIAS = 'replica'
+REPLICA_RETRASO_MAXIMO = int(os.environ.get('DB_REPLICA_RETRASO_MAXIMO', '5'))
+REPLICA_ADHERENCIA = int(os.environ.get('DB_REPLICA_ADHERENCIA', '15'))
+REPLICA_VERIFICACION = int(os.environ.get('DB_REPLICA_VERIFICACION', '10'))
+
+if os.environ.get('DB_REPLICA_HOST'):
+    DATABASES[REPLICA_ALIAS] = dict(
+        DATABASES['default'],
+        HOST=os.environ['DB_REPLICA_HOST'],
+        PORT=os.environ.get('DB_REPLICA_PORT', DATABASES['default']['PORT']),
+        USER=os.environ.get('DB_REPLICA_USER', DATABASES['default']['USER']),
+        PASSWORD=os.environ.get('DB_REPLICA_PASSWORD', DATABASES['default']['PASSWORD']),
+        # En las pruebas la réplica es la misma base de pruebas.
+        TEST={'MIRROR': 'default'},
+    )
+
+DATABASE_ROUTERS = ['sistemaApp.replicas.RouterReplica']
+
 
 # Password validation
 # https://docs.djangoproject.com/en/5.1/ref/settings/#auth-password-validators
@@ -129,12 +179,85 @@ DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
 SESSION_EXPIRE_AT_BROWSER_CLOSE = True
 
-MIDDLEWARE += [
-    'django.middleware.cache.UpdateCacheMiddleware',
-    'django.middleware.cache.FetchFromCacheMiddleware',
-]
-
-CACHE_MIDDLEWARE_SECONDS = 0
-CACHE_MIDDLEWARE_KEY_PREFIX = ''
+# Sesiones y usuarios: se leen de la caché 'sesiones' y solo se consultan en la base de datos si
+# no están en ella, para que la caja pueda cobrar aunque la base de datos no responda (ver
+# VENTAS_MODO). El usuario de cada sesión se guarda USUARIOS_SEGUNDOS segundos y se descarta al
+# modificarlo (ver sistemaApp.autenticacion).
+SESSION_ENGINE = 'django.contrib.sessions.backends.cached_db'
+SESSION_CACHE_ALIAS = 'sesiones'
+SESIONES_CACHE = 'sesiones'
+AUTHENTICATION_BACKENDS = ['sistemaApp.autenticacion.BackendUsuariosEnCache']
+USUARIOS_SEGUNDOS = int(os.environ.get('USUARIOS_SEGUNDOS', '300'))
+
+# Carrito de la caja: se guarda fuera de la sesión, una entrada por producto.
+# 'sistemaApp.carrito.AlmacenCarritoCache' usa la caché indicada en CARRITO_CACHE, que debe ser
+# compartida por todos los procesos y tener lugar para todos los carritos abiertos (no una caché
+# en memoria local); 'sistemaApp.carrito.AlmacenCarritoBD' los guarda en la base de datos.
+CARRITO_ALMACEN = 'sistemaApp.carrito.AlmacenCarritoCache'
+CARRITO_CACHE = 'carritos'
+CARRITO_TIMEOUT = 60 * 60 * 12
+
+# Registro de ventas de la caja (ver sistemaApp.diario_ventas):
+# 'directo' registra la venta en la base de datos durante el cobro; 'respaldo' hace lo mismo,
+# pero si la base de datos no responde guarda la venta en el diario local; 'diferido' siempre
+# la guarda en el diario local. El comando `sincronizar_ventas` registra las ventas del diario.
+# El cobro no necesita la base de datos mientras la sesión, el usuario y el cliente de la venta
+# estén en caché; si alguno no está y la base de datos no responde, el cobro falla.
+VENTAS_MODO = os.environ.get('VENTAS_MODO', 'respaldo')
+VENTAS_DIARIO = os.environ.get('VENTAS_DIARIO', str(BASE_DIR / 'ventas_pendientes.sqlite3'))
+
+# Cachés: 'default' (en memoria), 'carritos' y 'fragmentos', con los fragmentos de
+# plantillas ({% cache %}) y las versiones de los datos que forman sus claves (ver
+# sistemaApp.fragmentos). 'fragmentos' se guarda en disco para que todos los procesos del servidor
+# vean las mismas versiones. Los fragmentos viven FRAGMENTOS_SEGUNDOS segundos, aunque dejan de
+# usarse antes si cambian los datos.
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+    'fragmentos': {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': os.environ.get('CACHE_FRAGMENTOS', str(BASE_DIR / 'cache_fragmentos')),
+        'OPTIONS': {'MAX_ENTRIES': 5000},
+    },
+    # Sesiones y usuarios (sin sus contraseñas; ver sistemaApp.autenticacion), en disco para que
+    # todos los procesos del servidor los compartan, fuera del directorio del proyecto.
+    'sesiones': {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': os.environ.get('CACHE_SESIONES', os.path.join(tempfile.gettempdir(), 'sistema_sesiones')),
+        'OPTIONS': {'MAX_ENTRIES': 20000},
+    },
+    # Carritos de las cajas (ver CARRITO_CACHE), en disco para que todos los procesos vean el mismo
+    # carrito. Cada carrito ocupa una entrada por producto más su índice: con MAX_ENTRIES entradas
+    # caben cientos de carritos grandes abiertos antes de que la caché empiece a descartar.
+    'carritos': {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': os.environ.get('CACHE_CARRITOS', os.path.join(tempfile.gettempdir(), 'sistema_carritos')),
+        'OPTIONS': {'MAX_ENTRIES': 50000},
+    },
+}
+FRAGMENTOS_CACHE = 'fragmentos'
+FRAGMENTOS_SEGUNDOS = int(os.environ.get('FRAGMENTOS_SEGUNDOS', '600'))
 
 LOGIN_URL = '/'
+
+# Crea las tablas de los modelos no gestionados en la base de pruebas.
+TEST_RUNNER = 'sistemaApp.ejecutor_pruebas.EjecutorPruebas'
+
+# Registro estructurado de la instrumentación de peticiones (una línea JSON por petición).
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'handlers': {
+        'consola': {
+            'class': 'logging.StreamHandler',
+        },
+    },
+    'loggers': {
+        'sistemaApp.instrumentacion': {
+            'handlers': ['consola'],
+            'level': os.environ.get('INSTRUMENTACION_NIVEL', 'INFO'),
+            'propagate': False,
+        },
+    },
+}
@@ -0,0 +1,39 @@
+"""
+Configuración para medir el rendimiento de las vistas con ``python manage.py benchmark``.
+
+Usa una base de datos local (SQLite por defecto, o un MySQL local si se definen las variables
+``BENCHMARK_MYSQL_*``) para no cargar datos sintéticos en la base real. Uso::
+
+    python manage.py benchmark --settings=sistema.settings_benchmark
+"""
+
+from .settings import *  # noqa: F401,F403
+
+#: Habilita el comando `benchmark`, que se niega a poblar otras bases de datos.
+BENCHMARK = True
+
+if os.environ.get('BENCHMARK_MYSQL_HOST'):
+    DATABASES = {
+        'default': {
+            'ENGINE': 'django.db.backends.mysql',
+            'NAME': os.environ.get('BENCHMARK_MYSQL_NAME', 'benchmark'),
+            'USER': os.environ.get('BENCHMARK_MYSQL_USER', 'root'),
+            'PASSWORD': os.environ.get('BENCHMARK_MYSQL_PASSWORD', ''),
+            'HOST': os.environ['BENCHMARK_MYSQL_HOST'],
+            'PORT': os.environ.get('BENCHMARK_MYSQL_PORT', '3306'),
+            'CONN_MAX_AGE': DB_CONN_MAX_AGE,
+            'CONN_HEALTH_CHECKS': DB_CONN_HEALTH_CHECKS,
+        }
+    }
+else:
+    DATABASES = {
+        'default': {
+            'ENGINE': 'django.db.backends.sqlite3',
+            'NAME': os.environ.get('BENCHMARK_DB', str(BASE_DIR / 'benchmark.sqlite3')),
+            'CONN_MAX_AGE': DB_CONN_MAX_AGE,
+            'CONN_HEALTH_CHECKS': DB_CONN_HEALTH_CHECKS,
+        }
+    }
+
+# Un hasher rápido para que crear el usuario del benchmark no distorsione las mediciones.
+PASSWORD_HASHERS = ['django.contrib.auth.hashers.MD5PasswordHasher']
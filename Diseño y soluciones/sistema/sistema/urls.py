@@ -25,7 +25,11 @@ urlpatterns = [
     path('home/', views.home, name = 'Home'),
     path('logout/',views.logout_view, name='logout'),
     path('gproductos/',views.gProductos, name='GestionProductos'),
+    path('gproductos/json/',views.productos_json, name='ProductosJson'),
     path('crearproducto/',views.crear_producto, name='CrearProducto'),
+    path('importarproductos/',views.importar_productos_view, name='ImportarProductos'),
+    path('stockbajo/',views.stock_bajo, name='StockBajo'),
+    path('stockbajo/json/',views.stock_bajo_json, name='StockBajoJson'),
     path('modificarproducto/<int:codigo_producto>/',views.modificar_producto, name='ModificarProducto'),
     path('eliminarproducto/<int:codigo_producto>/',views.eliminar_producto, name='EliminarProducto'),
     path('gdepartamentos/',views.gDepartamentos, name='GestionDepartamentos'),
@@ -38,16 +42,21 @@ urlpatterns = [
     path('modificarproveedor/<int:id>/',views.modificar_proveedor, name='ModificarProveedor'),
     path('eliminarproveedor/<int:id>/',views.eliminar_proveedor, name='EliminarProveedor'),
     path('gcliente/',views.gCliente, name='GestionClientes'),
+    path('gcliente/json/',views.clientes_json, name='ClientesJson'),
     path('crearcliente/',views.crear_cliente, name='CrearCliente'),
     path('modificarcliente/<int:id_cliente>/', views.modificar_cliente, name='ModificarCliente'),
     path('eliminarcliente/<int:id_cliente>/', views.eliminar_cliente, name='EliminarCliente'),
     path('clientes/abonar/<int:id_cliente>/', views.abonar_deuda, name='AbonarDeuda'),
     path('aumentar_deuda/<int:id_cliente>/', views.aumentar_deuda, name='AumentarDeuda'),
+    path('clientes/antiguedad/', views.antiguedad_deudas, name='AntiguedadDeudas'),
+    path('clientes/antiguedad/csv/', views.antiguedad_deudas_csv, name='AntiguedadDeudasCsv'),
     path('agregar_producto/', views.agregar_producto, name='AgregarProducto'),
+    path('escanear/', views.escanear_producto, name='EscanearProducto'),
     path('quitar/<str:codigo_producto>/', views.quitar_producto, name='QuitarProducto'),
     path('cancelar_venta/', views.cancelar_venta, name='CancelarVenta'),
     path('registrar_venta/', views.registrar_venta, name='RegistrarVenta'),
     path('historial_venta/', views.historial_ventas, name='HistorialVentas'),
+    path('historial_venta/<int:id_venta>/', views.detalle_venta, name='DetalleVenta'),
     path('generar_reporte_ventas/', views.generar_reporte_ventas, name='generar_reporte_ventas'),
     path('agregar_varios_productos/', views.agregar_varios_productos, name='agregar_varios_productos'),
     path('buscar_productos/', views.buscar_productos, name='buscar_productos'),
@@ -1,3 +1,13 @@
 from django.contrib import admin
+from .models import ReglaPrecio
 
-# Register your models here.
+
+@admin.register(ReglaPrecio)
+class ReglaPrecioAdmin(admin.ModelAdmin):
+    """
+    Administración de las reglas de precio. Los cambios se aplican a los productos con el
+    comando ``recalcular_precios``.
+    """
+    list_display = ('tipo', 'clave', 'margen', 'iva')
+    list_filter = ('tipo',)
+    ordering = ('tipo', 'clave')
@@ -4,3 +4,7 @@ from django.apps import AppConfig
 class SistemaappConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'sistemaApp'
+
+    def ready(self):
+        # Registra los receptores de señales (índice de búsqueda de productos y conexiones nuevas).
+        from . import conexiones, signals  # noqa: F401
@@ -0,0 +1,103 @@
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.contrib.auth.backends import ModelBackend
+from django.core.cache import caches
+from django.db import transaction
+
+
+#: Campos del usuario que se guardan en la caché: los que usan las peticiones (el id, el nombre,
+#: si está activo y si es superusuario o del personal). La contraseña y los demás campos no se
+#: guardan; si una vista los usa, se leen de la base de datos.
+CAMPOS_USUARIO = ('id', 'username', 'is_active', 'is_staff', 'is_superuser')
+
+
+def cache_sesiones():
+    """
+    Retorna la caché de las sesiones y los usuarios (``settings.SESIONES_CACHE``).
+    """
+    return caches[getattr(settings, 'SESIONES_CACHE', 'sesiones')]
+
+
+def _clave(id_usuario):
+    return f'usuario:{id_usuario}'
+
+
+def _registro(usuario):
+    """
+    Convierte un usuario en el registro que se guarda en la caché: los `CAMPOS_USUARIO` y el
+    hash de sesión, que es un HMAC de la contraseña (el mismo que ya guarda la sesión), no la
+    contraseña.
+    """
+    registro = {campo: getattr(usuario, campo) for campo in CAMPOS_USUARIO}
+    registro['hash_sesion'] = usuario.get_session_auth_hash()
+    return registro
+
+
+def _usuario(registro, using):
+    """
+    Arma un usuario con los campos del registro, como si se hubiera leído con ``only()``: los demás
+    campos se leen de la base de datos si se usan, y `save` solo guarda los campos cargados.
+    """
+    modelo = get_user_model()
+    # `from_db` recibe los valores en el orden de los campos del modelo.
+    campos = [campo.attname for campo in modelo._meta.concrete_fields if campo.attname in CAMPOS_USUARIO]
+    usuario = modelo.from_db(using, campos, [registro[campo] for campo in campos])
+
+    def hash_sesion():
+        # Si la contraseña se cargó (por ejemplo, para cambiarla), el hash se calcula con ella.
+        if 'password' in usuario.__dict__:
+            return modelo.get_session_auth_hash(usuario)
+        return registro['hash_sesion']
+
+    usuario.get_session_auth_hash = hash_sesion
+    return usuario
+
+
+class BackendUsuariosEnCache(ModelBackend):
+    """
+    `ModelBackend` que guarda en la caché de sesiones los datos del usuario de cada sesión
+    (ver `CAMPOS_USUARIO`) durante ``settings.USUARIOS_SEGUNDOS``.
+
+    `AuthenticationMiddleware` obtiene el usuario de la sesión en cada petición; con la caché, la
+    petición no consulta la base de datos para eso, y la caja puede cobrar aunque la base de datos
+    no responda (ver la vista `registrar_venta`). Los permisos no se guardan: se consultan cuando
+    se verifican.
+
+    El usuario se descarta de la caché cuando se guarda o elimina (incluido el cambio de
+    contraseña, de `is_active` o de los flags de permisos) y cuando cambian sus grupos o
+    permisos (ver `olvidar_usuario`). Los cambios hechos con ``update()``, que no envía señales,
+    se ven al vencer la caché.
+    """
+
+    def get_user(self, user_id):
+        cache = cache_sesiones()
+        registro = cache.get(_clave(user_id))
+        if registro is not None:
+            return _usuario(registro, 'default')
+        usuario = super().get_user(user_id)
+        if usuario is not None:
+            cache.set(_clave(user_id), _registro(usuario), getattr(settings, 'USUARIOS_SEGUNDOS', 300))
+        return usuario
+
+    async def aget_user(self, user_id):
+        cache = cache_sesiones()
+        registro = await cache.aget(_clave(user_id))
+        if registro is not None:
+            return _usuario(registro, 'default')
+        usuario = await super().aget_user(user_id)
+        if usuario is not None:
+            await cache.aset(_clave(user_id), _registro(usuario), getattr(settings, 'USUARIOS_SEGUNDOS', 300))
+        return usuario
+
+
+def olvidar_usuario(id_usuario):
+    """
+    Descarta el usuario de la caché de sesiones.
+
+    Se descarta de inmediato y otra vez al confirmarse la transacción en curso, para que otra
+    petición no guarde mientras tanto el usuario anterior.
+
+    :param id_usuario: Id del usuario.
+    """
+    cache_sesiones().delete(_clave(id_usuario))
+    transaction.on_commit(lambda: cache_sesiones().delete(_clave(id_usuario)))
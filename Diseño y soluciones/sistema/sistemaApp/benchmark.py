@@ -0,0 +1,754 @@
+import asyncio
+import io
+import math
+import queue
+import random
+import sys
+import threading
+import time
+import tracemalloc
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+from urllib.parse import urlencode
+from django.apps import apps
+from django.contrib.auth.models import User
+from django.core.handlers.asgi import ASGIHandler
+from django.core.handlers.wsgi import WSGIHandler
+from django.core.management import call_command
+from django.db import DEFAULT_DB_ALIAS, close_old_connections, connection, connections, transaction
+from django.db.backends.signals import connection_created
+from django.test.utils import CaptureQueriesContext
+from django.urls import URLPattern, get_resolver, reverse
+from django.utils import timezone
+from . import busqueda, conexiones, fragmentos
+from .models import Categoria, Cliente, DetalleVenta, MovimientoDeuda, Producto, Proveedor, Venta
+from .precios import calcular_precio_venta
+
+
+#: Tamaños de los conjuntos de datos sintéticos.
+ESCALAS = {
+    'pequena': {'categorias': 20, 'proveedores': 50, 'productos': 1_000, 'clientes': 500, 'ventas': 20_000},
+    'mediana': {'categorias': 50, 'proveedores': 200, 'productos': 10_000, 'clientes': 5_000, 'ventas': 200_000},
+    'grande': {'categorias': 100, 'proveedores': 500, 'productos': 100_000, 'clientes': 50_000, 'ventas': 2_000_000},
+}
+
+#: Cantidad de filas por `bulk_create` al poblar la base.
+TAMANO_LOTE = 5_000
+
+#: Fecha de la última venta sintética. Es fija para que los datos sean reproducibles.
+FECHA_FINAL = datetime(2024, 12, 31, 21, 0)
+
+#: Días que abarcan las ventas sintéticas.
+DIAS_DE_VENTAS = 365
+
+#: Nombre del usuario con el que se recorren las vistas.
+USUARIO_BENCHMARK = 'benchmark'
+
+#: Cantidad de vendedores sintéticos.
+VENDEDORES = 5
+
+#: Métodos de pago de las ventas sintéticas.
+METODOS_PAGO = ['Efectivo', 'Tarjeta', 'Transferencia', 'Deuda']
+
+#: Nombres de URL que no se miden (cerrar sesión invalidaría el cliente de prueba).
+URLS_OMITIDAS = {'logout'}
+
+#: Viajes de ida y vuelta que cuesta abrir una conexión a MySQL por la red: TCP (1), TLS (2) y
+#: autenticación (2).
+VIAJES_CONEXION = 5
+
+#: Configuraciones de conexión que compara `medir_conexiones`.
+MODOS_CONEXION = {
+    'por_peticion': {'CONN_MAX_AGE': 0, 'CONN_HEALTH_CHECKS': False},
+    'persistente': {'CONN_MAX_AGE': 300, 'CONN_HEALTH_CHECKS': True},
+}
+
+#: Recorridos que mide `medir_conexiones`: nombres de URL que se piden en orden.
+RECORRIDOS_CONEXION = {
+    'busqueda': ['buscar_productos'],
+    'cobro': ['EscanearProducto', 'RegistrarVenta'],
+}
+
+#: Configuración de conexión de cada servidor que compara `medir_carga`. Con ASGI cada petición
+#: usa su propio hilo para la base de datos, por lo que las conexiones persistentes no se
+#: reutilizarían (ver `sistema/asgi.py`).
+SERVIDORES_CARGA = {
+    'wsgi': {'CONN_MAX_AGE': 300, 'CONN_HEALTH_CHECKS': True},
+    'asgi': {'CONN_MAX_AGE': 0, 'CONN_HEALTH_CHECKS': False},
+}
+
+_ARTICULOS = ['Arroz', 'Azúcar', 'Leche', 'Aceite', 'Fideos', 'Harina', 'Café', 'Té', 'Jabón', 'Detergente',
+              'Galletas', 'Atún', 'Yogur', 'Queso', 'Pan', 'Mantequilla', 'Sal', 'Jugo', 'Cereal', 'Shampoo']
+_MARCAS = ['Andes', 'Austral', 'Cordillera', 'Pacífico', 'Valle', 'Sur', 'Norte', 'Maipo', 'Elqui', 'Maule']
+_FORMATOS = ['250 g', '500 g', '1 kg', '1 L', '2 L', '400 ml', 'x6', 'x12']
+_NOMBRES = ['Ana', 'Juan', 'María', 'Pedro', 'Sofía', 'Diego', 'Camila', 'Jorge', 'Valentina', 'Luis']
+_APELLIDOS = ['González', 'Muñoz', 'Rojas', 'Díaz', 'Pérez', 'Soto', 'Contreras', 'Silva', 'Martínez', 'Sepúlveda']
+
+#: Tablas que se vacían antes de poblar, en orden de dependencias.
+_TABLAS = ['deuda_pendiente', 'movimiento_deuda', 'venta_clave', 'detalle_venta', 'resumen_venta_diario',
+           'valorizacion_inventario', 'stock_bajo', 'carrito_linea', 'venta', 'producto', 'cliente', 'proveedor',
+           'categoria']
+
+#: Primer código de producto sintético.
+_CODIGO_INICIAL = 1_000_000
+
+
+def preparar_base():
+    """
+    Crea las tablas de la base local del benchmark.
+
+    Las tablas de los modelos no gestionados (``managed = False``) no las crean las migraciones,
+    por lo que se crean directamente con el editor de esquema antes de migrar el resto.
+    """
+    call_command('migrate', 'auth', verbosity=0)
+    existentes = set(connection.introspection.table_names())
+    with connection.schema_editor() as editor:
+        for modelo in apps.get_app_config('sistemaApp').get_models():
+            if not modelo._meta.managed and modelo._meta.db_table not in existentes:
+                editor.create_model(modelo)
+    call_command('migrate', verbosity=0)
+
+
+def base_poblada(escala):
+    """
+    Indica si la base ya tiene los datos sintéticos de la escala indicada.
+
+    :param escala: Diccionario de `ESCALAS`.
+    :rtype: bool
+    """
+    return (
+        Producto.objects.count() == escala['productos']
+        and Cliente.objects.count() == escala['clientes']
+        and Venta.objects.count() == escala['ventas']
+    )
+
+
+def vaciar_base():
+    """
+    Elimina los datos de negocio y los usuarios del benchmark.
+    """
+    existentes = set(connection.introspection.table_names())
+    with transaction.atomic(), connection.cursor() as cursor:
+        for tabla in _TABLAS:
+            if tabla in existentes:
+                cursor.execute(f"DELETE FROM {connection.ops.quote_name(tabla)}")
+        User.objects.filter(username__startswith=USUARIO_BENCHMARK).delete()
+
+
+def _en_lotes(modelo, filas):
+    """
+    Inserta las filas de un generador con `bulk_create`, por lotes de `TAMANO_LOTE`.
+    """
+    lote = []
+    for fila in filas:
+        lote.append(fila)
+        if len(lote) == TAMANO_LOTE:
+            modelo.objects.bulk_create(lote)
+            lote = []
+    if lote:
+        modelo.objects.bulk_create(lote)
+
+
+def poblar(escala, semilla, salida=None):
+    """
+    Puebla la base con datos sintéticos reproducibles: la misma escala y semilla generan
+    siempre los mismos datos.
+
+    Las filas se insertan con `bulk_create`, por lo que no se disparan las señales de los
+    modelos; al final se reconstruyen el resumen de ventas y la valorización del inventario, y
+    se vacía la caché de fragmentos de plantillas.
+
+    :param escala: Diccionario de `ESCALAS`.
+    :param semilla: Semilla del generador de números aleatorios.
+    :param salida: Flujo donde informar el avance (por ejemplo `self.stdout` de un comando).
+    :return: Usuario con el que se recorren las vistas.
+    :rtype: User
+    """
+    aleatorio = random.Random(semilla)
+
+    def informar(texto):
+        if salida is not None:
+            salida.write(texto)
+
+    vaciar_base()
+    usuario = User.objects.create_superuser(USUARIO_BENCHMARK, password=USUARIO_BENCHMARK)
+    vendedores = [usuario.pk] + [
+        User.objects.create_user(f'{USUARIO_BENCHMARK}_vendedor{i}', password=USUARIO_BENCHMARK).pk
+        for i in range(1, VENDEDORES)
+    ]
+
+    informar("Poblando categorías, proveedores y clientes...")
+    Categoria.objects.bulk_create([
+        Categoria(categoria_id=i, nombre=f'{_ARTICULOS[i % len(_ARTICULOS)]} {i}')
+        for i in range(1, escala['categorias'] + 1)
+    ])
+    _en_lotes(Proveedor, (
+        Proveedor(id=i, nombre=f'Distribuidora {_MARCAS[i % len(_MARCAS)]} {i}', telefono=f'+569{aleatorio.randrange(10**8):08d}')
+        for i in range(1, escala['proveedores'] + 1)
+    ))
+    _en_lotes(Cliente, (
+        Cliente(
+            id_cliente=i,
+            nombre=aleatorio.choice(_NOMBRES),
+            apellido=aleatorio.choice(_APELLIDOS),
+            telefono=f'+569{aleatorio.randrange(10**8):08d}',
+            limite_credito=aleatorio.choice([-1, 50_000, 100_000, 200_000]),
+            deuda=aleatorio.choice([0, 0, 0, aleatorio.randrange(50_000)]),
+        )
+        for i in range(1, escala['clientes'] + 1)
+    ))
+    # La deuda inicial de cada cliente queda registrada como ajuste en el libro de deudas.
+    _en_lotes(MovimientoDeuda, (
+        MovimientoDeuda(cliente_id=id_cliente, tipo=MovimientoDeuda.AJUSTE, monto=deuda, saldo=deuda)
+        for id_cliente, deuda in Cliente.objects.filter(deuda__gt=0).values_list('id_cliente', 'deuda')
+    ))
+
+    informar("Poblando productos...")
+    precios = {}
+    productos = []
+    for i in range(escala['productos']):
+        codigo = _CODIGO_INICIAL + i
+        costo = aleatorio.randrange(200, 20_000)
+        precios[codigo] = calcular_precio_venta(costo)
+        productos.append(Producto(
+            codigo_producto=codigo,
+            nombre_producto=f'{_ARTICULOS[i % len(_ARTICULOS)]} {aleatorio.choice(_MARCAS)} {aleatorio.choice(_FORMATOS)} {i}',
+            precio_costo=costo,
+            precio_venta=precios[codigo],
+            stock_minimo=aleatorio.randrange(1, 20),
+            stock_actual=aleatorio.randrange(0, 500),
+            categoria_id=aleatorio.randrange(1, escala['categorias'] + 1),
+        ))
+    _en_lotes(Producto, productos)
+    del productos
+
+    informar("Poblando ventas...")
+    codigos = list(precios)
+    final = timezone.make_aware(FECHA_FINAL)
+    segundos = DIAS_DE_VENTAS * 24 * 60 * 60
+    for inicio in range(0, escala['ventas'], TAMANO_LOTE):
+        ventas, detalles = [], []
+        for id_venta in range(inicio + 1, min(inicio + TAMANO_LOTE, escala['ventas']) + 1):
+            lineas = {aleatorio.choice(codigos): aleatorio.randrange(1, 4) for _ in range(aleatorio.randrange(1, 5))}
+            metodo = aleatorio.choice(METODOS_PAGO)
+            ventas.append(Venta(
+                id_venta=id_venta,
+                fecha=final - timedelta(seconds=aleatorio.randrange(segundos)),
+                total=sum(precios[codigo] * cantidad for codigo, cantidad in lineas.items()),
+                metodo_pago=metodo,
+                id_cliente_id=aleatorio.randrange(1, escala['clientes'] + 1) if metodo == 'Deuda' or aleatorio.random() < 0.3 else None,
+                vendedor_id=aleatorio.choice(vendedores),
+            ))
+            detalles.extend(
+                DetalleVenta(venta_id=id_venta, producto_id=codigo, cantidad=cantidad, precio_venta=precios[codigo])
+                for codigo, cantidad in lineas.items()
+            )
+        with transaction.atomic():
+            Venta.objects.bulk_create(ventas)
+            DetalleVenta.objects.bulk_create(detalles, batch_size=TAMANO_LOTE)
+        informar(f"  {min(inicio + TAMANO_LOTE, escala['ventas'])} / {escala['ventas']} ventas")
+
+    informar("Reconstruyendo resumen de ventas, valorización del inventario, stock bajo y antigüedad de deudas...")
+    call_command('reconstruir_resumen_ventas', stdout=io.StringIO())
+    call_command('verificar_valorizacion', corregir=True, stdout=io.StringIO())
+    call_command('reconstruir_stock_bajo', stdout=io.StringIO())
+    call_command('reconstruir_antiguedad_deudas', stdout=io.StringIO())
+    fragmentos.cache_fragmentos().clear()
+    return usuario
+
+
+def muestra_de_datos():
+    """
+    Elige los registros que se usan como argumentos de las URLs, siempre los mismos para
+    una misma base.
+
+    :return: Diccionario con los valores de los argumentos de las URLs y de los formularios.
+    :rtype: dict
+    """
+    producto = Producto.objects.order_by('codigo_producto').only('codigo_producto', 'nombre_producto').first()
+    fin = timezone.localdate(timezone.make_aware(FECHA_FINAL))
+    return {
+        'codigo_producto': producto.codigo_producto,
+        'categoria_id': Categoria.objects.order_by('categoria_id').values_list('categoria_id', flat=True).first(),
+        'id': Proveedor.objects.order_by('id').values_list('id', flat=True).first(),
+        'id_cliente': Cliente.objects.order_by('id_cliente').values_list('id_cliente', flat=True).first(),
+        'id_venta': Venta.objects.order_by('-id_venta').values_list('id_venta', flat=True).first(),
+        'termino': producto.nombre_producto.split()[0][:4],
+        'cliente': Cliente.objects.order_by('id_cliente').values_list('apellido', flat=True).first()[:3],
+        'desde': (fin - timedelta(days=6)).isoformat(),
+        'hasta': fin.isoformat(),
+    }
+
+
+def peticiones(muestra):
+    """
+    Arma una petición por cada nombre de URL de `sistema/urls.py`.
+
+    Las URLs sin formulario se piden por GET; las que procesan datos usan los de `muestra`.
+    Los argumentos de la ruta (por ejemplo ``<int:codigo_producto>``) se toman de `muestra`
+    por su nombre.
+
+    :param muestra: Diccionario retornado por `muestra_de_datos`.
+    :return: Lista de diccionarios con `nombre`, `metodo`, `url`, `datos` y opcionalmente
+             `preparar` (función que recibe el cliente y se ejecuta antes de cada medición,
+             sin medirla).
+    :rtype: list
+    """
+    codigo = muestra['codigo_producto']
+
+    def cargar_carrito(cliente):
+        cliente.post(reverse('EscanearProducto'), {'codigo': codigo, 'cantidad': 1})
+
+    especiales = {
+        'buscar_productos': {'datos': {'q': muestra['termino']}},
+        'ProductosJson': {'datos': {'q': muestra['termino']}},
+        'ClientesJson': {'datos': {'q': muestra['cliente']}},
+        'agregar_varios_productos': {'metodo': 'post', 'datos': {'codigo_producto': codigo, 'cantidad': 1}},
+        'AgregarProducto': {'metodo': 'post', 'datos': {'producto': codigo, 'cantidad': 1}},
+        'EscanearProducto': {'metodo': 'post', 'datos': {'codigo': codigo, 'cantidad': 1}},
+        'RegistrarVenta': {'metodo': 'post', 'datos': {'metodo_pago': 'Efectivo'}, 'preparar': cargar_carrito},
+        'AbonarDeuda': {'metodo': 'post', 'datos': {'monto': 1}},
+        'AumentarDeuda': {'metodo': 'post', 'datos': {'monto': 1}},
+        'generar_reporte_ventas': {'metodo': 'post', 'datos': {'desde': muestra['desde'], 'hasta': muestra['hasta']}},
+    }
+
+    resultado = []
+    for patron in get_resolver().url_patterns:
+        if not isinstance(patron, URLPattern) or not patron.name or patron.name in URLS_OMITIDAS:
+            continue
+        argumentos = {nombre: muestra[nombre] for nombre in patron.pattern.converters}
+        peticion = {'nombre': patron.name, 'metodo': 'get', 'datos': {}}
+        peticion.update(especiales.get(patron.name, {}))
+        peticion['url'] = reverse(patron.name, kwargs=argumentos)
+        resultado.append(peticion)
+    return resultado
+
+
+def percentil(valores, porcentaje):
+    """
+    Calcula un percentil por el método del rango más cercano.
+
+    :param valores: Lista de números.
+    :param porcentaje: Percentil entre 0 y 100.
+    :rtype: float
+    """
+    ordenados = sorted(valores)
+    posicion = max(0, math.ceil(porcentaje / 100 * len(ordenados)) - 1)
+    return ordenados[posicion]
+
+
+def _ejecutar(cliente, peticion):
+    """
+    Ejecuta una petición dentro de una transacción que se revierte al terminar, para que las
+    vistas que modifican datos puedan medirse varias veces sobre los mismos datos.
+
+    :return: Tupla ``(respuesta, segundos, consultas)``.
+    """
+    with transaction.atomic():
+        if peticion.get('preparar'):
+            peticion['preparar'](cliente)
+        with CaptureQueriesContext(connection) as consultas:
+            inicio = time.perf_counter()
+            respuesta = getattr(cliente, peticion['metodo'])(peticion['url'], peticion['datos'])
+            if respuesta.streaming:
+                b''.join(respuesta.streaming_content)
+            duracion = time.perf_counter() - inicio
+        transaction.set_rollback(True)
+    return respuesta, duracion, len(consultas)
+
+
+def medir(cliente, peticion, repeticiones):
+    """
+    Mide una petición: latencia (percentiles), cantidad de consultas y memoria máxima.
+
+    Se hace una ejecución previa sin medir (por ejemplo, para que se construyan los índices en
+    memoria), luego `repeticiones` ejecuciones para la latencia y las consultas, y una última
+    con `tracemalloc` para la memoria, que no se incluye en la latencia.
+
+    :param cliente: Cliente de pruebas de Django con la sesión iniciada.
+    :param peticion: Diccionario retornado por `peticiones`.
+    :param repeticiones: Cantidad de ejecuciones medidas.
+    :return: Diccionario con los resultados de la petición.
+    :rtype: dict
+    """
+    respuesta, _, _ = _ejecutar(cliente, peticion)
+    tiempos, consultas = [], []
+    for _ in range(repeticiones):
+        respuesta, duracion, cantidad = _ejecutar(cliente, peticion)
+        tiempos.append(duracion * 1000)
+        consultas.append(cantidad)
+
+    tracemalloc.start()
+    try:
+        _ejecutar(cliente, peticion)
+        memoria = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+    return {
+        'metodo': peticion['metodo'].upper(),
+        'url': peticion['url'],
+        'estado': respuesta.status_code,
+        'consultas': max(consultas),
+        'p50_ms': round(percentil(tiempos, 50), 3),
+        'p90_ms': round(percentil(tiempos, 90), 3),
+        'p99_ms': round(percentil(tiempos, 99), 3),
+        'media_ms': round(sum(tiempos) / len(tiempos), 3),
+        'memoria_pico_kb': round(memoria / 1024, 1),
+    }
+
+
+def comparar(resultados, base, tolerancia, minimo_ms=1.0):
+    """
+    Compara los resultados con una medición anterior.
+
+    Una vista empeora si hace más consultas que antes o si su p50 supera al anterior en más de
+    la tolerancia (y en más de `minimo_ms`, para no reportar ruido en vistas muy rápidas).
+
+    :param resultados: Diccionario ``{nombre_url: resultado}`` de la medición actual.
+    :param base: Diccionario con el mismo formato de la medición anterior.
+    :param tolerancia: Aumento relativo permitido del p50 (por ejemplo 0.2 para 20 %).
+    :param minimo_ms: Aumento absoluto mínimo del p50 para considerarlo un empeoramiento.
+    :return: Lista de textos con las vistas que empeoraron.
+    :rtype: list
+    """
+    empeoradas = []
+    for nombre, actual in resultados.items():
+        anterior = base.get(nombre)
+        if anterior is None:
+            continue
+        if actual['consultas'] > anterior['consultas']:
+            empeoradas.append(f"{nombre}: {anterior['consultas']} -> {actual['consultas']} consultas")
+        limite = max(anterior['p50_ms'] * (1 + tolerancia), anterior['p50_ms'] + minimo_ms)
+        if actual['p50_ms'] > limite:
+            empeoradas.append(f"{nombre}: p50 {anterior['p50_ms']} ms -> {actual['p50_ms']} ms")
+    return empeoradas
+
+
+@contextmanager
+def latencia_simulada(milisegundos):
+    """
+    Simula una base de datos remota sobre la base local del benchmark.
+
+    Mientras dura el bloque, cada consulta y cada comprobación de la conexión (``CONN_HEALTH_CHECKS``)
+    esperan `milisegundos` (un viaje de ida y vuelta), y cada conexión nueva espera
+    `VIAJES_CONEXION` veces ese tiempo. Se aplica a la conexión del hilo actual y a las conexiones
+    que se abran en otros hilos durante el bloque (por ejemplo, las de `medir_carga`).
+
+    :param milisegundos: Latencia de un viaje de ida y vuelta.
+    """
+    espera = milisegundos / 1000
+    instaladas = []
+
+    def consulta(execute, sql, params, many, context):
+        time.sleep(espera)
+        return execute(sql, params, many, context)
+
+    def instalar(conexion):
+        if consulta in conexion.execute_wrappers:
+            return
+        es_usable = conexion.is_usable
+
+        def comprobar_conexion():
+            time.sleep(espera)
+            return es_usable()
+
+        # Va primero en la lista: `execute_wrapper` quita el último al salir del bloque, y la
+        # conexión puede abrirse dentro del bloque de otro (por ejemplo, del middleware).
+        conexion.execute_wrappers.insert(0, consulta)
+        conexion.is_usable = comprobar_conexion
+        instaladas.append(conexion)
+
+    def conexion_nueva(sender, connection, **kwargs):
+        time.sleep(espera * VIAJES_CONEXION)
+        instalar(connection)
+
+    instalar(connections[DEFAULT_DB_ALIAS])
+    connection_created.connect(conexion_nueva)
+    try:
+        yield
+    finally:
+        connection_created.disconnect(conexion_nueva)
+        for conexion in instaladas:
+            conexion.execute_wrappers.remove(consulta)
+            del conexion.is_usable
+
+
+def _ejecutar_con_conexion(cliente, peticion):
+    """
+    Ejecuta una petición cerrando antes y después las conexiones vencidas, como lo hace el servidor
+    con las señales `request_started` y `request_finished` (el cliente de pruebas no las cierra).
+
+    :return: Tupla ``(respuesta, segundos, consultas)``.
+    """
+    inicio = time.perf_counter()
+    close_old_connections()
+    try:
+        respuesta, _, consultas = _ejecutar(cliente, peticion)
+    finally:
+        close_old_connections()
+    return respuesta, time.perf_counter() - inicio, consultas
+
+
+def _conexiones_abiertas():
+    return conexiones.estadisticas.como_dict().get(connection.alias, {}).get('abiertas', 0)
+
+
+def medir_conexiones(cliente, peticiones, milisegundos, repeticiones):
+    """
+    Compara el costo de los recorridos de `RECORRIDOS_CONEXION` con cada configuración de
+    `MODOS_CONEXION`, con una latencia simulada de `milisegundos` por viaje a la base de datos
+    (ver `latencia_simulada`).
+
+    :param cliente: Cliente de pruebas de Django con la sesión iniciada.
+    :param peticiones: Lista retornada por `peticiones`.
+    :param milisegundos: Latencia de un viaje de ida y vuelta (0 si la base ya es remota).
+    :param repeticiones: Cantidad de veces que se mide cada recorrido.
+    :return: Diccionario ``{modo: {recorrido: resultado}}``.
+    :rtype: dict
+    """
+    por_nombre = {peticion['nombre']: peticion for peticion in peticiones}
+    # El carrito del cobro lo carga el escaneo anterior del mismo recorrido.
+    recorridos = {
+        nombre: [dict(por_nombre[url], preparar=None) for url in urls] for nombre, urls in RECORRIDOS_CONEXION.items()
+    }
+    originales = {clave: connection.settings_dict[clave] for clave in MODOS_CONEXION['persistente']}
+    resultados = {}
+    try:
+        for modo, opciones in MODOS_CONEXION.items():
+            connection.close()
+            connection.settings_dict.update(opciones)
+            resultados[modo] = {}
+            with latencia_simulada(milisegundos):
+                for nombre, pasos in recorridos.items():
+                    for paso in pasos:
+                        _ejecutar_con_conexion(cliente, paso)
+                    abiertas = _conexiones_abiertas()
+                    tiempos, consultas = [], 0
+                    for _ in range(repeticiones):
+                        duracion = 0.0
+                        for paso in pasos:
+                            respuesta, segundos, cantidad = _ejecutar_con_conexion(cliente, paso)
+                            duracion += segundos
+                            consultas += cantidad
+                        tiempos.append(duracion * 1000)
+                    abiertas = _conexiones_abiertas() - abiertas
+                    resultados[modo][nombre] = {
+                        'estado': respuesta.status_code,
+                        'peticiones': len(pasos) * repeticiones,
+                        'conexiones_abiertas': abiertas,
+                        'consultas': round(consultas / repeticiones, 1),
+                        'p50_ms': round(percentil(tiempos, 50), 3),
+                        'p90_ms': round(percentil(tiempos, 90), 3),
+                        'media_ms': round(sum(tiempos) / len(tiempos), 3),
+                    }
+    finally:
+        connection.close()
+        connection.settings_dict.update(originales)
+    return resultados
+
+
+def urls_busqueda(cantidad):
+    """
+    Arma las URLs de búsqueda que genera el autocompletado de la caja mientras se escribe: los
+    prefijos de uno a cuatro caracteres de los nombres de los artículos.
+
+    :param cantidad: Cantidad de URLs.
+    :rtype: list
+    """
+    terminos = [articulo[:largo] for articulo in _ARTICULOS for largo in range(1, 5)]
+    url = reverse('buscar_productos')
+    return [f"{url}?{urlencode({'q': terminos[i % len(terminos)]})}" for i in range(cantidad)]
+
+
+def _resultado_carga(tiempos, estados, segundos):
+    """
+    Resume una prueba de carga.
+
+    :param tiempos: Latencia de cada petición, en milisegundos (incluida la espera en cola).
+    :param estados: Código de estado de cada petición.
+    :param segundos: Duración total de la prueba.
+    :rtype: dict
+    """
+    return {
+        'peticiones': len(tiempos),
+        'errores': sum(1 for estado in estados if estado != 200),
+        'peticiones_por_segundo': round(len(tiempos) / segundos, 1),
+        'p50_ms': round(percentil(tiempos, 50), 3),
+        'p95_ms': round(percentil(tiempos, 95), 3),
+        'maximo_ms': round(max(tiempos), 3),
+    }
+
+
+def carga_wsgi(urls, cookie, concurrencia, hilos):
+    """
+    Pide las URLs por GET a la aplicación WSGI desde `concurrencia` clientes simultáneos,
+    atendidos por un trabajador de `hilos` hilos (como ``gunicorn --threads``): las peticiones
+    que no encuentran un hilo libre esperan en cola.
+
+    :param urls: Lista de URLs a pedir (cada una una vez).
+    :param cookie: Cabecera ``Cookie`` con la sesión iniciada.
+    :return: Tupla ``(tiempos, estados, segundos)``.
+    """
+    aplicacion = WSGIHandler()
+    pendientes = queue.SimpleQueue()
+    for url in urls:
+        pendientes.put(url)
+    tiempos, estados = [], []
+    bloqueo = threading.Lock()
+
+    def atender(url):
+        ruta, _, consulta = url.partition('?')
+        entorno = {
+            'REQUEST_METHOD': 'GET',
+            'SCRIPT_NAME': '',
+            'PATH_INFO': ruta,
+            'QUERY_STRING': consulta,
+            'SERVER_NAME': 'testserver',
+            'SERVER_PORT': '80',
+            'SERVER_PROTOCOL': 'HTTP/1.1',
+            'HTTP_HOST': 'testserver',
+            'HTTP_COOKIE': cookie,
+            'wsgi.input': io.BytesIO(),
+            'wsgi.errors': sys.stderr,
+            'wsgi.url_scheme': 'http',
+            'wsgi.multithread': True,
+            'wsgi.multiprocess': False,
+            'wsgi.run_once': False,
+        }
+        estado = []
+        respuesta = aplicacion(entorno, lambda status, headers: estado.append(status))
+        try:
+            b''.join(respuesta)
+        finally:
+            # Envía la señal `request_finished`, que cierra las conexiones vencidas.
+            respuesta.close()
+        return int(estado[0].split()[0])
+
+    def cliente(trabajador):
+        while True:
+            try:
+                url = pendientes.get_nowait()
+            except queue.Empty:
+                return
+            inicio = time.perf_counter()
+            estado = trabajador.submit(atender, url).result()
+            with bloqueo:
+                tiempos.append((time.perf_counter() - inicio) * 1000)
+                estados.append(estado)
+
+    inicio = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=hilos) as trabajador:
+        clientes = [threading.Thread(target=cliente, args=(trabajador,)) for _ in range(concurrencia)]
+        for hilo in clientes:
+            hilo.start()
+        for hilo in clientes:
+            hilo.join()
+    return tiempos, estados, time.perf_counter() - inicio
+
+
+def carga_asgi(urls, cookie, concurrencia):
+    """
+    Pide las URLs por GET a la aplicación ASGI desde `concurrencia` clientes simultáneos,
+    atendidos por un solo bucle de eventos (como ``uvicorn`` con un trabajador).
+
+    :param urls: Lista de URLs a pedir (cada una una vez).
+    :param cookie: Cabecera ``Cookie`` con la sesión iniciada.
+    :return: Tupla ``(tiempos, estados, segundos)``.
+    """
+    aplicacion = ASGIHandler()
+    pendientes = list(reversed(urls))
+    tiempos, estados = [], []
+
+    async def atender(url):
+        ruta, _, consulta = url.partition('?')
+        alcance = {
+            'type': 'http',
+            'asgi': {'version': '3.0'},
+            'http_version': '1.1',
+            'method': 'GET',
+            'scheme': 'http',
+            'path': ruta,
+            'raw_path': ruta.encode(),
+            'query_string': consulta.encode(),
+            'root_path': '',
+            'headers': [(b'host', b'testserver'), (b'cookie', cookie.encode())],
+            'client': ('127.0.0.1', 0),
+            'server': ('testserver', 80),
+        }
+        estado = []
+        terminada = asyncio.Event()
+        cuerpo_enviado = False
+
+        async def recibir():
+            nonlocal cuerpo_enviado
+            if not cuerpo_enviado:
+                cuerpo_enviado = True
+                return {'type': 'http.request', 'body': b'', 'more_body': False}
+            # El cliente no se desconecta antes de recibir la respuesta.
+            await terminada.wait()
+            return {'type': 'http.disconnect'}
+
+        async def enviar(mensaje):
+            if mensaje['type'] == 'http.response.start':
+                estado.append(mensaje['status'])
+            elif not mensaje.get('more_body', False):
+                terminada.set()
+
+        await aplicacion(alcance, recibir, enviar)
+        return estado[0]
+
+    async def cliente():
+        while pendientes:
+            url = pendientes.pop()
+            inicio = time.perf_counter()
+            estado = await atender(url)
+            tiempos.append((time.perf_counter() - inicio) * 1000)
+            estados.append(estado)
+
+    async def clientes():
+        await asyncio.gather(*(cliente() for _ in range(concurrencia)))
+
+    inicio = time.perf_counter()
+    asyncio.run(clientes())
+    return tiempos, estados, time.perf_counter() - inicio
+
+
+def medir_carga(cookie, milisegundos, concurrencia, peticiones, hilos):
+    """
+    Compara cuántas búsquedas del autocompletado por segundo atiende un trabajador WSGI de
+    `hilos` hilos y un trabajador ASGI, con `concurrencia` clientes simultáneos y una latencia
+    simulada de `milisegundos` por viaje a la base de datos (ver `latencia_simulada`).
+
+    Antes de cada medición se hace una ronda sin medir, para que se construya el índice de
+    búsqueda y se abran las conexiones persistentes del trabajador WSGI.
+
+    :param cookie: Cabecera ``Cookie`` con la sesión iniciada.
+    :param milisegundos: Latencia de un viaje de ida y vuelta (0 si la base ya es remota).
+    :param concurrencia: Cantidad de clientes simultáneos.
+    :param peticiones: Cantidad de peticiones medidas por servidor.
+    :param hilos: Hilos del trabajador WSGI.
+    :return: Diccionario ``{servidor: resultado}``.
+    :rtype: dict
+    """
+    busqueda.obtener_indice()
+    urls = urls_busqueda(peticiones)
+    originales = {clave: connection.settings_dict[clave] for clave in SERVIDORES_CARGA['wsgi']}
+    resultados = {}
+    try:
+        for servidor, opciones in SERVIDORES_CARGA.items():
+            connection.close()
+            connection.settings_dict.update(opciones)
+            with latencia_simulada(milisegundos):
+                if servidor == 'wsgi':
+                    carga_wsgi(urls[:concurrencia], cookie, concurrencia, hilos)
+                    medicion = carga_wsgi(urls, cookie, concurrencia, hilos)
+                else:
+                    carga_asgi(urls[:concurrencia], cookie, concurrencia)
+                    medicion = carga_asgi(urls, cookie, concurrencia)
+            resultados[servidor] = _resultado_carga(*medicion)
+    finally:
+        connection.close()
+        connection.settings_dict.update(originales)
+    return resultados
@@ -0,0 +1,481 @@
+import heapq
+import itertools
+import threading
+import time
+import unicodedata
+from bisect import bisect_left, insort
+from collections import OrderedDict
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from . import fragmentos
+from .models import Producto
+
+
+#: Largo mínimo de la consulta para buscar el texto en cualquier parte del nombre.
+LARGO_SUBCADENA = 3
+
+#: Contador de versiones de los índices: cada cambio de un índice le asigna una versión nueva.
+_versiones = itertools.count(1)
+
+
+def normalizar(texto):
+    """
+    Normaliza un texto para la búsqueda: minúsculas y sin tildes.
+
+    :param texto: Texto a normalizar.
+    :rtype: str
+    """
+    descompuesto = unicodedata.normalize('NFKD', str(texto).lower())
+    return ''.join(c for c in descompuesto if not unicodedata.combining(c))
+
+
+def trigramas(texto):
+    """
+    Retorna el conjunto de trigramas (subcadenas de 3 caracteres) de un texto.
+    """
+    return {texto[i:i + 3] for i in range(len(texto) - 2)}
+
+
+class _NodoTrie:
+    """
+    Nodo del trie de códigos de producto (un hijo por dígito).
+    """
+    __slots__ = ('hijos', 'codigo')
+
+    def __init__(self):
+        self.hijos = {}
+        self.codigo = None
+
+
+class IndiceProductos:
+    """
+    Índice en memoria de los productos para la búsqueda del punto de venta.
+
+    - Códigos: un trie por dígito, de modo que buscar por prefijo de código recorre solo
+      los productos que comparten ese prefijo.
+    - Nombres: una lista ordenada de ``(palabra, codigo)`` para buscar por inicio de palabra
+      y un índice de trigramas para encontrar el texto en cualquier parte del nombre.
+
+    Los resultados se ordenan así: código exacto, códigos que empiezan con el texto,
+    nombres con palabras que empiezan con el texto y nombres que contienen el texto.
+
+    El índice se mantiene por proceso y se actualiza con las señales de `Producto`
+    (ver `sistemaApp.signals`); la búsqueda no consulta la base de datos. Cada cambio le asigna
+    una `version` nueva, con la que `CacheBusquedas` descarta los resultados anteriores.
+    """
+
+    def __init__(self):
+        self._bloqueo = threading.RLock()
+        self._raiz = _NodoTrie()
+        self._productos = {}
+        self._palabras = []
+        self._trigramas = {}
+        self.version = next(_versiones)
+
+    def cargar(self, productos):
+        """
+        Carga el índice completo a partir de pares ``(codigo, nombre)``.
+        """
+        with self._bloqueo:
+            self.__init__()
+            for codigo, nombre in productos:
+                self._agregar(codigo, nombre, ordenar=False)
+            # La lista de palabras se ordena una sola vez al final de la carga.
+            self._palabras.sort()
+
+    def actualizar(self, codigo, nombre):
+        """
+        Agrega un producto al índice o actualiza su nombre. No hace nada si el producto ya estaba
+        indexado con ese nombre (por ejemplo, cuando solo cambió su stock).
+        """
+        with self._bloqueo:
+            datos = self._productos.get(codigo)
+            if datos is not None and datos[0] == nombre:
+                return
+            self._quitar(codigo)
+            self._agregar(codigo, nombre)
+            self.version = next(_versiones)
+
+    def eliminar(self, codigo):
+        """
+        Quita un producto del índice. No hace nada si el producto no estaba indexado.
+        """
+        with self._bloqueo:
+            if codigo in self._productos:
+                self._quitar(codigo)
+                self.version = next(_versiones)
+
+    def __len__(self):
+        return len(self._productos)
+
+    def _agregar(self, codigo, nombre, ordenar=True):
+        normalizado = normalizar(nombre)
+        palabras = tuple(sorted(set(normalizado.split())))
+        self._productos[codigo] = (nombre, normalizado, palabras)
+
+        nodo = self._raiz
+        for digito in str(codigo):
+            nodo = nodo.hijos.setdefault(digito, _NodoTrie())
+        nodo.codigo = codigo
+
+        for palabra in palabras:
+            if ordenar:
+                insort(self._palabras, (palabra, codigo))
+            else:
+                self._palabras.append((palabra, codigo))
+        for trigrama in trigramas(normalizado):
+            self._trigramas.setdefault(trigrama, set()).add(codigo)
+
+    def _quitar(self, codigo):
+        datos = self._productos.pop(codigo, None)
+        if datos is None:
+            return
+        _, normalizado, palabras = datos
+
+        nodo = self._raiz
+        for digito in str(codigo):
+            nodo = nodo.hijos.get(digito)
+            if nodo is None:
+                break
+        else:
+            nodo.codigo = None
+
+        for palabra in palabras:
+            posicion = bisect_left(self._palabras, (palabra, codigo))
+            if posicion < len(self._palabras) and self._palabras[posicion] == (palabra, codigo):
+                del self._palabras[posicion]
+        for trigrama in trigramas(normalizado):
+            codigos = self._trigramas.get(trigrama)
+            if codigos is not None:
+                codigos.discard(codigo)
+                if not codigos:
+                    del self._trigramas[trigrama]
+
+    def buscar(self, texto, limite=10):
+        """
+        Busca productos por código o nombre.
+
+        :param texto: Texto ingresado en el buscador.
+        :param limite: Cantidad máxima de resultados.
+        :return: Lista de tuplas ``(codigo, nombre)`` ordenadas por relevancia.
+        :rtype: list
+        """
+        consulta = normalizar(texto).strip()
+        if not consulta:
+            return []
+
+        with self._bloqueo:
+            encontrados = []
+            if consulta.isdigit():
+                encontrados.extend(self._buscar_codigo(consulta, limite))
+            if len(encontrados) < limite:
+                encontrados.extend(self._buscar_palabras(consulta, limite, set(encontrados)))
+            if len(encontrados) < limite and len(consulta) >= LARGO_SUBCADENA:
+                encontrados.extend(self._buscar_subcadena(consulta, limite - len(encontrados), set(encontrados)))
+            return [(codigo, self._productos[codigo][0]) for codigo in encontrados[:limite]]
+
+    def _buscar_codigo(self, prefijo, limite):
+        nodo = self._raiz
+        for digito in prefijo:
+            nodo = nodo.hijos.get(digito)
+            if nodo is None:
+                return []
+        # Recorrido en profundidad en orden de dígitos: primero el código exacto y luego
+        # los que empiezan con el prefijo, deteniéndose al llegar al límite.
+        resultado = []
+        pendientes = [nodo]
+        while pendientes and len(resultado) < limite:
+            nodo = pendientes.pop()
+            if nodo.codigo is not None:
+                resultado.append(nodo.codigo)
+            pendientes.extend(nodo.hijos[digito] for digito in sorted(nodo.hijos, reverse=True))
+        return resultado
+
+    def _buscar_palabras(self, consulta, limite, excluidos):
+        terminos = consulta.split()
+        # Se recorre el rango del término más largo (el más selectivo) y se verifican los demás.
+        principal = max(terminos, key=len)
+        otros = [termino for termino in terminos if termino is not principal]
+        resultado = []
+        posicion = bisect_left(self._palabras, (principal,))
+        while posicion < len(self._palabras) and len(resultado) + len(excluidos) < limite:
+            palabra, codigo = self._palabras[posicion]
+            if not palabra.startswith(principal):
+                break
+            posicion += 1
+            if codigo in excluidos or codigo in resultado:
+                continue
+            palabras = self._productos[codigo][2]
+            if all(any(p.startswith(termino) for p in palabras) for termino in otros):
+                resultado.append(codigo)
+        return resultado
+
+    def _buscar_subcadena(self, consulta, limite, excluidos):
+        conjuntos = [self._trigramas.get(trigrama) for trigrama in trigramas(consulta)]
+        if not conjuntos or any(conjunto is None for conjunto in conjuntos):
+            return []
+        conjuntos.sort(key=len)
+        candidatos = set(conjuntos[0]).intersection(*conjuntos[1:]) - excluidos
+        coincidencias = (
+            codigo for codigo in candidatos if consulta in self._productos[codigo][1]
+        )
+        return heapq.nsmallest(limite, coincidencias, key=lambda codigo: self._productos[codigo][1])
+
+    def candidatos(self, texto, maximo):
+        """
+        Retorna todos los productos que coinciden con el texto, sin ordenar.
+
+        :param texto: Texto normalizado (ver `normalizar`).
+        :param maximo: Cantidad máxima de productos.
+        :return: Conjunto de códigos, o `None` si coinciden más de `maximo` productos.
+        :rtype: set
+        """
+        with self._bloqueo:
+            resultado = set()
+            if texto.isdigit():
+                codigos = self._buscar_codigo(texto, maximo + 1)
+                if len(codigos) > maximo:
+                    return None
+                resultado.update(codigos)
+            # El recorrido de las palabras se detiene al superar el máximo, contando los ya encontrados.
+            resultado.update(self._buscar_palabras(texto, maximo + 1, resultado))
+            if len(resultado) > maximo:
+                return None
+            if len(texto) >= LARGO_SUBCADENA:
+                conjuntos = [self._trigramas.get(trigrama) for trigrama in trigramas(texto)]
+                if conjuntos and all(conjunto is not None for conjunto in conjuntos):
+                    conjuntos.sort(key=len)
+                    for codigo in set(conjuntos[0]).intersection(*conjuntos[1:]) - resultado:
+                        if texto in self._productos[codigo][1]:
+                            resultado.add(codigo)
+                            if len(resultado) > maximo:
+                                return None
+            return resultado
+
+    def buscar_en(self, texto, candidatos, limite):
+        """
+        Busca productos entre un conjunto de candidatos, con el mismo orden que `buscar`.
+
+        :param texto: Texto normalizado (ver `normalizar`).
+        :param candidatos: Códigos entre los que se busca (por ejemplo, los de un prefijo del texto).
+        :param limite: Cantidad máxima de resultados.
+        :return: Tupla ``(resultados, coincidencias)``: la lista de tuplas ``(codigo, nombre)`` y
+                 el conjunto de todos los candidatos que coinciden con el texto.
+        :rtype: tuple
+        """
+        terminos = texto.split()
+        principal = max(terminos, key=len)
+        otros = [termino for termino in terminos if termino is not principal]
+        with self._bloqueo:
+            ordenados = []
+            for codigo in candidatos:
+                datos = self._productos.get(codigo)
+                if datos is None:
+                    continue
+                orden = self._orden(codigo, datos, texto, principal, otros)
+                if orden is not None:
+                    ordenados.append((orden, codigo))
+            mejores = heapq.nsmallest(limite, ordenados)
+            return (
+                [(codigo, self._productos[codigo][0]) for _, codigo in mejores],
+                {codigo for _, codigo in ordenados},
+            )
+
+    def _orden(self, codigo, datos, texto, principal, otros):
+        """
+        Clave de orden de un producto para una consulta, equivalente al orden de `buscar`, o
+        `None` si el producto no coincide.
+        """
+        _, normalizado, palabras = datos
+        # El recorrido del trie en orden de dígitos es el orden alfabético de los códigos.
+        if texto.isdigit() and str(codigo).startswith(texto):
+            return (0, str(codigo))
+        if all(any(palabra.startswith(termino) for palabra in palabras) for termino in otros):
+            coincidentes = [palabra for palabra in palabras if palabra.startswith(principal)]
+            if coincidentes:
+                return (1, min(coincidentes), codigo)
+        if len(texto) >= LARGO_SUBCADENA and texto in normalizado:
+            return (2, normalizado, codigo)
+        return None
+
+
+_indice = None
+#: Versión del catálogo (`fragmentos.CATALOGO`) con la que se construyó `_indice`.
+_version_indice = None
+_bloqueo_carga = threading.Lock()
+
+
+def _construir(version):
+    """
+    Construye el índice con una sola consulta y lo asocia a la versión del catálogo leída antes
+    de la consulta: si el catálogo cambia mientras tanto, el índice se vuelve a construir en la
+    próxima búsqueda.
+
+    Mientras otro hilo lo reconstruye, se sigue usando el índice anterior.
+    """
+    global _indice, _version_indice
+    if not _bloqueo_carga.acquire(blocking=_indice is None):
+        return _indice
+    try:
+        if _indice is None or _version_indice != version:
+            indice = IndiceProductos()
+            indice.cargar(
+                Producto.objects.values_list('codigo_producto', 'nombre_producto').iterator(chunk_size=5000)
+            )
+            _indice, _version_indice = indice, version
+        return _indice
+    finally:
+        _bloqueo_carga.release()
+
+
+def obtener_indice():
+    """
+    Retorna el índice de productos del proceso, construyéndolo con una sola consulta la primera
+    vez que se usa.
+
+    Los cambios hechos en este proceso se aplican al índice al confirmarse (ver
+    `sistemaApp.signals`). Los hechos en otros procesos (otro servidor o el comando
+    ``importar_productos``) se detectan con la versión compartida del catálogo: si cambió desde
+    que se construyó el índice, se vuelve a construir.
+
+    :rtype: IndiceProductos
+    """
+    version = fragmentos.versiones([fragmentos.CATALOGO])[fragmentos.CATALOGO]
+    if _indice is not None and _version_indice == version:
+        return _indice
+    return _construir(version)
+
+
+async def aobtener_indice():
+    """
+    Versión asíncrona de `obtener_indice`. Mientras la versión del catálogo no cambie, el índice
+    se usa directamente; la construcción se hace en un hilo, sin bloquear el ciclo de eventos.
+
+    :rtype: IndiceProductos
+    """
+    version = (await fragmentos.aversiones([fragmentos.CATALOGO]))[fragmentos.CATALOGO]
+    if _indice is not None and _version_indice == version:
+        return _indice
+    return await sync_to_async(_construir)(version)
+
+
+def adoptar_version(anterior, nueva):
+    """
+    Asocia el índice a la versión nueva del catálogo escrita por este proceso, sin reconstruirlo,
+    si el índice tenía la versión anterior: los cambios de este proceso ya se aplicaron al índice
+    y ningún otro proceso cambió el catálogo en el medio.
+
+    :param anterior: Versión del catálogo antes del cambio.
+    :param nueva: Versión escrita.
+    """
+    global _version_indice
+    with _bloqueo_carga:
+        if _indice is not None and anterior is not None and _version_indice == anterior:
+            _version_indice = nueva
+
+
+def indice_cargado():
+    """
+    Retorna el índice si ya fue construido en este proceso, o `None` en caso contrario.
+    """
+    return _indice
+
+
+class CacheBusquedas:
+    """
+    Caché LRU acotada de los resultados del buscador de la caja, por texto normalizado.
+
+    Mientras se escribe, cada consulta extiende a la anterior: si la caché tiene todos los
+    productos que coinciden con un prefijo de la consulta (cuando son a lo sumo
+    `maximo_candidatos`), la consulta se responde ordenando solo esos productos, sin recorrer el
+    índice completo.
+
+    Los resultados vencen a los `segundos` y se descartan cuando cambia el índice (se crea,
+    renombra o elimina un producto; ver `IndiceProductos.version`).
+    """
+
+    def __init__(self, capacidad, segundos, maximo_candidatos=200):
+        """
+        Constructor de la caché.
+
+        :param capacidad: Cantidad máxima de consultas guardadas.
+        :param segundos: Tiempo de vida de cada resultado.
+        :param maximo_candidatos: Cantidad máxima de productos coincidentes que se guardan por consulta.
+        """
+        self.capacidad = capacidad
+        self.segundos = segundos
+        self.maximo_candidatos = maximo_candidatos
+        self._entradas = OrderedDict()
+        self._bloqueo = threading.Lock()
+        #: Consultas respondidas desde la caché, desde un prefijo y con el índice completo.
+        self.estadisticas = {'aciertos': 0, 'prefijos': 0, 'fallos': 0}
+
+    def _vigente(self, clave, version, ahora):
+        entrada = self._entradas.get(clave)
+        if entrada is None:
+            return None
+        if entrada[0] != version or entrada[1] <= ahora:
+            del self._entradas[clave]
+            return None
+        self._entradas.move_to_end(clave)
+        return entrada
+
+    def buscar(self, indice, texto, limite=10):
+        """
+        Busca productos por código o nombre, como `IndiceProductos.buscar`, usando la caché.
+
+        :param indice: Índice de productos del proceso (ver `obtener_indice`).
+        :param texto: Texto ingresado en el buscador.
+        :param limite: Cantidad máxima de resultados.
+        :return: Lista de tuplas ``(codigo, nombre)`` ordenadas por relevancia.
+        :rtype: list
+        """
+        consulta = normalizar(texto).strip()
+        if not consulta:
+            return []
+        # La versión se lee antes de buscar: si el índice cambia mientras tanto, el resultado
+        # queda guardado con la versión anterior y se descarta en la próxima consulta.
+        version = indice.version
+        ahora = time.monotonic()
+        base = None
+        with self._bloqueo:
+            entrada = self._vigente((consulta, limite), version, ahora)
+            if entrada is not None:
+                self.estadisticas['aciertos'] += 1
+                return list(entrada[2])
+            for largo in range(len(consulta) - 1, 0, -1):
+                # Los prefijos cortos no buscan en medio del nombre: no sirven para consultas largas.
+                if largo < LARGO_SUBCADENA <= len(consulta):
+                    break
+                prefijo = self._vigente((consulta[:largo], limite), version, ahora)
+                if prefijo is not None and prefijo[3] is not None:
+                    base = prefijo[3]
+                    break
+            self.estadisticas['prefijos' if base is not None else 'fallos'] += 1
+
+        if base is None:
+            base = indice.candidatos(consulta, self.maximo_candidatos)
+        if base is None:
+            resultados, coincidencias = indice.buscar(consulta, limite), None
+        else:
+            resultados, coincidencias = indice.buscar_en(consulta, base, limite)
+
+        with self._bloqueo:
+            self._entradas[(consulta, limite)] = (version, ahora + self.segundos, resultados, coincidencias)
+            self._entradas.move_to_end((consulta, limite))
+            while len(self._entradas) > self.capacidad:
+                self._entradas.popitem(last=False)
+        return list(resultados)
+
+    def vaciar(self):
+        """
+        Vacía la caché.
+        """
+        with self._bloqueo:
+            self._entradas.clear()
+
+
+#: Caché de búsquedas del proceso.
+cache_busquedas = CacheBusquedas(
+    getattr(settings, 'BUSQUEDA_CACHE_CAPACIDAD', 2000), getattr(settings, 'BUSQUEDA_CACHE_SEGUNDOS', 300)
+)
@@ -0,0 +1,171 @@
+from django.db import transaction
+from django.db.models import Case, F, When
+from .models import Producto, DetalleVenta, ResumenVentaDiario, StockBajo, ValorizacionInventario
+from .catalogo import cache_productos
+from . import fragmentos
+
+
+class StockInsuficienteError(ValueError):
+    """
+    Excepción lanzada cuando uno o más productos de la venta no tienen stock suficiente.
+    """
+
+    def __init__(self, faltantes):
+        """
+        Constructor de la excepción.
+
+        :param faltantes: Lista de tuplas ``(codigo, nombre, disponible, solicitado)``.
+        :type faltantes: list
+        """
+        self.faltantes = faltantes
+        detalle = ", ".join(
+            f"'{nombre}' (disponible: {disponible}, solicitado: {solicitado})"
+            for _, nombre, disponible, solicitado in faltantes
+        )
+        super().__init__(f"Stock insuficiente para {detalle}.")
+
+
+def agrupar_lineas(lineas):
+    """
+    Agrupa las líneas del carrito por código de producto sumando sus cantidades.
+
+    :param lineas: Iterable de diccionarios con las claves `codigo` y `cantidad`.
+    :return: Diccionario ``{codigo: cantidad}``.
+    :rtype: dict
+    """
+    cantidades = {}
+    for linea in lineas:
+        codigo = int(linea['codigo'])
+        cantidades[codigo] = cantidades.get(codigo, 0) + int(linea['cantidad'])
+    return cantidades
+
+
+def registrar_venta(venta, lineas, precios=None, permitir_negativo=False):
+    """
+    Registra una venta con sus líneas y descuenta el stock en una sola transacción.
+
+    El número de consultas no depende de la cantidad de productos ni de categorías:
+
+    1. Bloquea todas las filas de `Producto` involucradas con un único ``SELECT ... FOR UPDATE``
+       ordenado por código (el orden evita interbloqueos entre cajas).
+    2. Valida el stock en memoria.
+    3. Descuenta el stock con un único ``UPDATE`` usando ``CASE``.
+    4. Guarda la `Venta` y sus líneas (`DetalleVenta`) con un ``bulk_create``.
+    5. Suma la venta al resumen diario (`ResumenVentaDiario`) y descuenta las unidades vendidas
+       de la valorización del inventario (`ValorizacionInventario`), con una sola sentencia para
+       todas las categorías. La primera venta del día (por método de pago y vendedor) crea su fila
+       del resumen, con una inserción adicional.
+    6. Agrega a la lista de stock bajo (`StockBajo`) los productos que quedaron en su stock
+       mínimo o por debajo, con una sola sentencia y solo si hay alguno.
+
+    El total de la venta y el precio de cada línea se toman de la fila bloqueada, es decir,
+    el precio vigente al momento de la venta, salvo que se indiquen en `precios`.
+
+    Las ventas guardadas en el diario local (ver `sistemaApp.diario_ventas`) se registran con
+    `precios` (los que se cobraron en la caja) y `permitir_negativo`: como la venta ya ocurrió,
+    se registra aunque el stock quede negativo y los productos afectados se informan como conflicto.
+
+    :param venta: Instancia de `Venta` sin guardar (con `metodo_pago`, `id_cliente`, `vendedor` y `fecha`).
+    :param lineas: Iterable de diccionarios con las claves `codigo`, `cantidad` y opcionalmente `nombre`.
+    :param precios: Diccionario opcional ``{codigo: precio_venta}`` con los precios cobrados.
+    :param permitir_negativo: Si es `True`, no valida el stock; los productos que quedan con stock
+                              negativo o que ya no existen se dejan en `venta.faltantes` (los que
+                              no existen no se descuentan ni se guardan como línea).
+    :return: La venta guardada, con el atributo `faltantes` (lista de tuplas
+             ``(codigo, nombre, disponible, solicitado)``, vacía si no hubo conflictos).
+    :raises StockInsuficienteError: Si algún producto no tiene stock suficiente o ya no existe.
+    :raises ValueError: Si la venta no tiene productos o el cliente supera su límite de crédito.
+    """
+    lineas = list(lineas)
+    cantidades = agrupar_lineas(lineas)
+    if not cantidades:
+        raise ValueError("No hay productos agregados a la venta.")
+
+    nombres = {int(linea['codigo']): linea.get('nombre', linea['codigo']) for linea in lineas}
+    codigos = sorted(cantidades)
+
+    with transaction.atomic():
+        # Bloquea las filas en orden de código para que dos cajas no vendan el mismo stock.
+        productos = {
+            producto['codigo_producto']: producto
+            for producto in Producto.objects.select_for_update()
+            .filter(codigo_producto__in=codigos)
+            .order_by('codigo_producto')
+            .values(
+                'codigo_producto', 'nombre_producto', 'precio_venta', 'precio_costo', 'stock_actual',
+                'stock_minimo', 'categoria_id',
+            )
+        }
+
+        # Valida el stock en memoria.
+        faltantes = []
+        for codigo in codigos:
+            producto = productos.get(codigo)
+            disponible = producto['stock_actual'] if producto else 0
+            if cantidades[codigo] > disponible:
+                nombre = producto['nombre_producto'] if producto else nombres[codigo]
+                faltantes.append((codigo, nombre, disponible, cantidades[codigo]))
+        if faltantes and not permitir_negativo:
+            raise StockInsuficienteError(faltantes)
+        venta.faltantes = faltantes
+
+        # Precio de cada producto: el cobrado en la caja si se indicó, o el vigente.
+        cobrados = precios or {}
+        precio_linea = {
+            codigo: cobrados[codigo] if codigo in cobrados else productos[codigo]['precio_venta']
+            for codigo in codigos if codigo in productos or codigo in cobrados
+        }
+        # Los productos que ya no existen (solo con `permitir_negativo`) no tienen fila que descontar.
+        codigos = [codigo for codigo in codigos if codigo in productos]
+
+        # Descuenta el stock de todos los productos en una sola sentencia.
+        Producto.objects.filter(codigo_producto__in=codigos).update(
+            stock_actual=Case(
+                *[When(codigo_producto=codigo, then=F('stock_actual') - cantidades[codigo]) for codigo in codigos],
+                default=F('stock_actual'),
+            )
+        )
+
+        venta.total = sum(precio * cantidades[codigo] for codigo, precio in precio_linea.items())
+        venta.save()
+
+        DetalleVenta.objects.bulk_create([
+            DetalleVenta(
+                venta=venta,
+                producto_id=codigo,
+                cantidad=cantidades[codigo],
+                precio_venta=precio_linea[codigo],
+            )
+            for codigo in codigos
+        ])
+
+        # Suma la venta al resumen diario en la misma transacción.
+        ResumenVentaDiario.registrar_venta(venta)
+
+        # Descuenta las unidades vendidas de la valorización del inventario de cada categoría.
+        diferencias = {}
+        for codigo in codigos:
+            producto = productos[codigo]
+            _, unidades, valor = diferencias.get(producto['categoria_id'], (0, 0, 0))
+            diferencias[producto['categoria_id']] = (
+                0,
+                unidades - cantidades[codigo],
+                valor - cantidades[codigo] * producto['precio_costo'],
+            )
+        ValorizacionInventario.aplicar_diferencias(diferencias)
+
+        # Agrega a la lista de stock bajo los productos que cruzaron su stock mínimo con esta venta.
+        stocks = {codigo: productos[codigo]['stock_actual'] - cantidades[codigo] for codigo in codigos}
+        StockBajo.actualizar(bajos=[
+            codigo for codigo in codigos
+            if StockBajo.esta_bajo(stocks[codigo], productos[codigo]['stock_minimo'])
+            and not StockBajo.esta_bajo(productos[codigo]['stock_actual'], productos[codigo]['stock_minimo'])
+        ])
+
+        # El stock se descontó sin señales: cambia la versión del stock (no la del catálogo).
+        fragmentos.incrementar(fragmentos.STOCK)
+
+        # Al confirmar la transacción, la caché de productos de la caja refleja el stock nuevo.
+        transaction.on_commit(lambda: cache_productos.actualizar_stock(stocks))
+
+    return venta
@@ -0,0 +1,354 @@
+from django.conf import settings
+from django.core.cache import caches
+from django.utils.module_loading import import_string
+from .models import LineaCarrito
+
+
+class CarritoIncompletoError(ValueError):
+    """
+    El índice de un carrito lista productos cuyas líneas ya no están en el almacén (por ejemplo,
+    porque la caché las descartó o expiraron antes que el índice).
+    """
+
+    def __init__(self, lineas, faltantes):
+        """
+        :param lineas: Líneas que siguen en el almacén, ``{codigo: linea}``.
+        :param faltantes: Códigos de los productos cuyas líneas se perdieron.
+        """
+        self.lineas = lineas
+        self.faltantes = faltantes
+        self.total = sum(linea['precio_venta'] * linea['cantidad'] for linea in lineas.values())
+        super().__init__(
+            f"Se perdieron del carrito los productos con código {', '.join(map(str, faltantes))}. "
+            "Revise el carrito y vuelva a agregarlos antes de cobrar."
+        )
+
+
+class AlmacenCarritoCache:
+    """
+    Almacén de carritos sobre el framework de caché de Django.
+
+    Cada línea se guarda en su propia clave (``carrito:<clave>:<codigo>``) y una clave
+    de índice (``carrito:<clave>``) guarda los códigos y el total acumulado, de modo que
+    agregar un producto solo escribe la línea modificada y el índice.
+
+    La caché debe ser compartida por todos los procesos del servidor y tener lugar para todos
+    los carritos abiertos (ver ``CACHES['carritos']`` en settings). Si aun así la caché descarta
+    una línea, `cargar` lanza `CarritoIncompletoError` en lugar de retornar un total menor.
+    """
+
+    def __init__(self):
+        self.cache = caches[getattr(settings, 'CARRITO_CACHE', 'default')]
+        self.timeout = getattr(settings, 'CARRITO_TIMEOUT', 60 * 60 * 12)
+
+    def _clave_indice(self, clave):
+        return f'carrito:{clave}'
+
+    def _clave_linea(self, clave, codigo):
+        return f'carrito:{clave}:{codigo}'
+
+    def cargar(self, clave):
+        """
+        Carga las líneas y el total de un carrito.
+
+        :param clave: Identificador del carrito.
+        :return: Tupla ``(lineas, total)`` donde `lineas` es un diccionario ``{codigo: linea}``.
+        :raises CarritoIncompletoError: Si faltan líneas del índice. El índice se corrige con las
+            líneas que quedan, de modo que el aviso se da una sola vez.
+        """
+        indice = self.cache.get(self._clave_indice(clave))
+        if not indice:
+            return {}, 0
+        claves = [self._clave_linea(clave, codigo) for codigo in indice['codigos']]
+        lineas = self._armar(indice, claves, self.cache.get_many(claves))
+        if len(lineas) != len(indice['codigos']):
+            error = self._incompleto(indice, lineas)
+            self.cache.set(self._clave_indice(clave), {'codigos': list(lineas), 'total': error.total}, self.timeout)
+            raise error
+        return lineas, indice['total']
+
+    async def acargar(self, clave):
+        """
+        Versión asíncrona de `cargar`.
+        """
+        indice = await self.cache.aget(self._clave_indice(clave))
+        if not indice:
+            return {}, 0
+        claves = [self._clave_linea(clave, codigo) for codigo in indice['codigos']]
+        lineas = self._armar(indice, claves, await self.cache.aget_many(claves))
+        if len(lineas) != len(indice['codigos']):
+            error = self._incompleto(indice, lineas)
+            await self.cache.aset(self._clave_indice(clave), {'codigos': list(lineas), 'total': error.total}, self.timeout)
+            raise error
+        return lineas, indice['total']
+
+    def _armar(self, indice, claves, encontradas):
+        return {
+            codigo: encontradas[clave_linea]
+            for codigo, clave_linea in zip(indice['codigos'], claves)
+            if clave_linea in encontradas
+        }
+
+    def _incompleto(self, indice, lineas):
+        return CarritoIncompletoError(lineas, [codigo for codigo in indice['codigos'] if codigo not in lineas])
+
+    def guardar_linea(self, clave, linea, codigos, total):
+        """
+        Guarda una línea del carrito y actualiza el índice.
+
+        :param clave: Identificador del carrito.
+        :param linea: Línea modificada.
+        :param codigos: Códigos presentes en el carrito, en orden de inserción.
+        :param total: Total actualizado del carrito.
+        """
+        self.cache.set_many(self._valores_linea(clave, linea, codigos, total), self.timeout)
+
+    async def aguardar_linea(self, clave, linea, codigos, total):
+        """
+        Versión asíncrona de `guardar_linea`.
+        """
+        await self.cache.aset_many(self._valores_linea(clave, linea, codigos, total), self.timeout)
+
+    def _valores_linea(self, clave, linea, codigos, total):
+        return {
+            self._clave_linea(clave, linea['codigo']): linea,
+            self._clave_indice(clave): {'codigos': codigos, 'total': total},
+        }
+
+    def eliminar_linea(self, clave, codigo, codigos, total):
+        """
+        Elimina una línea del carrito y actualiza el índice.
+        """
+        self.cache.delete(self._clave_linea(clave, codigo))
+        self.cache.set(self._clave_indice(clave), {'codigos': codigos, 'total': total}, self.timeout)
+
+    def vaciar(self, clave, codigos):
+        """
+        Elimina todas las líneas y el índice del carrito.
+        """
+        self.cache.delete_many(
+            [self._clave_linea(clave, codigo) for codigo in codigos] + [self._clave_indice(clave)]
+        )
+
+
+class AlmacenCarritoBD:
+    """
+    Almacén de carritos en la tabla `carrito_linea`, con una fila por producto.
+
+    Agregar un producto actualiza (o inserta) solo la fila de ese producto.
+    """
+
+    def _consulta(self, clave):
+        return LineaCarrito.objects.filter(clave=clave).order_by('id').values(
+            'codigo', 'nombre', 'precio_venta', 'stock_actual', 'cantidad'
+        )
+
+    def _armar(self, filas):
+        lineas = {fila['codigo']: fila for fila in filas}
+        return lineas, sum(fila['precio_venta'] * fila['cantidad'] for fila in filas)
+
+    def cargar(self, clave):
+        return self._armar(list(self._consulta(clave)))
+
+    async def acargar(self, clave):
+        return self._armar([fila async for fila in self._consulta(clave)])
+
+    def guardar_linea(self, clave, linea, codigos, total):
+        valores = {campo: valor for campo, valor in linea.items() if campo != 'codigo'}
+        actualizadas = LineaCarrito.objects.filter(clave=clave, codigo=linea['codigo']).update(**valores)
+        if not actualizadas:
+            LineaCarrito.objects.create(clave=clave, **linea)
+
+    async def aguardar_linea(self, clave, linea, codigos, total):
+        valores = {campo: valor for campo, valor in linea.items() if campo != 'codigo'}
+        actualizadas = await LineaCarrito.objects.filter(clave=clave, codigo=linea['codigo']).aupdate(**valores)
+        if not actualizadas:
+            await LineaCarrito.objects.acreate(clave=clave, **linea)
+
+    def eliminar_linea(self, clave, codigo, codigos, total):
+        LineaCarrito.objects.filter(clave=clave, codigo=codigo).delete()
+
+    def vaciar(self, clave, codigos):
+        LineaCarrito.objects.filter(clave=clave).delete()
+
+
+def obtener_almacen():
+    """
+    Retorna una instancia del almacén configurado en ``settings.CARRITO_ALMACEN``.
+    """
+    return import_string(getattr(settings, 'CARRITO_ALMACEN', 'sistemaApp.carrito.AlmacenCarritoCache'))()
+
+
+class Carrito:
+    """
+    Carrito de compras de una caja, indexado por código de producto.
+
+    Agregar, actualizar y quitar productos son operaciones O(1) y el total se mantiene
+    de forma incremental. Cada línea es un diccionario con las claves `codigo`, `nombre`,
+    `precio_venta`, `stock_actual` y `cantidad`.
+    """
+
+    def __init__(self, clave, almacen=None):
+        """
+        Constructor del carrito. Las líneas se cargan del almacén al primer acceso.
+
+        :param clave: Identificador del carrito (por ejemplo, la clave de sesión de la caja).
+        :param almacen: Almacén donde se guardan las líneas; por defecto el configurado en settings.
+        """
+        self.clave = clave
+        self.almacen = almacen or obtener_almacen()
+        self._lineas = None
+        self._total = 0
+        #: `CarritoIncompletoError` si al cargar el carrito faltaban líneas en el almacén.
+        self.incompleto = None
+
+    @classmethod
+    def para_request(cls, request):
+        """
+        Retorna el carrito asociado a la sesión de la solicitud.
+
+        :param request: objeto HttpRequest de la caja.
+        :rtype: Carrito
+        """
+        if request.session.session_key is None:
+            request.session.save()
+        return cls(request.session.session_key)
+
+    @classmethod
+    async def apara_request(cls, request):
+        """
+        Versión asíncrona de `para_request`, para las vistas asíncronas.
+
+        :rtype: Carrito
+        """
+        if request.session.session_key is None:
+            await request.session.asave()
+        return cls(request.session.session_key)
+
+    def _cargar(self):
+        if self._lineas is None:
+            try:
+                self._lineas, self._total = self.almacen.cargar(self.clave)
+            except CarritoIncompletoError as error:
+                self._incompleto(error)
+        return self._lineas
+
+    async def acargar(self):
+        """
+        Carga las líneas del almacén de forma asíncrona. Después de cargarlas, las demás
+        operaciones de lectura (`total`, `lineas`, `cantidad`) no vuelven a consultar el almacén.
+        """
+        if self._lineas is None:
+            try:
+                self._lineas, self._total = await self.almacen.acargar(self.clave)
+            except CarritoIncompletoError as error:
+                self._incompleto(error)
+        return self._lineas
+
+    def _incompleto(self, error):
+        """
+        Continúa con las líneas que quedan en el almacén y guarda el error para avisar a la caja.
+        """
+        self._lineas, self._total = error.lineas, error.total
+        self.incompleto = error
+
+    @property
+    def aviso(self):
+        """
+        Mensaje para la caja si se perdieron líneas del carrito, o None. Se carga el carrito si
+        todavía no se había cargado.
+        """
+        self._cargar()
+        return str(self.incompleto) if self.incompleto else None
+
+    @property
+    def total(self):
+        """
+        Total del carrito (precio de venta por cantidad de cada línea).
+        """
+        self._cargar()
+        return self._total
+
+    def lineas(self):
+        """
+        Retorna las líneas del carrito en orden de inserción.
+
+        :rtype: list
+        """
+        return list(self._cargar().values())
+
+    def cantidad(self, codigo):
+        """
+        Retorna la cantidad agregada de un producto (0 si no está en el carrito).
+        """
+        linea = self._cargar().get(codigo)
+        return linea['cantidad'] if linea else 0
+
+    def agregar(self, producto, cantidad):
+        """
+        Agrega un producto al carrito o suma la cantidad si ya estaba.
+
+        :param producto: Diccionario con las claves `codigo`, `nombre`, `precio_venta` y `stock_actual`.
+        :param cantidad: Cantidad a agregar.
+        :return: La línea actualizada.
+        :rtype: dict
+        """
+        self._cargar()
+        linea = self._sumar(producto, cantidad)
+        self.almacen.guardar_linea(self.clave, linea, list(self._lineas), self._total)
+        return linea
+
+    async def aagregar(self, producto, cantidad):
+        """
+        Versión asíncrona de `agregar`.
+        """
+        await self.acargar()
+        linea = self._sumar(producto, cantidad)
+        await self.almacen.aguardar_linea(self.clave, linea, list(self._lineas), self._total)
+        return linea
+
+    def _sumar(self, producto, cantidad):
+        """
+        Suma el producto a las líneas ya cargadas y actualiza el total, sin guardar.
+        """
+        lineas = self._lineas
+        codigo = producto['codigo']
+        linea = lineas.get(codigo)
+        if linea:
+            # Si el precio cambió, el total se ajusta con el precio nuevo para toda la línea.
+            self._total -= linea['precio_venta'] * linea['cantidad']
+            linea['cantidad'] += cantidad
+        else:
+            linea = lineas[codigo] = {
+                'codigo': codigo,
+                'nombre': producto['nombre'],
+                'precio_venta': producto['precio_venta'],
+                'stock_actual': producto['stock_actual'],
+                'cantidad': cantidad,
+            }
+        linea['precio_venta'] = producto['precio_venta']
+        linea['stock_actual'] = producto['stock_actual']
+        self._total += linea['precio_venta'] * linea['cantidad']
+        return linea
+
+    def quitar(self, codigo):
+        """
+        Quita un producto del carrito. No hace nada si el producto no estaba.
+        """
+        lineas = self._cargar()
+        linea = lineas.pop(codigo, None)
+        if linea:
+            self._total -= linea['precio_venta'] * linea['cantidad']
+            self.almacen.eliminar_linea(self.clave, codigo, list(lineas), self._total)
+
+    def vaciar(self):
+        """
+        Elimina todos los productos del carrito.
+        """
+        codigos = list(self._cargar())
+        self.almacen.vaciar(self.clave, codigos)
+        self._lineas = {}
+        self._total = 0
+
+    def __len__(self):
+        return len(self._cargar())
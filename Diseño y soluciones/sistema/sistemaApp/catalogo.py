@@ -0,0 +1,164 @@
+import threading
+from collections import OrderedDict
+from django.conf import settings
+from . import fragmentos
+from .models import Producto
+
+
+def registro_producto(producto):
+    """
+    Convierte un producto en el registro liviano que usan la caché y el carrito.
+
+    :param producto: Instancia de `Producto` o diccionario con sus campos.
+    :return: Diccionario con las claves `codigo`, `nombre`, `precio_venta` y `stock_actual`.
+    :rtype: dict
+    """
+    if isinstance(producto, dict):
+        return {
+            'codigo': producto['codigo_producto'],
+            'nombre': producto['nombre_producto'],
+            'precio_venta': producto['precio_venta'],
+            'stock_actual': producto['stock_actual'],
+        }
+    return {
+        'codigo': producto.codigo_producto,
+        'nombre': producto.nombre_producto,
+        'precio_venta': producto.precio_venta,
+        'stock_actual': producto.stock_actual,
+    }
+
+
+class CacheProductos:
+    """
+    Caché LRU acotada de productos por código, usada por la caja al escanear.
+
+    Guarda solo el registro liviano del producto (código, nombre, precio y stock). Las vistas
+    de productos y la caja del proceso la mantienen al día escribiendo el registro nuevo al
+    guardar (ver `sistemaApp.signals` y `sistemaApp.caja`).
+
+    Los cambios hechos en otros procesos (otro servidor, la importación o el recálculo de
+    precios) se detectan con la versión compartida del catálogo (`fragmentos.CATALOGO`): cada
+    lectura la compara con la de los registros guardados y, si cambió, vacía la caché. El stock
+    que descuentan las ventas de otros procesos no cambia esa versión; la venta lo valida con la
+    fila bloqueada (ver `sistemaApp.caja.registrar_venta`).
+    """
+
+    def __init__(self, capacidad):
+        """
+        Constructor de la caché.
+
+        :param capacidad: Cantidad máxima de productos guardados.
+        """
+        self.capacidad = capacidad
+        self._registros = OrderedDict()
+        self._bloqueo = threading.Lock()
+        #: Versión del catálogo con la que se guardaron los registros.
+        self._version = None
+
+    def _sincronizar(self, version):
+        """
+        Vacía la caché si la versión del catálogo cambió desde que se guardaron los registros.
+
+        La versión se lee antes de consultar la base de datos: si el catálogo cambia mientras
+        tanto, el registro leído se descarta en la próxima lectura.
+        """
+        with self._bloqueo:
+            if version != self._version:
+                self._registros.clear()
+                self._version = version
+
+    def _en_cache(self, codigo):
+        with self._bloqueo:
+            registro = self._registros.get(codigo)
+            if registro is not None:
+                self._registros.move_to_end(codigo)
+                return dict(registro)
+        return None
+
+    def _consulta(self, codigo):
+        return Producto.objects.filter(codigo_producto=codigo).values(
+            'codigo_producto', 'nombre_producto', 'precio_venta', 'stock_actual'
+        )
+
+    def _guardar_fila(self, fila):
+        if fila is None:
+            return None
+        registro = registro_producto(fila)
+        self.guardar(registro)
+        return dict(registro)
+
+    def obtener(self, codigo):
+        """
+        Retorna el registro del producto, consultando la base de datos solo si no está en caché.
+
+        :param codigo: Código del producto.
+        :return: Copia del registro, o `None` si el producto no existe.
+        :rtype: dict
+        """
+        self._sincronizar(fragmentos.versiones([fragmentos.CATALOGO])[fragmentos.CATALOGO])
+        registro = self._en_cache(codigo)
+        if registro is not None:
+            return registro
+        return self._guardar_fila(self._consulta(codigo).first())
+
+    async def aobtener(self, codigo):
+        """
+        Versión asíncrona de `obtener`: si el producto no está en caché, lo consulta con el ORM
+        asíncrono.
+        """
+        self._sincronizar((await fragmentos.aversiones([fragmentos.CATALOGO]))[fragmentos.CATALOGO])
+        registro = self._en_cache(codigo)
+        if registro is not None:
+            return registro
+        return self._guardar_fila(await self._consulta(codigo).afirst())
+
+    def guardar(self, registro):
+        """
+        Guarda (o reemplaza) el registro de un producto.
+        """
+        with self._bloqueo:
+            self._registros[registro['codigo']] = dict(registro)
+            self._registros.move_to_end(registro['codigo'])
+            while len(self._registros) > self.capacidad:
+                self._registros.popitem(last=False)
+
+    def actualizar_stock(self, stocks):
+        """
+        Actualiza el stock de los productos que estén en caché.
+
+        :param stocks: Diccionario ``{codigo: stock_actual}``.
+        """
+        with self._bloqueo:
+            for codigo, stock in stocks.items():
+                registro = self._registros.get(codigo)
+                if registro is not None:
+                    registro['stock_actual'] = stock
+
+    def descontar_stock(self, cantidades):
+        """
+        Descuenta unidades del stock de los productos que estén en caché.
+
+        :param cantidades: Diccionario ``{codigo: unidades}``.
+        """
+        with self._bloqueo:
+            for codigo, cantidad in cantidades.items():
+                registro = self._registros.get(codigo)
+                if registro is not None:
+                    registro['stock_actual'] -= cantidad
+
+    def invalidar(self, codigos=None):
+        """
+        Quita productos de la caché. Sin argumentos, vacía la caché completa.
+
+        :param codigos: Iterable de códigos a quitar.
+        """
+        with self._bloqueo:
+            if codigos is None:
+                self._registros.clear()
+            else:
+                for codigo in codigos:
+                    self._registros.pop(codigo, None)
+
+
+#: Caché de productos del proceso.
+cache_productos = CacheProductos(getattr(settings, 'CACHE_PRODUCTOS_CAPACIDAD', 5000))
@@ -0,0 +1,141 @@
+from datetime import timedelta
+from django.db.models import Count, F, Q, Sum
+from django.db.models.functions import Coalesce, TruncDate
+from django.utils import timezone
+from .models import Cliente, DeudaPendiente, MovimientoDeuda, Venta
+
+
+#: Tramos del reporte de antigüedad: nombre, etiqueta y días máximos de antigüedad (`None` para el
+#: último tramo, que incluye la deuda sin fecha, guardada con `DeudaPendiente.SIN_FECHA`).
+TRAMOS = [
+    ('tramo_0_30', '0-30 días', 30),
+    ('tramo_31_60', '31-60 días', 60),
+    ('tramo_61_90', '61-90 días', 90),
+    ('tramo_mas_90', 'Más de 90 días', None),
+]
+
+
+def _sumas_tramos(hoy=None):
+    """
+    Retorna las sumas condicionales de `DeudaPendiente.monto` de cada tramo de `TRAMOS`.
+
+    :param hoy: Día desde el que se cuenta la antigüedad (por defecto, hoy).
+    :rtype: dict
+    """
+    hoy = hoy or timezone.localdate()
+    sumas = {}
+    anterior = None
+    for nombre, _, dias in TRAMOS:
+        condicion = Q() if anterior is None else Q(fecha__lt=hoy - timedelta(days=anterior))
+        if dias is not None:
+            condicion &= Q(fecha__gte=hoy - timedelta(days=dias))
+        sumas[nombre] = Coalesce(Sum('monto', filter=condicion), 0)
+        anterior = dias
+    return sumas
+
+
+def antiguedad_por_cliente(hoy=None, orden='-total'):
+    """
+    Calcula el reporte de antigüedad de deudas por cliente con una sola consulta agrupada sobre
+    la deuda pendiente por día (`DeudaPendiente`), que ya tiene descontados los abonos.
+
+    :param hoy: Día desde el que se cuenta la antigüedad (por defecto, hoy).
+    :param orden: Campo por el que se ordena el reporte (por defecto, la deuda total descendente).
+    :return: QuerySet de diccionarios con `cliente_id`, `cliente__nombre`, `cliente__apellido`,
+             un campo por tramo de `TRAMOS` y `total`.
+    :rtype: QuerySet
+    """
+    return DeudaPendiente.objects.values('cliente_id', 'cliente__nombre', 'cliente__apellido').annotate(
+        **_sumas_tramos(hoy), total=Sum('monto')
+    ).filter(total__gt=0).order_by(orden, 'cliente_id')
+
+
+def totales_antiguedad(hoy=None):
+    """
+    Calcula la deuda total de los clientes en cada tramo de `TRAMOS`.
+
+    :param hoy: Día desde el que se cuenta la antigüedad (por defecto, hoy).
+    :return: Diccionario con un campo por tramo, `total` y la cantidad de clientes con deuda (`clientes`).
+    :rtype: dict
+    """
+    return DeudaPendiente.objects.aggregate(
+        **_sumas_tramos(hoy), total=Coalesce(Sum('monto'), 0), clientes=Count('cliente_id', distinct=True)
+    )
+
+
+def repartir_deuda(deuda, cargos):
+    """
+    Reparte la deuda de un cliente entre sus cargos, considerando que los abonos pagan primero
+    los cargos más antiguos: la deuda pendiente son los cargos más recientes.
+
+    :param deuda: Deuda actual del cliente.
+    :param cargos: Lista de tuplas ``(fecha, monto)`` ordenada del cargo más reciente al más antiguo.
+    :return: Lista de tuplas ``(fecha, pendiente)``. La deuda que los cargos no alcanzan a cubrir
+             (por ejemplo, la anterior al libro de deudas) queda con fecha `DeudaPendiente.SIN_FECHA`.
+    :rtype: list
+    """
+    pendientes = []
+    for fecha, monto in cargos:
+        if deuda <= 0:
+            break
+        pendiente = min(monto, deuda)
+        if pendiente > 0:
+            pendientes.append((fecha, pendiente))
+            deuda -= pendiente
+    if deuda > 0:
+        pendientes.append((DeudaPendiente.SIN_FECHA, deuda))
+    return pendientes
+
+
+def calcular_deuda_pendiente():
+    """
+    Recalcula la deuda pendiente por día de todos los clientes con deuda desde las ventas a
+    crédito y los cargos del libro de deudas que no son ventas, agrupados por cliente y día en
+    una sola consulta.
+
+    Los cargos se leen ordenados por cliente, por lo que solo se mantienen en memoria los de un
+    cliente a la vez.
+
+    :return: Generador de instancias de `DeudaPendiente` sin guardar.
+    """
+    deudas = dict(Cliente.objects.filter(deuda__gt=0).values_list('id_cliente', 'deuda'))
+    zona = timezone.get_current_timezone()
+    ventas = Venta.objects.filter(metodo_pago='Deuda', id_cliente__deuda__gt=0).annotate(
+        deudor=F('id_cliente_id'), dia=TruncDate('fecha', tzinfo=zona)
+    ).values('deudor', 'dia').annotate(cargado=Sum('total')).order_by()
+    cargos = MovimientoDeuda.objects.filter(
+        tipo=MovimientoDeuda.CARGO, venta__isnull=True, cliente__deuda__gt=0
+    ).annotate(
+        deudor=F('cliente_id'), dia=TruncDate('fecha', tzinfo=zona)
+    ).values('deudor', 'dia').annotate(cargado=Sum('monto')).order_by()
+
+    def por_cliente():
+        cliente_id, grupo = None, []
+        for fila in ventas.union(cargos, all=True).order_by('deudor', '-dia').iterator():
+            if fila['deudor'] != cliente_id:
+                if grupo:
+                    yield cliente_id, grupo
+                cliente_id, grupo = fila['deudor'], []
+            grupo.append((fila['dia'], fila['cargado']))
+        if grupo:
+            yield cliente_id, grupo
+
+    for cliente_id, grupo in por_cliente():
+        for fecha, pendiente in repartir_deuda(deudas.pop(cliente_id), _sumar_dias(grupo)):
+            yield DeudaPendiente(cliente_id=cliente_id, fecha=fecha, monto=pendiente)
+    # Clientes con deuda sin cargos registrados
+    for cliente_id, deuda in deudas.items():
+        yield DeudaPendiente(cliente_id=cliente_id, fecha=DeudaPendiente.SIN_FECHA, monto=deuda)
+
+
+def _sumar_dias(cargos):
+    """
+    Junta los cargos del mismo día (ventas a crédito y cargos manuales).
+    """
+    juntos = []
+    for fecha, monto in cargos:
+        if juntos and juntos[-1][0] == fecha:
+            juntos[-1] = (fecha, juntos[-1][1] + monto)
+        else:
+            juntos.append((fecha, monto))
+    return juntos
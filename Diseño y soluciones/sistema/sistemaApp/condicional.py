@@ -0,0 +1,72 @@
+import hashlib
+from functools import wraps
+from asgiref.sync import iscoroutinefunction
+from django.utils.cache import get_conditional_response, patch_cache_control
+from . import fragmentos
+
+
+def etag_peticion(request, usuario, versiones):
+    """
+    Calcula el ETag de una respuesta a partir de las versiones de los datos que muestra.
+
+    El ETag cambia con las versiones, el usuario, si es superusuario (las vistas muestran
+    acciones distintas) y la ruta con sus parámetros (filtros, orden y página).
+
+    :param request: Petición.
+    :param usuario: Usuario de la petición.
+    :param versiones: Diccionario ``{nombre: version}`` (ver `fragmentos.versiones`).
+    :return: ETag entre comillas.
+    :rtype: str
+    """
+    partes = [f'{nombre}={version}' for nombre, version in sorted(versiones.items())]
+    partes += [str(usuario.pk), str(usuario.is_superuser), request.get_full_path()]
+    return '"%s"' % hashlib.md5('|'.join(partes).encode(), usedforsecurity=False).hexdigest()
+
+
+def _terminar(request, respuesta, etag):
+    # Una respuesta leída de la réplica puede ser más antigua que las versiones, por lo que no
+    # lleva ETag: el navegador la pide completa la próxima vez.
+    if respuesta.status_code == 304 or (
+        respuesta.status_code == 200 and getattr(request, 'alias_lectura', None) is None
+    ):
+        respuesta.headers.setdefault('ETag', etag)
+    # El navegador guarda la respuesta, pero la revalida en cada visita.
+    patch_cache_control(respuesta, private=True, no_cache=True)
+    return respuesta
+
+
+def condicional(*nombres):
+    """
+    Decorador de vistas GET que responden 304 (sin cambios) cuando el navegador ya tiene la
+    versión actual de la respuesta.
+
+    Como `django.views.decorators.http.condition`, pero el ETag se calcula solo con las
+    versiones de los datos (ver `sistemaApp.fragmentos`), sin consultar sus filas, y también
+    funciona con vistas asíncronas (el usuario se obtiene con ``request.auser()``).
+
+    :param nombres: Versiones de los datos que muestra la vista (por ejemplo `fragmentos.CATALOGO`).
+    """
+    def decorador(vista):
+        if iscoroutinefunction(vista):
+            @wraps(vista)
+            async def interna(request, *args, **kwargs):
+                if request.method not in ('GET', 'HEAD'):
+                    return await vista(request, *args, **kwargs)
+                etag = etag_peticion(request, await request.auser(), await fragmentos.aversiones(nombres))
+                respuesta = get_conditional_response(request, etag=etag)
+                if respuesta is None:
+                    respuesta = await vista(request, *args, **kwargs)
+                return _terminar(request, respuesta, etag)
+        else:
+            @wraps(vista)
+            def interna(request, *args, **kwargs):
+                if request.method not in ('GET', 'HEAD'):
+                    return vista(request, *args, **kwargs)
+                etag = etag_peticion(request, request.user, fragmentos.versiones(nombres))
+                respuesta = get_conditional_response(request, etag=etag)
+                if respuesta is None:
+                    respuesta = vista(request, *args, **kwargs)
+                return _terminar(request, respuesta, etag)
+        return interna
+
+    return decorador
@@ -0,0 +1,136 @@
+import threading
+from django.db import InterfaceError, OperationalError, connections
+from django.db.backends.signals import connection_created
+from django.dispatch import receiver
+
+
+#: Códigos de error de MySQL que indican que la base de datos no está disponible: no se pudo
+#: conectar con el servidor (2002 por el socket local, 2003 por TCP), el servidor cerró la
+#: conexión (2006) o la conexión se perdió durante una consulta (2013).
+CODIGOS_SIN_CONEXION = frozenset({2002, 2003, 2006, 2013})
+
+
+def es_error_conexion(error):
+    """
+    Indica si un error de base de datos significa que la base de datos no está disponible.
+
+    Solo lo son los `InterfaceError` (la conexión ya estaba cerrada) y los `OperationalError` con
+    un código de `CODIGOS_SIN_CONEXION`. Otros `OperationalError`, como un bloqueo mutuo (1213) o
+    una espera de bloqueo vencida (1205), ocurren con la base de datos respondiendo y no lo son.
+
+    :param error: Excepción capturada.
+    :rtype: bool
+    """
+    if isinstance(error, InterfaceError):
+        return True
+    return isinstance(error, OperationalError) and bool(error.args) and error.args[0] in CODIGOS_SIN_CONEXION
+
+
+def cerrar_conexiones_vencidas():
+    """
+    Cierra las conexiones del hilo que ya no sirven (se cortaron, tuvieron un error y no responden,
+    o superaron ``CONN_MAX_AGE``), como hace Django al comenzar y terminar cada petición
+    (`django.db.close_old_connections`), para que la próxima consulta abra una nueva.
+
+    No cierra las conexiones con una transacción en curso, que pertenecen a quien la abrió.
+    """
+    for conexion in connections.all(initialized_only=True):
+        if not conexion.in_atomic_block:
+            conexion.close_if_unusable_or_obsolete()
+
+
+class EstadisticasConexiones:
+    """
+    Contadores de las conexiones a la base de datos del proceso, por alias de base de datos:
+
+    - ``abiertas``: conexiones nuevas (cada una cuesta el saludo TCP, TLS y la autenticación con
+      el servidor).
+    - ``reutilizadas``: peticiones que usaron una conexión persistente abierta en una petición
+      anterior (ver ``CONN_MAX_AGE`` en `sistema/settings.py`).
+    - ``fallidas``: peticiones en las que la conexión con la base de datos falló.
+    """
+
+    CONTADORES = ('abiertas', 'reutilizadas', 'fallidas')
+
+    def __init__(self):
+        self._bloqueo = threading.Lock()
+        self._valores = {}
+
+    def sumar(self, alias, contador, cantidad=1):
+        """
+        Suma `cantidad` a un contador de un alias.
+        """
+        with self._bloqueo:
+            valores = self._valores.setdefault(alias, dict.fromkeys(self.CONTADORES, 0))
+            valores[contador] += cantidad
+
+    def como_dict(self):
+        """
+        Retorna una copia de los contadores.
+
+        :return: Diccionario ``{alias: {contador: valor}}``.
+        :rtype: dict
+        """
+        with self._bloqueo:
+            return {alias: dict(valores) for alias, valores in self._valores.items()}
+
+    def reiniciar(self):
+        """
+        Vuelve todos los contadores a cero.
+        """
+        with self._bloqueo:
+            self._valores.clear()
+
+
+#: Estadísticas de conexiones del proceso.
+estadisticas = EstadisticasConexiones()
+
+
+@receiver(connection_created)
+def conexion_abierta(sender, connection, **kwargs):
+    """
+    Cuenta cada conexión nueva a la base de datos.
+    """
+    estadisticas.sumar(connection.alias, 'abiertas')
+
+
+def conexiones_abiertas():
+    """
+    Retorna las conexiones abiertas del hilo actual.
+
+    :return: Diccionario ``{alias: conexion}`` con la conexión del controlador de cada alias.
+    :rtype: dict
+    """
+    return {
+        conexion.alias: conexion.connection
+        for conexion in connections.all(initialized_only=True)
+        if conexion.connection is not None
+    }
+
+
+def registrar_uso(previas, usadas):
+    """
+    Clasifica el uso de las conexiones durante una petición y lo suma a `estadisticas`.
+
+    - Una conexión es nueva si no es la misma que estaba abierta al comenzar la petición.
+    - Una conexión es reutilizada si ya estaba abierta al comenzar y la petición hizo consultas con ella.
+    - Una conexión falló si hubo errores de base de datos y la conexión no se pudo abrir o ya no
+      responde (la misma comprobación que hace Django antes de reutilizarla).
+
+    :param previas: Resultado de `conexiones_abiertas` al comenzar la petición.
+    :param usadas: Alias de las conexiones con las que se hicieron consultas.
+    :return: Diccionario con la cantidad de conexiones ``nuevas``, ``reutilizadas`` y ``fallidas``.
+    :rtype: dict
+    """
+    uso = {'nuevas': 0, 'reutilizadas': 0, 'fallidas': 0}
+    for conexion in connections.all(initialized_only=True):
+        anterior = previas.get(conexion.alias)
+        if conexion.errors_occurred and (conexion.connection is None or not conexion.is_usable()):
+            uso['fallidas'] += 1
+            estadisticas.sumar(conexion.alias, 'fallidas')
+        elif conexion.connection is not None and conexion.connection is not anterior:
+            uso['nuevas'] += 1
+        elif anterior is not None and conexion.alias in usadas:
+            uso['reutilizadas'] += 1
+            estadisticas.sumar(conexion.alias, 'reutilizadas')
+    return uso
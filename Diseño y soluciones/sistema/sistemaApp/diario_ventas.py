@@ -0,0 +1,343 @@
+import json
+import sqlite3
+import threading
+import uuid
+from datetime import datetime
+from django.conf import settings
+from django.db import DatabaseError, IntegrityError, OperationalError, transaction
+from django.utils import timezone
+from . import caja
+from .catalogo import cache_productos
+from .conexiones import cerrar_conexiones_vencidas, es_error_conexion
+from .models import ClaveVenta, Venta
+
+
+#: Estados de una venta del diario.
+PENDIENTE = 'pendiente'
+SINCRONIZADA = 'sincronizada'
+RECHAZADA = 'rechazada'
+
+#: Métodos de pago que no se guardan en el diario: la venta a crédito solo se acepta si el cliente
+#: no supera su límite, que se verifica en la base de datos al registrarla. En el diario se
+#: rechazaría al sincronizarla, cuando el cliente ya se llevó los productos.
+METODOS_EN_LINEA = frozenset({'Deuda'})
+
+
+class DiarioVentas:
+    """
+    Diario local de ventas: un archivo SQLite en el servidor de la caja donde se guardan las
+    ventas cobradas que aún no se registran en la base de datos.
+
+    Las ventas se agregan al final y se registran en el orden en que se cobraron (ver
+    `sincronizar`). Cada escritura se confirma en disco antes de retornar (modo WAL con
+    ``synchronous=FULL``), por lo que una venta aceptada no se pierde si el proceso termina.
+    """
+
+    def __init__(self, ruta):
+        """
+        Constructor del diario.
+
+        :param ruta: Ruta del archivo SQLite (se crea si no existe).
+        """
+        self.ruta = str(ruta)
+        self._creado = False
+        self._bloqueo = threading.Lock()
+
+    def _conectar(self):
+        conexion = sqlite3.connect(self.ruta, timeout=30, isolation_level=None)
+        conexion.execute("PRAGMA journal_mode=WAL")
+        conexion.execute("PRAGMA synchronous=FULL")
+        if not self._creado:
+            with self._bloqueo:
+                conexion.execute(
+                    "CREATE TABLE IF NOT EXISTS venta_pendiente ("
+                    " id INTEGER PRIMARY KEY AUTOINCREMENT,"
+                    " clave TEXT NOT NULL UNIQUE,"
+                    " creada TEXT NOT NULL,"
+                    " datos TEXT NOT NULL,"
+                    " estado TEXT NOT NULL,"
+                    " id_venta INTEGER,"
+                    " detalle TEXT,"
+                    " procesada TEXT)"
+                )
+                conexion.execute("CREATE INDEX IF NOT EXISTS venta_pendiente_estado ON venta_pendiente (estado, id)")
+                self._creado = True
+        return conexion
+
+    def agregar(self, clave, datos):
+        """
+        Agrega una venta al final del diario.
+
+        :param clave: Clave única de la venta.
+        :param datos: Diccionario serializable con los datos de la venta.
+        """
+        conexion = self._conectar()
+        try:
+            conexion.execute(
+                "INSERT INTO venta_pendiente (clave, creada, datos, estado) VALUES (?, ?, ?, ?)",
+                (str(clave), timezone.now().isoformat(), json.dumps(datos, ensure_ascii=False), PENDIENTE),
+            )
+        finally:
+            conexion.close()
+
+    def pendientes(self, limite=100):
+        """
+        Retorna las ventas pendientes más antiguas, en el orden en que se agregaron.
+
+        :return: Lista de tuplas ``(id, clave, datos)``.
+        :rtype: list
+        """
+        conexion = self._conectar()
+        try:
+            filas = conexion.execute(
+                "SELECT id, clave, datos FROM venta_pendiente WHERE estado = ? ORDER BY id LIMIT ?",
+                (PENDIENTE, limite),
+            ).fetchall()
+        finally:
+            conexion.close()
+        return [(id_, clave, json.loads(datos)) for id_, clave, datos in filas]
+
+    def marcar(self, id_, estado, id_venta=None, detalle=None):
+        """
+        Cambia el estado de una venta del diario.
+
+        :param id_: Id de la venta en el diario.
+        :param estado: Estado nuevo (`SINCRONIZADA` o `RECHAZADA`).
+        :param id_venta: Id de la `Venta` registrada.
+        :param detalle: Conflictos o motivo del rechazo (se guarda como JSON).
+        """
+        conexion = self._conectar()
+        try:
+            conexion.execute(
+                "UPDATE venta_pendiente SET estado = ?, id_venta = ?, detalle = ?, procesada = ? WHERE id = ?",
+                (estado, id_venta, json.dumps(detalle, ensure_ascii=False) if detalle else None, timezone.now().isoformat(), id_),
+            )
+        finally:
+            conexion.close()
+
+    def reintentar_rechazadas(self):
+        """
+        Vuelve a dejar pendientes las ventas rechazadas.
+
+        :return: Cantidad de ventas que quedaron pendientes.
+        :rtype: int
+        """
+        conexion = self._conectar()
+        try:
+            return conexion.execute(
+                "UPDATE venta_pendiente SET estado = ?, detalle = NULL, procesada = NULL WHERE estado = ?",
+                (PENDIENTE, RECHAZADA),
+            ).rowcount
+        finally:
+            conexion.close()
+
+    def contar(self):
+        """
+        Cuenta las ventas del diario por estado.
+
+        :return: Diccionario ``{estado: cantidad}``.
+        :rtype: dict
+        """
+        conexion = self._conectar()
+        try:
+            return dict(conexion.execute("SELECT estado, COUNT(*) FROM venta_pendiente GROUP BY estado").fetchall())
+        finally:
+            conexion.close()
+
+    def rechazadas(self):
+        """
+        Retorna las ventas rechazadas con su motivo.
+
+        :return: Lista de tuplas ``(id, clave, creada, detalle)``.
+        :rtype: list
+        """
+        conexion = self._conectar()
+        try:
+            return conexion.execute(
+                "SELECT id, clave, creada, detalle FROM venta_pendiente WHERE estado = ? ORDER BY id", (RECHAZADA,)
+            ).fetchall()
+        finally:
+            conexion.close()
+
+
+_diarios = {}
+
+
+def obtener_diario():
+    """
+    Retorna el diario de ventas configurado en ``settings.VENTAS_DIARIO``.
+
+    :rtype: DiarioVentas
+    """
+    ruta = str(settings.VENTAS_DIARIO)
+    if ruta not in _diarios:
+        _diarios[ruta] = DiarioVentas(ruta)
+    return _diarios[ruta]
+
+
+def modo_ventas():
+    """
+    Retorna el modo de registro de ventas configurado en ``settings.VENTAS_MODO``:
+
+    - ``'directo'``: la venta se registra en la base de datos durante el cobro.
+    - ``'respaldo'``: como ``'directo'``, pero si la base de datos no responde la venta se guarda
+      en el diario local.
+    - ``'diferido'``: la venta siempre se guarda en el diario local y se registra en la base de
+      datos con el comando ``sincronizar_ventas``, sin que el cobro espere a la base de datos.
+    """
+    return getattr(settings, 'VENTAS_MODO', 'directo')
+
+
+def _datos_venta(venta, lineas):
+    """
+    Convierte una venta sin guardar y las líneas del carrito en un diccionario serializable.
+    """
+    return {
+        'fecha': venta.fecha.isoformat(),
+        'metodo_pago': venta.metodo_pago,
+        'id_cliente': venta.id_cliente_id,
+        'vendedor': venta.vendedor_id,
+        'lineas': [
+            {
+                'codigo': int(linea['codigo']),
+                'nombre': linea.get('nombre', ''),
+                'cantidad': int(linea['cantidad']),
+                'precio_venta': linea['precio_venta'],
+            }
+            for linea in lineas
+        ],
+    }
+
+
+def encolar_venta(venta, lineas, clave=None):
+    """
+    Guarda una venta cobrada en el diario local, sin consultar la base de datos.
+
+    También descuenta las unidades vendidas del stock de la caché de productos de la caja, para
+    que el stock mostrado al escanear considere las ventas pendientes.
+
+    :param venta: Instancia de `Venta` sin guardar (con `metodo_pago`, `id_cliente`, `vendedor` y `fecha`).
+    :param lineas: Líneas del carrito (diccionarios con `codigo`, `nombre`, `cantidad` y `precio_venta`).
+    :param clave: Clave única de la venta; por defecto se genera una.
+    :return: Clave de la venta.
+    :raises ValueError: Si la venta no tiene productos o es a crédito (ver `METODOS_EN_LINEA`).
+    """
+    lineas = list(lineas)
+    if not lineas:
+        raise ValueError("No hay productos agregados a la venta.")
+    if venta.metodo_pago in METODOS_EN_LINEA:
+        raise ValueError(
+            "No se puede vender a crédito sin conexión con la base de datos. Use otro método de pago."
+        )
+    clave = clave or uuid.uuid4()
+    obtener_diario().agregar(clave, _datos_venta(venta, lineas))
+
+    cache_productos.descontar_stock(caja.agrupar_lineas(lineas))
+    return clave
+
+
+def registrar_con_clave(venta, lineas, clave, precios=None, permitir_negativo=False):
+    """
+    Registra una venta en la base de datos junto con su clave única (ver `ClaveVenta`).
+
+    Si ya hay una venta registrada con la clave, no registra nada y retorna esa venta.
+
+    :return: Tupla ``(id_venta, conflictos, nueva)``.
+    :raises StockInsuficienteError: Si no se permite stock negativo y falta stock.
+    :raises ValueError: Si la venta no tiene productos o el cliente supera su límite de crédito.
+    """
+    existente = ClaveVenta.objects.filter(clave=clave).values_list('venta_id', 'conflictos').first()
+    if existente is not None:
+        return existente[0], existente[1], False
+    try:
+        with transaction.atomic():
+            caja.registrar_venta(venta, lineas, precios=precios, permitir_negativo=permitir_negativo)
+            conflictos = [list(faltante) for faltante in venta.faltantes]
+            ClaveVenta.objects.create(clave=clave, venta=venta, conflictos=conflictos)
+    except IntegrityError:
+        # Otro proceso registró la misma venta entre la consulta y la inserción.
+        existente = ClaveVenta.objects.filter(clave=clave).values_list('venta_id', 'conflictos').first()
+        if existente is None:
+            raise
+        return existente[0], existente[1], False
+    return venta.id_venta, conflictos, True
+
+
+class ResultadoSincronizacion:
+    """
+    Resumen de una sincronización del diario de ventas.
+    """
+
+    def __init__(self):
+        self.sincronizadas = 0
+        self.repetidas = 0
+        #: Lista de tuplas ``(clave, id_venta, conflictos)`` de las ventas con stock negativo.
+        self.conflictos = []
+        #: Lista de tuplas ``(clave, motivo)`` de las ventas que no se pudieron registrar.
+        self.rechazadas = []
+        #: Error de conexión que detuvo la sincronización, si lo hubo.
+        self.error = None
+
+
+def sincronizar(limite=None, lote=100):
+    """
+    Registra en la base de datos las ventas pendientes del diario, en el orden en que se cobraron.
+
+    - Cada venta se registra en su propia transacción junto con su clave (ver `registrar_con_clave`),
+      por lo que sincronizar dos veces la misma venta no la duplica.
+    - La venta se registra con los precios cobrados y aunque el stock quede negativo; los productos
+      afectados se informan como conflictos.
+    - Si la venta no se puede registrar (por ejemplo, el cliente superó su límite de crédito), se
+      marca como rechazada y se continúa con la siguiente.
+    - Si la base de datos no responde (ver `sistemaApp.conexiones.es_error_conexion`), la
+      sincronización se detiene para conservar el orden; las ventas restantes quedan pendientes y
+      la conexión cortada se cierra, para que la próxima sincronización abra una nueva.
+    - Otros errores operativos, como un bloqueo mutuo o una espera de bloqueo vencida, se propagan:
+      la base de datos responde, la venta no se registró y queda pendiente.
+
+    Antes de cada lote se cierran las conexiones vencidas, por lo que el comando
+    ``sincronizar_ventas --continuo`` no reutiliza una conexión que se cortó mientras esperaba.
+
+    :param limite: Cantidad máxima de ventas a procesar (por defecto, todas).
+    :param lote: Cantidad de ventas que se leen del diario a la vez.
+    :rtype: ResultadoSincronizacion
+    """
+    diario = obtener_diario()
+    resultado = ResultadoSincronizacion()
+    procesadas = 0
+    while limite is None or procesadas < limite:
+        cerrar_conexiones_vencidas()
+        pendientes = diario.pendientes(lote if limite is None else min(lote, limite - procesadas))
+        if not pendientes:
+            break
+        for id_, clave, datos in pendientes:
+            procesadas += 1
+            venta = Venta(
+                fecha=datetime.fromisoformat(datos['fecha']),
+                metodo_pago=datos['metodo_pago'],
+                id_cliente_id=datos['id_cliente'],
+                vendedor_id=datos['vendedor'],
+            )
+            precios = {linea['codigo']: linea['precio_venta'] for linea in datos['lineas']}
+            try:
+                id_venta, conflictos, nueva = registrar_con_clave(
+                    venta, datos['lineas'], uuid.UUID(clave), precios=precios, permitir_negativo=True
+                )
+            except (ValueError, DatabaseError) as error:
+                if es_error_conexion(error):
+                    cerrar_conexiones_vencidas()
+                    resultado.error = error
+                    return resultado
+                if isinstance(error, OperationalError):
+                    raise
+                diario.marcar(id_, RECHAZADA, detalle=str(error))
+                resultado.rechazadas.append((clave, str(error)))
+                continue
+            diario.marcar(id_, SINCRONIZADA, id_venta=id_venta, detalle=conflictos)
+            if nueva:
+                resultado.sincronizadas += 1
+            else:
+                resultado.repetidas += 1
+            if conflictos:
+                resultado.conflictos.append((clave, id_venta, conflictos))
+    return resultado
@@ -0,0 +1,68 @@
+import logging
+from django.apps import apps
+from django.conf import settings
+from django.test.runner import DiscoverRunner
+from django.test.utils import override_settings
+
+
+class FallarExcesosPresupuesto(logging.Handler):
+    """
+    Convierte en un error de la prueba cada petición que excede su presupuesto de consultas.
+
+    `InstrumentacionMiddleware` registra los excesos en el logger ``sistemaApp.instrumentacion``;
+    este manejador lanza `AssertionError` al recibirlos, por lo que la petición falla en la prueba
+    que la hizo (ver `sistemaApp.instrumentacion.PRESUPUESTOS`).
+    """
+
+    def emit(self, record):
+        datos = getattr(record, 'instrumentacion', None)
+        if datos and datos.get('excesos'):
+            repetidas = ''.join(f"\n  {veces} x {sql}" for sql, veces in datos['repetidas'])
+            raise AssertionError('; '.join(datos['excesos']) + repetidas)
+
+
+class EjecutorPruebas(DiscoverRunner):
+    """
+    Ejecutor de pruebas que crea también las tablas de los modelos no gestionados.
+
+    Las tablas de `Producto`, `Venta`, `Cliente` y demás modelos con ``managed = False`` no las
+    crean las migraciones. Para la base de pruebas, esos modelos se marcan como gestionados y las
+    tablas de `sistemaApp` se crean directamente desde los modelos, sin sus migraciones.
+    """
+
+    def setup_test_environment(self, **kwargs):
+        super().setup_test_environment(**kwargs)
+        # En las pruebas solo interesan las peticiones que exceden su presupuesto, y hacen fallar
+        # la prueba.
+        self._logger_instrumentacion = logging.getLogger('sistemaApp.instrumentacion')
+        self._logger_instrumentacion.setLevel(logging.WARNING)
+        self._fallar_excesos = FallarExcesosPresupuesto()
+        self._logger_instrumentacion.addHandler(self._fallar_excesos)
+        # Los fragmentos de plantillas, las sesiones y los carritos se guardan en memoria, no en
+        # disco.
+        self._cache_fragmentos = override_settings(CACHES={
+            **settings.CACHES,
+            settings.FRAGMENTOS_CACHE: {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'},
+            settings.SESIONES_CACHE: {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'},
+            settings.CARRITO_CACHE: {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'},
+        })
+        self._cache_fragmentos.enable()
+
+    def teardown_test_environment(self, **kwargs):
+        self._cache_fragmentos.disable()
+        self._logger_instrumentacion.removeHandler(self._fallar_excesos)
+        super().teardown_test_environment(**kwargs)
+
+    def setup_databases(self, **kwargs):
+        self._no_gestionados = [
+            modelo for modelo in apps.get_app_config('sistemaApp').get_models() if not modelo._meta.managed
+        ]
+        for modelo in self._no_gestionados:
+            modelo._meta.managed = True
+        with override_settings(MIGRATION_MODULES={'sistemaApp': None}):
+            return super().setup_databases(**kwargs)
+
+    def teardown_databases(self, old_config, **kwargs):
+        super().teardown_databases(old_config, **kwargs)
+        for modelo in self._no_gestionados:
+            modelo._meta.managed = False
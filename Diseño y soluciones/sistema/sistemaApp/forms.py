@@ -1,5 +1,10 @@
 from django import forms    
+from django.conf import settings
+from django.db import DatabaseError
+from . import fragmentos
+from .conexiones import es_error_conexion
 from .models import Producto,Proveedor,Categoria,Cliente,Venta
+from .precios import ReglasPrecio
 from django.contrib.auth.models import User
 
 class RegisterForm(forms.Form):
@@ -151,16 +156,16 @@ class ProductoForm(forms.ModelForm):
         """
         Calcula el precio de venta del producto.
 
-        - Aplica un margen de ganancia del 40% y un IVA del 19% al precio de costo.
+        - Aplica al precio de costo el margen y el IVA de la regla de precio que corresponde al
+          producto (ver `ReglaPrecio`); por defecto, un margen de ganancia del 40% y un IVA del 19%.
 
         :return: Precio de venta calculado, o `None` si no hay precio de costo.
         """
-        precio_costo = self.cleaned_data.get('precio_costo')
-        if precio_costo is not None:
-            margen = 1.40  # Margen de ganancia del 40%.
-            iva = 1.19  # IVA del 19%.
-            return int(precio_costo * iva * margen)
-        return None
+        codigo = self.cleaned_data.get('codigo_producto')
+        categoria = self.cleaned_data.get('categoria')
+        categoria_id = categoria.pk if categoria else None
+        reglas = ReglasPrecio.cargar(codigo, categoria_id)
+        return reglas.precio_venta(self.cleaned_data.get('precio_costo'), codigo, categoria_id)
 
     def save(self, commit=True):
         """
@@ -270,9 +275,58 @@ class ClienteForm(forms.ModelForm):
 
         return deuda
 
+def cliente_existe(id_cliente):
+    """
+    Indica si existe el cliente, consultando la base de datos solo si la respuesta no está en la
+    caché de fragmentos.
+
+    La respuesta se guarda con la versión de los clientes (ver `fragmentos.CLIENTES`), por lo
+    que deja de usarse cuando se crea, modifica o elimina un cliente. Si la base de datos no
+    responde, el cliente se da por válido: la venta se guarda en el diario local y el cliente se
+    valida al registrarla (ver `sistemaApp.diario_ventas.sincronizar`).
+
+    :param id_cliente: Id del cliente.
+    :rtype: bool
+    """
+    cache = fragmentos.cache_fragmentos()
+    version = fragmentos.versiones([fragmentos.CLIENTES])[fragmentos.CLIENTES]
+    clave = f'cliente:{version}:{id_cliente}'
+    existe = cache.get(clave)
+    if existe is None:
+        try:
+            existe = Cliente.objects.filter(pk=id_cliente).exists()
+        except DatabaseError as error:
+            if not es_error_conexion(error):
+                raise
+            return True
+        cache.set(clave, existe, getattr(settings, 'FRAGMENTOS_SEGUNDOS', 600))
+    return existe
+
+
+class ClienteVentaField(forms.ModelChoiceField):
+    """
+    Campo del cliente de la venta: valida el id con `cliente_existe`, sin leer el cliente de la
+    base de datos. Retorna una referencia al cliente con solo su id, que es lo que guarda la venta.
+    """
+
+    def to_python(self, value):
+        if value in self.empty_values:
+            return None
+        try:
+            id_cliente = int(value)
+        except (TypeError, ValueError):
+            raise forms.ValidationError(self.error_messages['invalid_choice'], code='invalid_choice')
+        if not cliente_existe(id_cliente):
+            raise forms.ValidationError(self.error_messages['invalid_choice'], code='invalid_choice')
+        return Cliente(pk=id_cliente)
+
+
 class VentaForm(forms.ModelForm):
     """
     Formulario para la creación y edición de ventas en la base de datos.
+
+    El cliente se valida con la caché (ver `ClienteVentaField`), por lo que validar el formulario
+    no consulta la base de datos mientras los clientes no cambien.
     """
 
     class Meta:
@@ -281,12 +335,16 @@ class VentaForm(forms.ModelForm):
 
         - Basado en el modelo `Venta`.
         - Incluye los campos `metodo_pago` e `id_cliente`.
-        - Define un widget personalizado con clases Bootstrap para estilizar los campos.
+        - El cliente se envía en un campo oculto que completa el buscador de clientes de la caja
+          (ver la vista `clientes_json`), para no incluir todos los clientes en la página.
         """
         model = Venta
         fields = ['metodo_pago', 'id_cliente']
         widgets = {
-            'id_cliente': forms.Select(attrs={'class': 'form-control'}),  # Campo de selección de cliente con estilo 'form-control'.
+            'id_cliente': forms.HiddenInput(),  # Id del cliente elegido en el buscador.
+        }
+        field_classes = {
+            'id_cliente': ClienteVentaField,
         }
 
     # Definición del campo 'metodo_pago' como un campo de selección con opciones de pago.
@@ -297,4 +355,11 @@ class VentaForm(forms.ModelForm):
         error_messages={'required': " Por favor, seleccione un método de pago. "}  # Mensaje de error si no se selecciona un método de pago.
     )
 
+    def _get_validation_exclusions(self):
+        # El cliente ya se validó con `ClienteVentaField`: la validación del modelo volvería a
+        # consultar la base de datos para comprobar que existe.
+        exclusiones = super()._get_validation_exclusions()
+        exclusiones.add('id_cliente')
+        return exclusiones
+
 
@@ -0,0 +1,146 @@
+import time
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+from django.dispatch import Signal
+from django.utils.functional import SimpleLazyObject
+
+
+#: Datos cuya versión forma parte de las claves de los fragmentos de plantillas en caché y de
+#: los ETag de las respuestas (ver `sistemaApp.condicional`): los productos sin su stock (código,
+#: nombre, precios, stock mínimo y categoría), el stock de los productos y la valorización del
+#: inventario, las categorías, los clientes con sus deudas y los proveedores.
+#:
+#: Las ventas solo cambian `STOCK`, por lo que lo que no muestra el stock (por ejemplo, el
+#: buscador de la caja) sigue vigente después de cada cobro.
+CATALOGO = 'catalogo'
+STOCK = 'stock'
+CATEGORIAS = 'categorias'
+CLIENTES = 'clientes'
+PROVEEDORES = 'proveedores'
+VERSIONES = (CATALOGO, STOCK, CATEGORIAS, CLIENTES, PROVEEDORES)
+
+#: Señal enviada por este proceso después de cambiar versiones, con los argumentos `anteriores` y
+#: `nuevas` (diccionarios ``{nombre: version}``; la anterior es `None` si no estaba en la caché).
+versiones_cambiadas = Signal()
+
+
+def cache_fragmentos():
+    """
+    Retorna la caché de los fragmentos de plantillas y sus versiones (``settings.FRAGMENTOS_CACHE``).
+    """
+    return caches[getattr(settings, 'FRAGMENTOS_CACHE', 'fragmentos')]
+
+
+def _clave(nombre):
+    return f'version:{nombre}'
+
+
+def versiones(nombres=VERSIONES):
+    """
+    Retorna las versiones actuales de los datos, con una sola lectura de la caché.
+
+    Una versión que no está en la caché (la primera vez, o si la caché la descartó) comienza en la
+    hora actual en nanosegundos, para no repetir una versión anterior cuyos fragmentos sigan
+    guardados.
+
+    :param nombres: Nombres de las versiones (ver `VERSIONES`).
+    :return: Diccionario ``{nombre: version}``.
+    :rtype: dict
+    """
+    cache = cache_fragmentos()
+    claves = {nombre: _clave(nombre) for nombre in nombres}
+    guardadas = cache.get_many(claves.values())
+    resultado = {}
+    for nombre, clave in claves.items():
+        version = guardadas.get(clave)
+        if version is None:
+            cache.add(clave, time.time_ns(), None)
+            version = cache.get(clave)
+        resultado[nombre] = version
+    return resultado
+
+
+async def aversiones(nombres=VERSIONES):
+    """
+    Versión asíncrona de `versiones`.
+    """
+    cache = cache_fragmentos()
+    claves = {nombre: _clave(nombre) for nombre in nombres}
+    guardadas = await cache.aget_many(claves.values())
+    resultado = {}
+    for nombre, clave in claves.items():
+        version = guardadas.get(clave)
+        if version is None:
+            await cache.aadd(clave, time.time_ns(), None)
+            version = await cache.aget(clave)
+        resultado[nombre] = version
+    return resultado
+
+
+def _incrementar(nombres):
+    # La versión nueva es la hora en nanosegundos, escrita con `set`: dos procesos que cambian
+    # la versión a la vez escriben valores distintos de la anterior, por lo que ningún cambio se
+    # pierde. Con `incr`, que en la caché en archivos lee y escribe el valor sin bloqueo, dos
+    # cambios simultáneos podían dejar la misma versión que un solo cambio. Si el reloj retrocede,
+    # la versión igual avanza, para no repetir una anterior cuyos fragmentos sigan guardados.
+    cache = cache_fragmentos()
+    claves = {nombre: _clave(nombre) for nombre in nombres}
+    guardadas = cache.get_many(claves.values())
+    ahora = time.time_ns()
+    anteriores = {nombre: guardadas.get(clave) for nombre, clave in claves.items()}
+    nuevas = {nombre: max(ahora, (anteriores[nombre] or 0) + 1) for nombre in claves}
+    cache.set_many({claves[nombre]: version for nombre, version in nuevas.items()}, None)
+    versiones_cambiadas.send(sender=None, anteriores=anteriores, nuevas=nuevas)
+
+
+def incrementar(*nombres):
+    """
+    Cambia las versiones de los datos indicados, con lo que los fragmentos guardados con las
+    versiones anteriores dejan de usarse.
+
+    El cambio se hace al confirmarse la transacción en curso (o de inmediato fuera de una
+    transacción): si se hiciera antes, otra petición podría guardar los datos anteriores con la
+    versión nueva.
+
+    :param nombres: Nombres de las versiones (ver `VERSIONES`).
+    """
+    transaction.on_commit(lambda: _incrementar(nombres))
+
+
+def segundos(request):
+    """
+    Retorna el tiempo de vida de lo que se guarda en la caché de fragmentos durante una petición
+    (``settings.FRAGMENTOS_SEGUNDOS``). Si la petición lee de la réplica, no supera el retraso
+    máximo de la réplica, porque la versión puede ser más nueva que los datos que se leen.
+    """
+    segundos = getattr(settings, 'FRAGMENTOS_SEGUNDOS', 600)
+    if getattr(request, 'alias_lectura', None) is not None:
+        segundos = min(segundos, settings.REPLICA_RETRASO_MAXIMO)
+    return segundos
+
+
+def base(request):
+    """
+    Retorna la base de datos de la que lee la petición, que forma parte de las claves de la caché
+    de fragmentos.
+    """
+    return getattr(request, 'alias_lectura', None) or 'default'
+
+
+def contexto(request):
+    """
+    Procesador de contexto que agrega `fragmentos` a las plantillas, para armar las claves de
+    ``{% cache %}``:
+
+    - ``fragmentos.catalogo``, ``fragmentos.stock``, ``fragmentos.categorias`` y
+      ``fragmentos.clientes``: versiones de los datos (ver `versiones`).
+    - ``fragmentos.segundos``: tiempo de vida de los fragmentos (ver `segundos`).
+    - ``fragmentos.base``: base de datos de la que lee la petición (ver `base`).
+
+    Las versiones se leen de la caché solo si la plantilla las usa.
+    """
+    def datos():
+        return dict(versiones(), segundos=segundos(request), base=base(request))
+
+    return {'fragmentos': SimpleLazyObject(datos)}
@@ -0,0 +1,313 @@
+import csv
+import io
+from django.db import connection, transaction
+from . import fragmentos
+from .busqueda import indice_cargado
+from .catalogo import cache_productos, registro_producto
+from .models import Categoria, Producto, StockBajo, ValorizacionInventario
+from .precios import ReglasPrecio
+
+
+#: Cantidad de filas que se validan y guardan juntas.
+TAMANO_LOTE = 2_000
+
+#: Nombres aceptados para cada columna del archivo (en minúsculas).
+COLUMNAS = {
+    'codigo_producto': ('codigo_producto', 'codigo', 'código'),
+    'nombre_producto': ('nombre_producto', 'nombre'),
+    'precio_costo': ('precio_costo', 'costo', 'precio costo'),
+    'stock_minimo': ('stock_minimo', 'stock mínimo', 'stock minimo'),
+    'stock_actual': ('stock_actual', 'stock', 'stock actual'),
+    'categoria': ('categoria', 'categoría'),
+}
+
+#: Valor máximo de las columnas enteras de `producto`.
+ENTERO_MAXIMO = 2_147_483_647
+
+#: Campos que se actualizan en los productos existentes.
+CAMPOS_ACTUALIZABLES = ['nombre_producto', 'precio_costo', 'precio_venta', 'stock_minimo', 'stock_actual', 'categoria']
+
+
+class ErrorImportacion(ValueError):
+    """
+    Excepción lanzada cuando el archivo no se puede leer (formato o columnas no válidos).
+    """
+
+
+class ResultadoImportacion:
+    """
+    Resumen de una importación: productos creados, actualizados y errores por fila.
+    """
+
+    def __init__(self):
+        self.creados = 0
+        self.actualizados = 0
+        #: Lista de tuplas ``(numero_fila, mensaje)``.
+        self.errores = []
+
+    @property
+    def procesados(self):
+        return self.creados + self.actualizados
+
+
+def _encabezados(fila):
+    """
+    Asocia cada columna del archivo con su campo según `COLUMNAS`.
+
+    :param fila: Primera fila del archivo.
+    :return: Diccionario ``{campo: posicion}``.
+    :raises ErrorImportacion: Si falta alguna columna obligatoria.
+    """
+    posiciones = {}
+    for posicion, nombre in enumerate(fila):
+        nombre = str(nombre or '').strip().lower()
+        for campo, alias in COLUMNAS.items():
+            if nombre in alias:
+                posiciones[campo] = posicion
+    faltantes = [campo for campo in COLUMNAS if campo != 'categoria' and campo not in posiciones]
+    if faltantes:
+        raise ErrorImportacion(f"Faltan columnas en el archivo: {', '.join(faltantes)}.")
+    return posiciones
+
+
+def _filas_csv(archivo):
+    texto = io.TextIOWrapper(archivo, encoding='utf-8-sig', newline='')
+    muestra = texto.read(4096)
+    texto.seek(0)
+    try:
+        dialecto = csv.Sniffer().sniff(muestra, delimiters=',;\t')
+    except csv.Error:
+        dialecto = csv.excel
+    try:
+        yield from csv.reader(texto, dialecto)
+    finally:
+        texto.detach()
+
+
+def _filas_xlsx(archivo):
+    try:
+        import openpyxl
+    except ImportError:
+        raise ErrorImportacion("Para importar archivos .xlsx se requiere el paquete 'openpyxl'.")
+    libro = openpyxl.load_workbook(archivo, read_only=True, data_only=True)
+    try:
+        yield from libro.active.iter_rows(values_only=True)
+    finally:
+        libro.close()
+
+
+def leer_filas(archivo, nombre):
+    """
+    Lee un archivo CSV o XLSX de productos fila por fila, sin cargarlo completo en memoria.
+
+    :param archivo: Archivo binario abierto.
+    :param nombre: Nombre del archivo; su extensión indica el formato.
+    :return: Generador de tuplas ``(numero_fila, datos)``, donde `datos` es un diccionario con los
+             valores de las columnas de `COLUMNAS` (la fila 1 es el encabezado).
+    :raises ErrorImportacion: Si el formato o los encabezados no son válidos.
+    """
+    extension = nombre.lower().rsplit('.', 1)[-1]
+    if extension == 'csv':
+        filas = _filas_csv(archivo)
+    elif extension == 'xlsx':
+        filas = _filas_xlsx(archivo)
+    else:
+        raise ErrorImportacion("El archivo debe ser .csv o .xlsx.")
+
+    encabezado = next(filas, None)
+    if encabezado is None:
+        raise ErrorImportacion("El archivo está vacío.")
+    posiciones = _encabezados(encabezado)
+
+    for numero, fila in enumerate(filas, start=2):
+        if not any(valor not in (None, '') for valor in fila):
+            continue
+        yield numero, {
+            campo: fila[posicion] if posicion < len(fila) else None for campo, posicion in posiciones.items()
+        }
+
+
+def _entero(valor, campo, minimo):
+    """
+    Convierte un valor del archivo en entero (acepta ``"12"``, ``12`` y ``12.0``).
+
+    :raises ValueError: Si el valor no es un entero o está fuera del rango de la columna.
+    """
+    try:
+        numero = valor if isinstance(valor, (int, float)) else float(str(valor).strip().replace(',', '.'))
+        if numero != int(numero):
+            raise ValueError
+    except (ValueError, OverflowError):
+        raise ValueError(f"{campo} debe ser un número entero.")
+    if not minimo <= int(numero) <= ENTERO_MAXIMO:
+        raise ValueError(f"{campo} debe estar entre {minimo} y {ENTERO_MAXIMO}.")
+    return int(numero)
+
+
+def _validar(datos):
+    """
+    Valida una fila y la convierte en los valores del producto.
+
+    :return: Diccionario con los campos del producto y el nombre de la categoría.
+    :raises ValueError: Si algún valor no es válido.
+    """
+    nombre = str(datos['nombre_producto'] or '').strip()
+    if not nombre:
+        raise ValueError("El nombre del producto es obligatorio.")
+    if len(nombre) > 100:
+        raise ValueError("El nombre del producto no puede tener más de 100 caracteres.")
+    return {
+        'codigo_producto': _entero(datos['codigo_producto'], "El código del producto", 1),
+        'nombre_producto': nombre,
+        'precio_costo': _entero(datos['precio_costo'], "El precio de costo", 0),
+        'stock_minimo': _entero(datos['stock_minimo'], "El stock mínimo", 0),
+        'stock_actual': _entero(datos['stock_actual'], "El stock actual", 0),
+        'categoria': str(datos.get('categoria') or '').strip(),
+    }
+
+
+def _importar_lote(lote, resultado, crear_categorias, reglas):
+    """
+    Valida y guarda un lote de filas con un número de consultas constante.
+
+    1. Valida las filas en memoria (si un código se repite, vale la última fila).
+    2. Resuelve los nombres de las categorías con una consulta (y crea las que faltan si se pidió).
+    3. Calcula los precios de venta con las reglas de precio vigentes (ver `sistemaApp.precios`).
+    4. Lee los productos existentes con una consulta, crea los nuevos con `bulk_create` y actualiza
+       los existentes con un ``UPDATE`` preparado (ver `_actualizar`).
+    5. Aplica las diferencias a la valorización del inventario (una sentencia por categoría),
+       actualiza la lista de stock bajo y, al confirmar, actualiza el índice de búsqueda y la
+       caché de productos, ya que las operaciones masivas no disparan las señales de `Producto`.
+    """
+    validas = {}
+    for numero, datos in lote:
+        try:
+            valores = _validar(datos)
+        except ValueError as error:
+            resultado.errores.append((numero, str(error)))
+            continue
+        validas[valores['codigo_producto']] = (numero, valores)
+    if not validas:
+        return
+
+    nombres = {valores['categoria'] for _, valores in validas.values() if valores['categoria']}
+    categorias = dict(Categoria.objects.filter(nombre__in=nombres).values_list('nombre', 'categoria_id'))
+    faltantes = nombres - set(categorias)
+    if faltantes and crear_categorias:
+        Categoria.objects.bulk_create([Categoria(nombre=nombre) for nombre in sorted(faltantes)])
+        fragmentos.incrementar(fragmentos.CATEGORIAS)
+        categorias = dict(Categoria.objects.filter(nombre__in=nombres).values_list('nombre', 'categoria_id'))
+        faltantes = set()
+    for codigo, (numero, valores) in list(validas.items()):
+        if valores['categoria'] in faltantes:
+            resultado.errores.append((numero, f"La categoría '{valores['categoria']}' no existe."))
+            del validas[codigo]
+    if not validas:
+        return
+
+    with transaction.atomic():
+        existentes = {
+            codigo: (categoria_id, costo, stock)
+            for codigo, categoria_id, costo, stock in Producto.objects.select_for_update().filter(
+                codigo_producto__in=validas
+            ).values_list('codigo_producto', *Producto.CAMPOS_VALORIZACION)
+        }
+        nuevos, actualizados, cambios = [], [], []
+        for _, valores in validas.values():
+            producto = Producto(
+                codigo_producto=valores['codigo_producto'],
+                nombre_producto=valores['nombre_producto'],
+                precio_costo=valores['precio_costo'],
+                stock_minimo=valores['stock_minimo'],
+                stock_actual=valores['stock_actual'],
+                categoria_id=categorias.get(valores['categoria']),
+            )
+            producto.precio_venta = reglas.precio_venta(
+                producto.precio_costo, producto.codigo_producto, producto.categoria_id
+            )
+            anterior = existentes.get(producto.codigo_producto)
+            (actualizados if anterior is not None else nuevos).append(producto)
+            cambios.append((anterior, producto.valores_valorizacion()))
+
+        Producto.objects.bulk_create(nuevos, batch_size=TAMANO_LOTE)
+        _actualizar(actualizados)
+        ValorizacionInventario.registrar_cambios(cambios)
+        StockBajo.actualizar_productos(
+            (producto.codigo_producto, producto.stock_actual, producto.stock_minimo) for producto in nuevos + actualizados
+        )
+
+        registros = [(producto.codigo_producto, registro_producto(producto)) for producto in nuevos + actualizados]
+        transaction.on_commit(lambda: _notificar(registros))
+        fragmentos.incrementar(fragmentos.CATALOGO, fragmentos.STOCK)
+
+    resultado.creados += len(nuevos)
+    resultado.actualizados += len(actualizados)
+
+
+def _actualizar(productos):
+    """
+    Actualiza los productos existentes con un único ``UPDATE`` preparado y ejecutado con
+    `executemany`.
+
+    Se usa en lugar de `bulk_update`, que arma un ``CASE`` por campo con una rama por producto y
+    tarda varios milisegundos por fila solo en construir la sentencia.
+    """
+    if not productos:
+        return
+    opciones = Producto._meta
+    campos = [opciones.get_field(campo) for campo in CAMPOS_ACTUALIZABLES]
+    asignaciones = ', '.join(f"{connection.ops.quote_name(campo.column)} = %s" for campo in campos)
+    sql = (
+        f"UPDATE {connection.ops.quote_name(opciones.db_table)} SET {asignaciones} "
+        f"WHERE {connection.ops.quote_name(opciones.pk.column)} = %s"
+    )
+    with connection.cursor() as cursor:
+        cursor.executemany(sql, [
+            [getattr(producto, campo.attname) for campo in campos] + [producto.pk] for producto in productos
+        ])
+
+
+def _notificar(registros):
+    """
+    Actualiza el índice de búsqueda y la caché de productos del proceso con los productos
+    importados. Los demás procesos (y este, si la importación se hizo con el comando
+    ``importar_productos``) los ven al cambiar la versión del catálogo.
+    """
+    indice = indice_cargado()
+    for codigo, registro in registros:
+        if indice is not None:
+            indice.actualizar(codigo, registro['nombre'])
+        cache_productos.guardar(registro)
+
+
+def importar_productos(archivo, nombre, tamano_lote=TAMANO_LOTE, crear_categorias=False):
+    """
+    Importa (crea o actualiza) productos desde un archivo CSV o XLSX.
+
+    El archivo se lee por partes y cada lote de `tamano_lote` filas se guarda en su propia
+    transacción (ver `_importar_lote`). Las filas con errores se omiten y se informan al final.
+
+    Columnas: `codigo_producto`, `nombre_producto`, `precio_costo`, `stock_minimo`, `stock_actual`
+    y opcionalmente `categoria` (nombre de la categoría). El precio de venta se calcula con las
+    reglas de precio vigentes, igual que en el formulario de productos.
+
+    :param archivo: Archivo binario abierto.
+    :param nombre: Nombre del archivo (su extensión indica el formato).
+    :param tamano_lote: Cantidad de filas por lote.
+    :param crear_categorias: Si es `True`, crea las categorías que no existan en lugar de rechazar las filas.
+    :return: Resumen de la importación.
+    :rtype: ResultadoImportacion
+    :raises ErrorImportacion: Si el formato o los encabezados no son válidos.
+    """
+    resultado = ResultadoImportacion()
+    reglas = ReglasPrecio.cargar()
+    lote = []
+    for fila in leer_filas(archivo, nombre):
+        lote.append(fila)
+        if len(lote) >= tamano_lote:
+            _importar_lote(lote, resultado, crear_categorias, reglas)
+            lote = []
+    if lote:
+        _importar_lote(lote, resultado, crear_categorias, reglas)
+    resultado.errores.sort()
+    return resultado
@@ -0,0 +1,327 @@
+import json
+import logging
+import time
+from collections import Counter
+from contextlib import ExitStack, contextmanager
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.conf import settings
+from django.db import connections
+from . import conexiones
+
+
+logger = logging.getLogger('sistemaApp.instrumentacion')
+
+
+#: Presupuesto de cada nombre de URL de `sistema/urls.py`: cantidad máxima de consultas por
+#: petición (incluidas las de la sesión y el usuario) y, opcionalmente, de consultas duplicadas
+#: (la misma sentencia con los mismos parámetros; por defecto 0). Las peticiones de un método
+#: con un costo distinto (por ejemplo, el POST que guarda un formulario) tienen su propio
+#: presupuesto con la clave ``(nombre, método)``; los demás métodos usan el del nombre.
+#: Las pruebas de `sistemaApp.tests` fallan si una petición excede su presupuesto.
+PRESUPUESTOS = {
+    'login': {'consultas': 2},
+    'register': {'consultas': 2},
+    'Home': {'consultas': 3},
+    'buscar_productos': {'consultas': 2},
+    'GestionProductos': {'consultas': 5},
+    'ProductosJson': {'consultas': 5},
+    'CrearProducto': {'consultas': 3},
+    'ImportarProductos': {'consultas': 2},
+    'StockBajo': {'consultas': 5},
+    'StockBajoJson': {'consultas': 4},
+    'ModificarProducto': {'consultas': 4},
+    'EliminarProducto': {'consultas': 3},
+    'GestionDepartamentos': {'consultas': 3},
+    'CrearDepartamento': {'consultas': 2},
+    'ModificarDepartamento': {'consultas': 3},
+    'EliminarDepartamento': {'consultas': 3},
+    'ProductosAsociados': {'consultas': 5},
+    'GestionProveedores': {'consultas': 3},
+    'CrearProveedor': {'consultas': 2},
+    'ModificarProveedor': {'consultas': 3},
+    'EliminarProveedor': {'consultas': 3},
+    'GestionClientes': {'consultas': 3},
+    'ClientesJson': {'consultas': 3},
+    'CrearCliente': {'consultas': 2},
+    'ModificarCliente': {'consultas': 3},
+    # Si cambia la deuda, la ajusta y registra el movimiento (ver `MovimientoDeuda.ajustar`).
+    ('ModificarCliente', 'POST'): {'consultas': 13},
+    'EliminarCliente': {'consultas': 3},
+    'AbonarDeuda': {'consultas': 10},
+    'AumentarDeuda': {'consultas': 11},
+    'AntiguedadDeudas': {'consultas': 4},
+    'AntiguedadDeudasCsv': {'consultas': 3},
+    'AgregarProducto': {'consultas': 2},
+    'EscanearProducto': {'consultas': 2},
+    'QuitarProducto': {'consultas': 2},
+    'CancelarVenta': {'consultas': 2},
+    'RegistrarVenta': {'consultas': 3},
+    # La venta, sus líneas, el stock, los resúmenes y la clave de la venta; una venta a crédito
+    # suma el cargo al cliente, su deuda pendiente del día y el movimiento. Si el cargo supera el
+    # límite, `MovimientoDeuda.cargar` vuelve a verificar que el cliente exista (la consulta
+    # duplicada con la validación del formulario).
+    ('RegistrarVenta', 'POST'): {'consultas': 25, 'duplicadas': 1},
+    'HistorialVentas': {'consultas': 5},
+    'DetalleVenta': {'consultas': 4},
+    'generar_reporte_ventas': {'consultas': 4},
+    'agregar_varios_productos': {'consultas': 2},
+    'logout': {'consultas': 3},
+}
+
+
+class RegistroConsultas:
+    """
+    Registra las consultas SQL ejecutadas mientras está instalado como `execute_wrapper`.
+
+    Cuenta las consultas, suma su tiempo y detecta las duplicadas (misma sentencia y mismos
+    parámetros) y las similares (misma sentencia con distintos parámetros, el patrón típico
+    de un N+1).
+    """
+
+    def __init__(self):
+        self.consultas = 0
+        self.tiempo = 0.0
+        #: Alias de las bases de datos consultadas.
+        self.alias = set()
+        self._sentencias = Counter()
+        self._ejecuciones = Counter()
+
+    def __call__(self, execute, sql, params, many, context):
+        inicio = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.tiempo += time.perf_counter() - inicio
+            self.consultas += 1
+            self.alias.add(context['connection'].alias)
+            self._sentencias[sql] += 1
+            self._ejecuciones[(sql, repr(params))] += 1
+
+    @property
+    def duplicadas(self):
+        """
+        Cantidad de consultas que repiten una sentencia ya ejecutada con los mismos parámetros.
+        """
+        return sum(veces - 1 for veces in self._ejecuciones.values())
+
+    @property
+    def similares(self):
+        """
+        Cantidad de consultas que repiten una sentencia ya ejecutada con otros parámetros.
+        """
+        return sum(veces - 1 for veces in self._sentencias.values()) - self.duplicadas
+
+    def mas_repetidas(self, cantidad=3):
+        """
+        Retorna las sentencias que más se repiten.
+
+        :return: Lista de tuplas ``(sql, veces)`` con las sentencias ejecutadas más de una vez.
+        :rtype: list
+        """
+        return [(sql, veces) for sql, veces in self._sentencias.most_common(cantidad) if veces > 1]
+
+
+class MedicionPeticion:
+    """
+    Resultado de medir una petición: consultas, tiempo de base de datos, tiempo de la vista y uso
+    de las conexiones a la base de datos (ver `sistemaApp.conexiones.registrar_uso`).
+    """
+
+    def __init__(self, nombre_url, metodo, ruta):
+        self.nombre_url = nombre_url
+        self.metodo = metodo
+        self.ruta = ruta
+        self.registro = RegistroConsultas()
+        self.tiempo_vista = 0.0
+        self.estado = None
+        self.conexiones = {'nuevas': 0, 'reutilizadas': 0, 'fallidas': 0}
+
+    def como_dict(self):
+        """
+        Retorna la medición como diccionario, en el formato del registro estructurado.
+        """
+        return {
+            'url_name': self.nombre_url,
+            'metodo': self.metodo,
+            'ruta': self.ruta,
+            'estado': self.estado,
+            'consultas': self.registro.consultas,
+            'duplicadas': self.registro.duplicadas,
+            'similares': self.registro.similares,
+            'tiempo_bd_ms': round(self.registro.tiempo * 1000, 3),
+            'tiempo_vista_ms': round(self.tiempo_vista * 1000, 3),
+            'conexiones_nuevas': self.conexiones['nuevas'],
+            'conexiones_reutilizadas': self.conexiones['reutilizadas'],
+            'conexiones_fallidas': self.conexiones['fallidas'],
+        }
+
+
+def excesos_presupuesto(medicion, presupuestos=None):
+    """
+    Compara una medición con el presupuesto de su URL y método (o, si el método no tiene uno
+    propio, con el de su URL).
+
+    :param medicion: Instancia de `MedicionPeticion`.
+    :param presupuestos: Diccionario de presupuestos; por defecto `PRESUPUESTOS`.
+    :return: Lista de textos con los límites excedidos (vacía si cumple o la URL no tiene presupuesto).
+    :rtype: list
+    """
+    presupuestos = presupuestos or PRESUPUESTOS
+    presupuesto = presupuestos.get((medicion.nombre_url, medicion.metodo), presupuestos.get(medicion.nombre_url))
+    if presupuesto is None:
+        return []
+    excesos = []
+    if medicion.registro.consultas > presupuesto['consultas']:
+        excesos.append(
+            f"{medicion.nombre_url} {medicion.metodo}: {medicion.registro.consultas} consultas "
+            f"(presupuesto {presupuesto['consultas']})"
+        )
+    if medicion.registro.duplicadas > presupuesto.get('duplicadas', 0):
+        excesos.append(
+            f"{medicion.nombre_url} {medicion.metodo}: {medicion.registro.duplicadas} consultas duplicadas "
+            f"(presupuesto {presupuesto.get('duplicadas', 0)})"
+        )
+    return excesos
+
+
+@contextmanager
+def registrar_consultas(registro):
+    """
+    Instala `registro` como `execute_wrapper` en todas las conexiones mientras dura el bloque.
+    """
+    with ExitStack() as pila:
+        for conexion in connections.all():
+            pila.enter_context(conexion.execute_wrapper(registro))
+        yield registro
+
+
+class InstrumentacionMiddleware:
+    """
+    Middleware que mide cada petición: cantidad de consultas, tiempo de base de datos, consultas
+    duplicadas y similares, tiempo total de la vista y conexiones a la base de datos nuevas,
+    reutilizadas y fallidas (que además se suman a `sistemaApp.conexiones.estadisticas`).
+
+    - Escribe una línea JSON por petición en el logger ``sistemaApp.instrumentacion`` (nivel INFO,
+      o WARNING si la petición excede su presupuesto en `PRESUPUESTOS`).
+    - Con ``DEBUG = True`` agrega la medición a la respuesta en las cabeceras ``X-Consultas``,
+      ``X-Consultas-Duplicadas``, ``X-Tiempo-BD`` y ``X-Tiempo-Vista`` (en milisegundos) y en
+      ``Server-Timing``.
+    - Deja la medición en ``response.instrumentacion`` para las pruebas.
+
+    Debe ir primero en ``MIDDLEWARE`` para incluir las consultas de la sesión y del usuario.
+    En las respuestas por partes (`StreamingHttpResponse`) también se miden las consultas que
+    se hacen al generar el contenido; el registro se escribe al terminar de enviarlo.
+
+    Funciona también con las vistas asíncronas servidas por ASGI: las conexiones de Django son
+    propias de cada hilo, por lo que el registro se instala en el hilo donde se ejecutan las
+    consultas de la petición (el mismo para todas las llamadas a `sync_to_async` de la petición).
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(self.get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        medicion = MedicionPeticion(None, request.method, request.path)
+        previas = conexiones.conexiones_abiertas()
+        inicio = time.perf_counter()
+        with registrar_consultas(medicion.registro):
+            response = self.get_response(request)
+        medicion.tiempo_vista = time.perf_counter() - inicio
+        medicion.conexiones = conexiones.registrar_uso(previas, medicion.registro.alias)
+        return self._terminar(request, response, medicion)
+
+    async def __acall__(self, request):
+        medicion = MedicionPeticion(None, request.method, request.path)
+        pila = ExitStack()
+
+        def iniciar():
+            pila.enter_context(registrar_consultas(medicion.registro))
+            return conexiones.conexiones_abiertas()
+
+        def terminar(previas):
+            pila.close()
+            return conexiones.registrar_uso(previas, medicion.registro.alias)
+
+        previas = await sync_to_async(iniciar)()
+        inicio = time.perf_counter()
+        try:
+            response = await self.get_response(request)
+        finally:
+            medicion.tiempo_vista = time.perf_counter() - inicio
+            medicion.conexiones = await sync_to_async(terminar)(previas)
+        return self._terminar(request, response, medicion)
+
+    def _terminar(self, request, response, medicion):
+        """
+        Completa la medición con la respuesta, agrega las cabeceras y escribe el registro.
+        """
+        medicion.nombre_url = request.resolver_match.url_name if request.resolver_match else None
+        medicion.estado = response.status_code
+        response.instrumentacion = medicion
+
+        if settings.DEBUG:
+            response['X-Consultas'] = medicion.registro.consultas
+            response['X-Consultas-Duplicadas'] = medicion.registro.duplicadas
+            response['X-Tiempo-BD'] = f"{medicion.registro.tiempo * 1000:.1f}"
+            response['X-Tiempo-Vista'] = f"{medicion.tiempo_vista * 1000:.1f}"
+            response['Server-Timing'] = (
+                f"bd;dur={medicion.registro.tiempo * 1000:.1f}, vista;dur={medicion.tiempo_vista * 1000:.1f}"
+            )
+
+        if response.streaming and not response.is_async:
+            response.streaming_content = self._medir_contenido(response.streaming_content, medicion)
+        else:
+            self._registrar(medicion)
+        return response
+
+    def _medir_contenido(self, contenido, medicion):
+        """
+        Envuelve el contenido de una respuesta por partes para medir también su generación.
+        """
+        inicio = time.perf_counter()
+        try:
+            with registrar_consultas(medicion.registro):
+                yield from contenido
+        finally:
+            medicion.tiempo_vista += time.perf_counter() - inicio
+            self._registrar(medicion)
+
+    def _registrar(self, medicion):
+        """
+        Escribe la medición en el registro estructurado.
+        """
+        datos = medicion.como_dict()
+        excesos = excesos_presupuesto(medicion)
+        if excesos:
+            datos['excesos'] = excesos
+            datos['repetidas'] = medicion.registro.mas_repetidas()
+            logger.warning(json.dumps(datos, ensure_ascii=False), extra={'instrumentacion': datos})
+        else:
+            logger.info(json.dumps(datos, ensure_ascii=False), extra={'instrumentacion': datos})
+
+
+class PresupuestoConsultasMixin:
+    """
+    Mixin para `django.test.TestCase` que verifica el presupuesto de las respuestas medidas por
+    `InstrumentacionMiddleware`.
+    """
+
+    def assertPresupuesto(self, respuesta, presupuestos=None):
+        """
+        Falla si la respuesta excede el presupuesto de su URL.
+
+        :param respuesta: Respuesta del cliente de pruebas (con el contenido ya leído si es por partes).
+        :param presupuestos: Diccionario de presupuestos; por defecto `PRESUPUESTOS`.
+        """
+        medicion = respuesta.instrumentacion
+        excesos = excesos_presupuesto(medicion, presupuestos)
+        if excesos:
+            repetidas = ''.join(f"\n  {veces} x {sql}" for sql, veces in medicion.registro.mas_repetidas())
+            self.fail('; '.join(excesos) + repetidas)
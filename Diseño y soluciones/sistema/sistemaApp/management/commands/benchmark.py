@@ -0,0 +1,110 @@
+import json
+import logging
+import platform
+from pathlib import Path
+import django
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.test import Client
+from django.test.utils import setup_test_environment, teardown_test_environment
+from django.utils import timezone
+from sistemaApp import benchmark
+from django.contrib.auth.models import User
+
+
+class Command(BaseCommand):
+    """
+    Comando que mide el rendimiento de cada vista de `sistema/urls.py` sobre datos sintéticos.
+
+    Uso::
+
+        python manage.py benchmark --settings=sistema.settings_benchmark [--escala pequena|mediana|grande]
+            [--semilla 42] [--repeticiones 20] [--salida benchmark.json] [--base anterior.json]
+
+    Puebla la base local con datos reproducibles (solo si no los tiene ya), recorre las vistas
+    con el cliente de pruebas de Django y guarda en JSON, por vista, los percentiles de latencia,
+    la cantidad de consultas y la memoria máxima. Con ``--base`` compara contra una medición
+    anterior e informa las vistas que empeoraron.
+    """
+
+    help = "Mide latencia, consultas y memoria de cada vista sobre datos sintéticos."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--escala', choices=sorted(benchmark.ESCALAS), default='pequena',
+                            help="Tamaño de los datos sintéticos.")
+        parser.add_argument('--semilla', type=int, default=42, help="Semilla de los datos sintéticos.")
+        parser.add_argument('--repeticiones', type=int, default=20, help="Ejecuciones medidas por vista.")
+        parser.add_argument('--salida', default='benchmark.json', help="Archivo JSON con los resultados.")
+        parser.add_argument('--base', help="Archivo JSON de una medición anterior para comparar.")
+        parser.add_argument('--tolerancia', type=float, default=0.2,
+                            help="Aumento relativo permitido del p50 respecto de la base (0.2 = 20 %%).")
+        parser.add_argument('--fallar', action='store_true',
+                            help="Termina con error si alguna vista empeoró respecto de la base.")
+        parser.add_argument('--recrear', action='store_true', help="Vuelve a poblar la base aunque ya tenga datos.")
+        parser.add_argument('--solo', nargs='+', metavar='NOMBRE_URL', help="Mide solo estas URLs.")
+
+    def handle(self, *args, **options):
+        if not getattr(settings, 'BENCHMARK', False):
+            raise CommandError(
+                "El benchmark puebla la base con datos sintéticos; ejecútelo con --settings=sistema.settings_benchmark."
+            )
+        if options['repeticiones'] < 1:
+            raise CommandError("--repeticiones debe ser mayor a 0.")
+
+        base = None
+        if options['base']:
+            try:
+                base = json.loads(Path(options['base']).read_text(encoding='utf-8'))
+            except (OSError, ValueError) as error:
+                raise CommandError(f"No se pudo leer la base '{options['base']}': {error}")
+
+        escala = benchmark.ESCALAS[options['escala']]
+        benchmark.preparar_base()
+        if options['recrear'] or not benchmark.base_poblada(escala):
+            self.stdout.write(f"Poblando la base (escala {options['escala']}, semilla {options['semilla']})...")
+            usuario = benchmark.poblar(escala, options['semilla'], self.stdout)
+        else:
+            usuario = User.objects.get(username=benchmark.USUARIO_BENCHMARK)
+
+        # La instrumentación por petición se omite en la consola mientras se mide.
+        logging.getLogger('sistemaApp.instrumentacion').setLevel(logging.WARNING)
+        setup_test_environment()
+        try:
+            cliente = Client()
+            cliente.force_login(usuario)
+            peticiones = benchmark.peticiones(benchmark.muestra_de_datos())
+            if options['solo']:
+                peticiones = [peticion for peticion in peticiones if peticion['nombre'] in options['solo']]
+
+            vistas = {}
+            for peticion in peticiones:
+                vistas[peticion['nombre']] = resultado = benchmark.medir(cliente, peticion, options['repeticiones'])
+                self.stdout.write(
+                    f"{peticion['nombre']:<28} {resultado['estado']} "
+                    f"p50 {resultado['p50_ms']:>9.2f} ms  p90 {resultado['p90_ms']:>9.2f} ms  "
+                    f"p99 {resultado['p99_ms']:>9.2f} ms  {resultado['consultas']:>3} consultas  "
+                    f"{resultado['memoria_pico_kb']:>9.1f} KB"
+                )
+        finally:
+            teardown_test_environment()
+
+        Path(options['salida']).write_text(json.dumps({
+            'fecha': timezone.now().isoformat(),
+            'escala': options['escala'],
+            'semilla': options['semilla'],
+            'repeticiones': options['repeticiones'],
+            'motor': settings.DATABASES['default']['ENGINE'],
+            'django': django.get_version(),
+            'python': platform.python_version(),
+            'vistas': vistas,
+        }, indent=2, ensure_ascii=False), encoding='utf-8')
+        self.stdout.write(self.style.SUCCESS(f"Resultados guardados en {options['salida']}."))
+
+        if base is not None:
+            empeoradas = benchmark.comparar(vistas, base.get('vistas', {}), options['tolerancia'])
+            for texto in empeoradas:
+                self.stdout.write(self.style.WARNING(texto))
+            if not empeoradas:
+                self.stdout.write(self.style.SUCCESS("Ninguna vista empeoró respecto de la base."))
+            elif options['fallar']:
+                raise CommandError(f"{len(empeoradas)} mediciones empeoraron respecto de la base.")
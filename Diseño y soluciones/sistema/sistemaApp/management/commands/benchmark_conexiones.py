@@ -0,0 +1,96 @@
+import json
+import logging
+from pathlib import Path
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.test import Client
+from django.test.utils import setup_test_environment, teardown_test_environment
+from django.utils import timezone
+from sistemaApp import benchmark
+
+
+class Command(BaseCommand):
+    """
+    Comando que mide cuánto ahorran las conexiones persistentes a la base de datos en la búsqueda
+    de productos y en el cobro de la caja (ver `sistemaApp.benchmark.medir_conexiones`).
+
+    Uso::
+
+        python manage.py benchmark_conexiones --settings=sistema.settings_benchmark [--latencia 20]
+            [--repeticiones 20] [--escala pequena] [--salida conexiones.json]
+
+    Sobre la base local del benchmark simula una latencia de red de ``--latencia`` milisegundos por
+    viaje de ida y vuelta. Con un MySQL al que ya se le agregó latencia de red (``BENCHMARK_MYSQL_*``
+    y, por ejemplo, ``tc netem`` o un proxy), usar ``--latencia 0``.
+    """
+
+    help = "Compara una conexión por petición con conexiones persistentes bajo latencia de red."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--latencia', type=float, default=20,
+                            help="Latencia simulada por viaje a la base de datos, en milisegundos.")
+        parser.add_argument('--repeticiones', type=int, default=20, help="Ejecuciones medidas por recorrido.")
+        parser.add_argument('--escala', choices=sorted(benchmark.ESCALAS), default='pequena',
+                            help="Tamaño de los datos sintéticos.")
+        parser.add_argument('--semilla', type=int, default=42, help="Semilla de los datos sintéticos.")
+        parser.add_argument('--recrear', action='store_true', help="Vuelve a poblar la base aunque ya tenga datos.")
+        parser.add_argument('--salida', help="Archivo JSON donde guardar los resultados.")
+
+    def handle(self, *args, **options):
+        if not getattr(settings, 'BENCHMARK', False):
+            raise CommandError(
+                "El benchmark puebla la base con datos sintéticos; ejecútelo con --settings=sistema.settings_benchmark."
+            )
+        if options['repeticiones'] < 1:
+            raise CommandError("--repeticiones debe ser mayor a 0.")
+        if options['latencia'] < 0:
+            raise CommandError("--latencia no puede ser negativa.")
+
+        escala = benchmark.ESCALAS[options['escala']]
+        benchmark.preparar_base()
+        if options['recrear'] or not benchmark.base_poblada(escala):
+            self.stdout.write(f"Poblando la base (escala {options['escala']}, semilla {options['semilla']})...")
+            usuario = benchmark.poblar(escala, options['semilla'], self.stdout)
+        else:
+            usuario = User.objects.get(username=benchmark.USUARIO_BENCHMARK)
+
+        logging.getLogger('sistemaApp.instrumentacion').setLevel(logging.WARNING)
+        setup_test_environment()
+        try:
+            cliente = Client()
+            cliente.force_login(usuario)
+            peticiones = benchmark.peticiones(benchmark.muestra_de_datos())
+            resultados = benchmark.medir_conexiones(cliente, peticiones, options['latencia'], options['repeticiones'])
+        finally:
+            teardown_test_environment()
+
+        self.stdout.write(
+            f"Latencia simulada: {options['latencia']:g} ms por viaje "
+            f"({benchmark.VIAJES_CONEXION} viajes por conexión nueva)."
+        )
+        for recorrido in benchmark.RECORRIDOS_CONEXION:
+            for modo in benchmark.MODOS_CONEXION:
+                resultado = resultados[modo][recorrido]
+                self.stdout.write(
+                    f"{recorrido:<10} {modo:<13} {resultado['estado']} p50 {resultado['p50_ms']:>9.2f} ms  "
+                    f"p90 {resultado['p90_ms']:>9.2f} ms  {resultado['consultas']:>5} consultas  "
+                    f"{resultado['conexiones_abiertas']:>3} conexiones abiertas en {resultado['peticiones']} peticiones"
+                )
+            antes = resultados['por_peticion'][recorrido]['p50_ms']
+            ahorro = antes - resultados['persistente'][recorrido]['p50_ms']
+            self.stdout.write(self.style.SUCCESS(
+                f"{recorrido:<10} ahorro p50 con conexiones persistentes: {ahorro:.2f} ms "
+                f"({ahorro / antes * 100 if antes else 0:.0f} %)"
+            ))
+
+        if options['salida']:
+            Path(options['salida']).write_text(json.dumps({
+                'fecha': timezone.now().isoformat(),
+                'escala': options['escala'],
+                'latencia_ms': options['latencia'],
+                'repeticiones': options['repeticiones'],
+                'motor': settings.DATABASES['default']['ENGINE'],
+                'modos': resultados,
+            }, indent=2, ensure_ascii=False), encoding='utf-8')
+            self.stdout.write(self.style.SUCCESS(f"Resultados guardados en {options['salida']}."))
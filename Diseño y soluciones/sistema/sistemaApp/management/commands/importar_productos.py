@@ -0,0 +1,44 @@
+import time
+from django.core.management.base import BaseCommand, CommandError
+from sistemaApp.importacion import ErrorImportacion, TAMANO_LOTE, importar_productos
+
+
+class Command(BaseCommand):
+    """
+    Comando que importa (crea o actualiza) productos desde un archivo CSV o XLSX.
+
+    Uso::
+
+        python manage.py importar_productos catalogo.csv [--lote 2000] [--crear-categorias]
+
+    Ver `sistemaApp.importacion.importar_productos` para el formato del archivo.
+    """
+
+    help = "Importa productos desde un archivo CSV o XLSX."
+
+    def add_arguments(self, parser):
+        parser.add_argument('archivo', help="Ruta del archivo .csv o .xlsx.")
+        parser.add_argument('--lote', type=int, default=TAMANO_LOTE, help="Filas por lote.")
+        parser.add_argument('--crear-categorias', action='store_true',
+                            help="Crea las categorías que no existan en lugar de rechazar las filas.")
+
+    def handle(self, *args, **options):
+        if options['lote'] < 1:
+            raise CommandError("--lote debe ser mayor a 0.")
+        inicio = time.perf_counter()
+        try:
+            with open(options['archivo'], 'rb') as archivo:
+                resultado = importar_productos(
+                    archivo, options['archivo'], options['lote'], options['crear_categorias']
+                )
+        except OSError as error:
+            raise CommandError(f"No se pudo abrir el archivo: {error}")
+        except ErrorImportacion as error:
+            raise CommandError(str(error))
+
+        for numero, mensaje in resultado.errores:
+            self.stdout.write(self.style.WARNING(f"Fila {numero}: {mensaje}"))
+        self.stdout.write(self.style.SUCCESS(
+            f"{resultado.creados} productos creados, {resultado.actualizados} actualizados, "
+            f"{len(resultado.errores)} filas con errores ({time.perf_counter() - inicio:.1f} s)."
+        ))
@@ -0,0 +1,102 @@
+import json
+import logging
+from pathlib import Path
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.test import Client
+from django.test.utils import setup_test_environment, teardown_test_environment
+from django.utils import timezone
+from sistemaApp import benchmark
+
+
+class Command(BaseCommand):
+    """
+    Comando que compara cuántas búsquedas del autocompletado de la caja (``buscar_productos``)
+    atiende por segundo un trabajador WSGI con hilos y un trabajador ASGI, con muchos clientes
+    escribiendo a la vez (ver `sistemaApp.benchmark.medir_carga`).
+
+    Uso::
+
+        python manage.py prueba_carga --settings=sistema.settings_benchmark [--latencia 20]
+            [--concurrencia 32] [--peticiones 400] [--hilos 4] [--salida carga.json]
+
+    Sobre la base local del benchmark simula una latencia de red de ``--latencia`` milisegundos por
+    viaje de ida y vuelta. Con un MySQL al que ya se le agregó latencia de red, usar ``--latencia 0``.
+    """
+
+    help = "Compara el autocompletado de la caja servido por WSGI y por ASGI con muchos clientes simultáneos."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--latencia', type=float, default=20,
+                            help="Latencia simulada por viaje a la base de datos, en milisegundos.")
+        parser.add_argument('--concurrencia', type=int, default=32, help="Clientes simultáneos.")
+        parser.add_argument('--peticiones', type=int, default=400, help="Peticiones medidas por servidor.")
+        parser.add_argument('--hilos', type=int, default=4, help="Hilos del trabajador WSGI.")
+        parser.add_argument('--escala', choices=sorted(benchmark.ESCALAS), default='pequena',
+                            help="Tamaño de los datos sintéticos.")
+        parser.add_argument('--semilla', type=int, default=42, help="Semilla de los datos sintéticos.")
+        parser.add_argument('--recrear', action='store_true', help="Vuelve a poblar la base aunque ya tenga datos.")
+        parser.add_argument('--salida', help="Archivo JSON donde guardar los resultados.")
+
+    def handle(self, *args, **options):
+        if not getattr(settings, 'BENCHMARK', False):
+            raise CommandError(
+                "El benchmark puebla la base con datos sintéticos; ejecútelo con --settings=sistema.settings_benchmark."
+            )
+        for opcion in ('concurrencia', 'peticiones', 'hilos'):
+            if options[opcion] < 1:
+                raise CommandError(f"--{opcion} debe ser mayor a 0.")
+        if options['latencia'] < 0:
+            raise CommandError("--latencia no puede ser negativa.")
+
+        escala = benchmark.ESCALAS[options['escala']]
+        benchmark.preparar_base()
+        if options['recrear'] or not benchmark.base_poblada(escala):
+            self.stdout.write(f"Poblando la base (escala {options['escala']}, semilla {options['semilla']})...")
+            usuario = benchmark.poblar(escala, options['semilla'], self.stdout)
+        else:
+            usuario = User.objects.get(username=benchmark.USUARIO_BENCHMARK)
+
+        logging.getLogger('sistemaApp.instrumentacion').setLevel(logging.WARNING)
+        setup_test_environment()
+        try:
+            cliente = Client()
+            cliente.force_login(usuario)
+            cookie = f"{settings.SESSION_COOKIE_NAME}={cliente.cookies[settings.SESSION_COOKIE_NAME].value}"
+            resultados = benchmark.medir_carga(
+                cookie, options['latencia'], options['concurrencia'], options['peticiones'], options['hilos']
+            )
+        finally:
+            teardown_test_environment()
+
+        self.stdout.write(
+            f"Latencia simulada: {options['latencia']:g} ms por viaje; {options['concurrencia']} clientes "
+            f"simultáneos; trabajador WSGI de {options['hilos']} hilos."
+        )
+        for servidor, resultado in resultados.items():
+            self.stdout.write(
+                f"{servidor:<5} {resultado['peticiones_por_segundo']:>8.1f} peticiones/s  "
+                f"p50 {resultado['p50_ms']:>9.2f} ms  p95 {resultado['p95_ms']:>9.2f} ms  "
+                f"{resultado['errores']} errores en {resultado['peticiones']} peticiones"
+            )
+        wsgi, asgi = resultados['wsgi'], resultados['asgi']
+        if wsgi['peticiones_por_segundo']:
+            self.stdout.write(self.style.SUCCESS(
+                f"ASGI atiende {asgi['peticiones_por_segundo'] / wsgi['peticiones_por_segundo']:.1f} veces "
+                f"las búsquedas por segundo del trabajador WSGI."
+            ))
+        if wsgi['errores'] or asgi['errores']:
+            self.stderr.write(self.style.ERROR("Hubo respuestas con error; revise el registro del servidor."))
+
+        if options['salida']:
+            Path(options['salida']).write_text(json.dumps({
+                'fecha': timezone.now().isoformat(),
+                'escala': options['escala'],
+                'latencia_ms': options['latencia'],
+                'concurrencia': options['concurrencia'],
+                'hilos': options['hilos'],
+                'motor': settings.DATABASES['default']['ENGINE'],
+                'servidores': resultados,
+            }, indent=2, ensure_ascii=False), encoding='utf-8')
+            self.stdout.write(self.style.SUCCESS(f"Resultados guardados en {options['salida']}."))
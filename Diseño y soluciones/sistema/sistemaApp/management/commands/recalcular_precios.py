@@ -0,0 +1,49 @@
+from django.core.management.base import BaseCommand, CommandError
+from sistemaApp.models import Categoria
+from sistemaApp.precios import recalcular_precios
+
+
+class Command(BaseCommand):
+    """
+    Comando que recalcula el precio de venta de los productos según las reglas de precio
+    (ver `ReglaPrecio` y `sistemaApp.precios.recalcular_precios`).
+
+    Uso::
+
+        python manage.py recalcular_precios [--simular] [--categoria ID] [--mostrar 50]
+
+    Con ``--simular`` no modifica nada y muestra los precios que cambiarían.
+    """
+
+    help = "Recalcula el precio de venta de los productos según las reglas de precio."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--simular', '--dry-run', action='store_true',
+            help="Muestra los cambios sin guardarlos.",
+        )
+        parser.add_argument('--categoria', type=int, help="Recalcula solo los productos de esta categoría.")
+        parser.add_argument(
+            '--mostrar', type=int, default=50,
+            help="Cantidad máxima de cambios a mostrar con --simular (0 para mostrar todos).",
+        )
+
+    def handle(self, *args, **options):
+        categoria_id = options['categoria']
+        if categoria_id is not None and not Categoria.objects.filter(categoria_id=categoria_id).exists():
+            raise CommandError(f"La categoría {categoria_id} no existe.")
+
+        resultado = recalcular_precios(simular=options['simular'], categoria_id=categoria_id)
+
+        if not options['simular']:
+            self.stdout.write(self.style.SUCCESS(f"{resultado.modificados} precios de venta actualizados."))
+            return
+
+        mostrar = options['mostrar'] or len(resultado.cambios)
+        for codigo, nombre, actual, nuevo in resultado.cambios[:mostrar]:
+            self.stdout.write(f"{codigo} {nombre}: {actual} -> {nuevo} ({nuevo - actual:+d})")
+        if len(resultado.cambios) > mostrar:
+            self.stdout.write(f"... y {len(resultado.cambios) - mostrar} cambios más.")
+        self.stdout.write(self.style.WARNING(
+            f"{resultado.modificados} precios de venta cambiarían (simulación, no se guardó nada)."
+        ))
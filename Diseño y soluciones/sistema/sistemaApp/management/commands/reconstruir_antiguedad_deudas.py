@@ -0,0 +1,30 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from sistemaApp.cobranza import calcular_deuda_pendiente
+from sistemaApp.models import DeudaPendiente
+
+
+class Command(BaseCommand):
+    """
+    Comando que recalcula la deuda pendiente por día de los clientes (`DeudaPendiente`), con la
+    que se arma el reporte de antigüedad de deudas.
+
+    Uso::
+
+        python manage.py reconstruir_antiguedad_deudas
+
+    La deuda actual de cada cliente se reparte entre sus ventas a crédito y cargos más recientes
+    (los abonos pagan primero la deuda más antigua); lo que no alcanzan a cubrir queda sin fecha.
+    Las ventas y los cargos se agrupan en la base de datos por cliente y día.
+    """
+
+    help = "Recalcula la deuda pendiente por día de los clientes."
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            eliminadas, _ = DeudaPendiente.objects.all().delete()
+            creadas = DeudaPendiente.objects.bulk_create(calcular_deuda_pendiente(), batch_size=1000)
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Deuda pendiente reconstruida: {len(creadas)} filas creadas, {eliminadas} eliminadas."
+        ))
@@ -0,0 +1,63 @@
+from datetime import datetime
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.db.models import Count, Sum
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+from sistemaApp.models import Venta, ResumenVentaDiario
+
+
+class Command(BaseCommand):
+    """
+    Comando que recalcula el resumen diario de ventas (`ResumenVentaDiario`) a partir de la tabla `venta`.
+
+    Uso::
+
+        python manage.py reconstruir_resumen_ventas [--desde AAAA-MM-DD] [--hasta AAAA-MM-DD]
+
+    Sin fechas reconstruye el resumen completo. Las ventas se agrupan en la base de datos por
+    día, método de pago y vendedor, por lo que solo se traen las filas del resumen.
+    """
+
+    help = "Recalcula el resumen diario de ventas a partir de la tabla venta."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--desde', help="Fecha inicial (AAAA-MM-DD), inclusive.")
+        parser.add_argument('--hasta', help="Fecha final (AAAA-MM-DD), inclusive.")
+
+    def handle(self, *args, **options):
+        try:
+            desde = datetime.strptime(options['desde'], '%Y-%m-%d').date() if options['desde'] else None
+            hasta = datetime.strptime(options['hasta'], '%Y-%m-%d').date() if options['hasta'] else None
+        except ValueError:
+            raise CommandError("Las fechas deben tener el formato AAAA-MM-DD.")
+
+        # Agrupa las ventas por día (en la zona horaria del sistema), método de pago y vendedor
+        ventas = Venta.objects.annotate(dia=TruncDate('fecha', tzinfo=timezone.get_current_timezone()))
+        resumen = ResumenVentaDiario.objects.all()
+        if desde:
+            ventas = ventas.filter(dia__gte=desde)
+            resumen = resumen.filter(fecha__gte=desde)
+        if hasta:
+            ventas = ventas.filter(dia__lte=hasta)
+            resumen = resumen.filter(fecha__lte=hasta)
+        grupos = ventas.values('dia', 'metodo_pago', 'vendedor_id').annotate(
+            cantidad=Count('id_venta'), suma=Sum('total')
+        ).order_by()
+
+        with transaction.atomic():
+            eliminadas, _ = resumen.delete()
+            creadas = ResumenVentaDiario.objects.bulk_create([
+                ResumenVentaDiario(
+                    fecha=grupo['dia'],
+                    metodo_pago=grupo['metodo_pago'],
+                    clave_vendedor=grupo['vendedor_id'] or 0,
+                    cantidad_ventas=grupo['cantidad'],
+                    total=grupo['suma'] or 0,
+                )
+                for grupo in grupos.iterator()
+            ], batch_size=1000)
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Resumen reconstruido: {len(creadas)} filas creadas, {eliminadas} eliminadas."
+        ))
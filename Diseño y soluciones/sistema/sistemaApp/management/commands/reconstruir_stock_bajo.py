@@ -0,0 +1,34 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import F
+from sistemaApp.models import Producto, StockBajo
+
+
+class Command(BaseCommand):
+    """
+    Comando que recalcula la lista de productos con stock bajo (`StockBajo`) desde la tabla
+    `producto`.
+
+    Uso::
+
+        python manage.py reconstruir_stock_bajo
+
+    Agrega los productos que faltan en la lista (por ejemplo, por cambios de stock hechos fuera
+    de la aplicación) y quita los que ya no tienen stock bajo, conservando la fecha `desde` de
+    los demás.
+    """
+
+    help = "Recalcula la lista de productos con stock bajo."
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            reales = set(
+                Producto.objects.filter(stock_actual__lte=F('stock_minimo')).values_list('codigo_producto', flat=True)
+            )
+            guardados = set(StockBajo.objects.values_list('producto_id', flat=True))
+            StockBajo.actualizar(bajos=sorted(reales - guardados), normales=sorted(guardados - reales))
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Lista de stock bajo reconstruida: {len(reales)} productos "
+            f"({len(reales - guardados)} agregados, {len(guardados - reales)} quitados)."
+        ))
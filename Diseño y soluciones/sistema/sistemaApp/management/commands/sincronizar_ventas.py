@@ -0,0 +1,69 @@
+import time
+from django.core.management.base import BaseCommand, CommandError
+from sistemaApp import diario_ventas
+
+
+class Command(BaseCommand):
+    """
+    Comando que registra en la base de datos las ventas guardadas en el diario local de la caja
+    (ver `sistemaApp.diario_ventas.sincronizar`).
+
+    Uso::
+
+        python manage.py sincronizar_ventas [--continuo] [--intervalo 5] [--reintentar] [--estado]
+
+    Con ``--continuo`` queda en ejecución y sincroniza cada ``--intervalo`` segundos, para
+    correrlo como servicio junto a la aplicación.
+    """
+
+    help = "Registra en la base de datos las ventas pendientes del diario local."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--continuo', action='store_true', help="Sincroniza periódicamente hasta que se detenga.")
+        parser.add_argument('--intervalo', type=float, default=5, help="Segundos entre sincronizaciones con --continuo.")
+        parser.add_argument('--limite', type=int, help="Cantidad máxima de ventas a registrar.")
+        parser.add_argument('--reintentar', action='store_true', help="Vuelve a intentar las ventas rechazadas.")
+        parser.add_argument('--estado', action='store_true', help="Muestra el estado del diario sin sincronizar.")
+
+    def handle(self, *args, **options):
+        diario = diario_ventas.obtener_diario()
+
+        if options['estado']:
+            conteo = diario.contar()
+            for estado in (diario_ventas.PENDIENTE, diario_ventas.SINCRONIZADA, diario_ventas.RECHAZADA):
+                self.stdout.write(f"{estado}: {conteo.get(estado, 0)}")
+            for id_, clave, creada, detalle in diario.rechazadas():
+                self.stdout.write(self.style.WARNING(f"Rechazada {clave} ({creada}): {detalle}"))
+            return
+
+        if options['reintentar']:
+            self.stdout.write(f"{diario.reintentar_rechazadas()} ventas rechazadas vuelven a quedar pendientes.")
+
+        while True:
+            resultado = diario_ventas.sincronizar(limite=options['limite'])
+            self.informar(resultado)
+            if not options['continuo']:
+                if resultado.error is not None:
+                    raise CommandError(f"La base de datos no responde: {resultado.error}")
+                return
+            try:
+                time.sleep(options['intervalo'])
+            except KeyboardInterrupt:
+                return
+
+    def informar(self, resultado):
+        for clave, id_venta, conflictos in resultado.conflictos:
+            detalle = ", ".join(
+                f"'{nombre}' (disponible: {disponible}, vendido: {solicitado})"
+                for _, nombre, disponible, solicitado in conflictos
+            )
+            self.stdout.write(self.style.WARNING(f"Venta {id_venta} ({clave}) dejó stock negativo: {detalle}"))
+        for clave, motivo in resultado.rechazadas:
+            self.stdout.write(self.style.ERROR(f"Venta {clave} rechazada: {motivo}"))
+        if resultado.error is not None:
+            self.stdout.write(self.style.ERROR(f"Sincronización detenida, la base de datos no responde: {resultado.error}"))
+        if resultado.sincronizadas or resultado.repetidas or resultado.rechazadas:
+            self.stdout.write(self.style.SUCCESS(
+                f"{resultado.sincronizadas} ventas registradas, {resultado.repetidas} ya estaban registradas, "
+                f"{len(resultado.conflictos)} con conflictos de stock, {len(resultado.rechazadas)} rechazadas."
+            ))
@@ -0,0 +1,57 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import F, Sum
+from django.db.models.functions import Coalesce
+from sistemaApp.models import Cliente, MovimientoDeuda
+
+
+class Command(BaseCommand):
+    """
+    Comando que suma el libro de deudas (`MovimientoDeuda`) de cada cliente y lo compara con la
+    deuda guardada en `Cliente.deuda`.
+
+    Uso::
+
+        python manage.py verificar_deudas [--corregir]
+
+    Informa los clientes con diferencias. Con ``--corregir`` registra un ajuste por la diferencia
+    de cada uno, para que el libro cuadre con la deuda guardada.
+    """
+
+    help = "Compara la deuda de los clientes con su libro de deudas y reporta las diferencias."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--corregir', action='store_true',
+            help="Registra un ajuste en el libro de deudas por cada diferencia.",
+        )
+
+    def handle(self, *args, **options):
+        # Clientes cuya deuda no coincide con el saldo de su libro, en una sola consulta agrupada
+        diferencias = {
+            id_cliente: (deuda, saldo)
+            for id_cliente, deuda, saldo in Cliente.objects.annotate(
+                saldo=Coalesce(Sum('movimientos__monto'), 0),
+                deuda_actual=Coalesce('deuda', 0),
+            ).exclude(saldo=F('deuda_actual')).order_by('id_cliente').values_list('id_cliente', 'deuda_actual', 'saldo')
+        }
+        for id_cliente, (deuda, saldo) in diferencias.items():
+            self.stdout.write(self.style.WARNING(f"Cliente {id_cliente}: deuda {deuda}, libro {saldo}"))
+
+        if not diferencias:
+            self.stdout.write(self.style.SUCCESS("Las deudas de los clientes cuadran con el libro de deudas."))
+            return
+
+        if options['corregir']:
+            with transaction.atomic():
+                MovimientoDeuda.objects.bulk_create([
+                    MovimientoDeuda(
+                        cliente_id=id_cliente, tipo=MovimientoDeuda.AJUSTE, monto=deuda - saldo, saldo=deuda,
+                    )
+                    for id_cliente, (deuda, saldo) in diferencias.items()
+                ])
+            self.stdout.write(self.style.SUCCESS(f"Libro de deudas corregido ({len(diferencias)} clientes con diferencias)."))
+        else:
+            self.stdout.write(self.style.ERROR(
+                f"{len(diferencias)} clientes con diferencias. Use --corregir para registrar los ajustes."
+            ))
@@ -0,0 +1,75 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Count, F, Sum
+from sistemaApp import fragmentos
+from sistemaApp.models import Producto, ValorizacionInventario
+
+
+class Command(BaseCommand):
+    """
+    Comando que recalcula la valorización del inventario desde la tabla `producto` y la compara
+    con la guardada en `ValorizacionInventario`.
+
+    Uso::
+
+        python manage.py verificar_valorizacion [--corregir]
+
+    Informa las categorías con diferencias. Con ``--corregir`` reemplaza la valorización
+    guardada por la recalculada.
+    """
+
+    help = "Recalcula la valorización del inventario y reporta las diferencias."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--corregir', action='store_true',
+            help="Reemplaza la valorización guardada por la recalculada.",
+        )
+
+    def handle(self, *args, **options):
+        # Valorización real, agrupada por categoría en la base de datos
+        calculada = {
+            fila['categoria_id'] or 0: (fila['cantidad'], fila['unidades'] or 0, fila['valor'] or 0)
+            for fila in Producto.objects.values('categoria_id').annotate(
+                cantidad=Count('codigo_producto'),
+                unidades=Sum('stock_actual'),
+                valor=Sum(F('precio_costo') * F('stock_actual')),
+            ).order_by()
+        }
+        guardada = {
+            fila.clave_categoria: (fila.cantidad_productos, fila.unidades, fila.valor_costo)
+            for fila in ValorizacionInventario.objects.all()
+        }
+
+        diferencias = 0
+        for clave in sorted(set(calculada) | set(guardada)):
+            real = calculada.get(clave, (0, 0, 0))
+            registrada = guardada.get(clave, (0, 0, 0))
+            if real != registrada:
+                diferencias += 1
+                self.stdout.write(self.style.WARNING(
+                    f"Categoría {clave or 'sin categoría'}: "
+                    f"productos {registrada[0]} -> {real[0]}, "
+                    f"unidades {registrada[1]} -> {real[1]}, "
+                    f"valor {registrada[2]} -> {real[2]}"
+                ))
+
+        if not diferencias:
+            self.stdout.write(self.style.SUCCESS("La valorización del inventario no tiene diferencias."))
+            return
+
+        if options['corregir']:
+            with transaction.atomic():
+                ValorizacionInventario.objects.all().delete()
+                ValorizacionInventario.objects.bulk_create([
+                    ValorizacionInventario(
+                        clave_categoria=clave, cantidad_productos=cantidad, unidades=unidades, valor_costo=valor
+                    )
+                    for clave, (cantidad, unidades, valor) in calculada.items()
+                ])
+                fragmentos.incrementar(fragmentos.STOCK)
+            self.stdout.write(self.style.SUCCESS(f"Valorización corregida ({diferencias} categorías con diferencias)."))
+        else:
+            self.stdout.write(self.style.ERROR(
+                f"{diferencias} categorías con diferencias. Use --corregir para actualizar la valorización."
+            ))
@@ -0,0 +1,27 @@
+# Generated by Django 5.1.1 on 2026-10-18 08:58
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('sistemaApp', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DetalleVenta',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('cantidad', models.IntegerField()),
+                ('precio_venta', models.IntegerField()),
+                ('producto', models.ForeignKey(db_column='codigo_producto', db_constraint=False, on_delete=django.db.models.deletion.DO_NOTHING, to='sistemaApp.producto')),
+                ('venta', models.ForeignKey(db_column='id_venta', on_delete=django.db.models.deletion.CASCADE, related_name='detalles', to='sistemaApp.venta')),
+            ],
+            options={
+                'db_table': 'detalle_venta',
+            },
+        ),
+    ]
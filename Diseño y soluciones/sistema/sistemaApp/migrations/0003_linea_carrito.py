@@ -0,0 +1,29 @@
+# Generated by Django 5.1.1 on 2026-10-18 08:59
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('sistemaApp', '0002_detalle_venta'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='LineaCarrito',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('clave', models.CharField(max_length=40)),
+                ('codigo', models.IntegerField()),
+                ('nombre', models.CharField(max_length=100)),
+                ('precio_venta', models.IntegerField()),
+                ('stock_actual', models.IntegerField()),
+                ('cantidad', models.IntegerField()),
+            ],
+            options={
+                'db_table': 'carrito_linea',
+                'unique_together': {('clave', 'codigo')},
+            },
+        ),
+    ]
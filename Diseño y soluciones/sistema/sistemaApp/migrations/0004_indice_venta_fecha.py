@@ -0,0 +1,29 @@
+from django.db import migrations, models
+
+
+#: Índice para la paginación por cursor del historial de ventas, ordenado por (fecha, id_venta).
+INDICE_VENTA_FECHA = models.Index(fields=['fecha', 'id_venta'], name='venta_fecha_id_idx')
+
+
+def crear_indice(apps, schema_editor):
+    # La tabla `venta` no es gestionada por Django (managed = False), por lo que el índice
+    # se crea directamente con el editor de esquema en lugar de una operación AddIndex.
+    # Si la tabla no existe (por ejemplo, en una base vacía) no hay nada que indexar.
+    if 'venta' in schema_editor.connection.introspection.table_names():
+        schema_editor.add_index(apps.get_model('sistemaApp', 'Venta'), INDICE_VENTA_FECHA)
+
+
+def eliminar_indice(apps, schema_editor):
+    if 'venta' in schema_editor.connection.introspection.table_names():
+        schema_editor.remove_index(apps.get_model('sistemaApp', 'Venta'), INDICE_VENTA_FECHA)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('sistemaApp', '0003_linea_carrito'),
+    ]
+
+    operations = [
+        migrations.RunPython(crear_indice, eliminar_indice),
+    ]
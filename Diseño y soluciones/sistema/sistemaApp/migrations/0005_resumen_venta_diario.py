@@ -0,0 +1,31 @@
+# Generated by Django 5.1.1 on 2026-10-18 09:05
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('sistemaApp', '0004_indice_venta_fecha'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ResumenVentaDiario',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('fecha', models.DateField()),
+                ('metodo_pago', models.CharField(max_length=13)),
+                ('cantidad_ventas', models.IntegerField(default=0)),
+                ('total', models.BigIntegerField(default=0)),
+                ('vendedor', models.ForeignKey(blank=True, db_constraint=False, null=True, on_delete=django.db.models.deletion.DO_NOTHING, to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'db_table': 'resumen_venta_diario',
+                'unique_together': {('fecha', 'metodo_pago', 'vendedor')},
+            },
+        ),
+    ]
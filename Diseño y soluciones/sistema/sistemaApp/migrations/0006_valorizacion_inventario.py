@@ -0,0 +1,47 @@
+# Generated by Django 5.1.1 on 2026-10-18 09:08
+
+from django.db import migrations, models
+
+
+def calcular_valorizacion(apps, schema_editor):
+    # La tabla `producto` no es gestionada por Django y su estado en las migraciones no incluye
+    # la categoría, por lo que la valorización inicial se calcula con una consulta directa.
+    # Si la tabla no existe (por ejemplo, en una base vacía) no hay nada que valorizar.
+    conexion = schema_editor.connection
+    if 'producto' not in conexion.introspection.table_names():
+        return
+    with conexion.cursor() as cursor:
+        cursor.execute(
+            "SELECT COALESCE(categoria_id, 0), COUNT(*), COALESCE(SUM(stock_actual), 0), "
+            "COALESCE(SUM(precio_costo * stock_actual), 0) FROM producto GROUP BY COALESCE(categoria_id, 0)"
+        )
+        filas = cursor.fetchall()
+    ValorizacionInventario = apps.get_model('sistemaApp', 'ValorizacionInventario')
+    ValorizacionInventario.objects.bulk_create([
+        ValorizacionInventario(clave_categoria=clave, cantidad_productos=cantidad, unidades=unidades, valor_costo=valor)
+        for clave, cantidad, unidades, valor in filas
+    ])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('sistemaApp', '0005_resumen_venta_diario'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ValorizacionInventario',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('clave_categoria', models.IntegerField(unique=True)),
+                ('cantidad_productos', models.IntegerField(default=0)),
+                ('unidades', models.BigIntegerField(default=0)),
+                ('valor_costo', models.BigIntegerField(default=0)),
+            ],
+            options={
+                'db_table': 'valorizacion_inventario',
+            },
+        ),
+        migrations.RunPython(calcular_valorizacion, migrations.RunPython.noop),
+    ]
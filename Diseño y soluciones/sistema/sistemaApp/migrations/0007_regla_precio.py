@@ -0,0 +1,27 @@
+# Generated by Django 5.1.1 on 2026-10-18 10:02
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('sistemaApp', '0006_valorizacion_inventario'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ReglaPrecio',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('tipo', models.CharField(choices=[('global', 'Global'), ('categoria', 'Categoría'), ('producto', 'Producto')], max_length=9)),
+                ('clave', models.IntegerField(default=0)),
+                ('margen', models.DecimalField(blank=True, decimal_places=2, max_digits=5, null=True)),
+                ('iva', models.DecimalField(blank=True, decimal_places=2, max_digits=5, null=True)),
+            ],
+            options={
+                'db_table': 'regla_precio',
+                'unique_together': {('tipo', 'clave')},
+            },
+        ),
+    ]
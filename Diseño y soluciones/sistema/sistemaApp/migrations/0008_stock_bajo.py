@@ -0,0 +1,39 @@
+# Generated by Django 5.1.1 on 2026-10-18 11:15
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.db import migrations, models
+
+
+def calcular_stock_bajo(apps, schema_editor):
+    # Carga la lista inicial con una consulta directa sobre la tabla `producto` (no gestionada
+    # por Django). Si la tabla no existe (por ejemplo, en una base vacía) no hay nada que cargar.
+    conexion = schema_editor.connection
+    if 'producto' not in conexion.introspection.table_names():
+        return
+    with conexion.cursor() as cursor:
+        cursor.execute("SELECT codigo_producto FROM producto WHERE stock_actual <= stock_minimo")
+        codigos = [codigo for codigo, in cursor.fetchall()]
+    StockBajo = apps.get_model('sistemaApp', 'StockBajo')
+    StockBajo.objects.bulk_create([StockBajo(producto_id=codigo) for codigo in codigos], batch_size=2000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('sistemaApp', '0007_regla_precio'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='StockBajo',
+            fields=[
+                ('producto', models.OneToOneField(db_constraint=False, on_delete=django.db.models.deletion.DO_NOTHING, primary_key=True, related_name='stock_bajo', serialize=False, to='sistemaApp.producto')),
+                ('desde', models.DateTimeField(default=django.utils.timezone.now)),
+            ],
+            options={
+                'db_table': 'stock_bajo',
+            },
+        ),
+        migrations.RunPython(calcular_stock_bajo, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,28 @@
+# Generated by Django 5.1.1 on 2026-10-18 12:40
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('sistemaApp', '0008_stock_bajo'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ClaveVenta',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('clave', models.UUIDField(unique=True)),
+                ('registrada', models.DateTimeField(default=django.utils.timezone.now)),
+                ('conflictos', models.JSONField(blank=True, default=list)),
+                ('venta', models.ForeignKey(db_constraint=False, on_delete=django.db.models.deletion.DO_NOTHING, related_name='+', to='sistemaApp.venta')),
+            ],
+            options={
+                'db_table': 'venta_clave',
+            },
+        ),
+    ]
@@ -0,0 +1,51 @@
+# Generated by Django 5.1.1 on 2026-10-18 13:10
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.conf import settings
+from django.db import migrations, models
+from django.utils import timezone
+
+
+def registrar_deudas_iniciales(apps, schema_editor):
+    # Cada cliente con deuda recibe un ajuste por su deuda actual, para que el libro de deudas
+    # comience con el mismo saldo. La tabla `cliente` no es gestionada por Django; si no existe
+    # (por ejemplo, en una base vacía) no hay deudas que registrar.
+    conexion = schema_editor.connection
+    if 'cliente' not in conexion.introspection.table_names():
+        return
+    with conexion.cursor() as cursor:
+        cursor.execute(
+            "INSERT INTO movimiento_deuda (cliente_id, tipo, monto, saldo, fecha) "
+            "SELECT id_cliente, 'ajuste', deuda, deuda, %s FROM cliente WHERE deuda IS NOT NULL AND deuda <> 0",
+            [timezone.now()],
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('sistemaApp', '0009_venta_clave'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='MovimientoDeuda',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('tipo', models.CharField(choices=[('cargo', 'Cargo'), ('abono', 'Abono'), ('ajuste', 'Ajuste')], max_length=6)),
+                ('monto', models.IntegerField()),
+                ('saldo', models.IntegerField()),
+                ('fecha', models.DateTimeField(default=django.utils.timezone.now)),
+                ('cliente', models.ForeignKey(db_constraint=False, on_delete=django.db.models.deletion.DO_NOTHING, related_name='movimientos', to='sistemaApp.cliente')),
+                ('usuario', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to=settings.AUTH_USER_MODEL)),
+                ('venta', models.ForeignKey(blank=True, db_constraint=False, null=True, on_delete=django.db.models.deletion.DO_NOTHING, related_name='movimientos_deuda', to='sistemaApp.venta')),
+            ],
+            options={
+                'db_table': 'movimiento_deuda',
+                'indexes': [models.Index(fields=['cliente', 'fecha'], name='movimiento_deuda_cliente')],
+            },
+        ),
+        migrations.RunPython(registrar_deudas_iniciales, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,66 @@
+# Generated by Django 5.1.1 on 2026-10-18 14:02
+
+from datetime import timezone as dt_timezone
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+from django.utils import timezone
+
+
+def registrar_deuda_pendiente(apps, schema_editor):
+    # La deuda actual de cada cliente se reparte entre sus ventas a crédito más recientes (los
+    # abonos pagan primero las más antiguas); lo que las ventas no alcanzan a cubrir queda sin
+    # fecha. Las tablas `cliente` y `venta` no son gestionadas por Django, por lo que se leen con
+    # SQL; si no existen (por ejemplo, en una base vacía) no hay deudas que registrar.
+    from sistemaApp.cobranza import repartir_deuda
+
+    conexion = schema_editor.connection
+    if not {'cliente', 'venta'} <= set(conexion.introspection.table_names()):
+        return
+    DeudaPendiente = apps.get_model('sistemaApp', 'DeudaPendiente')
+    with conexion.cursor() as cursor:
+        cursor.execute("SELECT id_cliente, deuda FROM cliente WHERE deuda > 0")
+        deudas = dict(cursor.fetchall())
+        cursor.execute(
+            "SELECT v.id_cliente, v.fecha, v.total FROM venta v JOIN cliente c ON c.id_cliente = v.id_cliente "
+            "WHERE v.metodo_pago = 'Deuda' AND c.deuda > 0 ORDER BY v.id_cliente, v.fecha DESC"
+        )
+        ventas = {}
+        for id_cliente, fecha, total in cursor.fetchall():
+            # Con USE_TZ las fechas se guardan en UTC; el día se cuenta en la zona horaria del sistema.
+            dia = timezone.localdate(fecha.replace(tzinfo=dt_timezone.utc)) if settings.USE_TZ else fecha.date()
+            cargos = ventas.setdefault(id_cliente, [])
+            if cargos and cargos[-1][0] == dia:
+                cargos[-1] = (dia, cargos[-1][1] + total)
+            else:
+                cargos.append((dia, total))
+    DeudaPendiente.objects.bulk_create([
+        DeudaPendiente(cliente_id=id_cliente, fecha=fecha, monto=pendiente)
+        for id_cliente, deuda in deudas.items()
+        for fecha, pendiente in repartir_deuda(deuda, ventas.get(id_cliente, []))
+    ], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('sistemaApp', '0010_movimiento_deuda'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DeudaPendiente',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('fecha', models.DateField(blank=True, null=True)),
+                ('monto', models.IntegerField(default=0)),
+                ('cliente', models.ForeignKey(db_constraint=False, on_delete=django.db.models.deletion.DO_NOTHING, related_name='deuda_pendiente', to='sistemaApp.cliente')),
+            ],
+            options={
+                'db_table': 'deuda_pendiente',
+                'unique_together': {('cliente', 'fecha')},
+            },
+        ),
+        migrations.RunPython(registrar_deuda_pendiente, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,36 @@
+from django.db import migrations, models
+
+
+#: Índices para buscar clientes por el inicio del nombre, del apellido o del teléfono, y para
+#: recorrer el directorio de clientes por cursor, ordenado por (apellido, nombre, id_cliente).
+INDICES_CLIENTE = [
+    models.Index(fields=['apellido', 'nombre', 'id_cliente'], name='cliente_apellido_idx'),
+    models.Index(fields=['nombre'], name='cliente_nombre_idx'),
+    models.Index(fields=['telefono'], name='cliente_telefono_idx'),
+]
+
+
+def crear_indices(apps, schema_editor):
+    # La tabla `cliente` no es gestionada por Django (managed = False), por lo que los índices
+    # se crean directamente con el editor de esquema en lugar de operaciones AddIndex.
+    # Si la tabla no existe (por ejemplo, en una base vacía) no hay nada que indexar.
+    if 'cliente' in schema_editor.connection.introspection.table_names():
+        for indice in INDICES_CLIENTE:
+            schema_editor.add_index(apps.get_model('sistemaApp', 'Cliente'), indice)
+
+
+def eliminar_indices(apps, schema_editor):
+    if 'cliente' in schema_editor.connection.introspection.table_names():
+        for indice in INDICES_CLIENTE:
+            schema_editor.remove_index(apps.get_model('sistemaApp', 'Cliente'), indice)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('sistemaApp', '0011_deuda_pendiente'),
+    ]
+
+    operations = [
+        migrations.RunPython(crear_indices, eliminar_indices),
+    ]
@@ -0,0 +1,38 @@
+from django.db import migrations
+
+
+#: Índice para listar los productos de una categoría ordenados por nombre (ver la vista
+#: `productos_asociados`), sin ordenar todos los productos de la categoría en cada página.
+NOMBRE_INDICE = 'producto_categoria_nombre_idx'
+COLUMNAS_INDICE = ['categoria_id', 'nombre_producto', 'codigo_producto']
+
+
+def crear_indice(apps, schema_editor):
+    # La tabla `producto` no es gestionada por Django (managed = False) y su modelo histórico no
+    # incluye la categoría, por lo que el índice se crea con SQL a partir de los nombres de las
+    # columnas. Si la tabla no existe (por ejemplo, en una base vacía) no hay nada que indexar.
+    if 'producto' in schema_editor.connection.introspection.table_names():
+        schema_editor.execute('CREATE INDEX %s ON %s (%s)' % (
+            schema_editor.quote_name(NOMBRE_INDICE),
+            schema_editor.quote_name('producto'),
+            ', '.join(schema_editor.quote_name(columna) for columna in COLUMNAS_INDICE),
+        ))
+
+
+def eliminar_indice(apps, schema_editor):
+    if 'producto' in schema_editor.connection.introspection.table_names():
+        schema_editor.execute(schema_editor.sql_delete_index % {
+            'name': schema_editor.quote_name(NOMBRE_INDICE),
+            'table': schema_editor.quote_name('producto'),
+        })
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('sistemaApp', '0012_indices_cliente'),
+    ]
+
+    operations = [
+        migrations.RunPython(crear_indice, eliminar_indice),
+    ]
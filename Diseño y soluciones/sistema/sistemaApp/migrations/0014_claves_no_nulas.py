@@ -0,0 +1,80 @@
+import datetime
+
+from django.db import migrations, models
+from django.db.models import Count, F, Sum
+from django.db.models.functions import Coalesce
+
+
+#: Valor de `DeudaPendiente.SIN_FECHA` al crear esta migración.
+SIN_FECHA = datetime.date(1900, 1, 1)
+
+
+def unir_repetidas(modelo, claves, sumas):
+    # Las columnas nulas no cuentan en una restricción única, por lo que pudo haber varias filas
+    # con la misma clave; se suman en la primera y se eliminan las demás.
+    repetidas = modelo.objects.values(*claves).annotate(filas=Count('id')).filter(filas__gt=1).order_by()
+    for grupo in list(repetidas):
+        filas = modelo.objects.filter(**{clave: grupo[clave] for clave in claves})
+        totales = filas.aggregate(**{f'suma_{campo}': Sum(campo) for campo in sumas})
+        primera = filas.order_by('id').values_list('id', flat=True).first()
+        filas.exclude(id=primera).delete()
+        modelo.objects.filter(id=primera).update(**{campo: totales[f'suma_{campo}'] for campo in sumas})
+
+
+def completar_claves(apps, schema_editor):
+    ResumenVentaDiario = apps.get_model('sistemaApp', 'ResumenVentaDiario')
+    ResumenVentaDiario.objects.update(clave_vendedor=Coalesce(F('vendedor_id'), 0))
+    unir_repetidas(ResumenVentaDiario, ['fecha', 'metodo_pago', 'clave_vendedor'], ['cantidad_ventas', 'total'])
+
+    DeudaPendiente = apps.get_model('sistemaApp', 'DeudaPendiente')
+    DeudaPendiente.objects.filter(fecha__isnull=True).update(fecha=SIN_FECHA)
+    unir_repetidas(DeudaPendiente, ['cliente_id', 'fecha'], ['monto'])
+
+
+def restaurar_nulos(apps, schema_editor):
+    ResumenVentaDiario = apps.get_model('sistemaApp', 'ResumenVentaDiario')
+    ResumenVentaDiario.objects.exclude(clave_vendedor=0).update(vendedor_id=F('clave_vendedor'))
+    DeudaPendiente = apps.get_model('sistemaApp', 'DeudaPendiente')
+    DeudaPendiente.objects.filter(fecha=SIN_FECHA).update(fecha=None)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('sistemaApp', '0013_indice_producto_categoria'),
+    ]
+
+    operations = [
+        migrations.AlterUniqueTogether(
+            name='resumenventadiario',
+            unique_together=set(),
+        ),
+        migrations.AlterUniqueTogether(
+            name='deudapendiente',
+            unique_together=set(),
+        ),
+        migrations.AddField(
+            model_name='resumenventadiario',
+            name='clave_vendedor',
+            field=models.IntegerField(default=0),
+            preserve_default=False,
+        ),
+        migrations.RunPython(completar_claves, restaurar_nulos),
+        migrations.RemoveField(
+            model_name='resumenventadiario',
+            name='vendedor',
+        ),
+        migrations.AlterField(
+            model_name='deudapendiente',
+            name='fecha',
+            field=models.DateField(),
+        ),
+        migrations.AlterUniqueTogether(
+            name='resumenventadiario',
+            unique_together={('fecha', 'metodo_pago', 'clave_vendedor')},
+        ),
+        migrations.AlterUniqueTogether(
+            name='deudapendiente',
+            unique_together={('cliente', 'fecha')},
+        ),
+    ]
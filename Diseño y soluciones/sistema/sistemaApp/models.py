@@ -1,10 +1,35 @@
-from django.db import models, transaction
-from django.db.models import F, Sum
+from django.db import models, transaction, IntegrityError
+from django.db.models import Case, F, Q, Subquery, Sum, When
+from django.db.models.functions import Coalesce
 from django.contrib.auth.models import User
+from django.utils import timezone
+from datetime import date
 from decimal import Decimal
 from django.core.exceptions import ValidationError
 
 
+def incrementar_acumulado(modelo, claves, **incrementos):
+    """
+    Suma valores a una fila de una tabla de acumulados, creándola si no existe.
+
+    La suma se hace en la base de datos con expresiones `F()`, por lo que es segura
+    frente a escrituras concurrentes.
+
+    :param modelo: Modelo de la tabla de acumulados.
+    :param claves: Diccionario con los campos que identifican la fila.
+    :param incrementos: Valores a sumar a cada campo.
+    """
+    actualizacion = {campo: F(campo) + valor for campo, valor in incrementos.items()}
+    if modelo.objects.filter(**claves).update(**actualizacion):
+        return
+    try:
+        with transaction.atomic():
+            modelo.objects.create(**claves, **incrementos)
+    except IntegrityError:
+        # Otra transacción creó la fila entre la actualización y la inserción.
+        modelo.objects.filter(**claves).update(**actualizacion)
+
+
 class Categoria(models.Model):
     """
     Modelo que representa una categoría en la base de datos.
@@ -87,20 +112,22 @@ class Cliente(models.Model):
         """
         return self.nombre
 
-    def abonar_deuda(self, monto):
+    def abonar_deuda(self, monto, usuario_id=None):
         """
-        Permite realizar un abono a la deuda del cliente.
+        Permite realizar un abono a la deuda del cliente (ver `MovimientoDeuda.abonar`).
+
+        El abono se descuenta en la base de datos; el atributo `deuda` de la instancia no se
+        actualiza (usar `refresh_from_db` si se necesita).
 
         :param monto: Monto a abonar.
-        :type monto: float
+        :type monto: int
+        :param usuario_id: Id del usuario que registra el abono.
+        :return: Monto descontado de la deuda (a lo sumo la deuda que tenía el cliente).
         :raises ValueError: Si el monto es negativo.
         """
         if monto < 0:
             raise ValueError("El monto a abonar debe ser positivo.")
-        if self.deuda is None:
-            self.deuda = 0
-        self.deuda = max(0, self.deuda - monto)
-        self.save()
+        return MovimientoDeuda.abonar(self.id_cliente, monto, usuario_id=usuario_id)
 
     class Meta:
         """
@@ -139,6 +166,50 @@ class Producto(models.Model):
     #: Si se elimina una categoría, se eliminan los productos asociados.
     categoria = models.ForeignKey(Categoria, models.CASCADE, blank=True, null=True)
 
+    #: Campos que afectan la valorización del inventario (ver `ValorizacionInventario`).
+    CAMPOS_VALORIZACION = ('categoria_id', 'precio_costo', 'stock_actual')
+
+    #: Campos del catálogo: todos los que se muestran del producto salvo su stock (ver
+    #: `sistemaApp.fragmentos.CATALOGO`).
+    CAMPOS_CATALOGO = ('nombre_producto', 'precio_costo', 'precio_venta', 'stock_minimo', 'categoria_id')
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        """
+        Crea la instancia desde la base de datos guardando los valores que afectan la
+        valorización del inventario, para calcular la diferencia al guardar o eliminar, y los
+        del catálogo, para saber si al guardar solo cambió el stock (ver `sistemaApp.signals`).
+        """
+        instancia = super().from_db(db, field_names, values)
+        instancia._valorizacion_original = instancia.valores_valorizacion()
+        instancia._catalogo_original = instancia.valores_catalogo()
+        return instancia
+
+    def _valores(self, campos):
+        if any(campo not in self.__dict__ for campo in campos):
+            return None
+        return tuple(self.__dict__[campo] for campo in campos)
+
+    def valores_valorizacion(self):
+        """
+        Retorna los valores del producto que afectan la valorización del inventario.
+
+        :return: Tupla ``(categoria_id, precio_costo, stock_actual)``, o `None` si alguno
+                 de los campos no fue cargado desde la base de datos.
+        :rtype: tuple
+        """
+        return self._valores(self.CAMPOS_VALORIZACION)
+
+    def valores_catalogo(self):
+        """
+        Retorna los valores del producto que forman parte del catálogo.
+
+        :return: Tupla con los valores de `CAMPOS_CATALOGO`, o `None` si alguno de los campos no
+                 fue cargado desde la base de datos.
+        :rtype: tuple
+        """
+        return self._valores(self.CAMPOS_CATALOGO)
+
     @classmethod
     def contar_productos_totales(cls):
         """
@@ -241,19 +312,22 @@ class Venta(models.Model):
 
     def save(self, *args, **kwargs):
         """
-        Sobreescribe el método `save` para agregar una validación antes de guardar la venta.
+        Sobreescribe el método `save` para cargar las ventas a crédito a la deuda del cliente.
+
+        - Si la venta es nueva, está asociada a un cliente y el método de pago es 'Deuda', se
+          guarda junto con su cargo en el libro de deudas (`MovimientoDeuda.cargar`), que verifica
+          el límite de crédito en la misma sentencia que suma la venta a la deuda del cliente.
+          Si el cliente supera su límite, la venta no se guarda.
 
-        - Si la venta está asociada a un cliente y el método de pago es 'Deuda',
-          verifica que el cliente no supere su límite de crédito antes de actualizar su deuda.
+        :raises LimiteCreditoError: Si la venta supera el límite de crédito del cliente.
         """
-        if self.id_cliente and self.metodo_pago == 'Deuda':
+        if self._state.adding and self.id_cliente_id and self.metodo_pago == 'Deuda':
             with transaction.atomic():
-                cliente = self.id_cliente
-                if cliente.limite_credito != -1:  # Límite de crédito no infinito
-                    if (cliente.deuda or 0) + self.total > (cliente.limite_credito or 0):
-                        raise ValueError("El cliente ha superado su límite de crédito.")
-                cliente.deuda = (cliente.deuda or 0) + self.total
-                cliente.save()
+                super().save(*args, **kwargs)
+                MovimientoDeuda.cargar(
+                    self.id_cliente_id, self.total, venta=self, usuario_id=self.vendedor_id, fecha=self.fecha
+                )
+            return
         super().save(*args, **kwargs)
 
     @classmethod
@@ -274,3 +348,695 @@ class Venta(models.Model):
         """
         return cls.objects.aggregate(suma_total=Sum('total'))['suma_total'] or 0
 
+
+class DetalleVenta(models.Model):
+    """
+    Modelo que representa una línea (producto vendido) de una venta.
+    """
+
+    #: Relación de clave foránea con la venta a la que pertenece la línea.
+    venta = models.ForeignKey(Venta, models.CASCADE, db_column='id_venta', related_name='detalles')
+
+    #: Producto vendido. No se declara restricción en la base de datos para que eliminar
+    #: un producto del catálogo no rompa el historial de ventas.
+    producto = models.ForeignKey(
+        Producto, models.DO_NOTHING, db_column='codigo_producto', db_constraint=False
+    )
+
+    #: Cantidad de unidades vendidas.
+    cantidad = models.IntegerField()
+
+    #: Precio de venta unitario vigente al momento de la venta.
+    precio_venta = models.IntegerField()
+
+    @property
+    def subtotal(self):
+        """
+        Calcula el subtotal de la línea (precio unitario por cantidad).
+
+        :return: Subtotal de la línea.
+        :rtype: int
+        """
+        return self.precio_venta * self.cantidad
+
+    class Meta:
+        """
+        Configuración adicional para el modelo.
+        """
+        #: Nombre explícito de la tabla en la base de datos que se usará para este modelo.
+        db_table = 'detalle_venta'
+
+
+class LineaCarrito(models.Model):
+    """
+    Modelo que representa una línea del carrito de una caja cuando el carrito
+    se guarda en la base de datos (ver `sistemaApp.carrito.AlmacenCarritoBD`).
+    """
+
+    #: Identificador del carrito (clave de sesión de la caja).
+    clave = models.CharField(max_length=40)
+
+    #: Código del producto agregado.
+    codigo = models.IntegerField()
+
+    #: Nombre del producto al momento de agregarlo.
+    nombre = models.CharField(max_length=100)
+
+    #: Precio de venta unitario al momento de agregarlo.
+    precio_venta = models.IntegerField()
+
+    #: Stock disponible al momento de agregarlo.
+    stock_actual = models.IntegerField()
+
+    #: Cantidad agregada al carrito.
+    cantidad = models.IntegerField()
+
+    class Meta:
+        """
+        Configuración adicional para el modelo.
+        """
+        #: Nombre explícito de la tabla en la base de datos que se usará para este modelo.
+        db_table = 'carrito_linea'
+        #: Un producto aparece una sola vez por carrito.
+        unique_together = [('clave', 'codigo')]
+
+
+class ResumenVentaDiario(models.Model):
+    """
+    Modelo que acumula las ventas por día, método de pago y vendedor.
+
+    La caja lo actualiza en la misma transacción de cada venta, de modo que los totales del
+    historial y de los reportes se leen de esta tabla en lugar de recorrer `venta`. Se puede
+    reconstruir con el comando ``reconstruir_resumen_ventas``.
+    """
+
+    #: Día de las ventas (en la zona horaria del sistema).
+    fecha = models.DateField()
+
+    #: Método de pago de las ventas.
+    metodo_pago = models.CharField(max_length=13)
+
+    #: Id del vendedor de las ventas (0 para las ventas sin vendedor). No admite nulos para que
+    #: la restricción única también impida repetir la fila de las ventas sin vendedor.
+    clave_vendedor = models.IntegerField()
+
+    #: Cantidad de ventas.
+    cantidad_ventas = models.IntegerField(default=0)
+
+    #: Suma de los totales de las ventas.
+    total = models.BigIntegerField(default=0)
+
+    @classmethod
+    def registrar_venta(cls, venta):
+        """
+        Suma una venta al resumen de su día, método de pago y vendedor.
+
+        :param venta: Instancia de `Venta` ya guardada.
+        """
+        incrementar_acumulado(
+            cls,
+            {
+                'fecha': timezone.localdate(venta.fecha),
+                'metodo_pago': venta.metodo_pago,
+                'clave_vendedor': venta.vendedor_id or 0,
+            },
+            cantidad_ventas=1,
+            total=venta.total,
+        )
+
+    @classmethod
+    def totales(cls, desde=None, hasta=None, metodo_pago=None, vendedor=None):
+        """
+        Calcula la cantidad y la suma de las ventas a partir del resumen.
+
+        :param desde: Fecha inicial (inclusive) o `None`.
+        :param hasta: Fecha final (inclusive) o `None`.
+        :param metodo_pago: Método de pago o `None` para todos.
+        :param vendedor: Id del vendedor o `None` para todos.
+        :return: Tupla ``(cantidad_ventas, total)``.
+        :rtype: tuple
+        """
+        resumen = cls.objects.all()
+        if desde:
+            resumen = resumen.filter(fecha__gte=desde)
+        if hasta:
+            resumen = resumen.filter(fecha__lte=hasta)
+        if metodo_pago:
+            resumen = resumen.filter(metodo_pago=metodo_pago)
+        if vendedor:
+            resumen = resumen.filter(clave_vendedor=vendedor)
+        totales = resumen.aggregate(cantidad=Sum('cantidad_ventas'), suma=Sum('total'))
+        return totales['cantidad'] or 0, totales['suma'] or 0
+
+    class Meta:
+        """
+        Configuración adicional para el modelo.
+        """
+        #: Nombre explícito de la tabla en la base de datos que se usará para este modelo.
+        db_table = 'resumen_venta_diario'
+        #: Una fila por día, método de pago y vendedor.
+        unique_together = [('fecha', 'metodo_pago', 'clave_vendedor')]
+
+
+class ValorizacionInventario(models.Model):
+    """
+    Modelo que acumula la valorización del inventario por categoría.
+
+    Cada fila guarda la cantidad de productos, las unidades en stock y el valor a precio de
+    costo (``precio_costo * stock_actual``) de una categoría. Se actualiza por diferencias al
+    vender (ver `sistemaApp.caja`) y al crear, modificar o eliminar productos (ver
+    `sistemaApp.signals`), por lo que los totales no requieren recorrer el catálogo. El comando
+    ``verificar_valorizacion`` lo recalcula desde cero e informa las diferencias.
+    """
+
+    #: Id de la categoría (0 para los productos sin categoría).
+    clave_categoria = models.IntegerField(unique=True)
+
+    #: Cantidad de productos de la categoría.
+    cantidad_productos = models.IntegerField(default=0)
+
+    #: Unidades en stock de los productos de la categoría.
+    unidades = models.BigIntegerField(default=0)
+
+    #: Valor del stock a precio de costo.
+    valor_costo = models.BigIntegerField(default=0)
+
+    @classmethod
+    def aplicar(cls, categoria_id, productos=0, unidades=0, valor_costo=0):
+        """
+        Suma una diferencia a la valorización de una categoría.
+
+        :param categoria_id: Id de la categoría o `None` para los productos sin categoría.
+        :param productos: Diferencia en la cantidad de productos.
+        :param unidades: Diferencia en las unidades en stock.
+        :param valor_costo: Diferencia en el valor a precio de costo.
+        """
+        if not (productos or unidades or valor_costo):
+            return
+        incrementar_acumulado(
+            cls,
+            {'clave_categoria': categoria_id or 0},
+            cantidad_productos=productos,
+            unidades=unidades,
+            valor_costo=valor_costo,
+        )
+
+    @classmethod
+    def aplicar_diferencias(cls, diferencias):
+        """
+        Suma diferencias a la valorización de varias categorías con un solo ``UPDATE`` (un
+        ``CASE`` por campo). Las categorías que todavía no tienen fila se crean con `aplicar`.
+
+        :param diferencias: Diccionario ``{categoria_id: (productos, unidades, valor_costo)}``, con
+                            `categoria_id` `None` para los productos sin categoría.
+        """
+        diferencias = {
+            categoria_id or 0: valores for categoria_id, valores in diferencias.items() if any(valores)
+        }
+        if not diferencias:
+            return
+        actualizacion = {}
+        for posicion, campo in enumerate(('cantidad_productos', 'unidades', 'valor_costo')):
+            casos = [
+                When(clave_categoria=clave, then=F(campo) + valores[posicion])
+                for clave, valores in diferencias.items() if valores[posicion]
+            ]
+            if casos:
+                actualizacion[campo] = Case(*casos, default=F(campo), output_field=cls._meta.get_field(campo))
+        if cls.objects.filter(clave_categoria__in=diferencias).update(**actualizacion) == len(diferencias):
+            return
+        existentes = set(
+            cls.objects.filter(clave_categoria__in=diferencias).values_list('clave_categoria', flat=True)
+        )
+        for clave, valores in diferencias.items():
+            if clave not in existentes:
+                cls.aplicar(clave, *valores)
+
+    @classmethod
+    def registrar_cambio(cls, anterior, nuevo):
+        """
+        Aplica el cambio de un producto a la valorización.
+
+        :param anterior: Tupla ``(categoria_id, precio_costo, stock_actual)`` antes del cambio,
+                         o `None` si el producto es nuevo.
+        :param nuevo: Tupla con los valores después del cambio, o `None` si el producto se eliminó.
+        """
+        cls.registrar_cambios([(anterior, nuevo)])
+
+    @classmethod
+    def registrar_cambios(cls, cambios):
+        """
+        Aplica los cambios de varios productos a la valorización con una sola sentencia (ver
+        `aplicar_diferencias`).
+
+        :param cambios: Iterable de tuplas ``(anterior, nuevo)`` como en `registrar_cambio`.
+        """
+        diferencias = {}
+        for anterior, nuevo in cambios:
+            if anterior == nuevo:
+                continue
+            for valores, signo in ((anterior, -1), (nuevo, 1)):
+                if valores is None:
+                    continue
+                categoria_id, costo, stock = valores
+                productos, unidades, valor = diferencias.get(categoria_id, (0, 0, 0))
+                diferencias[categoria_id] = (productos + signo, unidades + signo * stock, valor + signo * costo * stock)
+        cls.aplicar_diferencias(diferencias)
+
+    @classmethod
+    def totales(cls):
+        """
+        Calcula la valorización total del inventario.
+
+        :return: Diccionario con `cantidad_productos`, `unidades` y `valor_costo`.
+        :rtype: dict
+        """
+        totales = cls.objects.aggregate(
+            cantidad_productos=Sum('cantidad_productos'), unidades=Sum('unidades'), valor_costo=Sum('valor_costo')
+        )
+        return {campo: valor or 0 for campo, valor in totales.items()}
+
+    @classmethod
+    def por_categoria(cls):
+        """
+        Retorna la valorización de cada categoría.
+
+        :return: Diccionario ``{categoria_id: fila}``, donde `categoria_id` es `None` para los
+                 productos sin categoría y `fila` es una instancia de `ValorizacionInventario`.
+        :rtype: dict
+        """
+        return {fila.clave_categoria or None: fila for fila in cls.objects.all()}
+
+    class Meta:
+        """
+        Configuración adicional para el modelo.
+        """
+        #: Nombre explícito de la tabla en la base de datos que se usará para este modelo.
+        db_table = 'valorizacion_inventario'
+
+
+class ReglaPrecio(models.Model):
+    """
+    Modelo que representa una regla de precios: el margen de ganancia y el IVA con que se
+    calcula el precio de venta a partir del precio de costo.
+
+    Hay tres alcances: la regla global, una regla por categoría y una regla por producto. Para
+    cada producto se usa el valor de la regla más específica que lo defina (producto, luego
+    categoría, luego global); si ninguna lo define se usan los valores de `sistemaApp.precios`.
+    Después de modificar las reglas, el comando ``recalcular_precios`` actualiza los precios de
+    venta de los productos afectados.
+    """
+
+    GLOBAL = 'global'
+    CATEGORIA = 'categoria'
+    PRODUCTO = 'producto'
+
+    #: Alcance de la regla.
+    tipo = models.CharField(max_length=9, choices=[
+        (GLOBAL, 'Global'),
+        (CATEGORIA, 'Categoría'),
+        (PRODUCTO, 'Producto'),
+    ])
+
+    #: Id de la categoría o código del producto según el alcance (0 para la regla global).
+    clave = models.IntegerField(default=0)
+
+    #: Margen de ganancia en porcentaje (vacío para usar el de la regla general).
+    margen = models.DecimalField(max_digits=5, decimal_places=2, blank=True, null=True)
+
+    #: IVA en porcentaje (vacío para usar el de la regla general).
+    iva = models.DecimalField(max_digits=5, decimal_places=2, blank=True, null=True)
+
+    def clean(self):
+        """
+        Valida la regla.
+
+        - La regla global usa la clave 0; las demás deben apuntar a una categoría o a un producto existente.
+        - Los porcentajes no pueden ser negativos y la regla debe definir al menos uno.
+
+        :raises ValidationError: Si alguna de las condiciones no se cumple.
+        """
+        if self.tipo == self.GLOBAL:
+            self.clave = 0
+        elif self.tipo == self.CATEGORIA and not Categoria.objects.filter(categoria_id=self.clave).exists():
+            raise ValidationError({'clave': "La categoría no existe."})
+        elif self.tipo == self.PRODUCTO and not Producto.objects.filter(codigo_producto=self.clave).exists():
+            raise ValidationError({'clave': "El producto no existe."})
+        if self.margen is None and self.iva is None:
+            raise ValidationError("La regla debe definir el margen, el IVA o ambos.")
+        for campo in ('margen', 'iva'):
+            if getattr(self, campo) is not None and getattr(self, campo) < 0:
+                raise ValidationError({campo: "El porcentaje no puede ser negativo."})
+
+    def __str__(self):
+        """
+        Retorna la representación en cadena de la regla.
+
+        :return: Alcance y porcentajes de la regla.
+        :rtype: str
+        """
+        alcance = 'Global' if self.tipo == self.GLOBAL else f"{self.get_tipo_display()} {self.clave}"
+        return f"{alcance}: margen {self.margen if self.margen is not None else '-'}%, IVA {self.iva if self.iva is not None else '-'}%"
+
+    class Meta:
+        """
+        Configuración adicional para el modelo.
+        """
+        #: Nombre explícito de la tabla en la base de datos que se usará para este modelo.
+        db_table = 'regla_precio'
+        #: Una sola regla por alcance.
+        unique_together = [('tipo', 'clave')]
+
+
+class StockBajo(models.Model):
+    """
+    Modelo que guarda la lista de productos con stock bajo (``stock_actual <= stock_minimo``).
+
+    La lista se mantiene al vender (ver `sistemaApp.caja`), al crear, modificar o eliminar
+    productos (ver `sistemaApp.signals`) y al importarlos, por lo que el reporte de reposición
+    solo lee estas filas en lugar de recorrer el catálogo. El comando ``reconstruir_stock_bajo``
+    la recalcula desde cero.
+    """
+
+    #: Producto con stock bajo (la tabla `producto` no es gestionada por Django, por lo que no
+    #: se crea la restricción de clave foránea).
+    producto = models.OneToOneField(
+        Producto, models.DO_NOTHING, primary_key=True, db_constraint=False, related_name='stock_bajo'
+    )
+
+    #: Fecha en que el producto quedó con stock bajo.
+    desde = models.DateTimeField(default=timezone.now)
+
+    @staticmethod
+    def esta_bajo(stock_actual, stock_minimo):
+        """
+        Indica si un producto tiene stock bajo (el mismo criterio que el filtro `stock_bajo` de la
+        lista de productos).
+
+        :rtype: bool
+        """
+        return stock_actual <= stock_minimo
+
+    @classmethod
+    def actualizar(cls, bajos=(), normales=()):
+        """
+        Agrega y quita productos de la lista, con a lo sumo una sentencia para cada operación.
+
+        Los productos que ya estaban en la lista conservan su fecha `desde`.
+
+        :param bajos: Códigos de los productos que tienen stock bajo.
+        :param normales: Códigos de los productos que ya no tienen stock bajo.
+        """
+        normales = list(normales)
+        if normales:
+            cls.objects.filter(producto_id__in=normales).delete()
+        bajos = list(bajos)
+        if bajos:
+            cls.objects.bulk_create([cls(producto_id=codigo) for codigo in bajos], ignore_conflicts=True)
+
+    @classmethod
+    def actualizar_productos(cls, productos):
+        """
+        Actualiza la lista según el stock de varios productos.
+
+        :param productos: Iterable de tuplas ``(codigo, stock_actual, stock_minimo)``.
+        """
+        bajos, normales = [], []
+        for codigo, stock_actual, stock_minimo in productos:
+            (bajos if cls.esta_bajo(stock_actual, stock_minimo) else normales).append(codigo)
+        cls.actualizar(bajos, normales)
+
+    class Meta:
+        """
+        Configuración adicional para el modelo.
+        """
+        #: Nombre explícito de la tabla en la base de datos que se usará para este modelo.
+        db_table = 'stock_bajo'
+
+
+class ClaveVenta(models.Model):
+    """
+    Modelo que guarda la clave única (UUID) con que la caja identificó cada venta.
+
+    Se guarda en la misma transacción que la `Venta`, por lo que permite registrar una venta
+    del diario local (ver `sistemaApp.diario_ventas`) sin duplicarla aunque se reintente, por
+    ejemplo, si la conexión se cortó al confirmar. También guarda los conflictos de stock que
+    hubo al registrarla.
+    """
+
+    #: Clave generada por la caja al cobrar la venta.
+    clave = models.UUIDField(unique=True)
+
+    #: Venta registrada con esta clave (la tabla `venta` no es gestionada por Django, por lo que
+    #: no se crea la restricción de clave foránea).
+    venta = models.ForeignKey(Venta, models.DO_NOTHING, db_constraint=False, related_name='+')
+
+    #: Fecha en que la venta llegó a la base de datos.
+    registrada = models.DateTimeField(default=timezone.now)
+
+    #: Productos que quedaron con stock negativo o que ya no existían al registrar la venta
+    #: (lista de ``[codigo, nombre, disponible, solicitado]``), o vacío si no hubo conflictos.
+    conflictos = models.JSONField(default=list, blank=True)
+
+    class Meta:
+        """
+        Configuración adicional para el modelo.
+        """
+        #: Nombre explícito de la tabla en la base de datos que se usará para este modelo.
+        db_table = 'venta_clave'
+
+
+class LimiteCreditoError(ValueError):
+    """
+    Excepción lanzada cuando un cargo haría que la deuda de un cliente supere su límite de crédito.
+    """
+
+    def __init__(self):
+        super().__init__("El cliente ha superado su límite de crédito.")
+
+
+class MovimientoDeuda(models.Model):
+    """
+    Modelo del libro de deudas de los clientes: cada cargo (venta a crédito o aumento de la deuda),
+    abono y ajuste agrega una fila, y las filas no se modifican.
+
+    `Cliente.deuda` es el saldo del libro (la suma de `monto` de los movimientos del cliente). Los
+    métodos de esta clase lo actualizan en la misma transacción que agregan el movimiento, con
+    expresiones `F()` en la base de datos, por lo que dos cajas que cobran o abonan a la vez al
+    mismo cliente no pierden actualizaciones. El comando ``verificar_deudas`` compara ambos.
+
+    En la misma transacción se actualiza la deuda pendiente por día del cliente (`DeudaPendiente`).
+    """
+
+    CARGO = 'cargo'
+    ABONO = 'abono'
+    AJUSTE = 'ajuste'
+
+    #: Tipos de movimiento.
+    TIPOS = [(CARGO, 'Cargo'), (ABONO, 'Abono'), (AJUSTE, 'Ajuste')]
+
+    #: Cliente del movimiento (la tabla `cliente` no es gestionada por Django, por lo que no se
+    #: crea la restricción de clave foránea).
+    cliente = models.ForeignKey(Cliente, models.DO_NOTHING, db_constraint=False, related_name='movimientos')
+
+    #: Venta a crédito que originó el cargo, si corresponde.
+    venta = models.ForeignKey(
+        Venta, models.DO_NOTHING, db_constraint=False, blank=True, null=True, related_name='movimientos_deuda'
+    )
+
+    #: Tipo de movimiento (ver `TIPOS`).
+    tipo = models.CharField(max_length=6, choices=TIPOS)
+
+    #: Variación de la deuda: positiva en los cargos y negativa en los abonos.
+    monto = models.IntegerField()
+
+    #: Deuda del cliente después del movimiento.
+    saldo = models.IntegerField()
+
+    #: Fecha del movimiento.
+    fecha = models.DateTimeField(default=timezone.now)
+
+    #: Usuario que registró el movimiento.
+    usuario = models.ForeignKey(User, models.SET_NULL, blank=True, null=True, related_name='+')
+
+    @classmethod
+    def _registrar(cls, cliente_id, tipo, monto, venta=None, usuario_id=None, fecha=None):
+        """
+        Agrega un movimiento después de actualizar la deuda del cliente. El saldo se lee de la
+        fila del cliente en la misma sentencia (la fila ya está bloqueada por la actualización).
+
+        Los cargos se suman a la deuda pendiente del día del movimiento y los ajustes positivos a
+        la deuda sin fecha; los abonos y los ajustes negativos pagan la deuda pendiente más antigua.
+        """
+        fecha = fecha or timezone.now()
+        if monto > 0:
+            DeudaPendiente.sumar(cliente_id, monto, timezone.localdate(fecha) if tipo == cls.CARGO else None)
+        elif monto < 0:
+            DeudaPendiente.descontar(cliente_id, -monto)
+        cls.objects.create(
+            cliente_id=cliente_id,
+            venta=venta,
+            tipo=tipo,
+            monto=monto,
+            saldo=Subquery(Cliente.objects.filter(id_cliente=cliente_id).values('deuda')[:1]),
+            fecha=fecha,
+            usuario_id=usuario_id,
+        )
+
+    @classmethod
+    def cargar(cls, cliente_id, monto, venta=None, usuario_id=None, fecha=None):
+        """
+        Suma un cargo a la deuda de un cliente si no supera su límite de crédito.
+
+        La verificación del límite y la actualización de la deuda son una sola sentencia
+        ``UPDATE ... WHERE`` (un límite de -1 es ilimitado y un límite vacío equivale a 0), por
+        lo que la verificación es correcta aunque varias cajas carguen al cliente a la vez.
+
+        :param cliente_id: Id del cliente.
+        :param monto: Monto a cargar.
+        :param venta: Venta a crédito que origina el cargo, si corresponde.
+        :param usuario_id: Id del usuario que registra el cargo.
+        :param fecha: Fecha del cargo (la de la venta); por defecto, la actual. La antigüedad de
+                      la deuda (`DeudaPendiente`) se cuenta desde ese día.
+        :raises LimiteCreditoError: Si el cargo supera el límite de crédito del cliente.
+        :raises Cliente.DoesNotExist: Si el cliente no existe.
+        """
+        deuda = Coalesce(F('deuda'), 0)
+        with transaction.atomic():
+            actualizados = Cliente.objects.filter(
+                Q(limite_credito=-1) | Q(limite_credito__gte=deuda + monto), id_cliente=cliente_id
+            ).update(deuda=deuda + monto)
+            if not actualizados:
+                if not Cliente.objects.filter(id_cliente=cliente_id).exists():
+                    raise Cliente.DoesNotExist(f"No existe el cliente {cliente_id}.")
+                raise LimiteCreditoError()
+            cls._registrar(cliente_id, cls.CARGO, monto, venta=venta, usuario_id=usuario_id, fecha=fecha)
+
+    @classmethod
+    def abonar(cls, cliente_id, monto, usuario_id=None):
+        """
+        Descuenta un abono de la deuda de un cliente. Si el abono supera la deuda, la deuda queda
+        en 0 y se registra solo el monto descontado.
+
+        :param cliente_id: Id del cliente.
+        :param monto: Monto a abonar.
+        :param usuario_id: Id del usuario que registra el abono.
+        :return: Monto descontado de la deuda.
+        :rtype: int
+        :raises Cliente.DoesNotExist: Si el cliente no existe.
+        """
+        with transaction.atomic():
+            # Caso habitual: el abono no supera la deuda y se descuenta con una sola sentencia.
+            if Cliente.objects.filter(id_cliente=cliente_id, deuda__gte=monto).update(deuda=F('deuda') - monto):
+                descontado = monto
+            else:
+                deuda = Cliente.objects.select_for_update().values_list('deuda', flat=True).get(id_cliente=cliente_id)
+                descontado = max(deuda or 0, 0)
+                if not descontado:
+                    return 0
+                Cliente.objects.filter(id_cliente=cliente_id).update(deuda=F('deuda') - descontado)
+            cls._registrar(cliente_id, cls.ABONO, -descontado, usuario_id=usuario_id)
+        return descontado
+
+    @classmethod
+    def ajustar(cls, cliente_id, deuda, usuario_id=None):
+        """
+        Deja la deuda de un cliente en un valor dado (por ejemplo, la deuda inicial de un cliente
+        nuevo o una corrección desde el formulario del cliente) y registra la diferencia como ajuste.
+
+        :param cliente_id: Id del cliente.
+        :param deuda: Deuda nueva.
+        :param usuario_id: Id del usuario que registra el ajuste.
+        :return: Diferencia registrada (0 si la deuda no cambió).
+        :rtype: int
+        :raises Cliente.DoesNotExist: Si el cliente no existe.
+        """
+        with transaction.atomic():
+            actual = Cliente.objects.select_for_update().values_list('deuda', flat=True).get(id_cliente=cliente_id)
+            diferencia = deuda - (actual or 0)
+            if diferencia:
+                Cliente.objects.filter(id_cliente=cliente_id).update(deuda=deuda)
+                cls._registrar(cliente_id, cls.AJUSTE, diferencia, usuario_id=usuario_id)
+        return diferencia
+
+    class Meta:
+        """
+        Configuración adicional para el modelo.
+        """
+        #: Nombre explícito de la tabla en la base de datos que se usará para este modelo.
+        db_table = 'movimiento_deuda'
+        #: Índice para leer los movimientos de un cliente en orden.
+        indexes = [models.Index(fields=['cliente', 'fecha'], name='movimiento_deuda_cliente')]
+
+
+class DeudaPendiente(models.Model):
+    """
+    Modelo con la deuda pendiente de cada cliente agrupada por el día en que se originó: los
+    cargos que todavía no se pagan, considerando que cada abono paga primero la deuda más antigua.
+
+    La suma de `monto` de un cliente es su deuda. El reporte de antigüedad de deudas (ver
+    `sistemaApp.cobranza`) se calcula agrupando esta tabla, sin recorrer las ventas ni el libro
+    de deudas. `MovimientoDeuda` la actualiza en la misma transacción de cada movimiento (con la
+    fila del cliente ya bloqueada) y el comando ``reconstruir_antiguedad_deudas`` la recalcula
+    desde las ventas a crédito y el libro de deudas.
+    """
+
+    #: Cliente de la deuda (la tabla `cliente` no es gestionada por Django, por lo que no se crea
+    #: la restricción de clave foránea).
+    cliente = models.ForeignKey(Cliente, models.DO_NOTHING, db_constraint=False, related_name='deuda_pendiente')
+
+    #: Día que se guarda en `fecha` cuando no se conoce el origen de la deuda (ajustes y deudas
+    #: anteriores al libro de deudas): es anterior a cualquier cargo, por lo que esa deuda se
+    #: considera la más antigua.
+    SIN_FECHA = date(1900, 1, 1)
+
+    #: Día en que se originó la deuda, o `SIN_FECHA` si no se conoce. No admite nulos para que
+    #: la restricción única también impida repetir la fila de la deuda sin fecha.
+    fecha = models.DateField()
+
+    #: Monto pendiente de los cargos del día.
+    monto = models.IntegerField(default=0)
+
+    @classmethod
+    def sumar(cls, cliente_id, monto, fecha=None):
+        """
+        Suma un cargo a la deuda pendiente de un día.
+
+        :param cliente_id: Id del cliente.
+        :param monto: Monto del cargo.
+        :param fecha: Día del cargo, o `None` si no se conoce.
+        """
+        incrementar_acumulado(cls, {'cliente_id': cliente_id, 'fecha': fecha or cls.SIN_FECHA}, monto=monto)
+
+    @classmethod
+    def descontar(cls, cliente_id, monto):
+        """
+        Descuenta un pago de la deuda pendiente de un cliente, comenzando por la más antigua.
+
+        Las filas pagadas por completo se eliminan con una sola sentencia.
+
+        :param cliente_id: Id del cliente.
+        :param monto: Monto pagado.
+        """
+        pagadas = []
+        pendientes = cls.objects.filter(cliente_id=cliente_id).order_by('fecha')
+        for id_, pendiente in pendientes.values_list('id', 'monto'):
+            if monto <= 0:
+                break
+            if pendiente <= monto:
+                pagadas.append(id_)
+            else:
+                cls.objects.filter(id=id_).update(monto=F('monto') - monto)
+            monto -= pendiente
+        if pagadas:
+            cls.objects.filter(id__in=pagadas).delete()
+
+    class Meta:
+        """
+        Configuración adicional para el modelo.
+        """
+        #: Nombre explícito de la tabla en la base de datos que se usará para este modelo.
+        db_table = 'deuda_pendiente'
+        #: Una fila por cliente y día.
+        unique_together = [('cliente', 'fecha')]
+
@@ -0,0 +1,214 @@
+from decimal import Decimal
+from django.db import transaction
+from django.db.models import ExpressionWrapper, F, IntegerField, Q, Value
+from . import fragmentos
+from .catalogo import cache_productos
+from .models import Producto, ReglaPrecio
+
+
+#: Margen de ganancia sobre el precio de costo, en porcentaje, si ninguna regla lo define.
+MARGEN = Decimal('40')
+
+#: IVA aplicado al precio de venta, en porcentaje, si ninguna regla lo define.
+IVA = Decimal('19')
+
+#: Divisor de `factor_precio`: los porcentajes se llevan a centésimas de punto (10000 = 100%).
+ESCALA = 10_000 * 10_000
+
+
+def factor_precio(margen, iva):
+    """
+    Calcula el factor entero por el que se multiplica el precio de costo.
+
+    El precio se calcula con aritmética entera (``precio_costo * factor // ESCALA``) para que
+    Python y la base de datos (ver `expresion_precio_venta`) obtengan exactamente el mismo valor.
+
+    :param margen: Margen de ganancia en porcentaje.
+    :param iva: IVA en porcentaje.
+    :return: ``(10000 + margen * 100) * (10000 + iva * 100)``.
+    :rtype: int
+    """
+    return (10_000 + int(Decimal(margen) * 100)) * (10_000 + int(Decimal(iva) * 100))
+
+
+def calcular_precio_venta(precio_costo, margen=MARGEN, iva=IVA):
+    """
+    Calcula el precio de venta de un producto a partir de su precio de costo.
+
+    - Aplica el margen de ganancia y luego el IVA al precio de costo, truncando a pesos enteros.
+
+    :param precio_costo: Precio de costo del producto.
+    :param margen: Margen de ganancia en porcentaje (por defecto 40%).
+    :param iva: IVA en porcentaje (por defecto 19%).
+    :return: Precio de venta calculado, o `None` si no hay precio de costo.
+    """
+    if precio_costo is None:
+        return None
+    return precio_costo * factor_precio(margen, iva) // ESCALA
+
+
+def expresion_precio_venta(margen, iva):
+    """
+    Retorna la expresión SQL equivalente a `calcular_precio_venta` sobre la columna `precio_costo`.
+
+    La división se hace después de restar el resto, de modo que es exacta también en las bases
+    de datos que dividen enteros con decimales (MySQL).
+    """
+    bruto = F('precio_costo') * Value(factor_precio(margen, iva))
+    return ExpressionWrapper((bruto - bruto % Value(ESCALA)) / Value(ESCALA), output_field=IntegerField())
+
+
+class ReglasPrecio:
+    """
+    Reglas de precio vigentes (ver `ReglaPrecio`), cargadas en memoria para resolver el margen
+    y el IVA de cualquier producto sin más consultas.
+    """
+
+    def __init__(self, reglas=()):
+        """
+        Constructor de las reglas.
+
+        :param reglas: Iterable de instancias de `ReglaPrecio`.
+        """
+        self.general = {'margen': MARGEN, 'iva': IVA}
+        self.categorias = {}
+        self.productos = {}
+        for regla in reglas:
+            if regla.tipo == ReglaPrecio.GLOBAL:
+                destino = self.general
+            else:
+                destino = (self.categorias if regla.tipo == ReglaPrecio.CATEGORIA else self.productos).setdefault(regla.clave, {})
+            for campo in ('margen', 'iva'):
+                if getattr(regla, campo) is not None:
+                    destino[campo] = getattr(regla, campo)
+
+    @classmethod
+    def cargar(cls, codigo_producto=None, categoria_id=None):
+        """
+        Carga las reglas desde la base de datos con una consulta.
+
+        Si se indica un producto, carga solo las reglas que pueden aplicarle (la global, la de
+        su categoría y la del producto); si no, carga todas.
+
+        :param codigo_producto: Código del producto.
+        :param categoria_id: Id de la categoría del producto.
+        :rtype: ReglasPrecio
+        """
+        reglas = ReglaPrecio.objects.all()
+        if codigo_producto is not None:
+            reglas = reglas.filter(
+                Q(tipo=ReglaPrecio.GLOBAL)
+                | Q(tipo=ReglaPrecio.CATEGORIA, clave=categoria_id or 0)
+                | Q(tipo=ReglaPrecio.PRODUCTO, clave=codigo_producto)
+            )
+        return cls(reglas)
+
+    def porcentajes_categoria(self, categoria_id):
+        """
+        Retorna el margen y el IVA de los productos de una categoría que no tienen regla propia.
+
+        :return: Tupla ``(margen, iva)``.
+        :rtype: tuple
+        """
+        valores = dict(self.general, **self.categorias.get(categoria_id, {}))
+        return valores['margen'], valores['iva']
+
+    def porcentajes(self, codigo_producto, categoria_id):
+        """
+        Retorna el margen y el IVA que corresponden a un producto.
+
+        :return: Tupla ``(margen, iva)``.
+        :rtype: tuple
+        """
+        margen, iva = self.porcentajes_categoria(categoria_id)
+        regla = self.productos.get(codigo_producto, {})
+        return regla.get('margen', margen), regla.get('iva', iva)
+
+    def precio_venta(self, precio_costo, codigo_producto, categoria_id):
+        """
+        Calcula el precio de venta de un producto con la regla que le corresponde.
+
+        :return: Precio de venta, o `None` si no hay precio de costo.
+        """
+        return calcular_precio_venta(precio_costo, *self.porcentajes(codigo_producto, categoria_id))
+
+
+class CambioPrecios:
+    """
+    Resumen de un recálculo de precios: productos modificados y, en modo de prueba, el detalle
+    de los cambios.
+    """
+
+    def __init__(self):
+        self.modificados = 0
+        #: Lista de tuplas ``(codigo, nombre, precio_actual, precio_nuevo)`` (solo en modo de prueba).
+        self.cambios = []
+
+
+def _grupos_recalculo(reglas, categoria_id=None):
+    """
+    Divide el catálogo en grupos de productos que comparten margen e IVA.
+
+    - Un grupo con los productos de las categorías sin regla propia (usan la regla global).
+    - Un grupo por cada categoría con regla.
+    - Un grupo por cada combinación de porcentajes de los productos con regla propia.
+
+    :param reglas: Instancia de `ReglasPrecio`.
+    :param categoria_id: Si se indica, limita los grupos a los productos de esa categoría.
+    :return: Lista de tuplas ``(consulta, margen, iva)``.
+    :rtype: list
+    """
+    productos = Producto.objects.all()
+    if categoria_id is not None:
+        productos = productos.filter(categoria_id=categoria_id)
+    excepciones = list(reglas.productos)
+    generales = productos.exclude(codigo_producto__in=excepciones)
+
+    grupos = [(generales.exclude(categoria_id__in=list(reglas.categorias)), *reglas.porcentajes_categoria(None))]
+    for clave in reglas.categorias:
+        if categoria_id is None or clave == categoria_id:
+            grupos.append((generales.filter(categoria_id=clave), *reglas.porcentajes_categoria(clave)))
+
+    # Las reglas por producto pueden definir solo uno de los porcentajes y heredar el otro de
+    # su categoría, por lo que se agrupan según los porcentajes resultantes.
+    por_porcentajes = {}
+    for codigo, categoria in productos.filter(codigo_producto__in=excepciones).values_list('codigo_producto', 'categoria_id'):
+        por_porcentajes.setdefault(reglas.porcentajes(codigo, categoria), []).append(codigo)
+    for (margen, iva), codigos in por_porcentajes.items():
+        grupos.append((Producto.objects.filter(codigo_producto__in=codigos), margen, iva))
+    return grupos
+
+
+def recalcular_precios(simular=False, categoria_id=None):
+    """
+    Recalcula el precio de venta de los productos según las reglas vigentes.
+
+    Cada grupo de productos con el mismo margen e IVA (ver `_grupos_recalculo`) se actualiza con
+    un único ``UPDATE`` que calcula el precio en la base de datos y solo escribe las filas cuyo
+    precio cambia. Todo se hace en una transacción; al confirmarla se vacía la caché de
+    productos de la caja, que guarda el precio de venta.
+
+    :param simular: Si es `True`, no modifica nada y retorna el detalle de los cambios.
+    :param categoria_id: Si se indica, solo recalcula los productos de esa categoría.
+    :return: Resumen del recálculo.
+    :rtype: CambioPrecios
+    """
+    resultado = CambioPrecios()
+    with transaction.atomic():
+        for consulta, margen, iva in _grupos_recalculo(ReglasPrecio.cargar(), categoria_id):
+            expresion = expresion_precio_venta(margen, iva)
+            consulta = consulta.exclude(precio_venta=expresion)
+            if simular:
+                cambios = consulta.annotate(precio_nuevo=expresion).order_by('codigo_producto').values_list(
+                    'codigo_producto', 'nombre_producto', 'precio_venta', 'precio_nuevo'
+                )
+                resultado.cambios.extend(cambios)
+            else:
+                resultado.modificados += consulta.update(precio_venta=expresion)
+        if resultado.modificados:
+            transaction.on_commit(cache_productos.invalidar)
+            fragmentos.incrementar(fragmentos.CATALOGO)
+    resultado.cambios.sort()
+    if simular:
+        resultado.modificados = len(resultado.cambios)
+    return resultado
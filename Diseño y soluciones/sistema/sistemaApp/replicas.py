@@ -0,0 +1,235 @@
+import logging
+import threading
+import time
+from contextvars import ContextVar
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.db import DatabaseError, connections
+
+
+logger = logging.getLogger('sistemaApp.replicas')
+
+
+#: Nombres de URL de las vistas de solo lectura del back-office, que leen de la réplica. Las vistas
+#: de la caja (carrito, stock al escanear, registrar la venta) y las que modifican deudas no están
+#: en la lista y siempre usan la base principal.
+VISTAS_LECTURA = {
+    'GestionProductos',
+    'ProductosJson',
+    'StockBajo',
+    'StockBajoJson',
+    'GestionDepartamentos',
+    'ProductosAsociados',
+    'GestionProveedores',
+    'GestionClientes',
+    'AntiguedadDeudas',
+    'AntiguedadDeudasCsv',
+    'HistorialVentas',
+    'DetalleVenta',
+    'generar_reporte_ventas',
+}
+
+#: Aplicaciones cuyos modelos se leen de la réplica. La sesión y el usuario siempre se leen de la
+#: base principal, para que un retraso de la réplica no cierre la sesión recién iniciada.
+APLICACIONES_REPLICA = {'sistemaApp'}
+
+#: Cookie que marca a un navegador que acaba de escribir en la base de datos: mientras exista
+#: (``REPLICA_ADHERENCIA`` segundos), sus lecturas van a la base principal.
+COOKIE_ESCRITURA = 'escritura_bd'
+
+
+class EstadoPeticion:
+    """
+    Base de datos de lectura de la petición en curso y si la petición escribió en la base de datos.
+    """
+
+    def __init__(self):
+        self.alias_lectura = None
+        self.escribio = False
+
+
+_estado = ContextVar('estado_replica', default=None)
+
+_bloqueo = threading.Lock()
+_verificaciones = {}
+
+
+def alias_replica():
+    """
+    Retorna el alias de la réplica configurada en ``settings.REPLICA_ALIAS``, o `None` si no hay
+    una réplica en ``settings.DATABASES``.
+    """
+    alias = getattr(settings, 'REPLICA_ALIAS', None)
+    return alias if alias in settings.DATABASES else None
+
+
+def retraso_replica(alias):
+    """
+    Consulta el retraso de la réplica respecto de la base principal.
+
+    En MySQL se lee ``Seconds_Behind_Source`` de ``SHOW REPLICA STATUS`` (``Seconds_Behind_Master``
+    de ``SHOW SLAVE STATUS`` en versiones anteriores a 8.0.22). Un servidor sin estado de réplica
+    (por ejemplo, un lector de un clúster administrado) y los demás motores se consideran al día.
+
+    :param alias: Alias de la réplica.
+    :return: Segundos de retraso, o `None` si la replicación está detenida o la réplica no responde.
+    """
+    conexion = connections[alias]
+    try:
+        if conexion.vendor != 'mysql':
+            conexion.ensure_connection()
+            return 0
+        with conexion.cursor() as cursor:
+            try:
+                cursor.execute("SHOW REPLICA STATUS")
+            except DatabaseError:
+                cursor.execute("SHOW SLAVE STATUS")
+            fila = cursor.fetchone()
+            if fila is None:
+                return 0
+            estado = dict(zip([columna[0] for columna in cursor.description], fila))
+    except DatabaseError as error:
+        logger.warning("La réplica '%s' no responde: %s", alias, error)
+        return None
+    return estado.get('Seconds_Behind_Source', estado.get('Seconds_Behind_Master'))
+
+
+def replica_disponible(alias):
+    """
+    Indica si se puede leer de la réplica: responde y su retraso no supera
+    ``settings.REPLICA_RETRASO_MAXIMO`` segundos.
+
+    El resultado se reutiliza durante ``settings.REPLICA_VERIFICACION`` segundos, para no consultar
+    el estado de la réplica en cada petición.
+
+    :rtype: bool
+    """
+    ahora = time.monotonic()
+    with _bloqueo:
+        verificacion = _verificaciones.get(alias)
+        if verificacion is not None and verificacion[0] > ahora:
+            return verificacion[1]
+    retraso = retraso_replica(alias)
+    disponible = retraso is not None and retraso <= settings.REPLICA_RETRASO_MAXIMO
+    if not disponible and retraso is not None:
+        logger.warning("La réplica '%s' tiene %s segundos de retraso; se lee de la base principal.", alias, retraso)
+    with _bloqueo:
+        _verificaciones[alias] = (ahora + settings.REPLICA_VERIFICACION, disponible)
+    return disponible
+
+
+class RouterReplica:
+    """
+    Router de bases de datos que envía las lecturas de las vistas de `VISTAS_LECTURA` a la réplica.
+
+    - La base de lectura de cada petición la decide `ReplicaMiddleware`; fuera de una petición
+      (comandos, tareas) todo usa la base principal.
+    - Las escrituras, y las lecturas para modificar (``select_for_update``, ``get_or_create``),
+      siempre van a la base principal. Cada escritura marca la petición para que las lecturas
+      siguientes del mismo navegador usen la base principal (ver `COOKIE_ESCRITURA`).
+    - Sin réplica configurada no cambia nada.
+    """
+
+    def db_for_read(self, model, **hints):
+        estado = _estado.get()
+        if estado is None or model._meta.app_label not in APLICACIONES_REPLICA:
+            return None
+        return estado.alias_lectura
+
+    def db_for_write(self, model, **hints):
+        estado = _estado.get()
+        if estado is not None:
+            estado.escribio = True
+        return 'default'
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # La réplica tiene los mismos datos que la base principal.
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        # La réplica recibe los cambios de esquema por la replicación.
+        if db == alias_replica():
+            return False
+        return None
+
+
+class ReplicaMiddleware:
+    """
+    Middleware que elige la base de datos de lectura de cada petición (ver `RouterReplica`).
+
+    - Las vistas de `VISTAS_LECTURA` leen de la réplica, salvo que el navegador haya escrito hace
+      menos de ``settings.REPLICA_ADHERENCIA`` segundos o que la réplica no esté disponible (ver
+      `replica_disponible`); en esos casos leen de la base principal.
+    - Si la petición escribe en la base de datos, agrega la cookie `COOKIE_ESCRITURA`.
+    - Deja la base de lectura elegida en ``request.alias_lectura`` (`None` para la base principal).
+
+    El estado de la petición se guarda en una variable de contexto, que también ven las
+    consultas que las vistas asíncronas hacen con `sync_to_async`.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(self.get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        request.alias_lectura = None
+        if alias_replica() is None:
+            return self.get_response(request)
+
+        estado = EstadoPeticion()
+        token = _estado.set(estado)
+        try:
+            response = self.get_response(request)
+        finally:
+            _estado.reset(token)
+        return self._terminar(response, estado)
+
+    async def __acall__(self, request):
+        request.alias_lectura = None
+        if alias_replica() is None:
+            return await self.get_response(request)
+
+        estado = EstadoPeticion()
+        token = _estado.set(estado)
+        try:
+            response = await self.get_response(request)
+        finally:
+            _estado.reset(token)
+        return self._terminar(response, estado)
+
+    def _terminar(self, response, estado):
+        if response.streaming and not response.is_async and estado.alias_lectura is not None:
+            response.streaming_content = self._leer_de(response.streaming_content, estado)
+        if estado.escribio:
+            response.set_cookie(
+                COOKIE_ESCRITURA, '1', max_age=settings.REPLICA_ADHERENCIA, httponly=True, samesite='Lax'
+            )
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        estado = _estado.get()
+        if estado is None or request.resolver_match.url_name not in VISTAS_LECTURA:
+            return None
+        if COOKIE_ESCRITURA in request.COOKIES:
+            return None
+        alias = alias_replica()
+        if replica_disponible(alias):
+            estado.alias_lectura = request.alias_lectura = alias
+        return None
+
+    def _leer_de(self, contenido, estado):
+        """
+        Mantiene la base de lectura mientras se genera una respuesta por partes.
+        """
+        anterior = _estado.get()
+        _estado.set(estado)
+        try:
+            yield from contenido
+        finally:
+            _estado.set(anterior)
@@ -0,0 +1,94 @@
+import math
+from datetime import timedelta
+from django.db.models import F, Sum
+from django.utils import timezone
+from .models import DetalleVenta, StockBajo
+
+
+#: Días de ventas que se usan para estimar la demanda diaria de cada producto.
+DIAS_VENTAS = 30
+
+#: Días de demanda que debe cubrir la reposición sugerida, además del stock mínimo.
+DIAS_COBERTURA = 14
+
+
+def cantidad_sugerida(stock_actual, stock_minimo, vendidas):
+    """
+    Calcula la cantidad sugerida a reponer de un producto con stock bajo.
+
+    - El stock objetivo es el stock mínimo más la demanda estimada de `DIAS_COBERTURA` días
+      (según las unidades vendidas en los últimos `DIAS_VENTAS` días). Sin ventas en ese período,
+      el objetivo es el doble del stock mínimo.
+    - La cantidad sugerida es la diferencia entre el objetivo y el stock actual (al menos 1).
+
+    :param stock_actual: Stock actual del producto.
+    :param stock_minimo: Stock mínimo del producto.
+    :param vendidas: Unidades vendidas en los últimos `DIAS_VENTAS` días.
+    :return: Unidades a reponer.
+    :rtype: int
+    """
+    cobertura = math.ceil(vendidas * DIAS_COBERTURA / DIAS_VENTAS) if vendidas else stock_minimo
+    return max(stock_minimo + cobertura - stock_actual, 1)
+
+
+def reporte_stock_bajo(categoria_id=None):
+    """
+    Arma el reporte de reposición: los productos con stock bajo agrupados por categoría, con la
+    cantidad sugerida a reponer.
+
+    Lee la lista precalculada `StockBajo` (unida a sus productos por clave primaria) y las ventas
+    recientes de esos productos, con dos consultas que no dependen del tamaño del catálogo.
+
+    :param categoria_id: Si se indica, solo incluye los productos de esa categoría (``'sin'`` para
+                         los productos sin categoría).
+    :return: Lista de diccionarios con las claves `categoria_id`, `categoria`, `productos` (lista de
+             diccionarios con `codigo`, `nombre`, `stock_actual`, `stock_minimo`, `vendidas`,
+             `sugerido` y `desde`) y `unidades_sugeridas`, ordenada por nombre de categoría.
+    :rtype: list
+    """
+    filas = StockBajo.objects.filter(
+        # Descarta las filas que hayan quedado desactualizadas por cambios hechos fuera de la aplicación.
+        producto__stock_actual__lte=F('producto__stock_minimo')
+    )
+    if categoria_id == 'sin':
+        filas = filas.filter(producto__categoria__isnull=True)
+    elif categoria_id is not None:
+        filas = filas.filter(producto__categoria_id=categoria_id)
+    filas = list(filas.order_by(
+        'producto__categoria__nombre', 'producto__categoria_id', 'producto__nombre_producto'
+    ).values(
+        'producto_id', 'producto__nombre_producto', 'producto__stock_actual', 'producto__stock_minimo',
+        'producto__categoria_id', 'producto__categoria__nombre', 'desde',
+    ))
+
+    vendidas = {}
+    if filas:
+        vendidas = dict(
+            DetalleVenta.objects.filter(
+                producto_id__in=[fila['producto_id'] for fila in filas],
+                venta__fecha__gte=timezone.now() - timedelta(days=DIAS_VENTAS),
+            ).values('producto_id').annotate(unidades=Sum('cantidad')).values_list('producto_id', 'unidades')
+        )
+
+    grupos = []
+    for fila in filas:
+        if not grupos or grupos[-1]['categoria_id'] != fila['producto__categoria_id']:
+            grupos.append({
+                'categoria_id': fila['producto__categoria_id'],
+                'categoria': fila['producto__categoria__nombre'] or 'Sin categoría',
+                'productos': [],
+                'unidades_sugeridas': 0,
+            })
+        unidades = vendidas.get(fila['producto_id'], 0)
+        sugerido = cantidad_sugerida(fila['producto__stock_actual'], fila['producto__stock_minimo'], unidades)
+        grupos[-1]['productos'].append({
+            'codigo': fila['producto_id'],
+            'nombre': fila['producto__nombre_producto'],
+            'stock_actual': fila['producto__stock_actual'],
+            'stock_minimo': fila['producto__stock_minimo'],
+            'vendidas': unidades,
+            'sugerido': sugerido,
+            'desde': fila['desde'],
+        })
+        grupos[-1]['unidades_sugeridas'] += sugerido
+    return grupos
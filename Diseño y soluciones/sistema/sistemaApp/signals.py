@@ -0,0 +1,168 @@
+from django.contrib.auth.models import User
+from django.db import transaction
+from django.db.models.signals import m2m_changed, pre_save, post_save, post_delete
+from django.dispatch import receiver
+from . import fragmentos
+from .autenticacion import olvidar_usuario
+from .models import Categoria, Cliente, MovimientoDeuda, Producto, Proveedor, StockBajo, ValorizacionInventario
+from .busqueda import adoptar_version, indice_cargado
+from .catalogo import cache_productos, registro_producto
+
+
+@receiver(pre_save, sender=Producto)
+def producto_por_guardar(sender, instance, **kwargs):
+    """
+    Obtiene los valores guardados del producto si la instancia no los trae desde la base de datos
+    (por ejemplo, un producto nuevo o cargado con `only()`), para calcular la diferencia en la
+    valorización del inventario.
+    """
+    if getattr(instance, '_valorizacion_original', None) is None:
+        fila = Producto.objects.filter(codigo_producto=instance.codigo_producto).values_list(
+            'categoria_id', 'precio_costo', 'stock_actual'
+        ).first()
+        instance._valorizacion_original = fila
+
+
+@receiver(post_save, sender=Producto)
+def producto_guardado(sender, instance, update_fields=None, **kwargs):
+    """
+    Actualiza la valorización del inventario, la lista de stock bajo, el índice de búsqueda y la
+    caché de productos cuando se crea o modifica un producto.
+    """
+    anterior = instance._valorizacion_original
+    if update_fields is None or anterior is None:
+        nuevo = instance.valores_valorizacion()
+    else:
+        # Con `update_fields` solo cambian en la base de datos los campos guardados
+        guardados = {'categoria_id' if campo == 'categoria' else campo for campo in update_fields}
+        nuevo = tuple(
+            getattr(instance, campo) if campo in guardados else valor
+            for campo, valor in zip(Producto.CAMPOS_VALORIZACION, anterior)
+        )
+    ValorizacionInventario.registrar_cambio(anterior, nuevo)
+    instance._valorizacion_original = nuevo
+
+    if update_fields is None or {'stock_actual', 'stock_minimo'} & set(update_fields):
+        if 'stock_actual' in instance.__dict__ and 'stock_minimo' in instance.__dict__:
+            stocks = [(instance.codigo_producto, instance.stock_actual, instance.stock_minimo)]
+        else:
+            # Algún campo no se cargó (por ejemplo, con `only()`): se lee el valor guardado.
+            stocks = Producto.objects.filter(codigo_producto=instance.codigo_producto).values_list(
+                'codigo_producto', 'stock_actual', 'stock_minimo'
+            )
+        StockBajo.actualizar_productos(stocks)
+
+    # El índice de búsqueda y la caché se actualizan al confirmarse la transacción, para no
+    # mostrar un producto cuyo cambio todavía puede deshacerse.
+    codigo, nombre = instance.codigo_producto, instance.nombre_producto
+
+    def actualizar_indice():
+        indice = indice_cargado()
+        if indice is not None:
+            indice.actualizar(codigo, nombre)
+
+    transaction.on_commit(actualizar_indice)
+    registro = registro_producto(instance)
+    transaction.on_commit(lambda: cache_productos.guardar(registro))
+
+    # Si solo cambió el stock (por ejemplo, un ajuste de inventario), lo que no muestra el stock
+    # sigue vigente.
+    catalogo = instance.valores_catalogo()
+    if (update_fields is not None and set(update_fields) <= {'stock_actual'}) or (
+        catalogo is not None and catalogo == getattr(instance, '_catalogo_original', None)
+    ):
+        fragmentos.incrementar(fragmentos.STOCK)
+    else:
+        fragmentos.incrementar(fragmentos.CATALOGO, fragmentos.STOCK)
+    instance._catalogo_original = catalogo
+
+
+@receiver(post_delete, sender=Producto)
+def producto_eliminado(sender, instance, **kwargs):
+    """
+    Descuenta el producto de la valorización del inventario y lo quita de la lista de stock bajo,
+    del índice de búsqueda y de la caché de productos cuando se elimina.
+    """
+    anterior = getattr(instance, '_valorizacion_original', None) or instance.valores_valorizacion()
+    ValorizacionInventario.registrar_cambio(anterior, None)
+    StockBajo.actualizar(normales=[instance.codigo_producto])
+
+    codigo = instance.codigo_producto
+
+    def quitar_de_indice():
+        indice = indice_cargado()
+        if indice is not None:
+            indice.eliminar(codigo)
+
+    transaction.on_commit(quitar_de_indice)
+    cache_productos.invalidar([codigo])
+    fragmentos.incrementar(fragmentos.CATALOGO, fragmentos.STOCK)
+
+
+@receiver(fragmentos.versiones_cambiadas)
+def catalogo_cambiado(sender, anteriores, nuevas, **kwargs):
+    """
+    Evita reconstruir el índice de búsqueda del proceso por un cambio del catálogo hecho en este
+    mismo proceso, que ya se aplicó al índice (los cambios de productos, la importación) o que no
+    lo afecta (el recálculo de precios). Ver `sistemaApp.busqueda.adoptar_version`.
+    """
+    if fragmentos.CATALOGO in nuevas:
+        adoptar_version(anteriores[fragmentos.CATALOGO], nuevas[fragmentos.CATALOGO])
+
+
+@receiver(post_save, sender=Categoria)
+@receiver(post_delete, sender=Categoria)
+def categoria_modificada(sender, **kwargs):
+    """
+    Cambia la versión de las categorías en los fragmentos de plantillas en caché (ver
+    `sistemaApp.fragmentos`) cuando se crea, modifica o elimina una categoría.
+    """
+    fragmentos.incrementar(fragmentos.CATEGORIAS)
+
+
+@receiver(post_save, sender=Cliente)
+@receiver(post_delete, sender=Cliente)
+@receiver(post_save, sender=MovimientoDeuda)
+def cliente_modificado(sender, **kwargs):
+    """
+    Cambia la versión de los clientes en los fragmentos de plantillas en caché cuando se crea,
+    modifica o elimina un cliente, o cuando cambia su deuda (cada cambio registra un movimiento
+    en el libro de deudas).
+    """
+    fragmentos.incrementar(fragmentos.CLIENTES)
+
+
+@receiver(post_save, sender=User)
+@receiver(post_delete, sender=User)
+def usuario_modificado(sender, instance, **kwargs):
+    """
+    Descarta de la caché de sesiones el usuario modificado o eliminado (ver
+    `sistemaApp.autenticacion.BackendUsuariosEnCache`), incluido el cambio de contraseña o de
+    `is_active` y el último ingreso.
+    """
+    olvidar_usuario(instance.pk)
+
+
+@receiver(m2m_changed, sender=User.groups.through)
+@receiver(m2m_changed, sender=User.user_permissions.through)
+def permisos_usuario_modificados(sender, instance, action, pk_set, **kwargs):
+    """
+    Descarta de la caché de sesiones los usuarios cuyos grupos o permisos cambiaron, desde el
+    usuario (``usuario.groups.add(...)``) o desde el grupo o permiso (``grupo.user_set.add(...)``).
+    """
+    if not action.startswith('post_'):
+        return
+    if isinstance(instance, User):
+        olvidar_usuario(instance.pk)
+    else:
+        for id_usuario in pk_set or ():
+            olvidar_usuario(id_usuario)
+
+
+@receiver(post_save, sender=Proveedor)
+@receiver(post_delete, sender=Proveedor)
+def proveedor_modificado(sender, **kwargs):
+    """
+    Cambia la versión de los proveedores cuando se crea, modifica o elimina un proveedor.
+    """
+    fragmentos.incrementar(fragmentos.PROVEEDORES)
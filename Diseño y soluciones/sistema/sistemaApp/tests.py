@@ -1,3 +1,1316 @@
-from django.test import TestCase
+import csv
+import functools
+import io
+import os
+import tempfile
+import time
+import uuid
+from decimal import Decimal
+from datetime import datetime, timedelta
+from unittest import mock
+from django.contrib.auth.models import Permission, User
+from django.db import OperationalError, connection
+from django.db.models import Count, Q, Sum
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import URLPattern, get_resolver, reverse
+from django.utils import timezone
+from . import autenticacion, benchmark, busqueda, caja, cobranza, conexiones, diario_ventas, fragmentos, precios, replicas, views
+from .busqueda import CacheBusquedas, IndiceProductos
+from .carrito import AlmacenCarritoBD, AlmacenCarritoCache, Carrito
+from .catalogo import CacheProductos
+from .importacion import importar_productos
+from .instrumentacion import PRESUPUESTOS, MedicionPeticion, PresupuestoConsultasMixin, RegistroConsultas, excesos_presupuesto, registrar_consultas
+from django.core.management import CommandError, call_command
+from .models import Categoria, ClaveVenta, Cliente, DetalleVenta, DeudaPendiente, LimiteCreditoError, MovimientoDeuda, Producto, Proveedor, ReglaPrecio, ResumenVentaDiario, StockBajo, ValorizacionInventario, Venta
 
-# Create your tests here.
+
+class DatosPruebaMixin:
+    """
+    Crea un catálogo, un proveedor, un cliente y algunas ventas para las pruebas de las vistas.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.usuario = User.objects.create_superuser('admin', password='admin')
+        categoria = Categoria.objects.create(nombre='Bebidas')
+        for codigo in range(1, 21):
+            Producto.objects.create(
+                codigo_producto=codigo, nombre_producto=f'Bebida {codigo}', precio_costo=100 * codigo,
+                precio_venta=166 * codigo, stock_minimo=5, stock_actual=100, categoria=categoria,
+            )
+        Proveedor.objects.create(nombre='Distribuidora')
+        cliente = Cliente.objects.create(nombre='Ana', apellido='Pérez', limite_credito=-1, deuda=0)
+        fecha = timezone.make_aware(benchmark.FECHA_FINAL)
+        for i in range(10):
+            caja.registrar_venta(
+                Venta(metodo_pago='Efectivo', id_cliente=cliente, vendedor=cls.usuario, fecha=fecha - timedelta(hours=i)),
+                [{'codigo': 1 + i % 5, 'cantidad': 1}, {'codigo': 6, 'cantidad': 2}],
+            )
+
+    def setUp(self):
+        # Los fragmentos y usuarios guardados por otra prueba pueden tener datos que ya se deshicieron.
+        fragmentos.cache_fragmentos().clear()
+        autenticacion.cache_sesiones().clear()
+        # La sesión y el usuario de la caja quedan en caché, como después de su primera petición.
+        self.client.force_login(self.usuario)
+        autenticacion.BackendUsuariosEnCache().get_user(self.usuario.pk)
+
+    def pedir(self, peticion):
+        """
+        Ejecuta una petición de `benchmark.peticiones` y retorna la respuesta con el contenido leído.
+        """
+        if peticion.get('preparar'):
+            peticion['preparar'](self.client)
+        respuesta = getattr(self.client, peticion['metodo'])(peticion['url'], peticion['datos'])
+        if respuesta.streaming:
+            b''.join(respuesta.streaming_content)
+        return respuesta
+
+
+class PresupuestoConsultasTests(DatosPruebaMixin, PresupuestoConsultasMixin, TestCase):
+    """
+    Verifica que cada vista cumpla su presupuesto de consultas (ver `sistemaApp.instrumentacion`).
+    """
+
+    def test_todas_las_urls_tienen_presupuesto(self):
+        nombres = {
+            patron.name for patron in get_resolver().url_patterns if isinstance(patron, URLPattern) and patron.name
+        }
+        self.assertEqual(nombres - set(PRESUPUESTOS), set())
+        # Los presupuestos por método deben ser de URLs que existen.
+        por_metodo = {clave[0] for clave in PRESUPUESTOS if isinstance(clave, tuple)}
+        self.assertEqual(por_metodo - nombres, set())
+
+    def test_vistas_cumplen_presupuesto(self):
+        for peticion in benchmark.peticiones(benchmark.muestra_de_datos()):
+            with self.subTest(url=peticion['nombre']):
+                # La primera petición carga los índices y cachés del proceso; se mide la segunda.
+                self.pedir(peticion)
+                respuesta = self.pedir(peticion)
+                self.assertLess(respuesta.status_code, 500)
+                self.assertPresupuesto(respuesta)
+
+
+class InstrumentacionTests(DatosPruebaMixin, TestCase):
+    """
+    Pruebas del middleware de instrumentación.
+    """
+
+    @override_settings(DEBUG=True)
+    def test_cabeceras_en_modo_debug(self):
+        respuesta = self.client.get(reverse('GestionProductos'))
+        self.assertEqual(int(respuesta['X-Consultas']), respuesta.instrumentacion.registro.consultas)
+        self.assertIn('X-Tiempo-BD', respuesta)
+        self.assertIn('X-Tiempo-Vista', respuesta)
+        self.assertIn('Server-Timing', respuesta)
+
+    def test_sin_cabeceras_fuera_de_debug(self):
+        respuesta = self.client.get(reverse('GestionProductos'))
+        self.assertNotIn('X-Consultas', respuesta)
+        self.assertEqual(respuesta.instrumentacion.nombre_url, 'GestionProductos')
+
+    def test_mide_respuestas_por_partes(self):
+        respuesta = self.client.post(reverse('generar_reporte_ventas'), {'desde': '2024-12-31'})
+        antes = respuesta.instrumentacion.registro.consultas
+        b''.join(respuesta.streaming_content)
+        self.assertGreater(respuesta.instrumentacion.registro.consultas, antes)
+
+    def test_presupuesto_por_metodo(self):
+        presupuestos = {'Vista': {'consultas': 2}, ('Vista', 'POST'): {'consultas': 5}}
+        for metodo, excesos in (('GET', ['Vista GET: 5 consultas (presupuesto 2)']), ('POST', [])):
+            medicion = MedicionPeticion('Vista', metodo, '/vista/')
+            medicion.registro.consultas = 5
+            self.assertEqual(excesos_presupuesto(medicion, presupuestos), excesos)
+
+    def test_las_peticiones_que_exceden_su_presupuesto_fallan_en_las_pruebas(self):
+        with mock.patch.dict(PRESUPUESTOS, {'GestionProductos': {'consultas': 0}}):
+            with self.assertRaisesMessage(AssertionError, 'GestionProductos GET'):
+                self.client.get(reverse('GestionProductos'))
+
+    def test_detecta_consultas_duplicadas_y_similares(self):
+        registro = RegistroConsultas()
+        with registrar_consultas(registro):
+            Producto.objects.get(codigo_producto=1)
+            Producto.objects.get(codigo_producto=1)
+            Producto.objects.get(codigo_producto=2)
+        self.assertEqual(registro.consultas, 3)
+        self.assertEqual(registro.duplicadas, 1)
+        self.assertEqual(registro.similares, 1)
+        self.assertEqual(len(registro.mas_repetidas()), 1)
+
+    def test_cuenta_conexiones_reutilizadas(self):
+        antes = conexiones.estadisticas.como_dict().get('default', {}).get('reutilizadas', 0)
+        respuesta = self.client.get(reverse('GestionProductos'))
+        # Las pruebas corren dentro de una transacción, por lo que la conexión ya estaba abierta.
+        self.assertEqual(respuesta.instrumentacion.conexiones, {'nuevas': 0, 'reutilizadas': 1, 'fallidas': 0})
+        self.assertEqual(conexiones.estadisticas.como_dict()['default']['reutilizadas'], antes + 1)
+
+
+class CajaTests(DatosPruebaMixin, TestCase):
+    """
+    Pruebas del registro de ventas de la caja (ver `sistemaApp.caja.registrar_venta`).
+    """
+
+    def stock(self, *codigos):
+        return dict(Producto.objects.filter(codigo_producto__in=codigos).values_list('codigo_producto', 'stock_actual'))
+
+    def test_registra_las_lineas_agrupadas_y_descuenta_el_stock(self):
+        antes = self.stock(2, 5)
+        venta = caja.registrar_venta(
+            Venta(metodo_pago='Efectivo', vendedor=self.usuario, fecha=timezone.now()),
+            [{'codigo': 2, 'cantidad': 3}, {'codigo': 5, 'cantidad': 1}, {'codigo': '2', 'cantidad': 1}],
+        )
+
+        self.assertEqual(venta.total, 4 * 166 * 2 + 166 * 5)
+        self.assertEqual(venta.faltantes, [])
+        self.assertEqual(
+            list(venta.detalles.order_by('producto_id').values_list('producto_id', 'cantidad', 'precio_venta')),
+            [(2, 4, 166 * 2), (5, 1, 166 * 5)],
+        )
+        self.assertEqual(self.stock(2, 5), {2: antes[2] - 4, 5: antes[5] - 1})
+
+    def test_sin_stock_suficiente_no_registra_nada(self):
+        antes = self.stock(2, 3)
+        ventas, detalles = Venta.objects.count(), DetalleVenta.objects.count()
+
+        with self.assertRaises(caja.StockInsuficienteError) as error:
+            caja.registrar_venta(
+                Venta(metodo_pago='Efectivo', vendedor=self.usuario, fecha=timezone.now()),
+                [{'codigo': 2, 'cantidad': 1}, {'codigo': 3, 'cantidad': 1000}, {'codigo': 99, 'cantidad': 1, 'nombre': 'Soda'}],
+            )
+        self.assertEqual(error.exception.faltantes, [(3, 'Bebida 3', antes[3], 1000), (99, 'Soda', 0, 1)])
+        # El stock del producto con stock suficiente tampoco se descontó.
+        self.assertEqual(self.stock(2, 3), antes)
+        self.assertEqual((Venta.objects.count(), DetalleVenta.objects.count()), (ventas, detalles))
+
+    def test_venta_sin_productos(self):
+        with self.assertRaisesMessage(ValueError, "No hay productos agregados a la venta."):
+            caja.registrar_venta(Venta(metodo_pago='Efectivo', vendedor=self.usuario, fecha=timezone.now()), [])
+
+
+class ListaProductosTests(DatosPruebaMixin, TestCase):
+    """
+    Pruebas de la lista de productos paginada, filtrada y ordenada (vistas `gProductos` y `productos_json`).
+    """
+
+    def setUp(self):
+        super().setUp()
+        # Un producto sin categoría y con stock bajo, y empates de stock entre los demás.
+        Producto.objects.create(codigo_producto=21, nombre_producto='Agua 1L', precio_costo=50, precio_venta=90, stock_minimo=5, stock_actual=2)
+
+    def pagina(self, **parametros):
+        respuesta = self.client.get(reverse('ProductosJson'), parametros)
+        self.assertEqual(respuesta.status_code, 200)
+        return respuesta.json()
+
+    def codigos(self, datos):
+        return [producto['codigo'] for producto in datos['productos']]
+
+    def test_ordena_y_pagina(self):
+        datos = self.pagina(orden='-venta', por_pagina=5, page=2)
+        self.assertEqual(self.codigos(datos), [15, 14, 13, 12, 11])
+        self.assertEqual((datos['pagina'], datos['paginas'], datos['total']), (2, 5, 21))
+        self.assertEqual((datos['tiene_anterior'], datos['tiene_siguiente'], datos['orden']), (True, True, '-venta'))
+
+        # Los empates de stock se ordenan por código, sin repetir productos entre páginas.
+        codigos = []
+        for numero in (1, 2, 3):
+            codigos += self.codigos(self.pagina(orden='stock', por_pagina=8, page=numero))
+        self.assertEqual(codigos, list(Producto.objects.order_by('stock_actual', 'codigo_producto').values_list('codigo_producto', flat=True)))
+
+    def test_filtra(self):
+        self.assertEqual(
+            self.codigos(self.pagina(q='1')),
+            list(Producto.objects.filter(Q(nombre_producto__icontains='1') | Q(codigo_producto__startswith='1')).order_by('codigo_producto').values_list('codigo_producto', flat=True)),
+        )
+        datos = self.pagina(categoria='sin')
+        self.assertEqual(datos['productos'], [{
+            'codigo': 21, 'nombre': 'Agua 1L', 'precio_costo': 50, 'precio_venta': 90, 'stock_minimo': 5, 'stock_actual': 2, 'categoria': None,
+        }])
+        self.assertEqual(self.codigos(self.pagina(stock_bajo='1')), [21])
+        self.assertEqual(self.pagina(categoria=Categoria.objects.get().pk)['total'], 20)
+
+        for parametros in ({'orden': 'precio'}, {'categoria': 'x'}):
+            with self.subTest(parametros=parametros):
+                respuesta = self.client.get(reverse('ProductosJson'), parametros)
+                self.assertEqual(respuesta.status_code, 400)
+                self.assertEqual(self.client.get(reverse('GestionProductos'), parametros).context['mensaje'], "Los filtros ingresados no son válidos.")
+
+    def test_la_pagina_en_cache_sigue_los_cambios(self):
+        respuesta = self.client.get(reverse('GestionProductos'), {'orden': 'nombre', 'por_pagina': 3})
+        self.assertEqual([producto.pk for producto in respuesta.context['productos']], [21, 1, 10])
+        self.assertEqual(respuesta.context['total_productos'], 21)
+        self.assertEqual(self.codigos(self.pagina(orden='nombre', por_pagina=3)), [21, 1, 10])
+
+        # Cambiar el nombre cambia la versión del catálogo: la página guardada ya no se usa.
+        producto = Producto.objects.get(pk=20)
+        producto.nombre_producto = 'Aceite'
+        with self.captureOnCommitCallbacks(execute=True):
+            producto.save()
+        self.assertEqual(self.codigos(self.pagina(orden='nombre', por_pagina=3)), [20, 21, 1])
+
+        # El stock que muestra la página en caché está al día aunque la venta no cambie el orden.
+        caja.registrar_venta(Venta(metodo_pago='Efectivo', vendedor=self.usuario, fecha=timezone.now()), [{'codigo': 1, 'cantidad': 5}])
+        datos = self.pagina(orden='nombre', por_pagina=3)
+        self.assertEqual(datos['productos'][2]['stock_actual'], Producto.objects.get(pk=1).stock_actual)
+
+
+class ImportacionProductosTests(DatosPruebaMixin, TestCase):
+    """
+    Pruebas de la importación masiva de productos (ver `sistemaApp.importacion`).
+    """
+
+    def importar(self, contenido, **kwargs):
+        return importar_productos(io.BytesIO(contenido.encode('utf-8')), 'productos.csv', **kwargs)
+
+    def test_crea_actualiza_y_reporta_errores(self):
+        resultado = self.importar(
+            "codigo;nombre;costo;stock minimo;stock actual;categoria\n"
+            "1;Bebida renombrada;4500;5;50;Bebidas\n"
+            "100;Snack;1000;2;10;Snacks\n"
+            "abc;Sin código;10;1;1;\n"
+            "101;Sin categoría;10;1;1;\n",
+            tamano_lote=2,
+        )
+        self.assertEqual((resultado.creados, resultado.actualizados), (1, 1))
+        self.assertEqual([numero for numero, _ in resultado.errores], [3, 4])
+
+        producto = Producto.objects.get(codigo_producto=1)
+        self.assertEqual(producto.nombre_producto, 'Bebida renombrada')
+        self.assertEqual(producto.precio_venta, precios.calcular_precio_venta(4500))
+        self.assertFalse(Producto.objects.filter(codigo_producto=100).exists())
+
+    def test_crea_categorias_y_mantiene_la_valorizacion(self):
+        self.importar(
+            "codigo_producto,nombre_producto,precio_costo,stock_minimo,stock_actual,categoria\n"
+            "2,Bebida 2,150,5,40,Snacks\n"
+            "200,Galletas,300,1,7,Snacks\n",
+            crear_categorias=True,
+        )
+        snacks = Categoria.objects.get(nombre='Snacks')
+        self.assertEqual(Producto.objects.get(codigo_producto=2).categoria_id, snacks.categoria_id)
+        fila = ValorizacionInventario.por_categoria()[snacks.categoria_id]
+        self.assertEqual((fila.cantidad_productos, fila.unidades, fila.valor_costo), (2, 47, 150 * 40 + 300 * 7))
+
+
+class ReglasPrecioTests(DatosPruebaMixin, TestCase):
+    """
+    Pruebas de las reglas de precio y del recálculo de precios (ver `sistemaApp.precios`).
+    """
+
+    def test_la_regla_mas_especifica_define_cada_porcentaje(self):
+        categoria = Categoria.objects.get(nombre='Bebidas')
+        ReglaPrecio.objects.create(tipo=ReglaPrecio.GLOBAL, iva=Decimal('21'))
+        ReglaPrecio.objects.create(tipo=ReglaPrecio.CATEGORIA, clave=categoria.pk, margen=Decimal('12.5'))
+        ReglaPrecio.objects.create(tipo=ReglaPrecio.PRODUCTO, clave=1, iva=Decimal('0'))
+
+        reglas = precios.ReglasPrecio.cargar()
+        self.assertEqual(reglas.porcentajes(1, categoria.pk), (Decimal('12.5'), Decimal('0')))
+        self.assertEqual(reglas.porcentajes(2, categoria.pk), (Decimal('12.5'), Decimal('21')))
+        self.assertEqual(reglas.porcentajes(2, None), (precios.MARGEN, Decimal('21')))
+        self.assertEqual(reglas.precio_venta(4500, 2, None), 4500 * 140 * 121 // 10_000)
+
+    def test_recalcula_en_la_base_igual_que_en_python(self):
+        ReglaPrecio.objects.create(tipo=ReglaPrecio.PRODUCTO, clave=3, margen=Decimal('33.33'))
+        Producto.objects.filter(codigo_producto=4).update(precio_costo=4500)
+
+        reglas = precios.ReglasPrecio.cargar()
+        esperados = {
+            producto.codigo_producto: reglas.precio_venta(producto.precio_costo, producto.codigo_producto, producto.categoria_id)
+            for producto in Producto.objects.all()
+        }
+        simulacion = precios.recalcular_precios(simular=True)
+        self.assertEqual({codigo: nuevo for codigo, _, _, nuevo in simulacion.cambios}, {
+            codigo: precio for codigo, precio in esperados.items()
+            if precio != Producto.objects.get(codigo_producto=codigo).precio_venta
+        })
+        self.assertEqual(esperados[4], 4500 * 140 * 119 // 10_000)
+        self.assertEqual(Producto.objects.get(codigo_producto=4).precio_venta, 664)
+
+        self.assertEqual(precios.recalcular_precios().modificados, simulacion.modificados)
+        for producto in Producto.objects.all():
+            self.assertEqual(
+                producto.precio_venta,
+                reglas.precio_venta(producto.precio_costo, producto.codigo_producto, producto.categoria_id),
+            )
+        self.assertEqual(precios.recalcular_precios(simular=True).modificados, 0)
+
+    def test_el_recalculo_llega_a_la_cache_de_otros_procesos(self):
+        # Caché de productos de otro proceso del servidor, que no recibe las señales de este.
+        otra = CacheProductos(capacidad=10)
+        self.assertEqual(otra.obtener(4)['precio_venta'], 664)
+        Producto.objects.filter(codigo_producto=4).update(precio_costo=4500)
+        with self.captureOnCommitCallbacks(execute=True):
+            precios.recalcular_precios()
+        self.assertEqual(otra.obtener(4)['precio_venta'], Producto.objects.get(codigo_producto=4).precio_venta)
+        self.assertNotEqual(otra.obtener(4)['precio_venta'], 664)
+
+
+class HistorialVentasTests(DatosPruebaMixin, TestCase):
+    """
+    Pruebas de la paginación por cursor y de los totales del historial de ventas.
+    """
+
+    def recorrer(self, **filtros):
+        """
+        Recorre todas las páginas del historial y retorna los ids de las ventas, en orden.
+        """
+        ids, cursor = [], None
+        while True:
+            respuesta = self.client.get(reverse('HistorialVentas'), {**filtros, **({'despues': cursor} if cursor else {})})
+            ids += [venta.id_venta for venta in respuesta.context['ventas']]
+            cursor = respuesta.context['siguiente']
+            if cursor is None:
+                return ids, respuesta
+
+    @mock.patch.object(views, 'VENTAS_POR_PAGINA', 3)
+    def test_pagina_las_ventas_con_la_misma_fecha(self):
+        # Cinco ventas en el mismo microsegundo: el cursor desempata por id entre páginas.
+        fecha = timezone.make_aware(benchmark.FECHA_FINAL).replace(microsecond=123456)
+        for codigo in range(1, 6):
+            caja.registrar_venta(
+                Venta(metodo_pago='Tarjeta', id_cliente=Cliente.objects.get(), vendedor=self.usuario, fecha=fecha),
+                [{'codigo': codigo, 'cantidad': 1}],
+            )
+
+        ids, _ = self.recorrer()
+        esperados = list(Venta.objects.order_by('-fecha', '-id_venta').values_list('id_venta', flat=True))
+        self.assertEqual(ids, esperados)
+
+        ids, respuesta = self.recorrer(metodo_pago='Tarjeta')
+        tarjeta = Venta.objects.filter(metodo_pago='Tarjeta')
+        self.assertEqual(ids, sorted(tarjeta.values_list('id_venta', flat=True), reverse=True))
+        self.assertEqual(respuesta.context['contar_ventas'], 5)
+        self.assertEqual(respuesta.context['sumar_totales'], tarjeta.aggregate(suma=Sum('total'))['suma'])
+
+    def test_el_cursor_conserva_los_microsegundos(self):
+        venta = Venta(id_venta=7, fecha=timezone.make_aware(benchmark.FECHA_FINAL).replace(microsecond=1))
+        self.assertEqual(views._decodificar_cursor(views._codificar_cursor(venta)), (venta.fecha, 7))
+
+        respuesta = self.client.get(reverse('HistorialVentas'), {'despues': 'x_1'})
+        self.assertEqual(respuesta.context['mensaje'], "Los filtros ingresados no son válidos.")
+        self.assertEqual(respuesta.context['ventas'], [])
+
+
+class ReporteVentasTests(DatosPruebaMixin, TestCase):
+    """
+    Pruebas del reporte de ventas que se envía por partes (vista `generar_reporte_ventas`).
+    """
+
+    def vender(self, metodo_pago, *fechas):
+        for fecha in fechas:
+            caja.registrar_venta(
+                Venta(metodo_pago=metodo_pago, id_cliente=Cliente.objects.get(), vendedor=self.usuario, fecha=timezone.make_aware(fecha)),
+                [{'codigo': 7, 'cantidad': 1}],
+            )
+
+    def test_el_reporte_incluye_el_rango_y_sus_totales(self):
+        # Cuatro ventas en el mismo instante, los bordes del rango y ventas fuera de él.
+        self.vender('Tarjeta', *[datetime(2024, 12, 31, 10, 0, 0, 500000)] * 4)
+        self.vender('Transferencia', datetime(2024, 12, 30), datetime(2024, 12, 29, 23, 59, 59, 999999), datetime(2025, 1, 1))
+
+        # Lotes de 4 ventas, para que el reporte tenga varios lotes y cortes entre ventas iguales
+        # (cada lote es una consulta más que las del presupuesto).
+        lotes = mock.patch.object(views, '_ventas_por_lotes', functools.partial(views._ventas_por_lotes, tamano=4))
+        presupuesto = mock.patch.dict(PRESUPUESTOS, {('generar_reporte_ventas', 'POST'): {'consultas': 8}})
+        with lotes, presupuesto:
+            respuesta = self.client.post(reverse('generar_reporte_ventas'), {'desde': '2024-12-30', 'hasta': '2024-12-31'})
+            contenido = b''.join(respuesta.streaming_content).decode()
+
+        ventas = Venta.objects.filter(
+            fecha__gte=timezone.make_aware(datetime(2024, 12, 30)), fecha__lt=timezone.make_aware(datetime(2025, 1, 1)),
+        )
+        lineas = contenido.splitlines()
+        self.assertEqual(
+            [int(linea.split(',')[0].removeprefix('ID: ')) for linea in lineas if linea.startswith('ID: ')],
+            list(ventas.order_by('fecha', 'id_venta').values_list('id_venta', flat=True)),
+        )
+        self.assertEqual(ventas.count(), 15)
+        self.assertIn("Total de Ventas: 15", lineas)
+        self.assertIn(f"Suma Total: ${ventas.aggregate(suma=Sum('total'))['suma']}", lineas)
+        for fila in ventas.values('metodo_pago').annotate(cantidad=Count('id_venta'), suma=Sum('total')):
+            self.assertIn(f"{fila['metodo_pago']}: {fila['cantidad']} ventas, ${fila['suma']}", lineas)
+
+    def test_rechaza_rangos_invalidos(self):
+        for datos in ({'desde': '31-12-2024'}, {'desde': '2024-12-31', 'hasta': '2024-12-30'}, {}):
+            with self.subTest(datos=datos):
+                self.assertEqual(self.client.post(reverse('generar_reporte_ventas'), datos).status_code, 400)
+
+
+class ResumenVentasTests(DatosPruebaMixin, TestCase):
+    """
+    Pruebas del resumen diario de ventas (`ResumenVentaDiario`) y del comando que lo reconstruye.
+    """
+
+    def setUp(self):
+        super().setUp()
+        # Una venta sin vendedor y una antes de la medianoche local, que en UTC ya es el día siguiente.
+        for vendedor, fecha in ((None, datetime(2024, 12, 30, 12)), (self.usuario, datetime(2024, 12, 31, 23, 30))):
+            caja.registrar_venta(
+                Venta(metodo_pago='Tarjeta', id_cliente=Cliente.objects.get(), vendedor=vendedor, fecha=timezone.make_aware(fecha)),
+                [{'codigo': 4, 'cantidad': 2}],
+            )
+
+    def esperado(self):
+        """
+        Resumen calculado venta por venta: ``{(dia, metodo_pago, clave_vendedor): (cantidad, total)}``.
+        """
+        grupos = {}
+        for fecha, metodo_pago, vendedor, total in Venta.objects.values_list('fecha', 'metodo_pago', 'vendedor_id', 'total'):
+            clave = (timezone.localdate(fecha), metodo_pago, vendedor or 0)
+            cantidad, suma = grupos.get(clave, (0, 0))
+            grupos[clave] = (cantidad + 1, suma + total)
+        return grupos
+
+    def resumen(self):
+        return {
+            (fecha, metodo_pago, vendedor): (cantidad, total)
+            for fecha, metodo_pago, vendedor, cantidad, total in ResumenVentaDiario.objects.values_list(
+                'fecha', 'metodo_pago', 'clave_vendedor', 'cantidad_ventas', 'total'
+            )
+        }
+
+    def test_la_caja_mantiene_el_resumen(self):
+        resumen = self.resumen()
+        self.assertEqual(resumen, self.esperado())
+        self.assertIn((datetime(2024, 12, 31).date(), 'Tarjeta', self.usuario.pk), resumen)
+        self.assertIn((datetime(2024, 12, 30).date(), 'Tarjeta', 0), resumen)
+
+    def test_reconstruir_corrige_el_resumen(self):
+        esperado = self.esperado()
+        ResumenVentaDiario.objects.filter(metodo_pago='Tarjeta').delete()
+        ResumenVentaDiario.objects.filter(metodo_pago='Efectivo').update(cantidad_ventas=1, total=1)
+        ResumenVentaDiario.objects.create(fecha='2024-12-29', metodo_pago='Deuda', clave_vendedor=0, cantidad_ventas=3, total=9)
+
+        # Con un rango solo se reconstruyen sus días.
+        call_command('reconstruir_resumen_ventas', desde='2024-12-30', hasta='2024-12-31', stdout=io.StringIO())
+        resumen = self.resumen()
+        self.assertEqual(resumen.pop((datetime(2024, 12, 29).date(), 'Deuda', 0)), (3, 9))
+        self.assertEqual(resumen, esperado)
+
+        call_command('reconstruir_resumen_ventas', stdout=io.StringIO())
+        self.assertEqual(self.resumen(), esperado)
+
+    def test_reconstruir_valida_las_fechas(self):
+        with self.assertRaisesMessage(CommandError, "AAAA-MM-DD"):
+            call_command('reconstruir_resumen_ventas', desde='31/12/2024', stdout=io.StringIO())
+
+
+class CacheBusquedasTests(SimpleTestCase):
+    """
+    Pruebas de la caché de resultados del buscador de la caja (ver `sistemaApp.busqueda`).
+    """
+
+    def setUp(self):
+        self.indice = IndiceProductos()
+        self.indice.cargar(
+            [(codigo, f'Bebida {codigo}') for codigo in range(1, 40)]
+            + [(100 + codigo, f'Galletas {sabor}') for codigo, sabor in enumerate(['Vainilla', 'Chocolate', 'Limón'])]
+            + [(200, 'Agua con gas'), (201, 'Jugo sabor a bebida')]
+        )
+        self.cache = CacheBusquedas(capacidad=50, segundos=60)
+
+    def test_las_consultas_mas_largas_se_responden_desde_el_prefijo(self):
+        for texto in ['bebida 1', 'galletas limon', 'ebi', '12', 'gal ch', 'agua c']:
+            for largo in range(1, len(texto) + 1):
+                with self.subTest(consulta=texto[:largo]):
+                    esperado = self.indice.buscar(texto[:largo], limite=10)
+                    self.assertEqual(self.cache.buscar(self.indice, texto[:largo], limite=10), esperado)
+                    self.assertEqual(self.cache.buscar(self.indice, texto[:largo], limite=10), esperado)
+        self.assertGreater(self.cache.estadisticas['prefijos'], self.cache.estadisticas['fallos'])
+
+    def test_los_cambios_de_productos_invalidan_la_cache(self):
+        self.assertEqual(self.cache.buscar(self.indice, 'soda'), [])
+        version = self.indice.version
+        self.indice.actualizar(1, 'Bebida 1')
+        self.assertEqual(self.indice.version, version)
+
+        self.indice.actualizar(300, 'Soda limón')
+        self.assertEqual(self.cache.buscar(self.indice, 'soda'), [(300, 'Soda limón')])
+        self.indice.eliminar(300)
+        self.assertEqual(self.cache.buscar(self.indice, 'soda'), [])
+
+
+class IndiceBusquedaTests(DatosPruebaMixin, TestCase):
+    """
+    Pruebas del índice de búsqueda de productos del proceso (ver `sistemaApp.busqueda`).
+    """
+
+    def test_los_cambios_llegan_al_indice_al_confirmarse(self):
+        indice = busqueda.obtener_indice()
+        with self.captureOnCommitCallbacks(execute=True):
+            producto = Producto.objects.create(
+                codigo_producto=500, nombre_producto='Soda limón', precio_costo=10, precio_venta=20,
+                stock_minimo=1, stock_actual=5, categoria=Categoria.objects.get(),
+            )
+            self.assertEqual(indice.buscar('soda'), [])
+        self.assertEqual(indice.buscar('soda'), [(500, 'Soda limón')])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            producto.delete()
+            self.assertEqual(indice.buscar('soda'), [(500, 'Soda limón')])
+        self.assertEqual(indice.buscar('soda'), [])
+
+    def buscar(self, texto):
+        respuesta = self.client.get(reverse('buscar_productos'), {'q': texto})
+        return [producto['nombre'] for producto in respuesta.json()['productos']]
+
+    def test_la_importacion_por_comando_llega_al_buscador(self):
+        self.assertEqual(self.buscar('soda'), [])
+        with tempfile.TemporaryDirectory() as directorio:
+            ruta = os.path.join(directorio, 'productos.csv')
+            with open(ruta, 'w', encoding='utf-8') as archivo:
+                archivo.write(
+                    "codigo_producto,nombre_producto,precio_costo,stock_minimo,stock_actual,categoria\n"
+                    "500,Soda limón,10,1,5,Bebidas\n"
+                )
+            with self.captureOnCommitCallbacks(execute=True):
+                call_command('importar_productos', ruta, stdout=io.StringIO())
+        self.assertEqual(self.buscar('soda'), ['Soda limón'])
+
+    def test_los_cambios_de_otro_proceso_reconstruyen_el_indice(self):
+        self.assertEqual(self.buscar('gaseosa'), [])
+        indice = busqueda.indice_cargado()
+        # Otro proceso renombra el producto y cambia la versión del catálogo: este proceso no
+        # recibe sus señales, solo ve la versión nueva en la caché compartida.
+        Producto.objects.filter(codigo_producto=3).update(nombre_producto='Gaseosa 3')
+        fragmentos.cache_fragmentos().set('version:catalogo', time.time_ns(), None)
+        self.assertEqual(self.buscar('gaseosa'), ['Gaseosa 3'])
+        self.assertIsNot(busqueda.indice_cargado(), indice)
+
+        # Un cambio de este proceso se aplica al índice sin reconstruirlo.
+        indice = busqueda.indice_cargado()
+        producto = Producto.objects.get(codigo_producto=4)
+        producto.nombre_producto = 'Gaseosa 4'
+        with self.captureOnCommitCallbacks(execute=True):
+            producto.save()
+        self.assertEqual(self.buscar('gaseosa'), ['Gaseosa 3', 'Gaseosa 4'])
+        self.assertIs(busqueda.indice_cargado(), indice)
+
+
+class StockBajoTests(DatosPruebaMixin, TestCase):
+    """
+    Pruebas de la lista de stock bajo y del reporte de reposición (ver `sistemaApp.reposicion`).
+    """
+
+    def codigos(self):
+        return set(StockBajo.objects.values_list('producto_id', flat=True))
+
+    def test_la_venta_y_las_modificaciones_mantienen_la_lista(self):
+        cliente = Cliente.objects.get()
+        caja.registrar_venta(
+            Venta(metodo_pago='Efectivo', id_cliente=cliente, vendedor=self.usuario, fecha=timezone.now()),
+            [{'codigo': 7, 'cantidad': 95}, {'codigo': 8, 'cantidad': 1}],
+        )
+        self.assertEqual(self.codigos(), {7})
+
+        producto = Producto.objects.get(codigo_producto=7)
+        producto.stock_actual = 50
+        producto.save()
+        producto = Producto.objects.only('codigo_producto').get(codigo_producto=8)
+        producto.stock_minimo = 200
+        producto.save(update_fields=['stock_minimo'])
+        self.assertEqual(self.codigos(), {8})
+
+        Producto.objects.get(codigo_producto=8).delete()
+        self.assertEqual(self.codigos(), set())
+
+    def test_reporte_agrupado_con_cantidad_sugerida(self):
+        caja.registrar_venta(
+            Venta(metodo_pago='Efectivo', id_cliente=Cliente.objects.get(), vendedor=self.usuario, fecha=timezone.now()),
+            [{'codigo': 6, 'cantidad': 30}],
+        )
+        Producto.objects.filter(codigo_producto__in=[6, 9]).update(stock_actual=3)
+        StockBajo.actualizar(bajos=[6, 9])
+
+        respuesta = self.client.get(reverse('StockBajoJson'))
+        self.assertEqual(respuesta.json()['total'], 2)
+        grupo, = respuesta.json()['categorias']
+        self.assertEqual(grupo['categoria'], 'Bebidas')
+        sugeridos = {producto['codigo']: producto['sugerido'] for producto in grupo['productos']}
+        # El producto 6 vendió 30 unidades en los últimos 30 días (14 en dos semanas); el 9 no tiene
+        # ventas recientes y se repone hasta el doble del stock mínimo.
+        self.assertEqual(sugeridos, {6: 5 + 14 - 3, 9: 5 + 5 - 3})
+        self.assertEqual(self.client.get(reverse('StockBajoJson'), {'categoria': 'x'}).status_code, 400)
+
+
+class DiarioVentasTests(DatosPruebaMixin, TestCase):
+    """
+    Pruebas del diario local de ventas y de su sincronización (ver `sistemaApp.diario_ventas`).
+    """
+
+    def setUp(self):
+        super().setUp()
+        directorio = tempfile.TemporaryDirectory()
+        self.addCleanup(directorio.cleanup)
+        ajustes = override_settings(VENTAS_MODO='diferido', VENTAS_DIARIO=os.path.join(directorio.name, 'diario.sqlite3'))
+        ajustes.enable()
+        self.addCleanup(ajustes.disable)
+
+    def cobrar(self, metodo_pago='Efectivo', **cantidades):
+        for codigo, cantidad in cantidades.items():
+            self.client.post(reverse('AgregarProducto'), {'producto': codigo[1:], 'cantidad': cantidad})
+        return self.client.post(reverse('RegistrarVenta'), {'metodo_pago': metodo_pago, 'id_cliente': Cliente.objects.get().pk})
+
+    def test_venta_diferida_se_registra_una_vez_con_conflictos(self):
+        ventas = Venta.objects.count()
+        self.assertEqual(self.cobrar(p1=60).status_code, 302)
+        self.assertEqual(self.cobrar(p1=30, p2=1).status_code, 302)
+        self.assertEqual(Venta.objects.count(), ventas)
+
+        # Otra caja vendió parte del stock mientras las ventas estaban en el diario.
+        Producto.objects.filter(codigo_producto=1).update(stock_actual=70)
+        resultado = diario_ventas.sincronizar()
+        self.assertEqual((resultado.sincronizadas, len(resultado.conflictos)), (2, 1))
+        self.assertEqual(Venta.objects.count(), ventas + 2)
+        self.assertEqual(Producto.objects.get(codigo_producto=1).stock_actual, -20)
+        self.assertEqual(ClaveVenta.objects.exclude(conflictos=[]).get().conflictos, [[1, 'Bebida 1', 10, 30]])
+
+        # Si el diario vuelve a enviar las mismas ventas, no se duplican.
+        with diario_ventas.obtener_diario()._conectar() as conexion:
+            conexion.execute("UPDATE venta_pendiente SET estado = ?", (diario_ventas.PENDIENTE,))
+        resultado = diario_ventas.sincronizar()
+        self.assertEqual((resultado.sincronizadas, resultado.repetidas), (0, 2))
+        self.assertEqual(Venta.objects.count(), ventas + 2)
+
+    def test_venta_rechazada_se_puede_reintentar(self):
+        # Una venta a crédito que quedó en el diario antes de que se dejaran de guardar en él.
+        Cliente.objects.update(limite_credito=100)
+        fecha = timezone.now() - timedelta(days=40)
+        venta = Venta(metodo_pago='Deuda', id_cliente=Cliente.objects.get(), vendedor=self.usuario, fecha=fecha)
+        diario_ventas.obtener_diario().agregar(
+            uuid.uuid4(), diario_ventas._datos_venta(venta, [{'codigo': 3, 'cantidad': 1, 'precio_venta': 498}])
+        )
+        resultado = diario_ventas.sincronizar()
+        self.assertEqual(len(resultado.rechazadas), 1)
+        self.assertEqual(diario_ventas.obtener_diario().contar(), {diario_ventas.RECHAZADA: 1})
+
+        Cliente.objects.update(limite_credito=-1)
+        self.assertEqual(diario_ventas.obtener_diario().reintentar_rechazadas(), 1)
+        self.assertEqual(diario_ventas.sincronizar().sincronizadas, 1)
+        # La deuda cuenta su antigüedad desde la venta, no desde la sincronización.
+        cargo = MovimientoDeuda.objects.get(tipo=MovimientoDeuda.CARGO)
+        self.assertEqual(cargo.fecha, fecha)
+        self.assertEqual(
+            DeudaPendiente.objects.get(cliente=cargo.cliente_id, fecha=timezone.localdate(fecha)).monto, 498
+        )
+
+    def test_las_ventas_a_credito_no_se_guardan_en_el_diario(self):
+        # En modo diferido la venta a crédito se registra en la base, que verifica el límite.
+        Cliente.objects.update(limite_credito=100)
+        ventas = Venta.objects.count()
+        respuesta = self.cobrar('Deuda', p3=1)
+        self.assertEqual(respuesta.status_code, 200)
+        self.assertIsInstance(respuesta.context['mensaje'], str)
+        Cliente.objects.update(limite_credito=-1)
+        self.assertEqual(self.cobrar('Deuda').status_code, 302)
+        self.assertEqual(Venta.objects.count(), ventas + 1)
+        self.assertEqual(diario_ventas.obtener_diario().contar(), {})
+
+        # Sin conexión, la caja la rechaza en lugar de guardarla.
+        with override_settings(VENTAS_MODO='respaldo'):
+            self.fallar_una_vez(OperationalError(2006, 'MySQL server has gone away'))
+            respuesta = self.cobrar('Deuda', p3=1)
+        self.assertEqual(respuesta.status_code, 200)
+        self.assertIn("sin conexión", respuesta.context['mensaje'])
+        self.assertEqual((Venta.objects.count(), diario_ventas.obtener_diario().contar()), (ventas + 1, {}))
+
+    def fallar_una_vez(self, error):
+        """
+        Hace que el próximo registro de una venta del diario falle con `error`, como si la
+        conexión se cortara en medio de la transacción.
+        """
+        registrar = diario_ventas.registrar_con_clave
+        errores = [error]
+
+        def registrar_con_error(*args, **kwargs):
+            if errores:
+                raise errores.pop()
+            return registrar(*args, **kwargs)
+
+        parche = mock.patch.object(diario_ventas, 'registrar_con_clave', registrar_con_error)
+        parche.start()
+        self.addCleanup(parche.stop)
+
+    def test_la_conexion_cortada_se_cierra_y_la_venta_se_registra_despues(self):
+        ventas = Venta.objects.count()
+        self.cobrar(p1=1)
+        self.cobrar(p2=1)
+        self.fallar_una_vez(OperationalError(2006, 'MySQL server has gone away'))
+        with mock.patch.object(diario_ventas, 'cerrar_conexiones_vencidas', wraps=diario_ventas.cerrar_conexiones_vencidas) as cerrar:
+            resultado = diario_ventas.sincronizar()
+        self.assertIsNotNone(resultado.error)
+        # Al comenzar el lote y después del error.
+        self.assertEqual(cerrar.call_count, 2)
+        self.assertEqual(diario_ventas.obtener_diario().contar(), {diario_ventas.PENDIENTE: 2})
+
+        resultado = diario_ventas.sincronizar()
+        self.assertEqual((resultado.error, resultado.sincronizadas), (None, 2))
+        self.assertEqual(Venta.objects.count(), ventas + 2)
+
+    def test_los_bloqueos_no_se_toman_como_falta_de_conexion(self):
+        self.cobrar(p1=1)
+        self.fallar_una_vez(OperationalError(1213, 'Deadlock found when trying to get lock'))
+        with self.assertRaises(OperationalError):
+            diario_ventas.sincronizar()
+        self.assertEqual(diario_ventas.obtener_diario().contar(), {diario_ventas.PENDIENTE: 1})
+        self.assertEqual(diario_ventas.sincronizar().sincronizadas, 1)
+
+    @override_settings(VENTAS_MODO='respaldo')
+    def test_la_caja_guarda_en_el_diario_solo_si_no_hay_conexion(self):
+        ventas = Venta.objects.count()
+        self.fallar_una_vez(OperationalError(2013, 'Lost connection to MySQL server during query'))
+        self.assertEqual(self.cobrar(p1=1).status_code, 302)
+        self.assertEqual((Venta.objects.count(), diario_ventas.obtener_diario().contar()), (ventas, {diario_ventas.PENDIENTE: 1}))
+
+        self.fallar_una_vez(OperationalError(1205, 'Lock wait timeout exceeded'))
+        with self.assertRaises(OperationalError):
+            self.cobrar(p1=1)
+        self.assertEqual(diario_ventas.obtener_diario().contar(), {diario_ventas.PENDIENTE: 1})
+
+    @override_settings(VENTAS_MODO='respaldo')
+    def test_la_caja_cobra_con_la_base_caida(self):
+        # Un cobro con la base disponible deja la sesión, el usuario y el cliente en caché.
+        self.assertEqual(self.cobrar(p1=1).status_code, 302)
+        ventas = Venta.objects.count()
+        cliente = Cliente.objects.get().pk
+        self.client.post(reverse('AgregarProducto'), {'producto': 2, 'cantidad': 1})
+
+        def caida(execute, sql, params, many, context):
+            raise OperationalError(2006, 'MySQL server has gone away')
+
+        with connection.execute_wrapper(caida):
+            respuesta = self.client.post(
+                reverse('RegistrarVenta'), {'metodo_pago': 'Efectivo', 'id_cliente': cliente}
+            )
+        self.assertEqual(respuesta.status_code, 302)
+        self.assertEqual(Venta.objects.count(), ventas)
+        self.assertEqual(diario_ventas.obtener_diario().contar(), {diario_ventas.PENDIENTE: 1})
+        self.assertEqual(diario_ventas.sincronizar().sincronizadas, 1)
+
+
+class UsuariosEnCacheTests(DatosPruebaMixin, TestCase):
+    """
+    Pruebas de la caché de los usuarios de las sesiones (ver `sistemaApp.autenticacion`).
+    """
+
+    def guardado(self):
+        return autenticacion.cache_sesiones().get(f'usuario:{self.usuario.pk}')
+
+    def test_guarda_solo_los_campos_de_la_peticion(self):
+        self.client.get(reverse('Home'))
+        registro = self.guardado()
+        self.assertEqual(set(registro), set(autenticacion.CAMPOS_USUARIO) | {'hash_sesion'})
+        self.assertNotIn(self.usuario.password, registro.values())
+
+        # El usuario armado desde la caché lee de la base los campos que no se guardan, y al
+        # guardarlo solo escribe los cargados.
+        User.objects.filter(pk=self.usuario.pk).update(email='admin@ejemplo.cl')
+        usuario = autenticacion.BackendUsuariosEnCache().get_user(self.usuario.pk)
+        self.assertTrue(usuario.is_superuser)
+        usuario.set_password('nueva')
+        usuario.save()
+        usuario = User.objects.get(pk=self.usuario.pk)
+        self.assertEqual(usuario.email, 'admin@ejemplo.cl')
+        self.assertTrue(usuario.check_password('nueva'))
+
+    def test_los_cambios_del_usuario_lo_descartan(self):
+        self.client.get(reverse('Home'))
+        self.usuario.user_permissions.add(Permission.objects.get(codename='view_user'))
+        self.assertIsNone(self.guardado())
+
+        self.client.get(reverse('Home'))
+        self.assertIsNotNone(self.guardado())
+        self.usuario.is_active = False
+        self.usuario.save()
+        self.assertIsNone(self.guardado())
+        self.assertEqual(self.client.get(reverse('Home')).status_code, 302)
+
+    def test_el_cambio_de_contrasena_cierra_las_sesiones(self):
+        self.assertEqual(self.client.get(reverse('Home')).status_code, 200)
+        usuario = User.objects.get(pk=self.usuario.pk)
+        usuario.set_password('otra')
+        usuario.save()
+        self.assertEqual(self.client.get(reverse('Home')).status_code, 302)
+
+
+@override_settings(REPLICA_ALIAS='default', REPLICA_VERIFICACION=0)
+class ReplicaTests(DatosPruebaMixin, TestCase):
+    """
+    Pruebas del router de la réplica de lectura (ver `sistemaApp.replicas`). La base de pruebas hace
+    de réplica, por lo que se verifica la base elegida para cada petición.
+    """
+
+    def test_vistas_de_lectura_usan_la_replica(self):
+        self.assertEqual(self.client.get(reverse('GestionProductos')).wsgi_request.alias_lectura, 'default')
+        self.assertIsNone(self.client.get(reverse('Home')).wsgi_request.alias_lectura)
+
+    def test_lee_de_la_principal_despues_de_escribir(self):
+        respuesta = self.client.post(reverse('CrearDepartamento'), {'nombre': 'Lácteos'})
+        self.assertIn(replicas.COOKIE_ESCRITURA, respuesta.cookies)
+        self.assertIsNone(self.client.get(reverse('GestionProductos')).wsgi_request.alias_lectura)
+
+    @override_settings(REPLICA_RETRASO_MAXIMO=-1)
+    def test_lee_de_la_principal_si_la_replica_esta_atrasada(self):
+        self.assertIsNone(self.client.get(reverse('GestionProductos')).wsgi_request.alias_lectura)
+
+
+class CarritoTests(DatosPruebaMixin, TestCase):
+    """
+    Pruebas del carrito de la caja y de sus almacenes (ver `sistemaApp.carrito`).
+    """
+
+    def producto(self, codigo, precio=None):
+        return {'codigo': codigo, 'nombre': f'Bebida {codigo}', 'precio_venta': precio or 166 * codigo, 'stock_actual': 100}
+
+    def test_suma_las_cantidades_y_mantiene_el_total(self):
+        for almacen in (AlmacenCarritoCache(), AlmacenCarritoBD()):
+            with self.subTest(almacen=type(almacen).__name__):
+                clave = str(uuid.uuid4())
+                carrito = Carrito(clave, almacen)
+                carrito.agregar(self.producto(2), 3)
+                carrito.agregar(self.producto(5), 1)
+                # El precio nuevo se aplica a toda la línea.
+                carrito.agregar(self.producto(2, precio=400), 2)
+
+                cargado = Carrito(clave, almacen)
+                self.assertEqual([(linea['codigo'], linea['cantidad']) for linea in cargado.lineas()], [(2, 5), (5, 1)])
+                self.assertEqual(cargado.total, 5 * 400 + 166 * 5)
+
+                cargado.quitar(2)
+                self.assertEqual(Carrito(clave, almacen).total, 166 * 5)
+                cargado.vaciar()
+                self.assertEqual((len(Carrito(clave, almacen)), Carrito(clave, almacen).total), (0, 0))
+
+    def test_avisa_si_se_perdieron_lineas(self):
+        almacen = AlmacenCarritoCache()
+        carrito = Carrito('caja', almacen)
+        carrito.agregar(self.producto(2), 3)
+        carrito.agregar(self.producto(5), 1)
+        almacen.cache.delete(almacen._clave_linea('caja', 2))
+
+        cargado = Carrito('caja', almacen)
+        self.assertEqual(cargado.lineas(), [self.producto(5) | {'cantidad': 1}])
+        self.assertEqual(cargado.total, 166 * 5)
+        self.assertEqual(cargado.incompleto.faltantes, [2])
+        self.assertIn('código 2', cargado.aviso)
+
+        # El índice se corrigió: el aviso se da una sola vez.
+        self.assertIsNone(Carrito('caja', almacen).aviso)
+
+    def test_no_cobra_un_carrito_incompleto(self):
+        for codigo in (2, 5):
+            self.client.post(reverse('AgregarProducto'), {'producto': codigo, 'cantidad': 1})
+        carrito = Carrito(self.client.session.session_key)
+        carrito.almacen.cache.delete(carrito.almacen._clave_linea(carrito.clave, 2))
+        ventas = Venta.objects.count()
+
+        datos = {'metodo_pago': 'Efectivo', 'id_cliente': Cliente.objects.get().pk}
+        respuesta = self.client.post(reverse('RegistrarVenta'), datos)
+        self.assertEqual(Venta.objects.count(), ventas)
+        self.assertIn('código 2', respuesta.context['mensaje'])
+        self.assertEqual(respuesta.context['total'], 166 * 5)
+
+        # Después de ver el aviso, la caja puede cobrar lo que queda.
+        self.assertEqual(self.client.post(reverse('RegistrarVenta'), datos).status_code, 302)
+        self.assertEqual(Venta.objects.latest('id_venta').total, 166 * 5)
+
+
+class VistasAsincronasTests(DatosPruebaMixin, PresupuestoConsultasMixin, TestCase):
+    """
+    Pruebas de las vistas asíncronas de la caja con el cliente ASGI de pruebas.
+    """
+
+    def setUp(self):
+        self.async_client.force_login(self.usuario)
+
+    async def test_busqueda_cumple_presupuesto(self):
+        await self.async_client.get(reverse('buscar_productos'), {'q': 'Bebida 1'})
+        respuesta = await self.async_client.get(reverse('buscar_productos'), {'q': 'Bebida 1'})
+        self.assertEqual(respuesta.json()['productos'][0], {'codigo': 1, 'nombre': 'Bebida 1'})
+        self.assertEqual(respuesta.instrumentacion.nombre_url, 'buscar_productos')
+        self.assertPresupuesto(respuesta)
+
+    async def test_escaneo_suma_al_carrito_y_verifica_stock(self):
+        url = reverse('EscanearProducto')
+        await self.async_client.post(url, {'codigo': 3, 'cantidad': 40})
+        respuesta = await self.async_client.post(url, {'codigo': 3, 'cantidad': 50})
+        self.assertEqual(respuesta.status_code, 200)
+        self.assertEqual(respuesta.json()['linea']['cantidad'], 90)
+        self.assertEqual(respuesta.json()['total'], 90 * 166 * 3)
+
+        respuesta = await self.async_client.post(url, {'codigo': 3, 'cantidad': 11})
+        self.assertEqual(respuesta.status_code, 409)
+        self.assertEqual(respuesta.json()['linea']['cantidad'], 90)
+
+    async def test_agregar_por_nombre_informa_los_datos_invalidos(self):
+        url = reverse('AgregarProducto')
+        respuesta = await self.async_client.post(url, {'producto': 'Bebida 1', 'cantidad': 'dos'})
+        self.assertEqual(respuesta.context['mensaje'], "La cantidad debe ser un número mayor a 0.")
+
+        # "Bebida 1" también es parte de "Bebida 10" a "Bebida 19": gana el nombre completo.
+        respuesta = await self.async_client.post(url, {'producto': 'bebida 1', 'cantidad': 2})
+        self.assertEqual([(linea['codigo'], linea['cantidad']) for linea in respuesta.context['productos_agregados']], [(1, 2)])
+
+        respuesta = await self.async_client.post(url, {'producto': 'Bebida 2', 'cantidad': 1})
+        self.assertEqual(respuesta.status_code, 200)
+        self.assertIn('Bebida 2', respuesta.context['mensaje'])
+        respuesta = await self.async_client.post(url, {'producto': 'ebida', 'cantidad': 1})
+        self.assertEqual(respuesta.status_code, 200)
+        self.assertIn("Hay varios productos que coinciden con 'ebida'", respuesta.context['mensaje'])
+        respuesta = await self.async_client.post(url, {'producto': 'Soda', 'cantidad': 1})
+        self.assertEqual(respuesta.context['mensaje'], "El producto no existe.")
+
+
+class DeudaClientesTests(DatosPruebaMixin, TestCase):
+    """
+    Pruebas del libro de deudas de los clientes (ver `MovimientoDeuda`).
+    """
+
+    def setUp(self):
+        super().setUp()
+        self.cliente = Cliente.objects.get()
+        Cliente.objects.update(limite_credito=1000)
+
+    def assertLibroCuadra(self):
+        self.cliente.refresh_from_db()
+        saldo = self.cliente.movimientos.aggregate(saldo=Sum('monto'))['saldo'] or 0
+        self.assertEqual(saldo, self.cliente.deuda)
+
+    def test_cargo_respeta_el_limite_de_credito(self):
+        MovimientoDeuda.cargar(self.cliente.pk, 600)
+        with self.assertRaises(LimiteCreditoError):
+            MovimientoDeuda.cargar(self.cliente.pk, 500)
+        respuesta = self.client.post(reverse('AumentarDeuda', args=[self.cliente.pk]), {'monto': 400})
+        self.assertEqual(respuesta.status_code, 302)
+        self.assertEqual(MovimientoDeuda.objects.filter(tipo=MovimientoDeuda.CARGO).count(), 2)
+        self.assertLibroCuadra()
+        self.assertEqual(self.cliente.deuda, 1000)
+
+    def test_venta_a_credito_registra_un_cargo(self):
+        venta = Venta(metodo_pago='Deuda', id_cliente=self.cliente, vendedor=self.usuario, fecha=timezone.now())
+        caja.registrar_venta(venta, [{'codigo': 2, 'cantidad': 1}])
+        movimiento = MovimientoDeuda.objects.get()
+        self.assertEqual((movimiento.venta_id, movimiento.monto, movimiento.saldo), (venta.pk, 332, 332))
+
+        ventas = Venta.objects.count()
+        with self.assertRaises(LimiteCreditoError):
+            caja.registrar_venta(
+                Venta(metodo_pago='Deuda', id_cliente=self.cliente, vendedor=self.usuario, fecha=timezone.now()),
+                [{'codigo': 5, 'cantidad': 1}],
+            )
+        self.assertEqual(Venta.objects.count(), ventas)
+        self.assertLibroCuadra()
+
+    def test_abono_no_deja_deuda_negativa(self):
+        MovimientoDeuda.cargar(self.cliente.pk, 300)
+        self.assertEqual(self.cliente.abonar_deuda(100, usuario_id=self.usuario.pk), 100)
+        self.assertEqual(self.cliente.abonar_deuda(500), 200)
+        self.assertEqual(self.cliente.abonar_deuda(50), 0)
+        self.assertEqual(list(MovimientoDeuda.objects.order_by('id').values_list('monto', 'saldo')), [(300, 300), (-100, 200), (-200, 0)])
+        self.assertLibroCuadra()
+
+    def test_verificar_deudas_corrige_diferencias(self):
+        self.client.post(reverse('ModificarCliente', args=[self.cliente.pk]), {
+            'nombre': 'Ana', 'apellido': 'Pérez', 'limite_credito': 1000, 'deuda': 250,
+        })
+        self.assertLibroCuadra()
+        Cliente.objects.update(deuda=400)
+        salida = io.StringIO()
+        call_command('verificar_deudas', '--corregir', stdout=salida)
+        self.assertIn('deuda 400, libro 250', salida.getvalue())
+        self.assertLibroCuadra()
+
+
+class AntiguedadDeudasTests(DatosPruebaMixin, TestCase):
+    """
+    Pruebas del reporte de antigüedad de deudas (ver `sistemaApp.cobranza`).
+    """
+
+    def setUp(self):
+        super().setUp()
+        self.cliente = Cliente.objects.get()
+
+    def cargar_hace(self, dias, monto):
+        """
+        Registra un cargo con `dias` días de antigüedad.
+        """
+        MovimientoDeuda.cargar(self.cliente.pk, monto)
+        fecha = timezone.now() - timedelta(days=dias)
+        MovimientoDeuda.objects.filter(pk=MovimientoDeuda.objects.latest('id').pk).update(fecha=fecha)
+        DeudaPendiente.objects.filter(fecha=timezone.localdate()).update(fecha=timezone.localdate(fecha))
+
+    def test_abonos_pagan_la_deuda_mas_antigua(self):
+        self.cargar_hace(100, 100)
+        self.cargar_hace(45, 200)
+        self.cargar_hace(0, 300)
+        self.cliente.abonar_deuda(150)
+
+        totales = cobranza.totales_antiguedad()
+        self.assertEqual(
+            [totales[nombre] for nombre, _, _ in cobranza.TRAMOS] + [totales['total'], totales['clientes']],
+            [300, 150, 0, 0, 450, 1],
+        )
+        self.assertEqual(cobranza.antiguedad_por_cliente().get()['total'], 450)
+
+        # Reconstruir desde el libro de deudas da la misma deuda pendiente.
+        pendiente = sorted(DeudaPendiente.objects.values_list('fecha', 'monto'))
+        call_command('reconstruir_antiguedad_deudas', stdout=io.StringIO())
+        self.assertEqual(sorted(DeudaPendiente.objects.values_list('fecha', 'monto')), pendiente)
+
+    def test_deuda_sin_fecha_es_la_mas_antigua(self):
+        MovimientoDeuda.ajustar(self.cliente.pk, 300)
+        MovimientoDeuda.ajustar(self.cliente.pk, 500)
+        # Los ajustes se suman en una sola fila sin fecha.
+        self.assertEqual(list(DeudaPendiente.objects.values_list('fecha', 'monto')), [(DeudaPendiente.SIN_FECHA, 500)])
+        self.cargar_hace(10, 100)
+        self.assertEqual(cobranza.totales_antiguedad()['tramo_mas_90'], 500)
+        self.cliente.abonar_deuda(550)
+        self.assertEqual(list(DeudaPendiente.objects.values_list('fecha', 'monto')), [(timezone.localdate() - timedelta(days=10), 50)])
+
+    def test_exportar_csv(self):
+        self.cargar_hace(70, 120)
+        respuesta = self.client.get(reverse('AntiguedadDeudasCsv'))
+        filas = list(csv.reader(io.StringIO(b''.join(respuesta.streaming_content).decode())))
+        self.assertEqual(filas[1], [str(self.cliente.pk), 'Ana', 'Pérez', '0', '0', '120', '0', '120'])
+        self.assertEqual(filas[-1], ['', 'Total', '', '0', '0', '120', '0', '120'])
+
+
+class DirectorioClientesTests(DatosPruebaMixin, TestCase):
+    """
+    Pruebas de la búsqueda de clientes, del directorio paginado por cursor y del buscador de
+    clientes de la caja.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        for i, (nombre, apellido) in enumerate([
+            ('Juan', 'Pérez'), ('Ana', 'Soto'), ('Pedro', 'Soto'), ('Ana', 'Soto'), ('Luis', 'Díaz'), ('Sofía', 'Rojas'),
+        ]):
+            Cliente.objects.create(nombre=nombre, apellido=apellido, telefono=f'+5691234{i:04d}', limite_credito=-1, deuda=0)
+
+    def test_busqueda_por_prefijos(self):
+        def encontrados(texto):
+            return sorted(f'{c.nombre} {c.apellido}' for c in views._buscar_clientes(texto))
+
+        self.assertEqual(encontrados('ana sot'), ['Ana Soto', 'Ana Soto'])
+        self.assertEqual(encontrados('pér'), ['Ana Pérez', 'Juan Pérez'])
+        self.assertEqual(encontrados('+56912340005'), ['Sofía Rojas'])
+        self.assertEqual(encontrados(str(Cliente.objects.get(nombre='Luis').pk)), ['Luis Díaz'])
+
+    def test_paginacion_por_cursor(self):
+        esperado = list(Cliente.objects.order_by(*views.ORDEN_CLIENTES).values_list('id_cliente', flat=True))
+        vistos, parametros, paginas = [], {}, []
+        while True:
+            clientes, anterior, siguiente = views._pagina_clientes(parametros, por_pagina=3)
+            paginas.append([c.pk for c in clientes])
+            vistos += paginas[-1]
+            if siguiente is None:
+                break
+            parametros = {'despues': siguiente}
+        self.assertEqual(vistos, esperado)
+
+        # Volver desde la última página recorre las mismas páginas.
+        clientes, anterior, _ = views._pagina_clientes({'antes': views._cursor_cliente(clientes[0])}, por_pagina=3)
+        self.assertEqual([c.pk for c in clientes], paginas[-2])
+
+        respuesta = self.client.get(reverse('GestionClientes'), {'despues': 'no-es-un-cursor'})
+        self.assertContains(respuesta, 'El enlace de la página no es válido.')
+
+    def test_buscador_de_la_caja(self):
+        datos = self.client.get(reverse('ClientesJson'), {'q': 'soto'}).json()
+        self.assertEqual([c['nombre'] for c in datos['clientes']], ['Ana', 'Ana', 'Pedro'])
+        self.assertEqual(self.client.get(reverse('ClientesJson')).json(), {'clientes': []})
+
+        # La página de la caja no incluye la lista de clientes.
+        respuesta = self.client.get(reverse('Home'))
+        self.assertContains(respuesta, 'name="id_cliente"')
+        self.assertNotContains(respuesta, 'Sofía')
+
+
+class DepartamentosTests(DatosPruebaMixin, TestCase):
+    """
+    Pruebas de la lista de categorías y de los productos asociados a una categoría.
+    """
+
+    def test_lista_las_categorias_con_su_valorizacion(self):
+        Categoria.objects.create(nombre='Vacía')
+        respuesta = self.client.get(reverse('GestionDepartamentos'))
+        filas = {categoria.nombre: categoria for categoria in respuesta.context['categoria']}
+        bebidas = Producto.objects.filter(categoria__nombre='Bebidas')
+        self.assertEqual(
+            (filas['Bebidas'].cantidad_productos, filas['Bebidas'].unidades, filas['Bebidas'].valor_costo),
+            (bebidas.count(), bebidas.aggregate(total=Sum('stock_actual'))['total'],
+             sum(producto.precio_costo * producto.stock_actual for producto in bebidas)),
+        )
+        self.assertEqual((filas['Vacía'].cantidad_productos, filas['Vacía'].valor_costo), (0, 0))
+        self.assertEqual(respuesta.context['totales']['cantidad_productos'], 20)
+
+    def test_la_venta_actualiza_todas_las_categorias_con_una_sentencia(self):
+        snacks = Categoria.objects.create(nombre='Snacks')
+        Producto.objects.create(
+            codigo_producto=30, nombre_producto='Papas', precio_costo=50, precio_venta=80,
+            stock_minimo=1, stock_actual=10, categoria=snacks,
+        )
+        # La primera venta crea la fila del resumen diario de hoy.
+        consultas = []
+        for lineas in ([{'codigo': 2, 'cantidad': 1}], [{'codigo': 1, 'cantidad': 1}],
+                       [{'codigo': 1, 'cantidad': 2}, {'codigo': 30, 'cantidad': 3}]):
+            with CaptureQueriesContext(connection) as capturadas:
+                caja.registrar_venta(Venta(metodo_pago='Efectivo', vendedor=self.usuario, fecha=timezone.now()), lineas)
+            consultas.append(len(capturadas))
+        self.assertEqual(consultas[1], consultas[2])
+
+        valorizacion = ValorizacionInventario.por_categoria()
+        for categoria in (Categoria.objects.get(nombre='Bebidas'), snacks):
+            productos = Producto.objects.filter(categoria=categoria)
+            self.assertEqual(
+                (valorizacion[categoria.categoria_id].unidades, valorizacion[categoria.categoria_id].valor_costo),
+                (productos.aggregate(total=Sum('stock_actual'))['total'],
+                 sum(producto.precio_costo * producto.stock_actual for producto in productos)),
+            )
+
+    def test_productos_asociados_paginados_y_ordenados(self):
+        categoria = Categoria.objects.get(nombre='Bebidas')
+        url = reverse('ProductosAsociados', args=[categoria.categoria_id])
+
+        respuesta = self.client.get(url, {'orden': '-costo', 'por_pagina': 8, 'page': 2})
+        pagina = respuesta.context['productos']
+        self.assertEqual(pagina.paginator.count, 20)
+        self.assertEqual([producto.codigo_producto for producto in pagina], list(range(12, 4, -1)))
+
+        respuesta = self.client.get(url, {'q': 'Bebida 1', 'stock_bajo': ''})
+        self.assertEqual(respuesta.context['productos'].paginator.count, 11)
+
+        respuesta = self.client.get(url, {'orden': 'categoria'})
+        self.assertEqual(respuesta.context['mensaje'], "Los filtros ingresados no son válidos.")
+
+
+class FragmentosTests(DatosPruebaMixin, TestCase):
+    """
+    Pruebas de los fragmentos de plantillas en caché y sus versiones (ver `sistemaApp.fragmentos`).
+    """
+
+    def test_la_tabla_en_cache_no_consulta_la_base(self):
+        # Guarda el usuario en caché para que las dos peticiones solo difieran en la tabla.
+        self.client.get(reverse('Home'))
+        primera = self.client.get(reverse('GestionDepartamentos'))
+        segunda = self.client.get(reverse('GestionDepartamentos'))
+        self.assertEqual(segunda.content, primera.content)
+        self.assertEqual(
+            segunda.instrumentacion.registro.consultas, primera.instrumentacion.registro.consultas - 1
+        )
+
+    def test_los_cambios_confirmados_cambian_la_version(self):
+        url = reverse('GestionProductos')
+        self.assertContains(self.client.get(url), 'Bebida 7')
+
+        with self.captureOnCommitCallbacks(execute=True):
+            producto = Producto.objects.get(codigo_producto=7)
+            producto.nombre_producto = 'Jugo de naranja'
+            producto.save()
+        respuesta = self.client.get(url)
+        self.assertContains(respuesta, 'Jugo de naranja')
+        self.assertNotContains(respuesta, 'Bebida 7')
+
+        version = fragmentos.versiones()[fragmentos.CLIENTES]
+        with self.captureOnCommitCallbacks(execute=True):
+            MovimientoDeuda.cargar(Cliente.objects.get().pk, 500)
+        self.assertGreater(fragmentos.versiones()[fragmentos.CLIENTES], version)
+
+    def test_la_pagina_en_cache_muestra_el_stock_actual(self):
+        url = reverse('GestionProductos')
+        self.client.get(url, {'orden': '-venta'})
+        with self.captureOnCommitCallbacks(execute=True):
+            caja.registrar_venta(
+                Venta(metodo_pago='Efectivo', vendedor=self.usuario, fecha=timezone.now()), [{'codigo': 20, 'cantidad': 7}],
+            )
+        with CaptureQueriesContext(connection) as consultas:
+            respuesta = self.client.get(url, {'orden': '-venta'})
+        # La venta no cambia qué productos forman la página: solo se leen sus filas.
+        self.assertFalse([consulta for consulta in consultas if 'ORDER BY' in consulta['sql']])
+        self.assertEqual(respuesta.context['productos'][0].codigo_producto, 20)
+        self.assertEqual(respuesta.context['productos'][0].stock_actual, 93)
+
+    def test_los_cambios_de_stock_no_cambian_el_catalogo(self):
+        anteriores = fragmentos.versiones()
+        with self.captureOnCommitCallbacks(execute=True):
+            producto = Producto.objects.get(codigo_producto=7)
+            producto.stock_actual = 40
+            producto.save()
+        versiones = fragmentos.versiones()
+        self.assertEqual(versiones[fragmentos.CATALOGO], anteriores[fragmentos.CATALOGO])
+        self.assertGreater(versiones[fragmentos.STOCK], anteriores[fragmentos.STOCK])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            producto.precio_venta = 999
+            producto.save()
+        self.assertGreater(fragmentos.versiones()[fragmentos.CATALOGO], versiones[fragmentos.CATALOGO])
+
+    def test_cada_cambio_da_una_version_nueva(self):
+        anteriores = set()
+        for _ in range(50):
+            with self.captureOnCommitCallbacks(execute=True):
+                fragmentos.incrementar(fragmentos.STOCK)
+            version = fragmentos.versiones()[fragmentos.STOCK]
+            self.assertNotIn(version, anteriores)
+            anteriores.add(version)
+
+    def test_sin_confirmar_no_cambia_la_version(self):
+        version = fragmentos.versiones()[fragmentos.CATEGORIAS]
+        Categoria.objects.create(nombre='Snacks')
+        self.assertEqual(fragmentos.versiones()[fragmentos.CATEGORIAS], version)
+
+
+class RespuestasCondicionalesTests(DatosPruebaMixin, TestCase):
+    """
+    Pruebas de las respuestas 304 con ETag (ver `sistemaApp.condicional`).
+    """
+
+    def test_responde_304_sin_consultar_las_filas(self):
+        url = reverse('GestionProductos')
+        respuesta = self.client.get(url)
+        etag = respuesta['ETag']
+        self.assertIn('no-cache', respuesta['Cache-Control'])
+
+        respuesta = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(respuesta.status_code, 304)
+        # La sesión y el usuario se leen de la caché (ver `sistemaApp.autenticacion`).
+        self.assertEqual(respuesta.instrumentacion.registro.consultas, 0)
+
+        # Otros parámetros u otro usuario tienen otro ETag.
+        self.assertEqual(self.client.get(url, {'page': 2}, HTTP_IF_NONE_MATCH=etag).status_code, 200)
+        self.client.force_login(User.objects.create_user('vendedor', password='vendedor'))
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+    def test_los_cambios_cambian_el_etag(self):
+        url = reverse('ProductosJson')
+        etag = self.client.get(url)['ETag']
+        with self.captureOnCommitCallbacks(execute=True):
+            caja.registrar_venta(
+                Venta(metodo_pago='Efectivo', id_cliente=Cliente.objects.get(), vendedor=self.usuario, fecha=timezone.now()),
+                [{'codigo': 3, 'cantidad': 1}],
+            )
+        respuesta = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(respuesta.status_code, 200)
+        self.assertNotEqual(respuesta['ETag'], etag)
+
+    def test_las_ventas_no_cambian_el_etag_del_buscador(self):
+        url = reverse('buscar_productos')
+        etag = self.client.get(url, {'q': 'bebida'})['ETag']
+        with self.captureOnCommitCallbacks(execute=True):
+            caja.registrar_venta(
+                Venta(metodo_pago='Efectivo', vendedor=self.usuario, fecha=timezone.now()), [{'codigo': 3, 'cantidad': 1}],
+            )
+        self.assertEqual(self.client.get(url, {'q': 'bebida'}, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+
+    def test_vistas_asincronas(self):
+        url = reverse('ClientesJson')
+        etag = self.client.get(url, {'q': 'ana'})['ETag']
+        self.assertEqual(self.client.get(url, {'q': 'ana'}, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+        with self.captureOnCommitCallbacks(execute=True):
+            Cliente.objects.create(nombre='Anabel', apellido='Rojas', limite_credito=-1, deuda=0)
+        respuesta = self.client.get(url, {'q': 'ana'}, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual([cliente['nombre'] for cliente in respuesta.json()['clientes']], ['Ana', 'Anabel'])
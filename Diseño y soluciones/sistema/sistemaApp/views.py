@@ -1,20 +1,37 @@
 from django.contrib.auth.models import User
 from django.contrib import messages
 from django.views.decorators.cache import cache_control
-from django.core.paginator import Paginator
+from django.core.paginator import Page, Paginator
 from django.core.exceptions import ValidationError
 from django.contrib.auth import authenticate, login, logout
 from django.contrib.auth.decorators import login_required
 from django.shortcuts import render, redirect, get_object_or_404
-from django.http import HttpResponse, HttpResponseRedirect
-from .models import Producto,Proveedor,Categoria,Cliente,Venta
+from django.http import HttpResponse, HttpResponseRedirect, StreamingHttpResponse
+from .models import Producto,Proveedor,Categoria,Cliente,Venta,ResumenVentaDiario,ValorizacionInventario
+from .models import LimiteCreditoError, MovimientoDeuda
 from .forms import CategoriaForms, ProveedorForm, ClienteForm, ProductoForm, VentaForm, RegisterForm
+from . import caja, cobranza, conexiones, diario_ventas, fragmentos
+from .condicional import condicional
+from .carrito import Carrito
+from .busqueda import aobtener_indice, cache_busquedas
+from .catalogo import cache_productos, registro_producto
+from .importacion import ErrorImportacion, importar_productos
+from .reposicion import reporte_stock_bajo
 from django.http import JsonResponse,HttpResponseForbidden
 from django.utils import timezone
+from django.utils.functional import SimpleLazyObject
+from django.utils.http import urlsafe_base64_decode, urlsafe_base64_encode
 from decimal import Decimal
-from django.db.models import Q
-from datetime import datetime
+from django.db import DatabaseError, transaction
+from django.db.models import Q, F, Count, Sum, BigIntegerField, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+from datetime import datetime, time, timedelta, timezone as dt_timezone
+import csv
+import hashlib
+import json
 import os
+import uuid
+from asgiref.sync import sync_to_async
 
 def login_view(request):
     """
@@ -96,8 +113,8 @@ def home(request):
     """
     Vista que muestra el inicio de la aplicación, con los productos agregados y su total.
 
-    Esta vista recupera los productos agregados desde la sesión del usuario, calcula el total 
-    de los precios de venta y renderiza la página de inicio con esa información.
+    Esta vista recupera los productos agregados desde el carrito de la caja, junto con su total
+    (mantenido de forma incremental por el carrito), y renderiza la página de inicio con esa información.
 
     Parámetros:
     - request: objeto HttpRequest que contiene los datos de la solicitud.
@@ -106,16 +123,15 @@ def home(request):
     - una respuesta con la plantilla 'home.html', que contiene la lista de productos agregados y el total calculado.
     """
     
-    # Obtiene la lista de productos agregados desde la sesión del usuario. Si no hay productos, se inicializa como una lista vacía.
-    productos_agregados = request.session.get('productos_agregados', [])
+    # Obtiene el carrito de la caja asociado a la sesión del usuario.
+    carrito = Carrito.para_request(request)
     
-    # Calcula el total sumando el precio de venta de cada producto agregado.
-    total = sum(producto['precio_venta'] for producto in productos_agregados)
-    
-    # Renderiza la plantilla 'home.html' pasando los productos agregados y el total calculado.
+    # Renderiza la plantilla 'home.html' pasando los productos agregados y el total del carrito.
     return render(request, 'venta/home.html', {
-        'productos_agregados': productos_agregados,  # Lista de productos añadidos.
-        'total': total,  # Suma total del precio de los productos agregados.
+        'mensaje': carrito.aviso,  # Aviso si se perdieron productos del carrito.
+        'productos_agregados': carrito.lineas(),  # Lista de productos añadidos.
+        'total': carrito.total,  # Suma total del precio por cantidad de los productos agregados.
+        'form': VentaForm(),  # Formulario para terminar la venta (método de pago y cliente).
     })
 
 
@@ -168,14 +184,21 @@ def register_view(request):
 
 
 @login_required
-def buscar_productos(request):
+@condicional(fragmentos.CATALOGO)
+async def buscar_productos(request):
     """
-    Vista para buscar productos basados en un término de búsqueda.
+    Vista asíncrona para buscar productos basados en un término de búsqueda.
 
     Esta vista permite a los usuarios autenticados realizar una búsqueda de productos 
-    en la base de datos. El término de búsqueda puede ser parte del nombre o código del 
-    producto. Los resultados se limitan a los primeros 10 productos que coincidan con 
-    el término de búsqueda.
+    en el índice en memoria (`sistemaApp.busqueda`), sin consultar la base de datos. El término
+    de búsqueda puede ser parte del nombre o el inicio del código del producto. Los resultados
+    se limitan a los primeros 10 productos, con las coincidencias exactas de código primero.
+    Los resultados se guardan en la caché de búsquedas, que responde las consultas siguientes
+    (las que agregan letras mientras se escribe) a partir de los resultados de la anterior.
+
+    Es asíncrona para que, servida por la aplicación ASGI (`sistema/asgi.py`), las búsquedas que
+    se hacen mientras se escribe no ocupen un hilo del servidor mientras esperan la
+    sesión y el usuario de la base de datos.
 
     Parámetros:
     - request: objeto HttpRequest que contiene los datos de la solicitud.
@@ -190,18 +213,15 @@ def buscar_productos(request):
     if 'q' in request.GET:
         query = request.GET['q']  # Obtiene el término de búsqueda de la URL.
         
-        # Realiza una consulta para buscar productos cuyo nombre o código contengan el término de búsqueda.
-        # Se limita a los primeros 10 resultados.
-        productos = Producto.objects.filter(
-            Q(nombre_producto__icontains=query) | Q(codigo_producto__icontains=query)
-        ).values('codigo_producto', 'nombre_producto')[:10]  
+        # Busca en el índice de productos (o en la caché de búsquedas); se limita a los primeros 10 resultados.
+        productos = cache_busquedas.buscar(await aobtener_indice(), query, limite=10)
 
         # Crea una lista de diccionarios con los resultados de búsqueda.
         resultados = []
-        for producto in productos:
+        for codigo, nombre in productos:
             resultados.append({
-                'codigo': producto['codigo_producto'],
-                'nombre': producto['nombre_producto'],
+                'codigo': codigo,
+                'nombre': nombre,
             })
         
         # Devuelve los resultados como una respuesta JSON.
@@ -211,8 +231,75 @@ def buscar_productos(request):
     return JsonResponse({'productos': []})
 
 
+async def _arender(request, plantilla, contexto):
+    """
+    Renderiza una plantilla desde una vista asíncrona.
+
+    El renderizado se hace en un hilo, porque la plantilla lee los mensajes de la sesión; antes
+    se reemplaza ``request.user`` por el usuario ya cargado por `login_required`, para que la
+    plantilla no lo vuelva a consultar.
+
+    :return: HttpResponse con la plantilla renderizada.
+    """
+    request.user = await request.auser()
+    return await sync_to_async(render)(request, plantilla, contexto)
+
+
+async def _producto_por_codigo(codigo):
+    """
+    Obtiene el registro liviano de un producto por su código desde la caché de productos.
+
+    :param codigo: Código del producto (texto o número).
+    :return: Diccionario con las claves `codigo`, `nombre`, `precio_venta` y `stock_actual`,
+             o `None` si el código no es válido o el producto no existe.
+    """
+    codigo = str(codigo or '').strip()
+    if not codigo.isdigit():
+        return None
+    return await cache_productos.aobtener(int(codigo))
+
+
+def _mensaje_carrito(carrito, mensaje):
+    """
+    Antepone al mensaje de la vista el aviso del carrito si se perdieron líneas (ver
+    `Carrito.aviso`). El carrito ya debe estar cargado.
+
+    :return: El mensaje para la plantilla, o None si no hay ninguno.
+    """
+    return ' '.join(filter(None, [carrito.aviso, mensaje])) or None
+
+
+async def _agregar_al_carrito(carrito, producto, cantidad):
+    """
+    Agrega un producto al carrito verificando el stock disponible, incluida la cantidad
+    que ya estaba en el carrito.
+
+    :param carrito: Carrito de la caja.
+    :param producto: Registro liviano del producto (ver `_producto_por_codigo`).
+    :param cantidad: Cantidad a agregar.
+    :return: Tupla ``(agregado, mensaje)``.
+    """
+    # Verifica si la cantidad a agregar excede el stock disponible
+    if cantidad > producto['stock_actual']:
+        return False, f"Stock insuficiente para '{producto['nombre']}'. Solo quedan {producto['stock_actual']} unidades."
+
+    # Obtiene la cantidad que ya está en el carrito para este producto (0 si no está)
+    await carrito.acargar()
+    cantidad_actual = carrito.cantidad(producto['codigo'])
+
+    if cantidad_actual + cantidad > producto['stock_actual']:
+        # Si la nueva cantidad excede el stock, muestra un mensaje de error
+        return False, f"Stock insuficiente para '{producto['nombre']}'. Solo puedes agregar {producto['stock_actual'] - cantidad_actual} unidades más."
+
+    # Agrega el producto al carrito o suma la cantidad si ya estaba
+    await carrito.aagregar(producto, cantidad)
+    if cantidad_actual:
+        return True, f"Producto '{producto['nombre']}' actualizado en el carrito."
+    return True, f"Producto '{producto['nombre']}' añadido con éxito al carrito."
+
+
 @login_required
-def agregar_varios_productos(request):
+async def agregar_varios_productos(request):
     """
     Vista para agregar varios productos al carrito de compras de un usuario.
 
@@ -229,10 +316,8 @@ def agregar_varios_productos(request):
       el total de la compra y los productos encontrados.
     """
     
-    # Verifica si ya existe una lista de productos agregados en la sesión
-    if 'productos_agregados' not in request.session:
-        # Si no existe, crea una lista vacía
-        request.session['productos_agregados'] = []
+    # Obtiene el carrito de la caja asociado a la sesión
+    carrito = await Carrito.apara_request(request)
 
     # Inicializa variables para los mensajes y productos encontrados
     mensaje = None
@@ -242,111 +327,360 @@ def agregar_varios_productos(request):
         # Obtiene el término de búsqueda del formulario y elimina los espacios extra
         search_term = request.POST.get('search', '').strip()
 
-        # Si hay un término de búsqueda, busca los productos que coincidan en código o nombre
-        if search_term:
-            productos_encontrados = Producto.objects.filter(
-                Q(codigo_producto__icontains=search_term) | Q(nombre_producto__icontains=search_term)
-            )
-        
         # Obtiene el código del producto y la cantidad a agregar desde el formulario
         codigo_producto = request.POST.get('codigo_producto')
         cantidad_a_agregar = int(request.POST.get('cantidad', 1))  # Valor por defecto de cantidad es 1
+
+        # Si hay un término de búsqueda y no es el código recién escaneado, busca los productos
+        # que coincidan en código o nombre en el índice de búsqueda (máximo 10 resultados)
+        if search_term and search_term != codigo_producto:
+            productos_encontrados = [
+                {'codigo': codigo, 'nombre': nombre}
+                for codigo, nombre in cache_busquedas.buscar(await aobtener_indice(), search_term, limite=10)
+            ]
         
-        try:
-            # Intenta obtener el producto correspondiente al código proporcionado
-            producto = Producto.objects.get(codigo_producto=codigo_producto)
+        # Obtiene el producto correspondiente al código proporcionado desde la caché de productos
+        producto = await _producto_por_codigo(codigo_producto)
 
-            # Verifica si la cantidad a agregar excede el stock disponible
-            if cantidad_a_agregar > producto.stock_actual:
-                # Si no hay suficiente stock, muestra un mensaje de error
-                mensaje = f"Stock insuficiente para '{producto.nombre_producto}'. Solo quedan {producto.stock_actual} unidades."
-            else:
-                # Obtiene los productos actualmente en el carrito de la sesión
-                productos_agregados = request.session['productos_agregados']
-
-                # Verifica si el producto ya está en el carrito
-                producto_en_carrito = next((p for p in productos_agregados if p['codigo'] == producto.codigo_producto), None)
-
-                if producto_en_carrito:
-                    # Si el producto ya está en el carrito, actualiza la cantidad
-                    cantidad_actual = producto_en_carrito['cantidad']
-                    if cantidad_actual + cantidad_a_agregar > producto.stock_actual:
-                        # Si la nueva cantidad excede el stock, muestra un mensaje de error
-                        mensaje = f"Stock insuficiente para '{producto.nombre_producto}'. Solo puedes agregar {producto.stock_actual - cantidad_actual} unidades más."
-                    else:
-                        # Si hay suficiente stock, actualiza la cantidad en el carrito
-                        producto_en_carrito['cantidad'] += cantidad_a_agregar
-                        mensaje = f"Producto '{producto.nombre_producto}' actualizado en el carrito."
-                else:
-                    # Si el producto no está en el carrito, lo agrega con su cantidad
-                    producto_data = {
-                        'codigo': producto.codigo_producto,
-                        'nombre': producto.nombre_producto,
-                        'precio_venta': producto.precio_venta,
-                        'stock_actual': producto.stock_actual,
-                        'cantidad': cantidad_a_agregar
-                    }
-                    # Agrega el producto al carrito en la sesión
-                    request.session['productos_agregados'].append(producto_data)
-                    mensaje = f"Producto '{producto.nombre_producto}' añadido con éxito al carrito."
-
-                # Marca la sesión como modificada para guardar los cambios
-                request.session.modified = True
-
-        except Producto.DoesNotExist:
+        if producto is None:
             # Si no se encuentra el producto, muestra un mensaje de error
             mensaje = "El producto no existe."
+        else:
+            # Agrega el producto al carrito si hay stock suficiente
+            _, mensaje = await _agregar_al_carrito(carrito, producto, cantidad_a_agregar)
 
-    # Calcula el total del carrito sumando los precios de los productos multiplicados por su cantidad
-    total = sum(producto['precio_venta'] * producto['cantidad'] for producto in request.session['productos_agregados'])
-    
-    # Obtiene los productos agregados del carrito
-    productos_agregados = request.session['productos_agregados']
-    
     # Renderiza la plantilla 'home.html' pasando el mensaje, los productos en el carrito, el total y los productos encontrados
-    return render(request, 'venta/home.html', {
-        'mensaje': mensaje,                # Mensaje de éxito o error
-        'productos_agregados': productos_agregados,  # Productos en el carrito
-        'total': total,                    # Total de la compra
-        'productos_encontrados': productos_encontrados  # Resultados de la búsqueda
+    await carrito.acargar()
+    return await _arender(request, 'venta/home.html', {
+        'mensaje': _mensaje_carrito(carrito, mensaje),  # Mensaje de éxito o error
+        'productos_agregados': carrito.lineas(),  # Productos en el carrito
+        'total': carrito.total,            # Total de la compra
+        'productos_encontrados': productos_encontrados,  # Resultados de la búsqueda
+        'form': VentaForm(),               # Formulario para terminar la venta
     })
 
 
 
+#: Cantidad de productos por página en la gestión de productos.
+PRODUCTOS_POR_PAGINA = 50
+
+#: Cantidad máxima de productos por página que se puede pedir con el parámetro `por_pagina`.
+MAXIMO_PRODUCTOS_POR_PAGINA = 200
+
+#: Columnas de la lista de productos: clave del parámetro `orden`, título y campo del modelo.
+COLUMNAS_PRODUCTOS = [
+    ('codigo', 'Código', 'codigo_producto'),
+    ('nombre', 'Nombre', 'nombre_producto'),
+    ('costo', 'Precio Costo', 'precio_costo'),
+    ('venta', 'Precio Venta', 'precio_venta'),
+    ('minimo', 'Stock Mínimo', 'stock_minimo'),
+    ('stock', 'Stock Actual', 'stock_actual'),
+    ('categoria', 'Categoría', 'categoria__nombre'),
+]
+
+
+def _consultar_productos(parametros):
+    """
+    Construye la consulta de la lista de productos a partir de los filtros y el orden pedidos.
+
+    Solo se leen las columnas que muestra la lista, con el nombre de la categoría en la misma
+    consulta (`select_related`). El orden siempre termina en el código para que las páginas
+    sean estables.
+
+    :param parametros: Diccionario (por ejemplo `request.GET`) con las claves opcionales `q`
+                       (nombre o inicio del código), `categoria` (id o ``sin`` para los productos
+                       sin categoría), `stock_bajo` y `orden` (clave de `COLUMNAS_PRODUCTOS`,
+                       con ``-`` al inicio para orden descendente).
+    :return: Tupla ``(productos, filtrado, orden)``, donde `filtrado` indica si se aplicó algún filtro.
+    :raises ValueError: Si la categoría o el orden no son válidos.
+    """
+    productos = Producto.objects.select_related('categoria').only(
+        'codigo_producto', 'nombre_producto', 'precio_costo', 'precio_venta',
+        'stock_minimo', 'stock_actual', 'categoria__nombre',
+    )
+    filtrado = False
+
+    texto = parametros.get('q', '').strip()
+    if texto:
+        condicion = Q(nombre_producto__icontains=texto)
+        if texto.isdigit():
+            condicion |= Q(codigo_producto__startswith=texto)
+        productos = productos.filter(condicion)
+        filtrado = True
+
+    categoria = parametros.get('categoria')
+    if categoria == 'sin':
+        productos = productos.filter(categoria__isnull=True)
+        filtrado = True
+    elif categoria:
+        productos = productos.filter(categoria_id=int(categoria))
+        filtrado = True
+
+    if parametros.get('stock_bajo'):
+        productos = productos.filter(stock_actual__lte=F('stock_minimo'))
+        filtrado = True
+
+    orden = parametros.get('orden') or 'codigo'
+    campos = {clave: campo for clave, _, campo in COLUMNAS_PRODUCTOS}
+    campo = campos.get(orden.lstrip('-'))
+    if campo is None:
+        raise ValueError("Orden no válido.")
+    descendente = '-' if orden.startswith('-') else ''
+    productos = productos.order_by(descendente + campo, descendente + 'codigo_producto')
+    return productos, filtrado, orden
+
+
+def _versiones_lista_productos(parametros, orden):
+    """
+    Retorna las versiones de las que depende qué productos forman una página de la lista y en
+    qué orden (ver `_pagina_en_cache`): el stock solo cuenta si se filtra o se ordena por él.
+    """
+    nombres = [fragmentos.CATALOGO, fragmentos.CATEGORIAS]
+    if parametros.get('stock_bajo') or orden.lstrip('-') == 'stock':
+        nombres.append(fragmentos.STOCK)
+    return nombres
+
+
+def _pagina_en_cache(request, productos, por_pagina, numero, total, nombres):
+    """
+    Obtiene una página de productos guardando en la caché de fragmentos solo los códigos de la
+    página y el total de productos encontrados.
+
+    La clave incluye las versiones `nombres` de los datos que definen qué productos forman la
+    página (ver `sistemaApp.fragmentos`). Mientras no cambien, la página se arma leyendo sus
+    filas por clave primaria, sin ordenar, filtrar ni contar los productos. Como las filas se
+    leen en cada petición, el stock que se muestra está al día aunque las ventas no cambien esas
+    versiones.
+
+    :param request: Petición; su ruta, sus parámetros y la base de la que lee forman la clave.
+    :param productos: Consulta ordenada de los productos (ver `_consultar_productos`).
+    :param por_pagina: Cantidad de productos por página.
+    :param numero: Número de página pedido.
+    :param total: Total de productos encontrados si ya se conoce, o `None` para contarlos.
+    :param nombres: Versiones de las que depende la página (ver `_versiones_lista_productos`).
+    :rtype: django.core.paginator.Page
+    """
+    paginador = Paginator(productos, por_pagina)
+    if total is not None:
+        paginador.count = total
+    partes = [fragmentos.base(request), request.path, request.GET.urlencode(), str(por_pagina), str(numero)]
+    partes += [f'{nombre}={version}' for nombre, version in sorted(fragmentos.versiones(nombres).items())]
+    clave = 'pagina_productos:' + hashlib.md5('|'.join(partes).encode(), usedforsecurity=False).hexdigest()
+
+    cache = fragmentos.cache_fragmentos()
+    guardada = cache.get(clave)
+    if guardada is None:
+        pagina = paginador.get_page(numero)
+        cache.set(clave, (pagina.number, paginador.count, [producto.pk for producto in pagina]), fragmentos.segundos(request))
+        return pagina
+
+    numero, contados, codigos = guardada
+    if total is None:
+        paginador.count = contados
+    filas = productos.order_by().in_bulk(codigos)
+    return Page([filas[codigo] for codigo in codigos if codigo in filas], numero, paginador)
+
+
+def _pagina_productos(request, total_productos=None):
+    """
+    Obtiene la página pedida de la lista de productos (ver `_pagina_en_cache`).
+
+    :param request: Petición con los filtros, el orden, `page` y `por_pagina` en `request.GET`.
+    :param total_productos: Total de productos del catálogo, si ya se conoce. Cuando no hay
+                            filtros se usa en lugar de contar los productos.
+    :return: Tupla ``(pagina, orden)`` con la página (`django.core.paginator.Page`, que se consulta
+             al usarla, por ejemplo si la tabla no está en la caché de fragmentos) y el orden aplicado.
+    :raises ValueError: Si los filtros o el orden no son válidos.
+    """
+    parametros = request.GET
+    productos, filtrado, orden = _consultar_productos(parametros)
+    try:
+        por_pagina = int(parametros.get('por_pagina') or PRODUCTOS_POR_PAGINA)
+    except ValueError:
+        por_pagina = PRODUCTOS_POR_PAGINA
+    por_pagina = max(1, min(por_pagina, MAXIMO_PRODUCTOS_POR_PAGINA))
+
+    # Sin filtros, el total sale de la valorización del inventario y no hace falta contar.
+    total = total_productos if not filtrado else None
+    pagina = SimpleLazyObject(lambda: _pagina_en_cache(
+        request, productos, por_pagina, parametros.get('page'), total, _versiones_lista_productos(parametros, orden)
+    ))
+    return pagina, orden
+
+
 @login_required  # Se asegura de que solo los usuarios autenticados puedan acceder a esta vista
+@condicional(fragmentos.CATALOGO, fragmentos.STOCK, fragmentos.CATEGORIAS)
 def gProductos(request):
     """
-    Vista para obtener y mostrar todos los productos de la base de datos.
+    Vista para obtener y mostrar los productos de la base de datos, paginados, filtrados y ordenados.
 
-    Esta vista obtiene todos los productos registrados en la base de datos y calcula 
-    el total de productos y el precio de costo total utilizando métodos de la clase Producto.
-    Luego, renderiza una plantilla con esta información.
+    Esta vista lee el total de productos y el precio de costo total de la valorización del
+    inventario (`ValorizacionInventario`), que se mantiene al día sin recorrer el catálogo,
+    y muestra solo una página de productos (ver `_consultar_productos`), por lo que el costo
+    de la página depende de su tamaño y no del tamaño del catálogo. Los productos que forman cada
+    página se guardan en la caché de fragmentos (ver `_pagina_en_cache`), de modo que después de
+    una venta solo se vuelven a leer las filas de la página.
 
     Parámetros:
-    - request: objeto HttpRequest que contiene los datos de la solicitud.
+    - request: objeto HttpRequest que contiene los datos de la solicitud. Acepta por GET los filtros
+      `q`, `categoria` y `stock_bajo`, el orden `orden` y la página `page`.
 
     Retorna:
-    - Una respuesta renderizada con la lista de productos, el total de productos y el total 
+    - Una respuesta renderizada con la página de productos, el total de productos y el total 
       del precio de costo.
     """
     
-    # Obtiene todos los productos de la base de datos
-    productos = Producto.objects.all()
-
-    # Llama al método de clase 'contar_productos_totales' para obtener el total de productos
-    total_productos = Producto.contar_productos_totales()
-
-    # Llama al método de clase 'sumar_precio_costo_total' para obtener la suma total del precio de costo de los productos
-    total_precio_costo = Producto.sumar_precio_costo_total()
+    # Obtiene el total de productos y la suma del precio de costo del stock desde la valorización del inventario
+    valorizacion = ValorizacionInventario.totales()
+    total_productos = valorizacion['cantidad_productos']
+    total_precio_costo = valorizacion['valor_costo']
 
-    # Renderiza la plantilla 'productos.html' y pasa los productos, total de productos y total de precio de costo
+    # Obtiene la página de productos según los filtros y el orden
+    mensaje = None
+    try:
+        pagina, orden = _pagina_productos(request, total_productos)
+    except ValueError:
+        mensaje = "Los filtros ingresados no son válidos."
+        pagina, orden = Paginator(Producto.objects.none(), PRODUCTOS_POR_PAGINA).get_page(1), 'codigo'
+
+    # Filtros actuales sin la página, para los enlaces de paginación
+    filtros = request.GET.copy()
+    filtros.pop('page', None)
+
+    # Filtros actuales sin el orden, para los enlaces de las columnas
+    filtros_orden = filtros.copy()
+    filtros_orden.pop('orden', None)
+    columnas = [
+        (titulo, '-' + clave if orden == clave else clave, clave == orden.lstrip('-'), orden.startswith('-'))
+        for clave, titulo, _ in COLUMNAS_PRODUCTOS
+    ]
+
+    # Renderiza la plantilla 'productos.html' y pasa la página de productos, total de productos y total de precio de costo
     return render(request, 'producto/productos.html', {
-        'productos': productos,                  # Lista de productos para mostrar en la plantilla
+        'productos': pagina,                     # Página de productos para mostrar en la plantilla
         'total_productos': total_productos,      # Total de productos para mostrar en la plantilla
-        'total_precio_costo': total_precio_costo # Total de precio de costo de los productos para mostrar en la plantilla
+        'total_precio_costo': total_precio_costo, # Total de precio de costo de los productos para mostrar en la plantilla
+        'columnas': columnas,                    # Columnas con su enlace de orden
+        'filtros': filtros,                      # Filtros aplicados
+        'filtros_query': filtros.urlencode(),
+        'filtros_orden_query': filtros_orden.urlencode(),
+        'categorias': Categoria.objects.order_by('nombre').only('categoria_id', 'nombre'),
+        'mensaje': mensaje,
     })
 
 
+@login_required
+@condicional(fragmentos.CATALOGO, fragmentos.STOCK, fragmentos.CATEGORIAS)
+def productos_json(request):
+    """
+    Vista que retorna una página de la lista de productos en formato JSON.
+
+    Usa la misma consulta que `gProductos` (filtros, orden y paginación), para que la lista
+    pueda cargar sus páginas sin recargar la página completa.
+
+    Parámetros:
+    - request: objeto HttpRequest con los mismos parámetros GET que `gProductos`.
+
+    Retorna:
+    - JsonResponse con los productos de la página, el número de página, la cantidad de páginas,
+      la cantidad de productos encontrados y si hay página anterior o siguiente.
+    """
+    try:
+        pagina, orden = _pagina_productos(request, ValorizacionInventario.totales()['cantidad_productos'])
+    except ValueError:
+        return JsonResponse({'status': 'error', 'mensaje': 'Los filtros ingresados no son válidos.'}, status=400)
+
+    return JsonResponse({
+        'productos': [
+            {
+                'codigo': producto.codigo_producto,
+                'nombre': producto.nombre_producto,
+                'precio_costo': producto.precio_costo,
+                'precio_venta': producto.precio_venta,
+                'stock_minimo': producto.stock_minimo,
+                'stock_actual': producto.stock_actual,
+                'categoria': producto.categoria.nombre if producto.categoria else None,
+            }
+            for producto in pagina
+        ],
+        'pagina': pagina.number,
+        'paginas': pagina.paginator.num_pages,
+        'total': pagina.paginator.count,
+        'tiene_anterior': pagina.has_previous(),
+        'tiene_siguiente': pagina.has_next(),
+        'orden': orden,
+    })
+
+
+
+def _categoria_stock_bajo(parametros):
+    """
+    Lee el filtro de categoría del reporte de stock bajo.
+
+    :return: Id de la categoría, ``'sin'`` para los productos sin categoría, o `None` sin filtro.
+    :raises ValueError: Si el valor no es válido.
+    """
+    categoria = parametros.get('categoria')
+    if not categoria:
+        return None
+    return categoria if categoria == 'sin' else int(categoria)
+
+
+@login_required
+def stock_bajo(request):
+    """
+    Vista del reporte de reposición: los productos en su stock mínimo o por debajo, agrupados por
+    categoría y con la cantidad sugerida a reponer.
+
+    El reporte se arma desde la lista precalculada de stock bajo (ver `sistemaApp.reposicion`),
+    por lo que no recorre el catálogo.
+
+    Parámetros:
+    - request: objeto HttpRequest que contiene los datos de la solicitud. Acepta por GET el filtro `categoria`.
+
+    Retorna:
+    - Una respuesta renderizada con los productos agrupados por categoría.
+    """
+    mensaje = None
+    try:
+        categoria_id = _categoria_stock_bajo(request.GET)
+    except ValueError:
+        mensaje = "Los filtros ingresados no son válidos."
+        categoria_id = None
+    grupos = reporte_stock_bajo(categoria_id)
+
+    return render(request, 'producto/stock_bajo.html', {
+        'grupos': grupos,
+        'total_productos': sum(len(grupo['productos']) for grupo in grupos),
+        'categorias': Categoria.objects.order_by('nombre').only('categoria_id', 'nombre'),
+        'categoria': request.GET.get('categoria', ''),
+        'mensaje': mensaje,
+    })
+
+
+@login_required
+@condicional(fragmentos.CATALOGO, fragmentos.STOCK, fragmentos.CATEGORIAS)
+def stock_bajo_json(request):
+    """
+    Vista que retorna el reporte de reposición en formato JSON (ver `stock_bajo`).
+
+    Parámetros:
+    - request: objeto HttpRequest. Acepta por GET el filtro `categoria`.
+
+    Retorna:
+    - JsonResponse con los productos con stock bajo agrupados por categoría y la cantidad total de productos.
+    """
+    try:
+        categoria_id = _categoria_stock_bajo(request.GET)
+    except ValueError:
+        return JsonResponse({'status': 'error', 'mensaje': 'Los filtros ingresados no son válidos.'}, status=400)
+    grupos = reporte_stock_bajo(categoria_id)
+
+    return JsonResponse({
+        'categorias': grupos,
+        'total': sum(len(grupo['productos']) for grupo in grupos),
+    })
+
 
 @login_required  # Asegura que solo los usuarios autenticados puedan acceder a esta vista
 def crear_producto(request):
@@ -392,6 +726,57 @@ def crear_producto(request):
 
 
 
+#: Cantidad máxima de errores por fila que se muestran tras una importación.
+ERRORES_IMPORTACION_VISIBLES = 200
+
+
+@login_required  # Asegura que solo los usuarios autenticados puedan acceder a esta vista
+def importar_productos_view(request):
+    """
+    Vista para importar (crear o actualizar) productos desde un archivo CSV o XLSX.
+
+    El archivo se procesa por lotes (ver `sistemaApp.importacion`): el precio de venta se calcula
+    con la misma regla que el formulario de productos y cada lote se guarda con operaciones
+    masivas. Las filas con errores se omiten y se listan al terminar.
+
+    Parámetros:
+    - request: objeto HttpRequest que contiene los datos de la solicitud. Por POST recibe el
+      archivo `archivo` y la opción `crear_categorias`.
+
+    Retorna:
+    - Una respuesta renderizada con el formulario de importación y, si se envió un archivo,
+      el resumen de la importación.
+    """
+    
+    resultado = None
+    errores = []
+    if request.method == 'POST':
+        archivo = request.FILES.get('archivo')
+        if archivo is None:
+            messages.error(request, 'Debe seleccionar un archivo.')
+        else:
+            try:
+                # Importa el archivo por lotes
+                resultado = importar_productos(
+                    archivo.file, archivo.name, crear_categorias=bool(request.POST.get('crear_categorias'))
+                )
+            except ErrorImportacion as error:
+                messages.error(request, str(error))
+            else:
+                errores = resultado.errores[:ERRORES_IMPORTACION_VISIBLES]
+                messages.success(
+                    request,
+                    f'Importación terminada: {resultado.creados} productos creados y {resultado.actualizados} actualizados.'
+                )
+
+    # Renderiza la plantilla 'importar_productos.html' con el resumen de la importación
+    return render(request, 'producto/importar_productos.html', {
+        'resultado': resultado,
+        'errores': errores,
+        'errores_ocultos': len(resultado.errores) - len(errores) if resultado else 0,
+    })
+
+
 @login_required  # Asegura que solo los usuarios autenticados puedan acceder a esta vista
 def modificar_producto(request, codigo_producto):
     """
@@ -478,27 +863,58 @@ def eliminar_producto(request, codigo_producto):
     return render(request, 'producto/eliminar_producto.html', {'producto': producto})
 
 
+#: Campos de la valorización del inventario que se muestran por categoría.
+CAMPOS_VALORIZACION_CATEGORIA = ('cantidad_productos', 'unidades', 'valor_costo')
+
+#: Columnas de la lista de productos de una categoría (las de `COLUMNAS_PRODUCTOS` sin la categoría).
+COLUMNAS_PRODUCTOS_CATEGORIA = [columna for columna in COLUMNAS_PRODUCTOS if columna[0] != 'categoria']
+
+
+def _categorias_valorizadas():
+    """
+    Retorna las categorías con su valorización del inventario (`ValorizacionInventario`) en la
+    misma consulta: `cantidad_productos`, `unidades` y `valor_costo` se leen con subconsultas
+    sobre la clave única de la valorización, sin recorrer los productos de cada categoría.
+
+    :rtype: django.db.models.QuerySet
+    """
+    valorizacion = ValorizacionInventario.objects.filter(clave_categoria=OuterRef('categoria_id'))
+    return Categoria.objects.annotate(**{
+        campo: Coalesce(Subquery(valorizacion.values(campo)[:1]), 0, output_field=BigIntegerField())
+        for campo in CAMPOS_VALORIZACION_CATEGORIA
+    })
+
+
 @login_required  # Asegura que solo los usuarios autenticados puedan acceder a esta vista
+@condicional(fragmentos.STOCK, fragmentos.CATEGORIAS)
 def gDepartamentos(request):
     """
-    Vista para mostrar las categorías de departamentos.
+    Vista para mostrar las categorías de departamentos con sus estadísticas de productos.
 
-    Esta vista obtiene todas las categorías de departamentos de la base de datos y las pasa
-    a la plantilla 'departamento/departamentos.html' para ser renderizadas.
+    Esta vista obtiene las categorías junto con la cantidad de productos, las unidades en stock
+    y el valor del stock a precio de costo de cada una, leídos de la valorización del inventario
+    en una sola consulta (ver `_categorias_valorizadas`), y los pasa a la plantilla
+    'departamento/departamentos.html' para ser renderizados. La consulta se hace al mostrar la
+    tabla, por lo que no se hace si la tabla está en la caché de fragmentos (ver
+    `sistemaApp.fragmentos`).
 
     Parámetros:
     - request: objeto HttpRequest que contiene los datos de la solicitud.
 
     Retorna:
-    - Una respuesta renderizada con las categorías obtenidas de la base de datos.
+    - Una respuesta renderizada con las categorías, sus estadísticas y los totales.
     """
     
-    # Obtiene todas las categorías de la base de datos
-    categoria = Categoria.objects.all()  # 'Categoria' es el modelo que almacena las categorías
+    # Obtiene las categorías con su valorización del inventario
+    categoria = _categorias_valorizadas().order_by('categoria_id')
 
-    # Renderiza la plantilla 'departamento/departamentos.html' y pasa las categorías al contexto
-    return render(request, 'departamento/departamentos.html', {'categoria': categoria})
+    # Suma las estadísticas de todas las categorías (con las filas ya leídas para la tabla)
+    totales = SimpleLazyObject(lambda: {
+        campo: sum(getattr(fila, campo) for fila in categoria) for campo in CAMPOS_VALORIZACION_CATEGORIA
+    })
 
+    # Renderiza la plantilla 'departamento/departamentos.html' y pasa las categorías al contexto
+    return render(request, 'departamento/departamentos.html', {'categoria': categoria, 'totales': totales})
 
 
 @login_required  # Asegura que solo los usuarios autenticados puedan acceder a esta vista
@@ -616,30 +1032,75 @@ def eliminar_departamentos(request, categoria_id):
 @login_required  # Asegura que solo los usuarios autenticados puedan acceder a esta vista
 def productos_asociados(request, categoria_id):
     """
-    Vista para mostrar los productos asociados a una categoría específica.
+    Vista para mostrar los productos asociados a una categoría específica, paginados y ordenados.
 
-    Esta vista obtiene una categoría por su ID y filtra los productos que están asociados a esa categoría.
-    Luego, renderiza una página que muestra la categoría y los productos asociados.
+    Esta vista obtiene la categoría por su ID junto con su valorización del inventario, y muestra
+    solo una página de sus productos, leyendo únicamente las columnas de la lista. Sin búsqueda,
+    el total de productos sale de la valorización y no hace falta contarlos, por lo que el costo
+    de la página no depende del tamaño de la categoría.
 
     Parámetros:
-    - request: objeto HttpRequest que contiene los datos de la solicitud.
+    - request: objeto HttpRequest que contiene los datos de la solicitud. Acepta por GET la búsqueda
+      `q`, el filtro `stock_bajo`, el orden `orden`, la página `page` y `por_pagina`.
     - categoria_id: el ID de la categoría de la cual se desean obtener los productos asociados.
 
     Retorna:
-    - Renderiza la plantilla 'prod_asociados.html' con los productos asociados a la categoría.
+    - Renderiza la plantilla 'prod_asociados.html' con la categoría y la página de productos asociados.
     """
     
-    # Se obtiene la categoría con el ID proporcionado en la URL, o se muestra una página de error si no existe
-    categoria = get_object_or_404(Categoria, categoria_id=categoria_id)
-    
-    # Se filtran los productos que pertenecen a esta categoría específica
-    productos = Producto.objects.filter(categoria=categoria)
+    # Se obtiene la categoría con su valorización, o se muestra una página de error si no existe
+    categoria = get_object_or_404(_categorias_valorizadas(), categoria_id=categoria_id)
+
+    # Se consulta la página de productos de la categoría, sin el nombre de la categoría (ya se conoce)
+    parametros = request.GET.copy()
+    parametros['categoria'] = str(categoria.categoria_id)
+    mensaje = None
+    try:
+        orden = parametros.get('orden') or 'codigo'
+        if orden.lstrip('-') not in {clave for clave, _, _ in COLUMNAS_PRODUCTOS_CATEGORIA}:
+            raise ValueError("Orden no válido.")
+        productos, _, orden = _consultar_productos(parametros)
+        productos = productos.select_related(None).only(
+            'codigo_producto', 'nombre_producto', 'precio_costo', 'precio_venta', 'stock_minimo', 'stock_actual',
+        )
+        try:
+            por_pagina = int(parametros.get('por_pagina') or PRODUCTOS_POR_PAGINA)
+        except ValueError:
+            por_pagina = PRODUCTOS_POR_PAGINA
+        # Sin filtros, el total sale de la valorización del inventario y no hace falta contar.
+        filtrado = parametros.get('q', '').strip() or parametros.get('stock_bajo')
+        pagina = SimpleLazyObject(lambda: _pagina_en_cache(
+            request, productos, max(1, min(por_pagina, MAXIMO_PRODUCTOS_POR_PAGINA)), parametros.get('page'),
+            None if filtrado else categoria.cantidad_productos, _versiones_lista_productos(parametros, orden),
+        ))
+    except ValueError:
+        mensaje = "Los filtros ingresados no son válidos."
+        pagina, orden = Paginator(Producto.objects.none(), PRODUCTOS_POR_PAGINA).get_page(1), 'codigo'
+
+    # Filtros actuales sin la página, para los enlaces de paginación, y sin el orden, para las columnas
+    filtros = request.GET.copy()
+    filtros.pop('page', None)
+    filtros_orden = filtros.copy()
+    filtros_orden.pop('orden', None)
+    columnas = [
+        (titulo, '-' + clave if orden == clave else clave, clave == orden.lstrip('-'), orden.startswith('-'))
+        for clave, titulo, _ in COLUMNAS_PRODUCTOS_CATEGORIA
+    ]
     
-    # Se renderiza la plantilla 'prod_asociados.html', pasando la categoría y los productos asociados
-    return render(request, 'departamento/prod_asociados.html', {'categoria': categoria, 'productos': productos})
+    # Se renderiza la plantilla 'prod_asociados.html', pasando la categoría y la página de productos
+    return render(request, 'departamento/prod_asociados.html', {
+        'categoria': categoria,
+        'productos': pagina,
+        'columnas': columnas,
+        'filtros': filtros,
+        'filtros_query': filtros.urlencode(),
+        'filtros_orden_query': filtros_orden.urlencode(),
+        'mensaje': mensaje,
+    })
 
 
 @login_required  # Asegura que solo los usuarios autenticados puedan acceder a esta vista
+@condicional(fragmentos.PROVEEDORES)
 def gProveedor(request):
     """
     Vista para mostrar la lista de proveedores ordenados por su ID.
@@ -752,23 +1213,266 @@ def eliminar_proveedor(request, id):
     return render(request, 'proveedor/eliminar_proveedor.html', {'proveedor': proveedor})
 
 
+#: Clientes por página del directorio de clientes.
+CLIENTES_POR_PAGINA = 50
+
+#: Cantidad máxima de clientes que retorna el buscador de clientes de la caja.
+CLIENTES_AUTOCOMPLETAR = 10
+
+#: Orden del directorio de clientes; la paginación por cursor usa los mismos campos.
+ORDEN_CLIENTES = ('apellido', 'nombre', 'id_cliente')
+
+
+def _buscar_clientes(texto):
+    """
+    Filtra los clientes por un texto de búsqueda, con condiciones que usan los índices de la
+    tabla `cliente` (ver la migración ``0012_indices_cliente``):
+
+    - Un número (con o sin ``+``) busca el inicio del teléfono o, si no tiene ``+``, el id del cliente.
+    - Un texto busca clientes cuyo nombre o apellido comience con cada una de sus palabras
+      (por ejemplo, "ana pér" encuentra a Ana Pérez).
+
+    :param texto: Texto de búsqueda (vacío para todos los clientes).
+    :return: QuerySet de `Cliente` sin ordenar.
+    """
+    clientes = Cliente.objects.all()
+    texto = (texto or '').strip()
+    if not texto:
+        return clientes
+    if texto.lstrip('+').isdigit():
+        condicion = Q(telefono__startswith=texto)
+        if texto.isdigit() and len(texto) <= 9:
+            condicion |= Q(id_cliente=int(texto))
+        return clientes.filter(condicion)
+    for palabra in texto.split():
+        clientes = clientes.filter(Q(nombre__istartswith=palabra) | Q(apellido__istartswith=palabra))
+    return clientes
+
+
+def _cursor_cliente(cliente):
+    """
+    Codifica la posición de un cliente en el orden `ORDEN_CLIENTES`, para los enlaces de paginación.
+    """
+    valores = [getattr(cliente, campo) for campo in ORDEN_CLIENTES]
+    return urlsafe_base64_encode(json.dumps(valores, ensure_ascii=False).encode())
+
+
+def _leer_cursor_cliente(cursor):
+    """
+    Decodifica un cursor de `_cursor_cliente`.
+
+    :return: Tupla ``(apellido, nombre, id_cliente)``.
+    :raises ValueError: Si el cursor no es válido.
+    """
+    try:
+        apellido, nombre, id_cliente = json.loads(urlsafe_base64_decode(cursor))
+        return str(apellido), str(nombre), int(id_cliente)
+    except (TypeError, ValueError):
+        raise ValueError("Cursor no válido.")
+
+
+def _pagina_clientes(parametros, por_pagina=CLIENTES_POR_PAGINA):
+    """
+    Obtiene una página del directorio de clientes con paginación por cursor: cada página es una
+    consulta que continúa después (o antes) del último cliente de la página anterior en el orden
+    `ORDEN_CLIENTES`, por lo que su costo no depende de cuántas páginas haya antes.
+
+    :param parametros: Diccionario con el texto de búsqueda `q` y, opcionalmente, el cursor
+                       `despues` (página siguiente) o `antes` (página anterior).
+    :param por_pagina: Cantidad de clientes por página.
+    :return: Tupla ``(clientes, anterior, siguiente)`` con la lista de clientes de la página y
+             los cursores de las páginas anterior y siguiente (`None` si no hay).
+    :raises ValueError: Si el cursor no es válido.
+    """
+    clientes = _buscar_clientes(parametros.get('q'))
+    if parametros.get('antes'):
+        apellido, nombre, id_cliente = _leer_cursor_cliente(parametros['antes'])
+        pagina = list(clientes.filter(
+            Q(apellido__lt=apellido) | Q(apellido=apellido, nombre__lt=nombre)
+            | Q(apellido=apellido, nombre=nombre, id_cliente__lt=id_cliente)
+        ).order_by(*('-' + campo for campo in ORDEN_CLIENTES))[:por_pagina + 1])
+        hay_anterior = len(pagina) > por_pagina
+        pagina = pagina[:por_pagina][::-1]
+        hay_siguiente = True
+    else:
+        if parametros.get('despues'):
+            apellido, nombre, id_cliente = _leer_cursor_cliente(parametros['despues'])
+            clientes = clientes.filter(
+                Q(apellido__gt=apellido) | Q(apellido=apellido, nombre__gt=nombre)
+                | Q(apellido=apellido, nombre=nombre, id_cliente__gt=id_cliente)
+            )
+        pagina = list(clientes.order_by(*ORDEN_CLIENTES)[:por_pagina + 1])
+        hay_anterior = bool(parametros.get('despues'))
+        hay_siguiente = len(pagina) > por_pagina
+        pagina = pagina[:por_pagina]
+    if not pagina:
+        return [], None, None
+    return (
+        pagina,
+        _cursor_cliente(pagina[0]) if hay_anterior else None,
+        _cursor_cliente(pagina[-1]) if hay_siguiente else None,
+    )
+
+
 @login_required  # Asegura que solo los usuarios autenticados puedan acceder a esta vista
 def gCliente(request):
     """
-    Vista para obtener y mostrar todos los clientes.
+    Vista para buscar y mostrar los clientes, por páginas.
 
-    Obtiene todos los clientes de la base de datos y los pasa a la plantilla 'clientes.html' para ser mostrados.
+    Muestra una página del directorio de clientes ordenado por apellido y nombre, filtrado por el
+    texto de búsqueda (ver `_buscar_clientes`) y paginado por cursor (ver `_pagina_clientes`), por
+    lo que el costo de la página no depende de la cantidad de clientes. La página se consulta al
+    mostrar la tabla, por lo que no se consulta si la tabla está en la caché de fragmentos (ver
+    `sistemaApp.fragmentos`).
+
+    Parámetros:
+    - request: objeto HttpRequest que contiene los datos de la solicitud. Acepta por GET el texto
+      de búsqueda `q` y los cursores de paginación `despues` y `antes`.
+
+    Retorna:
+    - Renderiza la plantilla 'clientes.html' con la página de clientes y los enlaces a las páginas
+      anterior y siguiente.
+    """
+    mensaje = None
+    parametros = request.GET
+    try:
+        for cursor in (parametros.get('antes'), parametros.get('despues')):
+            if cursor:
+                _leer_cursor_cliente(cursor)
+    except ValueError:
+        mensaje = "El enlace de la página no es válido."
+        parametros = {'q': request.GET.get('q')}
+
+    # Página de clientes con los cursores de las páginas anterior y siguiente, consultada al mostrarla
+    pagina = SimpleLazyObject(lambda: dict(zip(('clientes', 'anterior', 'siguiente'), _pagina_clientes(parametros))))
+
+    return render(request, 'cliente/clientes.html', {
+        'pagina': pagina,
+        'q': request.GET.get('q', ''),
+        'mensaje': mensaje,
+    })
+
+
+@login_required
+@condicional(fragmentos.CLIENTES)
+async def clientes_json(request):
+    """
+    Vista asíncrona del buscador de clientes de la caja: retorna en JSON los primeros clientes
+    que coinciden con el texto de búsqueda (ver `_buscar_clientes`).
+
+    Reemplaza la lista desplegable con todos los clientes en el formulario de venta, por lo que
+    la página de la caja no crece con la cantidad de clientes.
+
+    Parámetros:
+    - request: objeto HttpRequest. Acepta por GET el texto de búsqueda `q`.
+
+    Retorna:
+    - JsonResponse con la lista `clientes` (id, nombre, apellido, teléfono, deuda y límite de crédito).
+    """
+    texto = request.GET.get('q', '').strip()
+    clientes = []
+    if texto:
+        consulta = _buscar_clientes(texto).order_by(*ORDEN_CLIENTES).values(
+            'id_cliente', 'nombre', 'apellido', 'telefono', 'deuda', 'limite_credito'
+        )[:CLIENTES_AUTOCOMPLETAR]
+        clientes = [cliente async for cliente in consulta]
+    return JsonResponse({'clientes': clientes})
+
+
+#: Clientes por página del reporte de antigüedad de deudas.
+CLIENTES_POR_PAGINA_ANTIGUEDAD = 50
+
+#: Clientes por consulta al exportar el reporte de antigüedad de deudas.
+CLIENTES_POR_LOTE_ANTIGUEDAD = 2000
+
+
+@login_required
+def antiguedad_deudas(request):
+    """
+    Vista del reporte de antigüedad de deudas: cuánto debe cada cliente y hace cuánto tiempo, en
+    tramos de 0-30, 31-60, 61-90 y más de 90 días, con los totales de cada tramo.
+
+    El reporte se calcula agrupando la deuda pendiente por día (ver `sistemaApp.cobranza`), que
+    se mantiene al día con cada venta a crédito y cada abono, por lo que no recorre las ventas.
+    Muestra una página de clientes, de la mayor deuda a la menor.
+
+    Parámetros:
+    - request: objeto HttpRequest que contiene los datos de la solicitud. Acepta por GET la página `page`.
+
+    Retorna:
+    - Una respuesta renderizada con los totales por tramo y la página de clientes.
+    """
+    totales = cobranza.totales_antiguedad()
+    paginador = Paginator(cobranza.antiguedad_por_cliente(), CLIENTES_POR_PAGINA_ANTIGUEDAD)
+    # La cantidad de clientes con deuda ya viene en los totales y no hace falta contarlos.
+    paginador.count = totales['clientes']
+    return render(request, 'cliente/antiguedad_deudas.html', {
+        'tramos': [(etiqueta, totales[nombre]) for nombre, etiqueta, _ in cobranza.TRAMOS],
+        'totales': totales,
+        'clientes': paginador.get_page(request.GET.get('page')),
+    })
+
+
+class _Eco:
+    """
+    Archivo de solo escritura que retorna lo que se escribe, para generar un CSV por partes con
+    `csv.writer`.
+    """
+
+    def write(self, valor):
+        return valor
+
+
+def _contenido_antiguedad(hoy, tamano=CLIENTES_POR_LOTE_ANTIGUEDAD):
+    """
+    Genera el reporte de antigüedad de deudas en CSV por partes, leyendo los clientes en lotes
+    consecutivos por id (paginación por cursor) para no cargar el reporte completo en memoria.
+
+    :param hoy: Día desde el que se cuenta la antigüedad (el mismo para todos los lotes).
+    :param tamano: Cantidad de clientes por lote.
+    :return: Generador de cadenas de texto.
+    """
+    escritor = csv.writer(_Eco())
+    campos = [nombre for nombre, _, _ in cobranza.TRAMOS]
+    yield escritor.writerow(
+        ['ID Cliente', 'Nombre', 'Apellido'] + [etiqueta for _, etiqueta, _ in cobranza.TRAMOS] + ['Total']
+    )
+    filas = cobranza.antiguedad_por_cliente(hoy, orden='cliente_id')
+    totales = dict.fromkeys(campos + ['total'], 0)
+    ultimo = None
+    while True:
+        lote = list((filas if ultimo is None else filas.filter(cliente_id__gt=ultimo))[:tamano])
+        lineas = []
+        for fila in lote:
+            for campo in totales:
+                totales[campo] += fila[campo]
+            lineas.append(escritor.writerow(
+                [fila['cliente_id'], fila['cliente__nombre'], fila['cliente__apellido']]
+                + [fila[campo] for campo in campos] + [fila['total']]
+            ))
+        yield ''.join(lineas)
+        if len(lote) < tamano:
+            break
+        ultimo = lote[-1]['cliente_id']
+    yield escritor.writerow(['', 'Total', ''] + [totales[campo] for campo in campos] + [totales['total']])
+
+
+@login_required
+def antiguedad_deudas_csv(request):
+    """
+    Vista que exporta el reporte de antigüedad de deudas de todos los clientes en formato CSV
+    (ver `antiguedad_deudas`), enviándolo mientras se genera (`StreamingHttpResponse`).
 
     Parámetros:
     - request: objeto HttpRequest que contiene los datos de la solicitud.
 
     Retorna:
-    - Renderiza la plantilla 'clientes.html', pasando todos los clientes obtenidos desde la base de datos como contexto.
+    - StreamingHttpResponse: Un archivo CSV con la deuda de cada cliente por tramo y los totales.
     """
-    
-    clientes = Cliente.objects.all()  # Obtiene todos los clientes de la base de datos
-    return render(request, 'cliente/clientes.html', {'clientes': clientes})
-    # Renderiza la plantilla 'clientes.html', pasando los clientes obtenidos como contexto
+    hoy = timezone.localdate()
+    response = StreamingHttpResponse(_contenido_antiguedad(hoy), content_type='text/csv; charset=utf-8')
+    response['Content-Disposition'] = f'attachment; filename=antiguedad_deudas_{hoy.isoformat()}.csv'
+    return response
 
 
 @login_required  # Asegura que solo los usuarios autenticados puedan acceder a esta vista
@@ -803,7 +1507,13 @@ def crear_cliente(request):
 
         try:
             cliente.full_clean()  # Valida todos los campos del cliente según las restricciones del modelo
-            cliente.save()  # Si la validación es exitosa, guarda el cliente en la base de datos
+            # Si la validación es exitosa, guarda el cliente en la base de datos; la deuda inicial
+            # se registra como ajuste en el libro de deudas
+            deuda = cliente.deuda or 0
+            cliente.deuda = 0
+            with transaction.atomic():
+                cliente.save()
+                MovimientoDeuda.ajustar(cliente.id_cliente, deuda, usuario_id=request.user.pk)
             return redirect('GestionClientes')  # Redirige a la vista de gestión de clientes
         except ValidationError as e:
             # Si hay errores de validación, se capturan y se devuelven a la vista con los mensajes de error
@@ -844,7 +1554,12 @@ def modificar_cliente(request, id_cliente):
                 # Guarda los datos del cliente sin confirmación inmediata (commit=False)
                 cliente = form.save(commit=False)
                 cliente.full_clean()  # Valida el cliente antes de guardarlo
-                cliente.save()  # Guarda el cliente modificado en la base de datos
+                # Guarda el cliente modificado en la base de datos; si se cambió la deuda, la
+                # diferencia se registra como ajuste en el libro de deudas
+                with transaction.atomic():
+                    cliente.save(update_fields=[campo for campo in form.Meta.fields if campo != 'deuda'])
+                    if 'deuda' in form.changed_data:
+                        MovimientoDeuda.ajustar(cliente.id_cliente, cliente.deuda or 0, usuario_id=request.user.pk)
                 return redirect('GestionClientes')  # Redirige a la vista de gestión de clientes
             except ValidationError as e:
                 # Si hay un error de validación, se agrega al formulario para mostrarlo al usuario
@@ -916,7 +1631,7 @@ def abonar_deuda(request, id_cliente):
                 messages.error(request, "El monto debe ser mayor a 0.")  # Mensaje de error si el monto no es válido
             else:
                 # Llama al método 'abonar_deuda' del modelo Cliente para reducir la deuda
-                cliente.abonar_deuda(monto)
+                cliente.abonar_deuda(monto, usuario_id=request.user.pk)
                 # Muestra un mensaje de éxito al usuario
                 messages.success(request, f"Se abonaron ${monto} a la deuda del cliente.")
                 return redirect('GestionClientes')  # Redirige a la vista de gestión de clientes
@@ -959,13 +1674,14 @@ def aumentar_deuda(request, id_cliente):
             if monto <= 0:
                 messages.error(request, "El monto debe ser mayor a 0.")  # Mensaje de error si el monto no es válido
             else:
-                # Verifica si el cliente tiene un límite de crédito y si el aumento de deuda supera ese límite
-                if cliente.limite_credito != -1 and cliente.deuda + monto > cliente.limite_credito:
+                # Registra el cargo en el libro de deudas; la base de datos verifica el límite de crédito
+                # en la misma sentencia que aumenta la deuda
+                try:
+                    MovimientoDeuda.cargar(cliente.id_cliente, monto, usuario_id=request.user.pk)
+                except LimiteCreditoError:
                     messages.error(request, "El monto a aumentar supera el límite de crédito del cliente.")
                 else:
                     # Si el monto es válido y no supera el límite de crédito, se aumenta la deuda
-                    cliente.deuda += monto  
-                    cliente.save()  # Guarda los cambios en la base de datos
                     messages.success(request, f"Se aumentó ${monto} a la deuda del cliente.")  # Mensaje de éxito
                 return redirect('GestionClientes')  # Redirige a la vista de gestión de clientes
         except ValueError:
@@ -977,81 +1693,140 @@ def aumentar_deuda(request, id_cliente):
 
 
 @login_required
-def agregar_producto(request):
+async def agregar_producto(request):
     """
     Vista para agregar productos al carrito de compras (sesión de productos agregados).
 
     Si la solicitud es de tipo POST, el código o nombre del producto y la cantidad solicitada son procesados.
-    Si el producto es encontrado en la base de datos y hay suficiente stock, el producto se agrega a la sesión.
+    Si el producto es encontrado en la base de datos y hay suficiente stock, el producto se agrega al carrito
+    (si ya estaba, se suma la cantidad).
     Si no hay suficiente stock o el producto no existe, se muestra un mensaje de error.
 
     Parámetros:
     - request: objeto HttpRequest que contiene los datos de la solicitud.
 
     Retorna:
-    - Si la solicitud es POST, redirige a la misma vista con el mensaje de éxito o error y los productos agregados a la sesión.
-    - Calcula el total de la venta sumando el precio por cantidad de cada producto agregado.
+    - Si la solicitud es POST, redirige a la misma vista con el mensaje de éxito o error y los productos agregados al carrito.
+    - El total de la venta lo mantiene el carrito de forma incremental.
     """
     
-    # Verifica si no existen productos agregados en la sesión y los inicializa como una lista vacía
-    if 'productos_agregados' not in request.session:
-        request.session['productos_agregados'] = []
+    # Obtiene el carrito de la caja asociado a la sesión y carga sus líneas
+    carrito = await Carrito.apara_request(request)
+    await carrito.acargar()
 
     mensaje = None  # Variable para almacenar mensajes de éxito o error
     if request.method == 'POST':  # Verifica si la solicitud es un POST (el usuario ha enviado el formulario)
         producto_input = request.POST.get('producto')  # Obtiene el código o nombre del producto ingresado
-        cantidad = int(request.POST.get('cantidad', 1))  # Obtiene la cantidad solicitada (por defecto 1)
+        try:
+            cantidad = int(request.POST.get('cantidad') or 1)  # Obtiene la cantidad solicitada (por defecto 1)
+        except ValueError:
+            cantidad = 0
 
-        if producto_input:  # Verifica si se ha ingresado un código o nombre de producto
+        if cantidad <= 0:
+            # Mensaje de error si la cantidad no es un número mayor a 0
+            mensaje = "La cantidad debe ser un número mayor a 0."
+        elif producto_input:  # Verifica si se ha ingresado un código o nombre de producto
             try:
-                # Si el valor ingresado es un número, busca el producto por código
+                # Si el valor ingresado es un número, busca el producto por código en la caché de productos
                 if producto_input.isdigit():  
-                    producto = Producto.objects.get(codigo_producto=producto_input)
+                    producto = await _producto_por_codigo(producto_input)
+                    if producto is None:
+                        raise Producto.DoesNotExist
                 else:
-                    # Si no es un número, busca el producto por nombre (con búsqueda parcial)
-                    producto = Producto.objects.get(nombre_producto__icontains=producto_input)
-
-                # Verifica si hay suficiente stock para la cantidad solicitada
-                if producto.stock_actual >= cantidad:
-                    # Si hay stock suficiente, agrega el producto a la sesión
-                    producto_data = {
-                        'codigo': producto.codigo_producto,
-                        'nombre': producto.nombre_producto,
-                        'precio_venta': producto.precio_venta,
-                        'cantidad': cantidad,
-                        'stock_actual': producto.stock_actual
-                    }
-                    request.session['productos_agregados'].append(producto_data)  # Agrega el producto a la lista de productos en sesión
-                    request.session.modified = True  # Marca la sesión como modificada para guardar los cambios
+                    # Si no es un número, busca el producto por su nombre completo y, si no hay
+                    # ninguno, por una parte del nombre
+                    try:
+                        fila = await Producto.objects.aget(nombre_producto__iexact=producto_input)
+                    except Producto.DoesNotExist:
+                        fila = await Producto.objects.aget(nombre_producto__icontains=producto_input)
+                    producto = registro_producto(fila)
+
+                # Verifica si hay suficiente stock para la cantidad solicitada más la que ya está en el carrito
+                if producto['stock_actual'] >= carrito.cantidad(producto['codigo']) + cantidad:
+                    # Si hay stock suficiente, agrega el producto al carrito (o suma la cantidad si ya estaba)
+                    await carrito.aagregar(producto, cantidad)
 
                     # Mensaje de éxito
-                    mensaje = f"Producto '{producto.nombre_producto}' agregado con éxito. Cantidad: {cantidad}."
+                    mensaje = f"Producto '{producto['nombre']}' agregado con éxito. Cantidad: {cantidad}."
                 else:
                     # Mensaje de error si no hay suficiente stock
-                    mensaje = f"No hay suficiente stock de '{producto.nombre_producto}' para la cantidad solicitada. Stock disponible: {producto.stock_actual}."
+                    mensaje = f"No hay suficiente stock de '{producto['nombre']}' para la cantidad solicitada. Stock disponible: {producto['stock_actual']}."
 
             except Producto.DoesNotExist:
                 # Mensaje de error si el producto no existe en la base de datos
                 mensaje = "El producto no existe."
+            except Producto.MultipleObjectsReturned:
+                # Mensaje de error si el nombre coincide con más de un producto
+                mensaje = f"Hay varios productos que coinciden con '{producto_input}'. Ingrese el código o el nombre completo."
         else:
             # Mensaje de error si no se ha ingresado un producto
             mensaje = "Debe ingresar un código o nombre de producto."
 
-    # Calcula el total de la venta sumando el precio * cantidad de cada producto en la lista
-    total = sum(producto['precio_venta'] * producto['cantidad'] for producto in request.session['productos_agregados'])
-    # Recupera los productos que se han agregado a la sesión
-    productos_agregados = request.session['productos_agregados']
-    
     # Renderiza la plantilla con los mensajes, los productos agregados y el total de la venta
-    return render(request, 'venta/home.html', {'mensaje': mensaje, 'productos_agregados': productos_agregados, 'total': total})
+    return await _arender(request, 'venta/home.html', {
+        'mensaje': _mensaje_carrito(carrito, mensaje), 'productos_agregados': carrito.lineas(), 'total': carrito.total,
+        'form': VentaForm(),
+    })
+
+@login_required
+async def escanear_producto(request):
+    """
+    Vista asíncrona para agregar al carrito un producto escaneado por su código exacto.
+
+    Está pensada para los lectores de código de barras: busca el producto en la caché de
+    productos (sin consultar la base de datos si ya estaba en caché), lo agrega al carrito
+    y responde en JSON, sin volver a renderizar la página de la caja.
+
+    Parámetros:
+    - request: objeto HttpRequest con los campos POST `codigo` y `cantidad` (por defecto 1).
+
+    Retorna:
+    - JsonResponse con el estado, el mensaje, la línea actualizada del carrito y el total.
+    """
+    
+    # Solo se aceptan solicitudes POST
+    if request.method != 'POST':
+        return JsonResponse({'status': 'error', 'mensaje': 'Método no permitido.'}, status=405)
+
+    try:
+        # Obtiene la cantidad a agregar (por defecto 1)
+        cantidad = int(request.POST.get('cantidad') or 1)
+    except ValueError:
+        return JsonResponse({'status': 'error', 'mensaje': 'Cantidad inválida.'}, status=400)
+    if cantidad <= 0:
+        return JsonResponse({'status': 'error', 'mensaje': 'La cantidad debe ser mayor a 0.'}, status=400)
+
+    # Obtiene el producto desde la caché de productos
+    producto = await _producto_por_codigo(request.POST.get('codigo'))
+    if producto is None:
+        return JsonResponse({'status': 'error', 'mensaje': 'El producto no existe.'}, status=404)
+
+    # Si se perdieron productos del carrito, la página de la caja muestra un carrito que ya no
+    # existe: se pide recargarla antes de seguir agregando.
+    carrito = await Carrito.apara_request(request)
+    await carrito.acargar()
+    if carrito.incompleto:
+        return JsonResponse({
+            'status': 'error', 'mensaje': f'{carrito.aviso} Recargue la página de la caja.', 'total': carrito.total,
+        }, status=409)
+
+    # Agrega el producto al carrito si hay stock suficiente
+    agregado, mensaje = await _agregar_al_carrito(carrito, producto, cantidad)
+
+    return JsonResponse({
+        'status': 'success' if agregado else 'error',
+        'mensaje': mensaje,
+        'linea': {**producto, 'cantidad': carrito.cantidad(producto['codigo'])},
+        'total': carrito.total,
+    }, status=200 if agregado else 409)
+
 
 @login_required
 def quitar_producto(request, codigo_producto):
     """
-    Vista para eliminar un producto del carrito de compras (productos agregados a la sesión).
+    Vista para eliminar un producto del carrito de compras de la caja.
 
-    Si la lista de productos agregados existe en la sesión, se elimina el producto con el código proporcionado.
-    Luego, la sesión se actualiza con la lista de productos sin el producto eliminado.
+    Se elimina del carrito la línea del producto con el código proporcionado.
 
     Parámetros:
     - request: objeto HttpRequest que contiene los datos de la solicitud.
@@ -1061,17 +1836,10 @@ def quitar_producto(request, codigo_producto):
     - Redirige al usuario a la página de inicio (Home) después de eliminar el producto.
     """
     
-    # Verifica si existe una lista de productos agregados en la sesión
-    if 'productos_agregados' in request.session:
-        # Obtiene la lista de productos agregados desde la sesión
-        productos = request.session.get('productos_agregados', [])
-        
-        # Crea una lista con los productos que no coincidan con el código del producto a eliminar
-        productos_actualizados = [producto for producto in productos if producto['codigo'] != codigo_producto]
-        
-        # Actualiza la sesión con la lista de productos actualizada (sin el producto eliminado)
-        request.session['productos_agregados'] = productos_actualizados
-        request.session.modified = True  # Marca la sesión como modificada para guardar los cambios
+    # El código llega como texto desde la URL; las líneas del carrito se indexan por código numérico
+    if codigo_producto.isdigit():
+        # Quita la línea del producto; solo se escribe esa línea en el almacén del carrito
+        Carrito.para_request(request).quitar(int(codigo_producto))
 
     # Redirige al usuario a la página de inicio (Home) después de eliminar el producto
     return redirect('Home')
@@ -1082,7 +1850,7 @@ def cancelar_venta(request):
     """
     Vista para cancelar una venta eliminando los productos agregados del carrito de compras.
 
-    Si existen productos agregados en la sesión, se elimina la lista de productos de la sesión y se marca la sesión como modificada para guardar los cambios.
+    Se eliminan todas las líneas del carrito de la caja.
 
     Parámetros:
     - request: objeto HttpRequest que contiene los datos de la solicitud.
@@ -1091,13 +1859,8 @@ def cancelar_venta(request):
     - JsonResponse: Un objeto JSON con el estado de la operación (success).
     """
     
-    # Verifica si existen productos agregados en la sesión
-    if 'productos_agregados' in request.session:
-        # Elimina la lista de productos agregados de la sesión
-        del request.session['productos_agregados']
-        
-        # Marca la sesión como modificada para que los cambios se guarden
-        request.session.modified = True  
+    # Vacía el carrito de la caja
+    Carrito.para_request(request).vaciar()
 
     # Devuelve una respuesta JSON con el estado de la operación
     return JsonResponse({'status': 'success'})
@@ -1108,7 +1871,21 @@ def registrar_venta(request):
     """
     Vista para registrar una venta, procesando el formulario y actualizando el stock de los productos.
 
-    Si la solicitud es de tipo POST, procesa los datos del formulario y registra la venta en la base de datos. Además, actualiza el stock de los productos comprados y limpia la lista de productos agregados en la sesión.
+    Si la solicitud es de tipo POST, procesa los datos del formulario y registra la venta en la base de datos. Además, actualiza el stock de los productos comprados y vacía el carrito de la caja.
+
+    Según ``settings.VENTAS_MODO`` (ver `sistemaApp.diario_ventas.modo_ventas`), la venta se registra
+    directamente, se guarda en el diario local de ventas si la base de datos no responde
+    (``'respaldo'``), o siempre se guarda en el diario local para registrarla después (``'diferido'``).
+    Las ventas a crédito nunca se guardan en el diario (ver `diario_ventas.METODOS_EN_LINEA`): se
+    registran en la base de datos, que verifica el límite del cliente, y si no responde se rechazan.
+
+    La sesión, el usuario (ver `sistemaApp.autenticacion`), el cliente (ver
+    `forms.cliente_existe`) y el carrito se leen de la caché, por lo que el cobro no necesita la
+    base de datos mientras estén en ella. Si alguno no está en caché y la base de datos no
+    responde, la petición falla antes de llegar a esta vista.
+
+    Si se perdieron productos del carrito (ver `carrito.CarritoIncompletoError`), la venta no se
+    registra y se muestra el carrito que queda con el aviso, para que la caja lo revise.
 
     Parámetros:
     - request: objeto HttpRequest que contiene los datos de la solicitud.
@@ -1131,31 +1908,48 @@ def registrar_venta(request):
             # Asignamos la fecha de la venta a la fecha actual
             venta.fecha = timezone.now()
             
-            # Calculamos el total de la venta sumando el precio de venta de cada producto multiplicado por la cantidad
-            venta.total = sum(
-                producto['precio_venta'] * producto['cantidad']
-                for producto in request.session.get('productos_agregados', [])
-            )
-            
             # Asignamos el vendedor como el usuario logueado
             venta.vendedor = request.user
-            
-            # Guardamos la venta en la base de datos
-            venta.save()
-
-            # Actualizamos el stock de los productos que fueron comprados
-            for producto_data in request.session['productos_agregados']:
-                producto = Producto.objects.get(codigo_producto=producto_data['codigo'])
-                
-                # Restamos la cantidad de productos comprados del stock actual
-                producto.stock_actual -= producto_data['cantidad']
-                
-                # Guardamos el producto actualizado
-                producto.save()
-
-            # Limpiamos la lista de productos agregados en la sesión, ya que la venta ha sido registrada
-            request.session['productos_agregados'] = []
-            request.session.modified = True
+
+            carrito = Carrito.para_request(request)
+
+            lineas = carrito.lineas()
+            modo = diario_ventas.modo_ventas()
+
+            try:
+                if carrito.incompleto:
+                    # No se cobra un carrito al que le faltan productos sin que la caja lo revise.
+                    raise carrito.incompleto
+                if modo == 'diferido' and venta.metodo_pago not in diario_ventas.METODOS_EN_LINEA:
+                    # Guarda la venta en el diario local; el cobro no espera a la base de datos.
+                    diario_ventas.encolar_venta(venta, lineas)
+                elif modo in ('respaldo', 'diferido'):
+                    # Registra la venta con una clave única; si la base de datos no responde, la guarda
+                    # en el diario local con la misma clave para registrarla después sin duplicarla.
+                    # Los demás errores (por ejemplo, un bloqueo mutuo) se propagan.
+                    clave = uuid.uuid4()
+                    try:
+                        diario_ventas.registrar_con_clave(venta, lineas, clave)
+                    except DatabaseError as error:
+                        if not conexiones.es_error_conexion(error):
+                            raise
+                        # Las ventas a crédito no se guardan: `encolar_venta` las rechaza.
+                        diario_ventas.encolar_venta(venta, lineas, clave)
+                else:
+                    # Registra la venta, sus líneas y descuenta el stock en una sola transacción.
+                    # El total se calcula con el precio vigente de cada producto.
+                    caja.registrar_venta(venta, lineas)
+            except ValueError as e:
+                # Carrito incompleto, stock insuficiente, venta vacía o límite de crédito superado
+                return render(request, 'venta/home.html', {
+                    'form': form,
+                    'mensaje': str(e),
+                    'productos_agregados': lineas,
+                    'total': carrito.total,
+                })
+
+            # Vaciamos el carrito, ya que la venta ha sido registrada
+            carrito.vaciar()
 
             # Redirigimos al usuario a la página de inicio
             return redirect('Home')
@@ -1169,96 +1963,332 @@ def registrar_venta(request):
 
 
 @login_required
-def historial_ventas(request):
+def detalle_venta(request, id_venta):
     """
-    Vista para mostrar el historial de ventas, incluyendo una lista de ventas, el total de ventas realizadas y la suma de los totales.
-
-    Obtiene todas las ventas ordenadas por fecha (de la más reciente a la más antigua) y calcula el número total de ventas y la suma de los montos de todas las ventas.
+    Vista para mostrar los productos vendidos en una venta.
 
     Parámetros:
     - request: objeto HttpRequest que contiene los datos de la solicitud.
+    - id_venta: ID de la venta a consultar.
 
     Retorna:
-    - Render: Renderiza la plantilla 'historial_ventas.html' con la lista de ventas, el número total de ventas y la suma de los totales de las ventas.
+    - Render: Renderiza la plantilla 'detalle_venta.html' con la venta y sus líneas.
     """
     
-    # Obtiene todas las ventas ordenadas por fecha en orden descendente (de la más reciente a la más antigua)
-    ventas = Venta.objects.all().order_by('-fecha')
+    # Busca la venta con el id proporcionado, si no existe, devuelve un error 404
+    venta = get_object_or_404(Venta, id_venta=id_venta)
+
+    # Obtiene las líneas de la venta junto con su producto en una sola consulta
+    detalles = venta.detalles.select_related('producto').order_by('id')
+
+    return render(request, 'venta/detalle_venta.html', {'venta': venta, 'detalles': detalles})
+
+
+#: Cantidad de ventas por página en el historial.
+VENTAS_POR_PAGINA = 50
+
+
+def _rango_fechas(desde, hasta):
+    """
+    Convierte un rango de fechas (texto 'AAAA-MM-DD') en un rango de fechas y horas.
+
+    El rango se aplica sobre la columna `fecha` sin funciones, para que la base de datos
+    pueda usar el índice de `venta`.
+
+    :param desde: Fecha inicial (inclusive) o cadena vacía.
+    :param hasta: Fecha final (inclusive) o cadena vacía.
+    :return: Tupla ``(inicio, fin)`` con el inicio del primer día y el inicio del día siguiente
+             al último (cualquiera puede ser `None`).
+    :raises ValueError: Si alguna fecha no tiene el formato esperado.
+    """
+    inicio = fin = None
+    if desde:
+        inicio = timezone.make_aware(datetime.combine(datetime.strptime(desde, '%Y-%m-%d').date(), time.min))
+    if hasta:
+        dia_final = datetime.strptime(hasta, '%Y-%m-%d').date() + timedelta(days=1)
+        fin = timezone.make_aware(datetime.combine(dia_final, time.min))
+    return inicio, fin
+
+
+def _filtrar_ventas(ventas, filtros):
+    """
+    Aplica los filtros del historial de ventas a un queryset de ventas.
+
+    :param ventas: QuerySet de `Venta`.
+    :param filtros: Diccionario (por ejemplo `request.GET`) con las claves opcionales
+                    `desde`, `hasta`, `metodo_pago`, `cliente` y `vendedor`.
+    :return: QuerySet filtrado.
+    :raises ValueError: Si las fechas o los identificadores no son válidos.
+    """
+    inicio, fin = _rango_fechas(filtros.get('desde'), filtros.get('hasta'))
+    if inicio:
+        ventas = ventas.filter(fecha__gte=inicio)
+    if fin:
+        ventas = ventas.filter(fecha__lt=fin)
+    if filtros.get('metodo_pago'):
+        ventas = ventas.filter(metodo_pago=filtros['metodo_pago'])
+    if filtros.get('cliente'):
+        ventas = ventas.filter(id_cliente_id=int(filtros['cliente']))
+    if filtros.get('vendedor'):
+        ventas = ventas.filter(vendedor_id=int(filtros['vendedor']))
+    return ventas
+
+
+def _codificar_cursor(venta):
+    """
+    Codifica la posición de una venta en el historial como ``<microsegundos>_<id_venta>``.
+    """
+    delta = venta.fecha - datetime(1970, 1, 1, tzinfo=dt_timezone.utc)
+    return f"{delta // timedelta(microseconds=1)}_{venta.id_venta}"
+
+
+def _decodificar_cursor(cursor):
+    """
+    Decodifica un cursor generado por `_codificar_cursor`.
+
+    :return: Tupla ``(fecha, id_venta)``.
+    :raises ValueError: Si el cursor no es válido.
+    """
+    microsegundos, id_venta = cursor.split('_')
+    fecha = datetime(1970, 1, 1, tzinfo=dt_timezone.utc) + timedelta(microseconds=int(microsegundos))
+    return fecha, int(id_venta)
+
+
+def _totales_ventas(filtros):
+    """
+    Calcula la cantidad y la suma de las ventas que cumplen los filtros del historial.
+
+    Los filtros de fecha, método de pago y vendedor se resuelven con el resumen diario
+    (`ResumenVentaDiario`), que tiene a lo más una fila por día, método y vendedor. Solo el
+    filtro por cliente, que el resumen no guarda, requiere sumar las ventas.
+
+    :param filtros: Diccionario con los filtros del historial (ver `_filtrar_ventas`).
+    :return: Tupla ``(cantidad_ventas, total)``.
+    :raises ValueError: Si los filtros no son válidos.
+    """
+    if filtros.get('cliente'):
+        totales = _filtrar_ventas(Venta.objects.all(), filtros).aggregate(cantidad=Count('id_venta'), suma=Sum('total'))
+        return totales['cantidad'], totales['suma'] or 0
+    _rango_fechas(filtros.get('desde'), filtros.get('hasta'))
+    return ResumenVentaDiario.totales(
+        desde=filtros.get('desde'),
+        hasta=filtros.get('hasta'),
+        metodo_pago=filtros.get('metodo_pago'),
+        vendedor=int(filtros['vendedor']) if filtros.get('vendedor') else None,
+    )
+
+
+@login_required
+def historial_ventas(request):
+    """
+    Vista para mostrar el historial de ventas, incluyendo una página de ventas, el total de ventas realizadas y la suma de los totales.
+
+    El número de ventas y la suma de los totales se leen del resumen diario de ventas y
+    respetan los filtros aplicados (ver `_totales_ventas`).
+
+    Las ventas se muestran de la más reciente a la más antigua con paginación por cursor (keyset)
+    sobre ``(fecha, id_venta)``: cada página busca directamente a partir de la última venta de la
+    página anterior, por lo que su costo no depende de cuántas ventas hay en la tabla. El cliente
+    y el vendedor se obtienen en la misma consulta (`select_related`).
+
+    Parámetros:
+    - request: objeto HttpRequest que contiene los datos de la solicitud. Acepta por GET los filtros
+      `desde`, `hasta`, `metodo_pago`, `cliente` y `vendedor`, y el cursor `despues`.
+
+    Retorna:
+    - Render: Renderiza la plantilla 'historial_ventas.html' con la página de ventas, el cursor de la
+      página siguiente, el número total de ventas y la suma de los totales de las ventas.
+    """
     
-    # Llama a un método personalizado para contar el número total de ventas
-    contar_ventas = Venta.contar_ventas()
+    # Ventas ordenadas por fecha e id en orden descendente, con cliente y vendedor en la misma consulta
+    ventas = Venta.objects.select_related('id_cliente', 'vendedor').only(
+        'id_venta', 'fecha', 'total', 'metodo_pago',
+        'id_cliente__nombre', 'id_cliente__apellido', 'vendedor__username',
+    ).order_by('-fecha', '-id_venta')
+
+    mensaje = None
+    try:
+        # Aplica los filtros de fecha, método de pago, cliente y vendedor
+        ventas = _filtrar_ventas(ventas, request.GET)
+
+        # Si hay cursor, continúa después de la última venta de la página anterior
+        if request.GET.get('despues'):
+            fecha, id_venta = _decodificar_cursor(request.GET['despues'])
+            ventas = ventas.filter(Q(fecha__lt=fecha) | Q(fecha=fecha, id_venta__lt=id_venta))
+    except ValueError:
+        mensaje = "Los filtros ingresados no son válidos."
+        ventas = ventas.none()
+
+    # Se pide una venta extra para saber si existe una página siguiente
+    pagina = list(ventas[:VENTAS_POR_PAGINA + 1])
+    siguiente = None
+    if len(pagina) > VENTAS_POR_PAGINA:
+        pagina = pagina[:VENTAS_POR_PAGINA]
+        siguiente = _codificar_cursor(pagina[-1])
+
+    # Filtros actuales (sin el cursor) para construir los enlaces de paginación
+    filtros = request.GET.copy()
+    filtros.pop('despues', None)
     
-    # Llama a un método personalizado para calcular la suma de los totales de todas las ventas
-    sumar_totales = Venta.sumar_totales()
+    # Número de ventas y suma de los totales según los filtros, leídos del resumen diario
+    try:
+        contar_ventas, sumar_totales = _totales_ventas(request.GET)
+    except ValueError:
+        contar_ventas, sumar_totales = 0, 0
     
     # Renderiza la plantilla 'historial_ventas.html' con los datos obtenidos
     return render(request, 'venta/historial_ventas.html', {
-        'ventas': ventas,              # Lista de ventas para mostrar en el historial
+        'ventas': pagina,                # Página de ventas para mostrar en el historial
+        'siguiente': siguiente,          # Cursor de la página siguiente (None si es la última)
+        'es_primera': 'despues' not in request.GET,
+        'filtros': filtros,              # Filtros aplicados
+        'filtros_query': filtros.urlencode(),
+        'vendedores': User.objects.order_by('username').only('id', 'username'),
+        'metodos_pago': [metodo for metodo, _ in VentaForm.base_fields['metodo_pago'].choices],
+        'mensaje': mensaje,
         'contar_ventas': contar_ventas,  # Número total de ventas realizadas
         'sumar_totales': sumar_totales,  # Suma total de los montos de todas las ventas
     })
 
+#: Cantidad de ventas leídas por consulta al generar el reporte.
+VENTAS_POR_LOTE_REPORTE = 2000
+
+
+def _ventas_por_lotes(ventas, tamano=VENTAS_POR_LOTE_REPORTE):
+    """
+    Recorre un queryset de ventas en lotes consecutivos ordenados por ``(fecha, id_venta)``.
+
+    Cada lote es una consulta que continúa después de la última venta del lote anterior
+    (paginación por cursor), así que en memoria solo hay un lote a la vez, incluso con
+    backends que cargan el resultado completo de cada consulta (como MySQL).
+
+    :param ventas: QuerySet de `Venta` ya filtrado.
+    :param tamano: Cantidad de ventas por lote.
+    :return: Generador de listas de ventas.
+    """
+    ventas = ventas.order_by('fecha', 'id_venta')
+    lote = list(ventas[:tamano])
+    while lote:
+        yield lote
+        if len(lote) < tamano:
+            break
+        ultima = lote[-1]
+        lote = list(ventas.filter(
+            Q(fecha__gt=ultima.fecha) | Q(fecha=ultima.fecha, id_venta__gt=ultima.id_venta)
+        )[:tamano])
+
+
+def _contenido_reporte(ventas, titulo, periodo, resumen=()):
+    """
+    Genera el contenido del reporte de ventas por partes, para enviarlo mientras se lee.
+
+    El número de ventas y la suma total se acumulan en la misma pasada sobre las ventas.
+
+    :param ventas: QuerySet de `Venta` ya filtrado, con cliente y vendedor en `select_related`.
+    :param titulo: Título del reporte.
+    :param periodo: Texto con la fecha o el rango de fechas del reporte.
+    :param resumen: Iterable de diccionarios con `metodo_pago`, `cantidad` y `suma` para el
+                    resumen por método de pago al final del reporte.
+    :return: Generador de cadenas de texto.
+    """
+    yield (
+        f"{titulo}\n"
+        f"Fecha: {periodo}\n"
+        "====================================\n"
+    )
+
+    cantidad = 0
+    suma = 0
+    for lote in _ventas_por_lotes(ventas):
+        lineas = []
+        for venta in lote:
+            cantidad += 1
+            suma += venta.total
+            lineas.append(
+                f"ID: {venta.id_venta}, "
+                f"Cliente: {venta.id_cliente}, "
+                f"Método de Pago: {venta.metodo_pago}, "
+                f"Vendedor: {venta.vendedor}, "
+                f"Total: ${venta.total}\n"
+            )
+        yield ''.join(lineas)
+
+    yield (
+        "====================================\n"
+        f"Total de Ventas: {cantidad}\n"
+        f"Suma Total: ${suma}\n"
+    )
+
+    lineas = [
+        f"{fila['metodo_pago']}: {fila['cantidad']} ventas, ${fila['suma']}\n"
+        for fila in resumen
+    ]
+    if lineas:
+        yield "------------------------------------\nResumen por Método de Pago:\n" + ''.join(lineas)
+
+
+@login_required
 def generar_reporte_ventas(request):
     """
-    Vista para generar un reporte de ventas en formato .txt basado en una fecha seleccionada.
+    Vista para generar un reporte de ventas en formato .txt para una fecha o un rango de fechas.
 
-    La vista permite al usuario seleccionar una fecha a través de un formulario. Filtra las ventas realizadas en esa fecha
-    y genera un archivo de texto con el historial detallado de ventas, incluyendo información como ID de venta, cliente, 
-    método de pago, vendedor y el total. El archivo se ofrece como descarga al usuario.
+    El reporte se envía mientras se genera (`StreamingHttpResponse`): las ventas se leen en lotes
+    con su cliente y vendedor en la misma consulta, y los totales se acumulan en la misma pasada,
+    por lo que la memoria usada no depende de la cantidad de ventas del rango. El resumen por
+    método de pago se lee del resumen diario de ventas.
 
     Parámetros:
     - request: objeto HttpRequest que contiene los datos de la solicitud.
 
     Flujo:
-    1. Se obtiene la fecha seleccionada desde el formulario enviado mediante POST.
-    2. Se valida el formato de la fecha.
-    3. Se filtran las ventas realizadas en la fecha proporcionada.
-    4. Se genera el contenido del archivo .txt con los datos de las ventas.
+    1. Se obtienen las fechas desde el formulario enviado mediante POST: `desde` y `hasta`
+       (si falta `hasta`, se usa solo el día `desde`). También se acepta el campo `fecha` para un solo día.
+    2. Se valida el formato de las fechas.
+    3. Se filtran las ventas realizadas en el rango.
+    4. Se genera el contenido del archivo .txt por partes con los datos de las ventas.
     5. Se retorna el archivo como respuesta para su descarga.
     6. Si no es una solicitud POST, se renderiza una plantilla para seleccionar la fecha.
 
     Retorna:
-    - HttpResponse: Un archivo de texto con las ventas del día seleccionado para su descarga.
+    - StreamingHttpResponse: Un archivo de texto con las ventas del rango seleccionado para su descarga.
     - Render: Renderiza la plantilla 'generar_reporte.html' si no se ha enviado el formulario.
     """
     
     if request.method == 'POST':
-        # Obtiene la fecha seleccionada del formulario en formato de cadena
-        fecha_str = request.POST.get('fecha')
+        # Obtiene las fechas seleccionadas del formulario en formato de cadena
+        desde = request.POST.get('desde') or request.POST.get('fecha')
+        hasta = request.POST.get('hasta') or desde
         
         try:
-            # Convierte la fecha proporcionada a un objeto de tipo date
-            fecha_seleccionada = datetime.strptime(fecha_str, '%Y-%m-%d').date()
-        except ValueError:
-            # Si la fecha no es válida, retorna un mensaje de error
+            # Convierte las fechas proporcionadas en un rango de fechas y horas
+            inicio, fin = _rango_fechas(desde, hasta)
+        except (TypeError, ValueError):
+            # Si alguna fecha no es válida, retorna un mensaje de error
+            return HttpResponse("Fecha inválida", status=400)
+        if inicio is None or inicio >= fin:
             return HttpResponse("Fecha inválida", status=400)
-        
-        # Filtra las ventas realizadas en la fecha seleccionada
-        ventas_del_dia = Venta.objects.filter(fecha__date=fecha_seleccionada)
 
-        # Genera el contenido del archivo .txt
-        contenido = "Historial de Ventas del Día\n"
-        contenido += f"Fecha: {fecha_seleccionada}\n"
-        contenido += "====================================\n"
-        
-        for venta in ventas_del_dia:
-            contenido += (
-                f"ID: {venta.id_venta}, "
-                f"Cliente: {venta.id_cliente}, "
-                f"Método de Pago: {venta.metodo_pago}, "
-                f"Vendedor: {venta.vendedor}, "
-                f"Total: ${venta.total}\n"
-            )
-        
-        contenido += "====================================\n"
-        contenido += f"Total de Ventas: {ventas_del_dia.count()}\n"
-        contenido += f"Suma Total: ${sum(venta.total for venta in ventas_del_dia)}\n"
+        # Filtra las ventas realizadas en el rango, con cliente y vendedor en la misma consulta
+        ventas = Venta.objects.filter(fecha__gte=inicio, fecha__lt=fin).select_related(
+            'id_cliente', 'vendedor'
+        ).only('id_venta', 'fecha', 'total', 'metodo_pago', 'id_cliente__nombre', 'vendedor__username')
 
-        # Devuelve el archivo .txt como respuesta para su descarga
-        response = HttpResponse(contenido, content_type='text/plain')
-        response['Content-Disposition'] = f'attachment; filename=ventas_{fecha_seleccionada}.txt'
+        if desde == hasta:
+            titulo, periodo, nombre = "Historial de Ventas del Día", desde, f"ventas_{desde}.txt"
+        else:
+            titulo, periodo, nombre = "Historial de Ventas", f"{desde} al {hasta}", f"ventas_{desde}_{hasta}.txt"
+
+        # Resumen por método de pago del rango, leído del resumen diario
+        resumen = ResumenVentaDiario.objects.filter(fecha__gte=desde, fecha__lte=hasta).values(
+            'metodo_pago'
+        ).annotate(cantidad=Sum('cantidad_ventas'), suma=Sum('total')).order_by('metodo_pago')
+
+        # Devuelve el archivo .txt como respuesta para su descarga, enviándolo mientras se genera
+        response = StreamingHttpResponse(
+            _contenido_reporte(ventas, titulo, periodo, resumen), content_type='text/plain; charset=utf-8'
+        )
+        response['Content-Disposition'] = f'attachment; filename={nombre}'
         return response
 
     # Renderiza la plantilla para seleccionar una fecha si no es una solicitud POST
     return render(request, 'venta/generar_reporte.html')
-